@@ -0,0 +1,203 @@
+/* BPPOutside.cpp : Implementation of the header-defined interface. The base pair
+ *                  probabilities are computed as the derivatives of the -d2 partition
+ *                  function, u(1,n), with respect to each of its up(i,j) terms:
+ *                  P(i,j) = up(i,j) * d u(1,n) / d up(i,j) / u(1,n).
+ *                  The derivatives (outside values) are accumulated by running the
+ *                  PartitionFunctionD2 recursions backwards, one diagonal of the
+ *                  arrays at a time (from the longest span to the shortest). Since the
+ *                  internal loops are bounded by MAXLOOP, both passes run in O(n^3).
+ */
+
+#include <string.h>
+
+#include <vector>
+#include <new>
+
+#include "include/options.h"
+#include "include/global.h"
+#include "include/utils.h"
+#include "include/boltzmann_main.h"
+#include "include/partition-func-d2.h"
+#include "include/algorithms-partition.h"
+#include "include/AdvancedDouble.h"
+
+#include "BPPOutside.h"
+#include "ErrorHandling.h"
+
+static inline double BPPExp(BPPPartitionFunction_t &pfunc, double arg) {
+     return pfunc.myExp(arg).getNativeValue();
+}
+
+/* The (scaled) Boltzmann weight of the exterior or multiloop contributions of
+ * the pair (h,l) in the s1, s2, s3 and u recursions:
+ */
+static inline double BPPExteriorWeight(BPPPartitionFunction_t &pfunc, int h, int l) {
+     return BPPExp(pfunc, -(pfunc.ED5_new(h, l, h - 1) + pfunc.ED3_new(h, l, l + 1) +
+                            pfunc.auPenalty_new(h, l)) / RT);
+}
+
+/* The weight of the closing pair (i,j) in the upm recursion: */
+static inline double BPPMultiloopClosingWeight(BPPPartitionFunction_t &pfunc, int i, int j) {
+     return BPPExp(pfunc, -(pfunc.EA_new() + pfunc.auPenalty_new(i, j) + pfunc.ED5_new(j, i, j - 1) +
+                            pfunc.ED3_new(j, i, i + 1) + 2 * pfunc.EB_new()) / RT);
+}
+
+/* The pairs for which calc_up(i,j) computes a non-trivial value: */
+static inline bool BPPCanPair(int i, int j) {
+     return canPair(RNA[i], RNA[j]) && !(g_LIMIT_DISTANCE && j - i > g_contactDistance);
+}
+
+static void ComputeOutsideProbabilities(BPPPartitionFunction_t &pfunc, int n,
+		                        BPPTriangularArray &U, BPPTriangularArray &U1,
+		                        BPPTriangularArray &UPX, double **bppProbs) {
+     double M = pfunc.get_M_RT(), Z = U(1, n);
+     // The inside arrays are read past their diagonals at u(j+1,j) = 1 and u1(j+1,j) = 0:
+     #define BPPGetU(i, j)                  ((i) > (j) ? 1.0 : U(i, j))
+     #define BPPGetU1(i, j)                 ((i) > (j) ? 0.0 : U1(i, j))
+     // Outside values of u, u1, s1, s2, s3 and up:
+     BPPTriangularArray Ubar(n), U1bar(n), S1bar(n), S2bar(n), S3bar(n), UPbar(n);
+     std::vector<double> mPow(n + 2), ecmPow(n + 2);
+     for(int k = 0; k <= n + 1; k++) {
+          mPow[k] = BPPExp(pfunc, M * k / RT);
+          ecmPow[k] = BPPExp(pfunc, -(k * (pfunc.EC_new() - M)) / RT);
+     }
+     double ebWeight = BPPExp(pfunc, -pfunc.EB_new() / RT);
+     for(int span = n - 1; span > TURN; span--) {
+          // Each cell only depends on the outside values of longer spans (and on
+          // its own, in the order below), so a diagonal can be filled in parallel:
+          #ifdef _OPENMP
+          #pragma omp parallel for schedule(dynamic)
+          #endif
+          for(int a = 1; a <= n - span; a++) {
+               int b = a + span;
+               // u(a,b) is used by s1(h,b) (with l = a-1), and is the root:
+               double ubar = (a == 1 && b == n) ? 1.0 : 0.0;
+               for(int h = 1; h <= a - 2 - TURN; h++) {
+                    ubar += S1bar(h, b) * UPX(h, a - 1);
+               }
+               Ubar(a, b) = ubar;
+               // u1(a,b) is used by s3(h,b) and s2(h,b+1) (with l = a-1):
+               double u1bar = 0.0;
+               for(int h = 1; h <= a - 2 - TURN; h++) {
+                    double s2bar = (b < n) ? S2bar(h, b + 1) * mPow[1] : 0.0;
+                    u1bar += UPX(h, a - 1) * (S3bar(h, b) + s2bar);
+               }
+               U1bar(a, b) = u1bar;
+               // s3(a,b) is used by u1(i,b) for i <= a:
+               S3bar(a, b) = (a > 1 ? S3bar(a - 1, b) * ecmPow[1] : 0.0) + u1bar * ebWeight;
+               // up(a,b) is used by s1, s2, s3 and u as the pair (h,l), and by the
+               // up(i,j) of the pairs enclosing it in a stack or an internal loop:
+               double upbar = 0.0, extWeight = 0.0;
+               if(BPPCanPair(a, b)) {
+                    extWeight = BPPExteriorWeight(pfunc, a, b);
+                    for(int j = b + 1; j <= n; j++) {
+                         upbar += S1bar(a, j) * BPPGetU(b + 1, j) +
+                                  S2bar(a, j) * mPow[1] * BPPGetU1(b + 1, j - 1);
+                    }
+                    for(int j = b; j <= n && b + 1 <= n; j++) {
+                         upbar += S3bar(a, j) * (ecmPow[j - b] + BPPGetU1(b + 1, j));
+                    }
+                    for(int i = 1; i <= a; i++) {
+                         upbar += Ubar(i, b) * mPow[a - i];
+                    }
+                    upbar *= extWeight;
+                    if(a > 1 && b < n && BPPCanPair(a - 1, b + 1)) {
+                         upbar += UPbar(a - 1, b + 1) *
+                                  BPPExp(pfunc, -(pfunc.eS_new(a - 1, b + 1) - M * 2) / RT);
+                    }
+                    for(int i = a - 1; i >= 1 && a - i - 1 <= MAXLOOP; i--) {
+                         for(int j = b + 1; j <= n && (a - i - 1) + (j - b - 1) <= MAXLOOP; j++) {
+                              if((i == a - 1 && j == b + 1) || UPbar(i, j) == 0.0 || !BPPCanPair(i, j)) {
+                                   continue;
+                              }
+                              upbar += UPbar(i, j) *
+                                       BPPExp(pfunc, -(pfunc.eL_new(i, j, a, b) - M * (j - i - b + a)) / RT);
+                         }
+                    }
+               }
+               UPbar(a, b) = upbar;
+               // s2(a,b) is used by upm(i,b) for i < a (which only up(i,b) uses):
+               double s2bar = 0.0;
+               if(a > 1) {
+                    double upmbar = BPPCanPair(a - 1, b) ?
+                                    UPbar(a - 1, b) * BPPMultiloopClosingWeight(pfunc, a - 1, b) : 0.0;
+                    s2bar = S2bar(a - 1, b) * ecmPow[1] + upmbar * mPow[1];
+               }
+               S2bar(a, b) = s2bar;
+               // s1(a,b) is used by u(i,b) for i <= a:
+               S1bar(a, b) = (a > 1 ? S1bar(a - 1, b) : 0.0) + ubar * mPow[b - a];
+               if(Z > 0.0 && extWeight > 0.0) {
+                    bppProbs[a][b] = UPX(a, b) / extWeight * upbar / Z;
+               }
+          }
+     }
+     #undef BPPGetU
+     #undef BPPGetU1
+}
+
+BPPInsideArrays::BPPInsideArrays(BPPPartitionFunction_t &pfunc, int numBases) : 
+     n(numBases), U(numBases), U1(numBases), UPX(numBases) {
+     #ifdef _OPENMP
+     #pragma omp parallel for schedule(dynamic)
+     #endif
+     for(int i = 1; i <= n; i++) {
+          for(int j = i; j <= n; j++) {
+               U(i, j) = pfunc.get_u(i, j).getNativeValue();
+               U1(i, j) = pfunc.get_u1(i, j).getNativeValue();
+               if(j - i > TURN) {
+                    UPX(i, j) = pfunc.get_up(i, j).getNativeValue() * BPPExteriorWeight(pfunc, i, j);
+               }
+          }
+     }
+}
+
+double ** BPPInsideArrays::ComputeProbabilities(BPPPartitionFunction_t &pfunc) {
+     double **_P = mallocTwoD(n + 1, n + 1);
+     if(_P == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+          return NULL;
+     }
+     for(int i = 0; i <= n; i++) {
+          memset(_P[i], 0, (n + 1) * sizeof(double));
+     }
+     try {
+          ComputeOutsideProbabilities(pfunc, n, U, U1, UPX, _P);
+     } catch(std::bad_alloc &) {
+          freeTwoD(_P, n + 1, n + 1);
+          SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+          return NULL;
+     }
+     return _P;
+}
+
+double ** ComputeD2BasePairProbabilities(MFEStructRuntimeArgs_t *rtArgs) {
+     if(rtArgs == NULL || rtArgs->numBases <= 0) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+          return NULL;
+     }
+     int n = rtArgs->numBases;
+     int no_dangle_mode = 0;
+     if(CALC_PF_DO) no_dangle_mode=1;
+     t1 = get_seconds();
+     // The outside pass relies on the MAXLOOP bounded internal loops of the
+     // approximate up recursion, so it is always used for the inside pass here
+     // (with --exactintloop the callers use the legacy recursions instead):
+     BPPPartitionFunction_t pfunc;
+     pfunc.calculate_partition(n, 0, no_dangle_mode, true, scaleFactor);
+     BPPInsideArrays *insideArrays = NULL;
+     try {
+          insideArrays = new BPPInsideArrays(pfunc, n);
+     } catch(std::bad_alloc &) {
+          insideArrays = NULL;
+     }
+     pfunc.free_partition();
+     if(insideArrays == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+          return NULL;
+     }
+     double **_P = insideArrays->ComputeProbabilities(pfunc);
+     delete insideArrays;
+     t1 = get_seconds() - t1;
+     if(!SILENT && _P != NULL) fprintf(CONFIG_STDMSGOUT, "BPP (inside / outside) running time: %f seconds\n", t1);
+     return _P;
+}
@@ -0,0 +1,69 @@
+/* BPPOutside.h : Base pair probabilities from an outside pass over the GTFold -d2
+ *                partition function arrays.
+ */
+
+#ifndef __BPP_OUTSIDE_H__
+#define __BPP_OUTSIDE_H__
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+#include "PythonConfig.h"
+#include "MFEStruct.h"
+
+/* Returns the (numBases + 1) x (numBases + 1) matrix P with P[i][j] (i < j) the
+ * probability that bases i and j pair (the lower triangle is zero). The matrix is
+ * allocated with mallocTwoD and so is released with freeTwoD. Returns NULL if
+ * the working storage cannot be allocated:
+ */
+double ** ComputeD2BasePairProbabilities(MFEStructRuntimeArgs_t *rtArgs);
+
+#ifdef __cplusplus
+}
+#endif
+
+#ifdef __cplusplus
+
+#include <vector>
+
+#include "include/partition-func-d2.h"
+#include "include/AdvancedDouble.h"
+
+typedef PartitionFunctionD2<AdvancedDouble_Native> BPPPartitionFunction_t;
+
+/* The upper triangle (1 <= i <= j <= n) of an n x n array, stored row by row: */
+class BPPTriangularArray {
+     public:
+          BPPTriangularArray(int numBases) :
+               n(numBases), data(((size_t) numBases * (numBases + 1)) >> 1, 0.0) {}
+          inline double & operator()(int i, int j) {
+               return data[RowOffset(i) + (j - i)];
+          }
+     private:
+          inline size_t RowOffset(int i) const {
+               return ((size_t) (i - 1) * (2 * n + 2 - i)) >> 1;
+          }
+          int n;
+          std::vector<double> data;
+};
+
+/* The two halves of ComputeD2BasePairProbabilities for callers which also use the 
+ * inside arrays of pfunc for something else (the Analyze sampling): the constructor 
+ * keeps a copy of the parts of the inside arrays that the outside pass reads (and 
+ * throws std::bad_alloc if it cannot), so that the partition function arrays can 
+ * be freed before ComputeProbabilities runs the outside pass. The probabilities 
+ * are returned as in ComputeD2BasePairProbabilities:
+ */
+class BPPInsideArrays {
+     public:
+          BPPInsideArrays(BPPPartitionFunction_t &pfunc, int numBases);
+          double ** ComputeProbabilities(BPPPartitionFunction_t &pfunc);
+     private:
+          int n;
+          BPPTriangularArray U, U1, UPX;
+};
+
+#endif
+
+#endif
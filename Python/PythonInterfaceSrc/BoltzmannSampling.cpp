@@ -5,6 +5,12 @@
 
 #include <sys/stat.h>
 #include <sys/types.h>
+#include <string.h>
+#include <math.h>
+
+#include <vector>
+#include <algorithm>
+#include <functional>
 
 #include "include/options.h"
 #include "include/global.h"
@@ -15,12 +21,15 @@
 #include "include/algorithms-partition.h"
 #include "include/stochastic-sampling.h"
 #include "include/stochastic-sampling-d2.h"
+#include "include/random-generator.h"
 #include "include/AdvancedDouble.h"
 
 #include "BoltzmannSampling.h"
+#include "BPPOutside.h"
 #include "Utils.h"
 #include "ErrorHandling.h"
 #include "GTFoldPython.h"
+#include "GTFoldContext.h"
 #include "LoadThermoParams.h"
 
 int OUTPUT_FILES_CONFIG = 0;
@@ -178,6 +187,10 @@ void ValidateOptions(void) {
 }
 
 void * ConfigureBoltzmannMainRuntimeParameters(MFEStructRuntimeArgs_t *rtArgs) {
+     return ConfigureBoltzmannRuntimeParametersWithMFE(rtArgs, NULL);
+}
+
+void * ConfigureBoltzmannRuntimeParametersWithMFE(MFEStructRuntimeArgs_t *rtArgs, double *mfeResult) {
      if(rtArgs == NULL) {
 	  SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
           return NULL;
@@ -230,18 +243,15 @@ void * ConfigureBoltzmannMainRuntimeParameters(MFEStructRuntimeArgs_t *rtArgs) {
 	       fprintf(CONFIG_STDMSGOUT, 
 		          "\nLimiting contact distance to %d\n", contactDistance);
      }
-     if(scaleFactor != 0.0){
+     if(scaleFactor != 0.0 || mfeResult != NULL){
           double mfe = ComputeMFEStructure(rtArgs);
-          scaleFactor = scaleFactor * mfe;
+          if(scaleFactor != 0.0) scaleFactor = scaleFactor * mfe;
+          if(mfeResult != NULL) *mfeResult = mfe;
      }
      return rtArgs;
 }
 
-PyObject * HandleBPP(MFEStructRuntimeArgs_t *rtArgs) {
-     if(rtArgs == NULL) {
-          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
-	     return ReturnPythonNone();
-     }
+static double ** ComputeLegacyBPPArrays(MFEStructRuntimeArgs_t *rtArgs) {
      double **_Q,  **_QM, **_QB, **_P;
      _Q  = mallocTwoD(rtArgs->numBases + 1, rtArgs->numBases + 1);
      _QM = mallocTwoD(rtArgs->numBases + 1, rtArgs->numBases + 1);
@@ -250,10 +260,36 @@ PyObject * HandleBPP(MFEStructRuntimeArgs_t *rtArgs) {
 
      fill_partition_fn_arrays(rtArgs->numBases, _Q, _QB, _QM);
      fillBasePairProbabilities(rtArgs->numBases, _Q, _QB, _QM, _P);
-     if(WRITEAUXFILES) {
+     freeTwoD(_Q,  rtArgs->numBases + 1, rtArgs->numBases + 1);
+     freeTwoD(_QM, rtArgs->numBases + 1, rtArgs->numBases + 1);
+     freeTwoD(_QB, rtArgs->numBases + 1, rtArgs->numBases + 1);
+     return _P;
+}
+
+/* With the (default) -d2 energy model, the probabilities come from the O(n^3) 
+ * outside pass over the -d2 partition function arrays. The outside pass needs the 
+ * approximate up recursion, so with --exactintloop (and in the other dangle modes) 
+ * the O(n^4) Dirks & Pierce style recursions in algorithms-partition.c are used: 
+ */
+static double ** ComputeBPPArrays(MFEStructRuntimeArgs_t *rtArgs) {
+     double **_P = CALC_PF_D2 && PF_D2_UP_APPROX_ENABLED ? ComputeD2BasePairProbabilities(rtArgs) : 
+                                                           ComputeLegacyBPPArrays(rtArgs);
+     if(_P != NULL && WRITEAUXFILES) {
           printBasePairProbabilitiesDetail(rtArgs->numBases, structure, _P, bppOutFile);
           if(!SILENT) fprintf(CONFIG_STDMSGOUT, "Saved BPP output in %s\n", bppOutFile);
      }
+     return _P;
+}
+
+PyObject * HandleBPP(MFEStructRuntimeArgs_t *rtArgs) {
+     if(rtArgs == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+	     return ReturnPythonNone();
+     }
+     double **_P = ComputeBPPArrays(rtArgs);
+     if(_P == NULL) {
+          return ReturnPythonNone();
+     }
      PyGILState_STATE pgState = PyGILState_Ensure();
      int nb = rtArgs->numBases, lstIdx = 0;
      PyObject *pyStructObj = PyList_New(nb * (nb - 1) >> 1);
@@ -270,33 +306,158 @@ PyObject * HandleBPP(MFEStructRuntimeArgs_t *rtArgs) {
      Py_INCREF(pyStructObj);
      PyGILState_Release(pgState);
       
-     freeTwoD(_Q,  rtArgs->numBases + 1, rtArgs->numBases + 1);
-     freeTwoD(_QM, rtArgs->numBases + 1, rtArgs->numBases + 1);
-     freeTwoD(_QB, rtArgs->numBases + 1, rtArgs->numBases + 1);
      freeTwoD(_P,  rtArgs->numBases + 1, rtArgs->numBases + 1);
      return pyStructObj;
 }
 
+/* Copies the probabilities in _P into a new bytearray laid out as in matrixFormat: */
+static PyObject * PackBPPMatrix(double **_P, int nb, int matrixFormat) {
+     bool packedMatrix = (matrixFormat & BPP_MATRIX_PACKED) != 0;
+     bool singlePrecision = (matrixFormat & BPP_MATRIX_FLOAT32) != 0;
+     size_t numEntries = packedMatrix ? ((size_t) nb * (nb - 1)) >> 1 : (size_t) nb * nb;
+     size_t entrySize = singlePrecision ? sizeof(float) : sizeof(double);
+     // The bytearray is only visible to this thread until it is returned, so 
+     // it is filled in without holding the GIL: 
+     PyGILState_STATE pgState = PyGILState_Ensure();
+     PyObject *bppMatrixObj = PyByteArray_FromStringAndSize(NULL, numEntries * entrySize);
+     char *bppMatrixData = bppMatrixObj == NULL ? NULL : PyByteArray_AS_STRING(bppMatrixObj);
+     PyGILState_Release(pgState);
+     if(bppMatrixObj == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+          return NULL;
+     }
+     memset(bppMatrixData, 0, numEntries * entrySize);
+     size_t packedIdx = 0;
+     for(int i = 1; i <= nb; i++) {
+          for(int j = i + 1; j <= nb; j++, packedIdx++) {
+               // Only the pairs that can close a hairpin have a nonzero probability: 
+               double bppValue = (j - i > 3) ? _P[i][j] : 0.0;
+               size_t ijIdx = packedMatrix ? packedIdx : (size_t) (i - 1) * nb + (j - 1);
+               size_t jiIdx = packedMatrix ? packedIdx : (size_t) (j - 1) * nb + (i - 1);
+               if(singlePrecision) {
+                    ((float *) bppMatrixData)[ijIdx] = ((float *) bppMatrixData)[jiIdx] = (float) bppValue;
+               }
+               else {
+                    ((double *) bppMatrixData)[ijIdx] = ((double *) bppMatrixData)[jiIdx] = bppValue;
+               }
+          }
+     }
+     return bppMatrixObj;
+}
+
+PyObject * HandleBPPMatrix(MFEStructRuntimeArgs_t *rtArgs, int matrixFormat) {
+     if(rtArgs == NULL || rtArgs->numBases <= 0) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+          return ReturnPythonNone();
+     }
+     double **_P = ComputeBPPArrays(rtArgs);
+     if(_P == NULL) {
+          return ReturnPythonNone();
+     }
+     int nb = rtArgs->numBases;
+     PyObject *bppMatrixObj = PackBPPMatrix(_P, nb, matrixFormat);
+     freeTwoD(_P, nb + 1, nb + 1);
+     if(bppMatrixObj == NULL) {
+          return ReturnPythonNone();
+     }
+     return bppMatrixObj;
+}
+
+PyObject * HandleBPPSparse(MFEStructRuntimeArgs_t *rtArgs, double cutoff, int topKPerBase) {
+     if(rtArgs == NULL || rtArgs->numBases <= 0) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+          return ReturnPythonNone();
+     }
+     double **_P = ComputeBPPArrays(rtArgs);
+     if(_P == NULL) {
+          return ReturnPythonNone();
+     }
+     int nb = rtArgs->numBases;
+     // Only the pairs that can close a hairpin have a nonzero probability: 
+     #define BPPSparseEntry(i, j)        ((j) - (i) > 3 || (i) - (j) > 3 ? _P[MIN(i, j)][MAX(i, j)] : 0.0)
+     std::vector<double> unpairedProbs(nb, 1.0), topKThresholds(nb, cutoff), baseProbs;
+     for(int i = 1; i <= nb; i++) {
+          baseProbs.clear();
+          for(int j = 1; j <= nb; j++) {
+               double bppValue = BPPSparseEntry(i, j);
+               unpairedProbs[i - 1] -= bppValue;
+               if(bppValue >= cutoff && bppValue > 0.0) {
+                    baseProbs.push_back(bppValue);
+               }
+          }
+          unpairedProbs[i - 1] = MAX(0.0, MIN(1.0, unpairedProbs[i - 1]));
+          if(topKPerBase > 0 && (int) baseProbs.size() > topKPerBase) {
+               std::nth_element(baseProbs.begin(), baseProbs.begin() + (topKPerBase - 1), 
+                                baseProbs.end(), std::greater<double>());
+               topKThresholds[i - 1] = baseProbs[topKPerBase - 1];
+          }
+     }
+     std::vector<int> iIndices, jIndices;
+     std::vector<double> pairProbs;
+     for(int i = 1; i <= nb; i++) {
+          for(int j = i + 4; j <= nb; j++) {
+               double bppValue = BPPSparseEntry(i, j);
+               if(bppValue < cutoff || bppValue <= 0.0 || 
+                  (bppValue < topKThresholds[i - 1] && bppValue < topKThresholds[j - 1])) {
+                    continue;
+               }
+               iIndices.push_back(i - 1);
+               jIndices.push_back(j - 1);
+               pairProbs.push_back(bppValue);
+          }
+     }
+     #undef BPPSparseEntry
+     freeTwoD(_P, nb + 1, nb + 1);
+     size_t numPairs = pairProbs.size();
+     PyGILState_STATE pgState = PyGILState_Ensure();
+     PyObject *sparseTuple = Py_BuildValue("(NNNN)", 
+          PyByteArray_FromStringAndSize((const char *) iIndices.data(), numPairs * sizeof(int)), 
+          PyByteArray_FromStringAndSize((const char *) jIndices.data(), numPairs * sizeof(int)), 
+          PyByteArray_FromStringAndSize((const char *) pairProbs.data(), numPairs * sizeof(double)), 
+          PyByteArray_FromStringAndSize((const char *) unpairedProbs.data(), nb * sizeof(double)));
+     PyGILState_Release(pgState);
+     if(sparseTuple == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+          return ReturnPythonNone();
+     }
+     return sparseTuple;
+}
+
+PyObject * HandleBPPOutput(MFEStructRuntimeArgs_t *rtArgs, const BPPOutputFormat_t *bppFormat) {
+     if(bppFormat == NULL || bppFormat->outputMode == BPP_OUTPUT_LIST) {
+          return HandleBPP(rtArgs);
+     }
+     else if(bppFormat->outputMode == BPP_OUTPUT_MATRIX) {
+          return HandleBPPMatrix(rtArgs, bppFormat->matrixFormat);
+     }
+     return HandleBPPSparse(rtArgs, bppFormat->cutoff, bppFormat->topKPerBase);
+}
+
 /* Start sampling functions and data: */
-#include <map>
 #include <string>
 #include <utility>
 #include <iostream>
 
-typedef std::map< std::string,std::pair<int,double> > RawSampleDataList_t;
+/* The distinct sampled structures with their (count, energy), see structure_table.h: */
+typedef sample_table_t RawSampleDataList_t;
 
-PyObject * PackageBatchSampleOutputForPython(RawSampleDataList_t rawSampleData) {
+/* The actual probability of each structure is its Boltzmann weight over the 
+ * partition function, exp(logPFunc). The structures are listed in sorted order: 
+ */
+static PyObject * PackageSampleOutputForPython(const RawSampleDataList_t &rawSampleData, int numSamples, 
+		                                   double logPFunc) {
      PyGILState_STATE pgState = PyGILState_Ensure();
      PyObject *structObjList = PyList_New(rawSampleData.size());
      PyGILState_Release(pgState);
      int lstIdx = 0;
-     std::map< std::string,std::pair<int,double> >::iterator iter;
-     for(iter = rawSampleData.begin(); iter != rawSampleData.end();  ++iter) {
-          const std::string& ss = iter->first;
-          const std::pair<int, double>& pp = iter->second;
-          const double& estimated_p =  (double) pp.first / (double) num_rnd;
+     std::vector<size_t> order = rawSampleData.sorted_indices();
+     std::string ss;
+     for(size_t e = 0; e < order.size(); ++e) {
+          rawSampleData.structure(order[e], ss);
+          const std::pair<int, double>& pp = rawSampleData.value(order[e]);
+          const double& estimated_p =  (double) pp.first / (double) numSamples;
           const double& energy = pp.second;
-          double actual_p = pow(2.718281, -1.0 * energy * 100 / RT) / U;
+          double actual_p = exp(-1.0 * energy * 100 / RT - logPFunc);
 	     pgState = PyGILState_Ensure();
 	     PyObject *structTuple = PyTuple_New(4);
 	     PyTuple_SetItem(structTuple, 0, PyFloat_FromDouble(estimated_p));
@@ -313,10 +474,44 @@ PyObject * PackageBatchSampleOutputForPython(RawSampleDataList_t rawSampleData)
      return structObjList;
 }
 
+PyObject * PackageBatchSampleOutputForPython(const RawSampleDataList_t &rawSampleData) {
+     return PackageSampleOutputForPython(rawSampleData, num_rnd, log((double) U));
+}
+
+/* The raw (mergeable) counts: a list of (dotStruct, count, energy) tuples: */
+static PyObject * PackageSampleSummaryForPython(RawSampleDataList_t &rawSampleData) {
+     PyGILState_STATE pgState = PyGILState_Ensure();
+     PyObject *structObjList = PyList_New(rawSampleData.size());
+     int lstIdx = 0;
+     std::vector<size_t> order = rawSampleData.sorted_indices();
+     std::string ss;
+     for(size_t e = 0; structObjList != NULL && e < order.size(); ++e) {
+          const std::pair<int, double>& pp = rawSampleData.value(order[e]);
+          PyObject *structTuple = Py_BuildValue("(sid)", rawSampleData.structure(order[e], ss), 
+			                        pp.first, pp.second);
+          if(structTuple == NULL) {
+               Py_CLEAR(structObjList);
+               break;
+          }
+          PyList_SET_ITEM(structObjList, lstIdx++, structTuple);
+     }
+     PyGILState_Release(pgState);
+     if(structObjList == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+          return ReturnPythonNone();
+     }
+     return structObjList;
+}
+
+static PyObject * PackageBatchSamples(RawSampleDataList_t &rawSampleData, int outputFormat) {
+     if(outputFormat == SAMPLE_OUTPUT_SUMMARY) {
+          return PackageSampleSummaryForPython(rawSampleData);
+     }
+     return PackageBatchSampleOutputForPython(rawSampleData);
+}
+
 template<typename T>
-RawSampleDataList_t HandleD2Sample(StochasticTracebackD2<T> std2, int N, 
-		                         MFEStructRuntimeArgs_t *rtArgs) {
-     RawSampleDataList_t rawStructList;
+void InitializeD2Sampler(StochasticTracebackD2<T> &std2, MFEStructRuntimeArgs_t *rtArgs) {
      if(!SILENT) fprintf(CONFIG_STDMSGOUT, "\nComputing stochastic traceback (D2 Sample) ...\n");
      int pf_count_mode = 0;
      if(PF_COUNT_MODE) pf_count_mode=1;
@@ -330,6 +525,12 @@ RawSampleDataList_t HandleD2Sample(StochasticTracebackD2<T> std2, int N,
      if(!SILENT) fprintf(CONFIG_STDMSGOUT, 
 		         "D2 Traceback initialization (partition function computation) "
 		         "running time: %f seconds\n", t1);
+}
+
+template<typename T>
+RawSampleDataList_t RunD2BatchSample(StochasticTracebackD2<T> &std2, int N, 
+		                         MFEStructRuntimeArgs_t *rtArgs) {
+     RawSampleDataList_t rawStructList;
      t1 = get_seconds();
      if(!DUMP_CT_FILE) {
           if(ST_D2_ENABLE_COUNTS_PARALLELIZATION && g_nthreads != 1)
@@ -354,11 +555,19 @@ RawSampleDataList_t HandleD2Sample(StochasticTracebackD2<T> std2, int N,
      if(!SILENT) fprintf(CONFIG_STDMSGOUT, 
 		         "D2 Traceback computation running time: %f seconds\n", t1);
      if(PF_PRINT_ARRAYS_ENABLED) std2.printPfMatrixesToFile(pfArraysOutFile);
+     return rawStructList;
+}
+
+template<typename T>
+RawSampleDataList_t HandleD2Sample(StochasticTracebackD2<T> &std2, int N, 
+		                         MFEStructRuntimeArgs_t *rtArgs) {
+     InitializeD2Sampler<T>(std2, rtArgs);
+     RawSampleDataList_t rawStructList = RunD2BatchSample<T>(std2, N, rtArgs);
      std2.free_traceback();
      return rawStructList;
 }
 
-PyObject * HandleD2Sample(int advDblSpec, int N, MFEStructRuntimeArgs_t *rtArgs) {
+PyObject * HandleD2Sample(int advDblSpec, int N, MFEStructRuntimeArgs_t *rtArgs, int outputFormat) {
      if(N <= 0 || rtArgs == NULL) {
           SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
 	  return ReturnPythonNone();
@@ -389,7 +598,305 @@ PyObject * HandleD2Sample(int advDblSpec, int N, MFEStructRuntimeArgs_t *rtArgs)
 	       SetLastErrorCode(GTFPYTHON_ERRNO_INVBOLTZPARAMS, NULL);
 	       return ReturnPythonNone();
      }
-     return PackageBatchSampleOutputForPython(rawStructArr);
+     return PackageBatchSamples(rawStructArr, outputFormat);
+}
+
+/* The traceback (and partition function arrays) of a BoltzmannSampler_t, for 
+ * any of the AdvancedDouble types: 
+ */
+class BoltzmannSamplerTraceback {
+     public:
+          virtual ~BoltzmannSamplerTraceback() {}
+          virtual RawSampleDataList_t Sample(int N, MFEStructRuntimeArgs_t *rtArgs) = 0;
+          virtual double SampleStructure(int *structure) = 0;
+};
+
+template<typename T>
+class D2BoltzmannSamplerTraceback : public BoltzmannSamplerTraceback {
+     public:
+          D2BoltzmannSamplerTraceback(MFEStructRuntimeArgs_t *rtArgs) {
+               InitializeD2Sampler<T>(std2, rtArgs);
+          }
+          ~D2BoltzmannSamplerTraceback() {
+               std2.free_traceback();
+          }
+          RawSampleDataList_t Sample(int N, MFEStructRuntimeArgs_t *rtArgs) {
+               return RunD2BatchSample<T>(std2, N, rtArgs);
+          }
+          double SampleStructure(int *structure) {
+               return std2.sample_structure(structure);
+          }
+     private:
+          StochasticTracebackD2<T> std2;
+};
+
+struct BoltzmannSampler {
+     char                      *baseSeq;
+     MFEStructRuntimeArgs_t    rtArgs;
+     GTFoldEngineState_t       engineState;
+     BoltzmannSamplerTraceback *traceback;
+};
+
+BoltzmannSampler_t * AllocBoltzmannSampler(MFEStructRuntimeArgs_t *rtArgs) {
+     if(rtArgs == NULL || rtArgs->baseSeq == NULL || rtArgs->numBases <= 0) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+          return NULL;
+     }
+     else if(!CALC_PF_D2) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_DANGLE, "BoltzmannSampler requires the -d2 dangle model");
+          return NULL;
+     }
+     BoltzmannSampler_t *sampler = (BoltzmannSampler_t *) malloc(sizeof(BoltzmannSampler_t));
+     char *baseSeq = CopyString(rtArgs->baseSeq, NULL);
+     if(sampler == NULL || baseSeq == NULL) {
+          Free(sampler);
+          Free(baseSeq);
+          SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+          return NULL;
+     }
+     // The sampler takes over the (parsed) constraints of rtArgs: 
+     sampler->baseSeq = baseSeq;
+     sampler->rtArgs = *rtArgs;
+     sampler->rtArgs.baseSeq = baseSeq;
+     InitMFEStructRuntimeArgs(rtArgs);
+     sampler->traceback = NULL;
+     if(!ConfigureBoltzmannMainRuntimeParameters(&(sampler->rtArgs))) {
+          FreeGTFoldMFEStructureData(sampler->rtArgs.numBases);
+          FreeBoltzmannSampler(sampler);
+          return NULL;
+     }
+     SaveGTFoldEngineState(&(sampler->engineState));
+     try {
+          switch(PF_ST_D2_ADVANCED_DOUBLE_SPECIFIER) {
+               case 1:
+                    sampler->traceback = new D2BoltzmannSamplerTraceback<AdvancedDouble_Native>(&(sampler->rtArgs));
+                    break;
+               case 2:
+                    sampler->traceback = new D2BoltzmannSamplerTraceback<AdvancedDouble_BigNum>(&(sampler->rtArgs));
+                    break;
+               case 3:
+                    sampler->traceback = new D2BoltzmannSamplerTraceback<AdvancedDouble_Hybrid>(&(sampler->rtArgs));
+                    break;
+               case 4:
+                    sampler->traceback = new D2BoltzmannSamplerTraceback<AdvancedDouble_BigNumOptimized>(&(sampler->rtArgs));
+                    break;
+               default:
+                    SetLastErrorCode(GTFPYTHON_ERRNO_INVBOLTZPARAMS, NULL);
+                    break;
+          }
+     } catch(std::bad_alloc &) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+     }
+     FreeGTFoldMFEStructureData(sampler->rtArgs.numBases);
+     if(sampler->traceback == NULL) {
+          FreeBoltzmannSampler(sampler);
+          return NULL;
+     }
+     return sampler;
+}
+
+/* The traceback reads the encoded sequence and the energy model from the engine, 
+ * so these are switched back to the ones the partition function was computed with 
+ * (keeping the last error of the caller) while the sampler is used: 
+ */
+static bool BeginBoltzmannSamplerTraceback(BoltzmannSampler_t *sampler, GTFoldEngineState_t *callerState) {
+     SaveGTFoldEngineState(callerState);
+     RestoreGTFoldEngineState(&(sampler->engineState));
+     memcpy(&ErrorCodeErrno, &(callerState->lastError), sizeof(ErrorCode_t));
+     return InitGTFoldMFEStructureData(&(sampler->rtArgs)) == GTFPYTHON_ERRNO_OK && 
+            LoadThermodynamicParameters(ACTIVE_THERMO_PARAMS, GTFOLD_DATADIR) == GTFPYTHON_ERRNO_OK;
+}
+
+static void EndBoltzmannSamplerTraceback(BoltzmannSampler_t *sampler, GTFoldEngineState_t *callerState) {
+     FreeGTFoldMFEStructureData(sampler->rtArgs.numBases);
+     memcpy(&(callerState->lastError), &ErrorCodeErrno, sizeof(ErrorCode_t));
+     RestoreGTFoldEngineState(callerState);
+}
+
+static bool CheckBoltzmannSamplerArgs(BoltzmannSampler_t *sampler, int N) {
+     if(sampler == NULL || N <= 0) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+          return false;
+     }
+     else if(sampler->traceback == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, "The BoltzmannSampler is closed");
+          return false;
+     }
+     return true;
+}
+
+PyObject * SampleFromBoltzmannSampler(BoltzmannSampler_t *sampler, int N) {
+     if(!CheckBoltzmannSamplerArgs(sampler, N)) {
+          return ReturnPythonNone();
+     }
+     GTFoldEngineState_t callerState;
+     num_rnd = N;
+     PyObject *sampleStructsListObj = NULL;
+     if(BeginBoltzmannSamplerTraceback(sampler, &callerState)) {
+          RawSampleDataList_t rawStructArr = sampler->traceback->Sample(N, &(sampler->rtArgs));
+          sampleStructsListObj = PackageBatchSampleOutputForPython(rawStructArr);
+     }
+     EndBoltzmannSamplerTraceback(sampler, &callerState);
+     if(sampleStructsListObj == NULL) {
+          return ReturnPythonNone();
+     }
+     return sampleStructsListObj;
+}
+
+PyObject * SampleBatchFromBoltzmannSampler(BoltzmannSampler_t *sampler, int N, long long firstIndex) {
+     if(!CheckBoltzmannSamplerArgs(sampler, N) || firstIndex < 0) {
+          if(firstIndex < 0) SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+          return ReturnPythonNone();
+     }
+     int n = sampler->rtArgs.numBases;
+     PyGILState_STATE pgState = PyGILState_Ensure();
+     PyObject *pairTableBytes = PyBytes_FromStringAndSize(NULL, (Py_ssize_t) N * n * sizeof(int));
+     PyObject *energyBytes = PyBytes_FromStringAndSize(NULL, (Py_ssize_t) N * sizeof(double));
+     PyGILState_Release(pgState);
+     if(pairTableBytes == NULL || energyBytes == NULL) {
+          pgState = PyGILState_Ensure();
+          Py_XDECREF(pairTableBytes);
+          Py_XDECREF(energyBytes);
+          PyErr_Clear();
+          PyGILState_Release(pgState);
+          SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+          return ReturnPythonNone();
+     }
+     // The new bytes objects are not shared yet, so they are filled in place: 
+     int *pairTables = (int *) PyBytes_AS_STRING(pairTableBytes);
+     double *energies = (double *) PyBytes_AS_STRING(energyBytes);
+     GTFoldEngineState_t callerState;
+     bool samplesOK = false;
+     if(BeginBoltzmannSamplerTraceback(sampler, &callerState)) {
+          BoltzmannSamplerTraceback *traceback = sampler->traceback;
+          g_sample_index_offset = firstIndex;
+          uint64_t seed = rng_batch_seed();
+          #ifdef _OPENMP
+          #pragma omp parallel for schedule(guided) if(ST_D2_ENABLE_COUNTS_PARALLELIZATION && g_nthreads != 1)
+          #endif
+          for(int count = 1; count <= N; count++) {
+               std::vector<int> structure(n + 1, 0);
+               rng_seed_sample(seed, count);
+               energies[count - 1] = traceback->SampleStructure(&structure[0]);
+               memcpy(pairTables + (size_t) (count - 1) * n, &structure[1], n * sizeof(int));
+          }
+          g_sample_index_offset = 0;
+          samplesOK = true;
+     }
+     EndBoltzmannSamplerTraceback(sampler, &callerState);
+     pgState = PyGILState_Ensure();
+     PyObject *batchTuple = samplesOK ? Py_BuildValue("(NN)", pairTableBytes, energyBytes) : NULL;
+     if(!samplesOK) {
+          Py_DECREF(pairTableBytes);
+          Py_DECREF(energyBytes);
+     }
+     PyGILState_Release(pgState);
+     if(batchTuple == NULL) {
+          if(GetLastErrorCode() == GTFPYTHON_ERRNO_OK) {
+               SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+          }
+          return ReturnPythonNone();
+     }
+     return batchTuple;
+}
+
+void CloseBoltzmannSampler(BoltzmannSampler_t *sampler) {
+     if(sampler == NULL) {
+          return;
+     }
+     delete sampler->traceback;
+     sampler->traceback = NULL;
+}
+
+void FreeBoltzmannSampler(BoltzmannSampler_t *sampler) {
+     if(sampler == NULL) {
+          return;
+     }
+     CloseBoltzmannSampler(sampler);
+     FreeMFEStructRuntimeArgs(&(sampler->rtArgs));
+     Free(sampler->baseSeq);
+     Free(sampler);
+}
+
+PyObject * HandleD2Analysis(MFEStructRuntimeArgs_t *rtArgs, int wantFlags, int N, int bppMatrixFormat) {
+     if(rtArgs == NULL || rtArgs->numBases <= 0 || ((wantFlags & ANALYZE_WANT_SAMPLES) && N <= 0)) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+          return ReturnPythonNone();
+     }
+     int n = rtArgs->numBases;
+     bool wantBPP = (wantFlags & ANALYZE_WANT_BPP) != 0;
+     bool wantSamples = (wantFlags & ANALYZE_WANT_SAMPLES) != 0;
+     if(!SILENT) fprintf(CONFIG_STDMSGOUT, "\nComputing the D2 partition function (Analyze) ...\n");
+     // The sampler owns the partition function arrays, which the BPP stage reads 
+     // before they are freed. The outside pass needs the approximate up recursion 
+     // (::seealso ComputeBPPArrays), so with --exactintloop the BPP stage uses the 
+     // legacy recursions after the traceback instead:
+     bool outsideBPP = wantBPP && PF_D2_UP_APPROX_ENABLED;
+     t1 = get_seconds();
+     StochasticTracebackD2<AdvancedDouble_Native> std2;
+     std2.initialize(n, 0, 0, 0, PF_D2_UP_APPROX_ENABLED, false, energyDecomposeOutFile, scaleFactor);
+     BPPPartitionFunction_t &pfunc = std2.get_partition_function();
+     double logPFunc = log(pfunc.get_u(1, n).getNativeValue()) - pfunc.get_M_RT() * n / RT;
+     BPPInsideArrays *insideArrays = NULL;
+     if(outsideBPP) {
+          try {
+               insideArrays = new BPPInsideArrays(pfunc, n);
+          } catch(std::bad_alloc &) {
+               std2.free_traceback();
+               SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+               return ReturnPythonNone();
+          }
+     }
+     t1 = get_seconds() - t1;
+     if(!SILENT) fprintf(CONFIG_STDMSGOUT, "D2 partition function running time: %f seconds\n", t1);
+     RawSampleDataList_t rawStructList;
+     if(wantSamples) {
+          t1 = get_seconds();
+          rawStructList = std2.batch_sample(N, ST_D2_ENABLE_SCATTER_PLOT, ST_D2_ENABLE_ONE_SAMPLE_PARALLELIZATION, 
+                                            false, 0.0, ST_D2_ENABLE_BPP_PROBABILITY, sampleOutFile, 
+                                            estimateBppOutputFile, scatterPlotOutputFile);
+          t1 = get_seconds() - t1;
+          if(!SILENT) fprintf(CONFIG_STDMSGOUT, "D2 Traceback computation running time: %f seconds\n", t1);
+     }
+     std2.free_traceback();
+     PyObject *bppMatrixObj = NULL;
+     if(wantBPP) {
+          t1 = get_seconds();
+          double **_P = NULL;
+          if(outsideBPP) {
+               _P = insideArrays->ComputeProbabilities(pfunc);
+               delete insideArrays;
+          }
+          else {
+               _P = ComputeLegacyBPPArrays(rtArgs);
+          }
+          if(_P == NULL) {
+               return ReturnPythonNone();
+          }
+          if(WRITEAUXFILES) {
+               printBasePairProbabilitiesDetail(n, structure, _P, bppOutFile);
+          }
+          bppMatrixObj = PackBPPMatrix(_P, n, bppMatrixFormat);
+          freeTwoD(_P, n + 1, n + 1);
+          if(bppMatrixObj == NULL) {
+               return ReturnPythonNone();
+          }
+          t1 = get_seconds() - t1;
+          if(!SILENT) fprintf(CONFIG_STDMSGOUT, "BPP running time: %f seconds\n", t1);
+     }
+     PyObject *samplesListObj = wantSamples ? 
+                                PackageSampleOutputForPython(rawStructList, N, logPFunc) : NULL;
+     PyGILState_STATE pgState = PyGILState_Ensure();
+     PyObject *pfTupleObj = Py_BuildValue("(dd)", logPFunc, -logPFunc * RT / 100.0);
+     PyObject *analysisTuple = Py_BuildValue("(NNN)", pfTupleObj, 
+                                             bppMatrixObj == NULL ? Py_BuildValue("") : bppMatrixObj, 
+                                             samplesListObj == NULL ? Py_BuildValue("") : samplesListObj);
+     PyGILState_Release(pgState);
+     if(analysisTuple == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+          return ReturnPythonNone();
+     }
+     return analysisTuple;
 }
 
 RawSampleDataList_t ComputeDsBatchSample(int N, int baseSeqLength, const char *baseSeq) {
@@ -419,13 +926,14 @@ RawSampleDataList_t ComputeDsBatchSample(int N, int baseSeqLength, const char *b
 	  }
      }
      //// data dump preparation code ends here
-     srand(time(NULL));
+     uint64_t seed = rng_batch_seed();
      int *structure = new int[baseSeqLength + 1];
-     std::map< std::string,std::pair<int,double> >  uniq_structs;
+     RawSampleDataList_t uniq_structs;
      if(N > 0) {
           if(!SILENT) fprintf(CONFIG_STDMSGOUT, "\nSampling structures...\n");
           int count;
           for(count = 1; count <= num_rnd; ++count) {
+               rng_seed_sample(seed, count);
                memset(structure, 0, (baseSeqLength + 1) * sizeof(int));
                double energy = rnd_structure(structure, baseSeqLength);
                std::string ensemble(baseSeqLength + 1, '.');
@@ -435,15 +943,8 @@ RawSampleDataList_t ComputeDsBatchSample(int N, int baseSeqLength, const char *b
                          ensemble[structure[i]] = ')';
                     }
 	       }
-	       std::map<std::string,std::pair<int,double> >::iterator iter ;
-               if((iter = uniq_structs.find(ensemble.substr(1))) != uniq_structs.end()) {
-                    std::pair<int, double>& pp = iter->second;
-                    pp.first++;
-               }
-               else {
-                    uniq_structs.insert(make_pair(ensemble.substr(1), 
-					std::pair<int, double>(1, energy)));
-	       }
+	       bool inserted;
+               uniq_structs.insert(ensemble.c_str() + 1, std::pair<int, double>(0, energy), inserted).first++;
                //// data dump code starts here again
 	       if(DUMP_CT_FILE || WRITEAUXFILES) {
                     std::stringstream ss2;
@@ -459,10 +960,11 @@ RawSampleDataList_t ComputeDsBatchSample(int N, int baseSeqLength, const char *b
           int pcount = 0;
           int maxCount = 0; std::string bestStruct;
           double bestE = INFINITY;
-          std::map< std::string, std::pair<int, double> >::iterator iter;
-          for(iter = uniq_structs.begin(); iter != uniq_structs.end(); ++iter) {
-               const std::string& ss = iter->first;
-               const std::pair<int, double>& pp = iter->second;
+          std::vector<size_t> order = uniq_structs.sorted_indices();
+          std::string ss;
+          for(size_t e = 0; e < order.size(); ++e) {
+               uniq_structs.structure(order[e], ss);
+               const std::pair<int, double>& pp = uniq_structs.value(order[e]);
                const double& estimated_p =  (double) pp.first / (double) N;
                const double& energy = pp.second;
                double actual_p = pow(2.718281, -1.0 * energy * 100 / RT) / U;
@@ -493,7 +995,7 @@ RawSampleDataList_t ComputeDsBatchSample(int N, int baseSeqLength, const char *b
      return uniq_structs;
 }
 
-PyObject * HandleDsSample(int N, MFEStructRuntimeArgs_t *rtArgs) {
+PyObject * HandleDsSample(int N, MFEStructRuntimeArgs_t *rtArgs, int outputFormat) {
      if(N <= 0 || rtArgs == NULL) {
           SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
 	  return ReturnPythonNone();
@@ -517,6 +1019,6 @@ PyObject * HandleDsSample(int N, MFEStructRuntimeArgs_t *rtArgs) {
           fprintf(CONFIG_STDMSGOUT, "Traceback computation running time: %9.6f seconds\n", t1);
      }
      free_partition();
-     return PackageBatchSampleOutputForPython(rawStructsList);
+     return PackageBatchSamples(rawStructsList, outputFormat);
 }
  
@@ -24,10 +24,82 @@ void ConfigureOutputFileSettings(void);
 void ValidateOptions(void);
 
 void * ConfigureBoltzmannMainRuntimeParameters(MFEStructRuntimeArgs_t *rtArgs);
+/* Also computes the MFE (and MFE structure) when mfeResult is not NULL, and stores 
+ * it in *mfeResult, so that the caller does not need another MFE fill: 
+ */
+void * ConfigureBoltzmannRuntimeParametersWithMFE(MFEStructRuntimeArgs_t *rtArgs, double *mfeResult);
 PyObject * HandleBPP(MFEStructRuntimeArgs_t *rtArgs);
 
-PyObject * HandleD2Sample(int advDblSpec, int N, MFEStructRuntimeArgs_t *rtArgs);
-PyObject * HandleDsSample(int N, MFEStructRuntimeArgs_t *rtArgs);
+/* Layouts of the raw base pair probability matrices (flags, combined with |): 
+ * the full symmetric n x n matrix in row major order, or the upper triangle 
+ * (i < j, row by row) packed into n(n-1)/2 entries, of doubles or floats: 
+ */
+#define BPP_MATRIX_FULL                     (0x00)
+#define BPP_MATRIX_PACKED                   (0x01)
+#define BPP_MATRIX_FLOAT32                  (0x02)
+
+PyObject * HandleBPPMatrix(MFEStructRuntimeArgs_t *rtArgs, int matrixFormat);
+
+/* Which of the BPP outputs above (or the sparse output) the ComputeBPP* functions 
+ * return: the sparse output keeps only the pairs with probability >= cutoff (and, 
+ * when topKPerBase > 0, which are among the topKPerBase most likely pairs of one 
+ * of their two bases):
+ */
+#define BPP_OUTPUT_LIST                     (0)
+#define BPP_OUTPUT_MATRIX                   (1)
+#define BPP_OUTPUT_SPARSE                   (2)
+
+typedef struct {
+     int    outputMode;
+     int    matrixFormat;
+     double cutoff;
+     int    topKPerBase;
+} BPPOutputFormat_t;
+
+PyObject * HandleBPPSparse(MFEStructRuntimeArgs_t *rtArgs, double cutoff, int topKPerBase);
+PyObject * HandleBPPOutput(MFEStructRuntimeArgs_t *rtArgs, const BPPOutputFormat_t *bppFormat);
+
+/* The outputFormat of the sampling handlers: */
+#define SAMPLE_OUTPUT_LIST                  (0) // (estProb, actualProb, energy, dotStruct) tuples
+#define SAMPLE_OUTPUT_SUMMARY               (1) // (dotStruct, count, energy) tuples
+
+PyObject * HandleD2Sample(int advDblSpec, int N, MFEStructRuntimeArgs_t *rtArgs, int outputFormat);
+PyObject * HandleDsSample(int N, MFEStructRuntimeArgs_t *rtArgs, int outputFormat);
+
+/* A handle which keeps the -d2 partition function arrays of one sequence (and a copy 
+ * of the engine settings they were computed with) to sample from repeatedly. The 
+ * arrays are only freed by CloseBoltzmannSampler (or FreeBoltzmannSampler). The 
+ * sampler takes over the parsed constraints of rtArgs: 
+ */
+typedef struct BoltzmannSampler BoltzmannSampler_t;
+
+#define BOLTZMANN_SAMPLER_CAPSULE_NAME      ("GTFoldPython.BoltzmannSampler")
+
+BoltzmannSampler_t * AllocBoltzmannSampler(MFEStructRuntimeArgs_t *rtArgs);
+PyObject * SampleFromBoltzmannSampler(BoltzmannSampler_t *sampler, int N);
+
+/* Samples the structures firstIndex+1, ..., firstIndex+N (of the seed in g_sample_seed) 
+ * one by one, without collecting the unique structures, and returns the tuple 
+ * (pairTables, energies) of bytes objects: the N x numBases (native) int array of 
+ * pair tables (the 1-based partner of each base, or zero) and the N doubles of the 
+ * sample energies (kcal/mol): 
+ */
+PyObject * SampleBatchFromBoltzmannSampler(BoltzmannSampler_t *sampler, int N, long long firstIndex);
+void CloseBoltzmannSampler(BoltzmannSampler_t *sampler);
+void FreeBoltzmannSampler(BoltzmannSampler_t *sampler);
+
+/* The stages of an Analyze call (flags, combined with |): */
+#define ANALYZE_WANT_MFE                    (0x01)
+#define ANALYZE_WANT_SUBOPT                 (0x02)
+#define ANALYZE_WANT_PF                     (0x04)
+#define ANALYZE_WANT_BPP                    (0x08)
+#define ANALYZE_WANT_SAMPLES                (0x10)
+
+/* Runs one -d2 partition function fill for the PF, BPP and SAMPLES stages, and 
+ * returns the tuple ((log of the partition function, ensemble free energy), BPP 
+ * matrix in the bppMatrixFormat layout or None, list of N samples or None): 
+ */
+PyObject * HandleD2Analysis(MFEStructRuntimeArgs_t *rtArgs, int wantFlags, int N, int bppMatrixFormat);
 
 #ifdef __cplusplus
 }
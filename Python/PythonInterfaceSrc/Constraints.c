@@ -46,6 +46,61 @@ Constraint_t * ParseConstraintsList(ConsListCType_t consList, int consLength) {
      return consArr;
 }
 
+/* Converts a Python list of (consType, i, j, k) tuples. The GIL must be held by the caller. 
+ * Returns NULL with *consLength set to zero for None or an empty list: 
+ */
+Constraint_t * ParsePythonConstraintsList(PyObject *consListObj, int *consLength) {
+     if(consLength == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+	  return NULL;
+     }
+     *consLength = 0;
+     if(consListObj == NULL || consListObj == Py_None) {
+          return NULL;
+     }
+     PyObject *consSeq = PySequence_Fast(consListObj, "Expected a list of constraints");
+     if(consSeq == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_PYARGS, "Expected a list of constraints");
+	  return NULL;
+     }
+     int numCons = (int) PySequence_Fast_GET_SIZE(consSeq);
+     if(numCons == 0) {
+          Py_DECREF(consSeq);
+	  return NULL;
+     }
+     Constraint_t *consArr = (Constraint_t *) malloc(numCons * sizeof(Constraint_t));
+     if(consArr == NULL) {
+          Py_DECREF(consSeq);
+	  SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+	  return NULL;
+     }
+     for(int ci = 0; ci < numCons; ci++) {
+          int consFields[4];
+          PyObject *consTuple = PySequence_Fast_GET_ITEM(consSeq, ci);
+	  if(!PySequence_Check(consTuple) || PySequence_Size(consTuple) != 4) {
+	       Free(consArr);
+	       Py_DECREF(consSeq);
+	       SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CONSTRAINT, "Constraints must be (consType, i, j, k) tuples");
+	       return NULL;
+	  }
+	  for(int fi = 0; fi < 4; fi++) {
+	       PyObject *consField = PySequence_GetItem(consTuple, fi);
+	       consFields[fi] = consField == NULL ? -1 : (int) PyLong_AsLong(consField);
+	       Py_XDECREF(consField);
+	  }
+	  if(PyErr_Occurred()) {
+	       Free(consArr);
+	       Py_DECREF(consSeq);
+	       SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CONSTRAINT, "Constraints must be (consType, i, j, k) tuples");
+	       return NULL;
+	  }
+	  consArr[ci] = ParseSingleConstraint(consFields);
+     }
+     Py_DECREF(consSeq);
+     *consLength = numCons;
+     return consArr;
+}
+
 int CountForcedConstraints(Constraint_t *consList, int consLength) {
      int fconsCount = 0;
      for(int ci = 0; ci < consLength; ci++) {
@@ -37,6 +37,7 @@ typedef int ConsListCType_t[][4];
 
 Constraint_t ParseSingleConstraint(ConsCType_t consTypeArr);
 Constraint_t * ParseConstraintsList(ConsListCType_t consList, int consLength);
+Constraint_t * ParsePythonConstraintsList(PyObject *consListObj, int *consLength);
 
 int CountForcedConstraints(Constraint_t *consList, int consLength);
 int CheckForcedConstraintValid(Constraint_t cons, int prevConsLength, int baseSeqLength);
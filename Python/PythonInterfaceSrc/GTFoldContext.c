@@ -0,0 +1,229 @@
+/* GTFoldContext.c : Implementation of the header-defined interface;
+ */
+
+#include <string.h>
+
+#include "include/options.h"
+#include "include/global.h"
+#include "include/boltzmann_main.h"
+#include "include/mfe_main.h"
+
+#include "GTFoldContext.h"
+#include "ErrorHandling.h"
+#include "Utils.h"
+#include "GTFoldDataDir.c"
+
+/* The engine lock is recursive so that a thread which has activated a context
+ * can still call any of the (locking) library functions while it is active:
+ */
+static pthread_mutex_t GTFOLD_ENGINE_LOCK;
+static pthread_once_t  GTFOLD_ENGINE_LOCK_INIT = PTHREAD_ONCE_INIT;
+
+static void CreateGTFoldEngineLock(void) {
+     pthread_mutexattr_t lockAttr;
+     pthread_mutexattr_init(&lockAttr);
+     pthread_mutexattr_settype(&lockAttr, PTHREAD_MUTEX_RECURSIVE);
+     pthread_mutex_init(&GTFOLD_ENGINE_LOCK, &lockAttr);
+     pthread_mutexattr_destroy(&lockAttr);
+}
+
+/* A forked child only has the thread that called fork(), so the lock may be held 
+ * by a thread that no longer exists. Start the child out with a fresh lock: 
+ */
+static void ResetGTFoldEngineLockInChild(void) {
+     CreateGTFoldEngineLock();
+}
+
+static void InitGTFoldEngineLock(void) {
+     CreateGTFoldEngineLock();
+     pthread_atfork(NULL, NULL, ResetGTFoldEngineLockInChild);
+}
+
+void AcquireGTFoldEngineLock(void) {
+     pthread_once(&GTFOLD_ENGINE_LOCK_INIT, InitGTFoldEngineLock);
+     if(pthread_mutex_trylock(&GTFOLD_ENGINE_LOCK) == 0) {
+          return;
+     }
+     else if(PyGILState_Check()) {
+          // Never block on the engine while holding the GIL: the thread that
+          // currently owns the engine may need the GIL to finish its work
+          Py_BEGIN_ALLOW_THREADS
+          pthread_mutex_lock(&GTFOLD_ENGINE_LOCK);
+          Py_END_ALLOW_THREADS
+     }
+     else {
+          pthread_mutex_lock(&GTFOLD_ENGINE_LOCK);
+     }
+}
+
+void ReleaseGTFoldEngineLock(void) {
+     pthread_mutex_unlock(&GTFOLD_ENGINE_LOCK);
+}
+
+PyObject * ReturnFromGTFoldEngine(PyObject *pyObjReturn) {
+     ReleaseGTFoldEngineLock();
+     return pyObjReturn;
+}
+
+PyThreadState * BeginGTFoldEngineCompute(void) {
+     PyThreadState *pyThreadState = NULL;
+     if(PyGILState_Check()) {
+          pyThreadState = PyEval_SaveThread();
+     }
+     AcquireGTFoldEngineLock();
+     return pyThreadState;
+}
+
+void EndGTFoldEngineCompute(PyThreadState *pyThreadState) {
+     ReleaseGTFoldEngineLock();
+     if(pyThreadState != NULL) {
+          PyEval_RestoreThread(pyThreadState);
+     }
+}
+
+void SaveGTFoldEngineState(GTFoldEngineState_t *engineState) {
+     if(engineState == NULL) {
+          return;
+     }
+     engineState->dangles = dangles;
+     engineState->g_dangles = g_dangles;
+     engineState->tMismatch = T_MISMATCH;
+     engineState->g_mismatch = g_mismatch;
+     engineState->limitDistance = LIMIT_DISTANCE;
+     engineState->g_limitDistance = g_LIMIT_DISTANCE;
+     engineState->contactDistance = contactDistance;
+     engineState->g_contactDistance = g_contactDistance;
+     engineState->prefilterMode = b_prefilter;
+     engineState->g_prefilterMode = g_prefilter_mode;
+     engineState->prefilter1 = prefilter1;
+     engineState->prefilter2 = prefilter2;
+     engineState->g_prefilter1 = g_prefilter1;
+     engineState->g_prefilter2 = g_prefilter2;
+     engineState->unaMode = UNAMODE;
+     engineState->rnaMode = RNAMODE;
+     engineState->g_unaMode = g_unamode;
+     engineState->paramDir = PARAM_DIR;
+     engineState->numThreads = nThreads;
+     engineState->g_numThreads = g_nthreads;
+     engineState->calcPFDo = CALC_PF_DO;
+     engineState->calcPFDs = CALC_PF_DS;
+     engineState->calcPFD2 = CALC_PF_D2;
+     engineState->pfCountMode = PF_COUNT_MODE;
+     engineState->bppEnabled = BPP_ENABLED;
+     engineState->suboptEnabled = SUBOPT_ENABLED;
+     engineState->thermoParams = ACTIVE_THERMO_PARAMS;
+     strcpy(engineState->dataDir, GTFOLD_DATADIR);
+     SaveGTFoldExtraSettings(&(engineState->extraSettings));
+     memcpy(&(engineState->lastError), &ErrorCodeErrno, sizeof(ErrorCode_t));
+}
+
+void RestoreGTFoldEngineState(const GTFoldEngineState_t *engineState) {
+     if(engineState == NULL) {
+          return;
+     }
+     dangles = engineState->dangles;
+     g_dangles = engineState->g_dangles;
+     T_MISMATCH = engineState->tMismatch;
+     g_mismatch = engineState->g_mismatch;
+     LIMIT_DISTANCE = engineState->limitDistance;
+     g_LIMIT_DISTANCE = engineState->g_limitDistance;
+     contactDistance = engineState->contactDistance;
+     g_contactDistance = engineState->g_contactDistance;
+     b_prefilter = engineState->prefilterMode;
+     g_prefilter_mode = engineState->g_prefilterMode;
+     prefilter1 = engineState->prefilter1;
+     prefilter2 = engineState->prefilter2;
+     g_prefilter1 = engineState->g_prefilter1;
+     g_prefilter2 = engineState->g_prefilter2;
+     UNAMODE = engineState->unaMode;
+     RNAMODE = engineState->rnaMode;
+     g_unamode = engineState->g_unaMode;
+     PARAM_DIR = engineState->paramDir;
+     nThreads = engineState->numThreads;
+     g_nthreads = engineState->g_numThreads;
+     CALC_PF_DO = engineState->calcPFDo;
+     CALC_PF_DS = engineState->calcPFDs;
+     CALC_PF_D2 = engineState->calcPFD2;
+     PF_COUNT_MODE = engineState->pfCountMode;
+     BPP_ENABLED = engineState->bppEnabled;
+     SUBOPT_ENABLED = engineState->suboptEnabled;
+     ACTIVE_THERMO_PARAMS = engineState->thermoParams;
+     strcpy(GTFOLD_DATADIR, engineState->dataDir);
+     RestoreGTFoldExtraSettings(&(engineState->extraSettings));
+     memcpy(&ErrorCodeErrno, &(engineState->lastError), sizeof(ErrorCode_t));
+}
+
+GTFoldContext_t * AllocGTFoldContext(void) {
+     GTFoldContext_t *gtfCtx = (GTFoldContext_t *) malloc(sizeof(GTFoldContext_t));
+     if(gtfCtx == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+	     return NULL;
+     }
+     memset(gtfCtx, 0, sizeof(GTFoldContext_t));
+     // New contexts start out with a copy of the current process-wide settings:
+     AcquireGTFoldEngineLock();
+     SaveGTFoldEngineState(&(gtfCtx->settings));
+     ReleaseGTFoldEngineLock();
+     gtfCtx->settings.lastError.errorCode = GTFPYTHON_ERRNO_OK;
+     strcpy(gtfCtx->settings.lastError.errorMsg, ErrorCodeStrerror(GTFPYTHON_ERRNO_OK));
+     gtfCtx->isActive = false;
+     return gtfCtx;
+}
+
+void FreeGTFoldContext(GTFoldContext_t *gtfCtx) {
+     if(gtfCtx != NULL && gtfCtx->isActive && pthread_equal(gtfCtx->ownerThread, pthread_self())) {
+          DeactivateGTFoldContext(gtfCtx);
+     }
+     Free(gtfCtx);
+}
+
+int ActivateGTFoldContext(GTFoldContext_t *gtfCtx) {
+     if(gtfCtx == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+	     return GetLastErrorCode();
+     }
+     AcquireGTFoldEngineLock();
+     if(gtfCtx->isActive) {
+          ReleaseGTFoldEngineLock();
+          SetLastErrorCode(GTFPYTHON_ERRNO_RUNCFG, "The GTFold context is already active");
+	     return GetLastErrorCode();
+     }
+     SaveGTFoldEngineState(&(gtfCtx->savedState));
+     RestoreGTFoldEngineState(&(gtfCtx->settings));
+     ErrorCodeErrno.errorCode = GTFPYTHON_ERRNO_OK;
+     strcpy(ErrorCodeErrno.errorMsg, ErrorCodeStrerror(GTFPYTHON_ERRNO_OK));
+     gtfCtx->isActive = true;
+     gtfCtx->ownerThread = pthread_self();
+     return GTFPYTHON_ERRNO_OK;
+}
+
+int DeactivateGTFoldContext(GTFoldContext_t *gtfCtx) {
+     if(gtfCtx == NULL || !gtfCtx->isActive) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+	     return GetLastErrorCode();
+     }
+     else if(!pthread_equal(gtfCtx->ownerThread, pthread_self())) {
+          // Only the owning thread holds the engine lock (and may release it):
+          SetLastErrorCode(GTFPYTHON_ERRNO_RUNCFG, "The GTFold context is active in another thread");
+	     return GetLastErrorCode();
+     }
+     // Keep any settings changed (and the last error raised) while active:
+     SaveGTFoldEngineState(&(gtfCtx->settings));
+     RestoreGTFoldEngineState(&(gtfCtx->savedState));
+     gtfCtx->isActive = false;
+     ReleaseGTFoldEngineLock();
+     return GTFPYTHON_ERRNO_OK;
+}
+
+GTFoldContext_t * GTFoldContextFromCapsule(PyObject *ctxCapsule) {
+     PyGILState_STATE pgState = PyGILState_Ensure();
+     GTFoldContext_t *gtfCtx = NULL;
+     if(ctxCapsule != NULL && PyCapsule_IsValid(ctxCapsule, GTFOLD_CONTEXT_CAPSULE_NAME)) {
+          gtfCtx = (GTFoldContext_t *) PyCapsule_GetPointer(ctxCapsule, GTFOLD_CONTEXT_CAPSULE_NAME);
+     }
+     PyGILState_Release(pgState);
+     if(gtfCtx == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_PYARGS, "Expected a GTFoldContext handle");
+     }
+     return gtfCtx;
+}
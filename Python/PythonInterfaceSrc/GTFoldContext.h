@@ -0,0 +1,109 @@
+/* GTFoldContext.h : Folding contexts (settings and error state) which are swapped
+ *                   in and out of the process-global GTFold engine state;
+ */
+
+#ifndef __GTFOLD_CONTEXT_H__
+#define __GTFOLD_CONTEXT_H__
+
+#include <pthread.h>
+
+#include "PythonConfig.h"
+#include "ErrorHandling.h"
+#include "LoadThermoParams.h"
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+/* The values of every engine global which GTFoldPythonConfigSettings writes (in the 
+ * order its keyword table lists them), so that the extra settings are kept per context:
+ */
+#define GTFOLD_EXTRA_SETTINGS_MAXVARS      (128)
+#define GTFOLD_EXTRA_SETTINGS_MAXSTRINGS   (8)
+
+typedef struct {
+     int    intValues[GTFOLD_EXTRA_SETTINGS_MAXVARS];
+     double doubleValues[GTFOLD_EXTRA_SETTINGS_MAXVARS];
+     char   stringValues[GTFOLD_EXTRA_SETTINGS_MAXSTRINGS][STR_BUFFER_SIZE];
+     char   outputDir[STR_BUFFER_SIZE];
+     int    pfD2UpApproxEnabled;
+} GTFoldExtraSettings_t;
+
+/* Every engine setting that the exported functions read or modify. The GTFold
+ * engine (and its OpenMP regions) only ever sees the globals, so a context is
+ * switched in by copying these values into the globals and out again afterwards:
+ */
+typedef struct {
+     int   dangles;
+     int   g_dangles;
+     int   tMismatch;
+     int   g_mismatch;
+     int   limitDistance;
+     int   g_limitDistance;
+     int   contactDistance;
+     int   g_contactDistance;
+     int   prefilterMode;
+     int   g_prefilterMode;
+     int   prefilter1;
+     int   prefilter2;
+     int   g_prefilter1;
+     int   g_prefilter2;
+     int   unaMode;
+     int   rnaMode;
+     int   g_unaMode;
+     int   paramDir;
+     int   numThreads;
+     int   g_numThreads;
+     int   calcPFDo;
+     int   calcPFDs;
+     int   calcPFD2;
+     int   pfCountMode;
+     int   bppEnabled;
+     int   suboptEnabled;
+     const ThermoParams_t *thermoParams;
+     char  dataDir[STR_BUFFER_SIZE];
+     GTFoldExtraSettings_t extraSettings;
+     ErrorCode_t lastError;
+} GTFoldEngineState_t;
+
+/* An active context holds the engine lock, so it is only ever deactivated by the
+ * thread which activated it (ownerThread):
+ */
+typedef struct {
+     GTFoldEngineState_t settings;
+     GTFoldEngineState_t savedState;
+     bool                isActive;
+     pthread_t           ownerThread;
+} GTFoldContext_t;
+
+#define GTFOLD_CONTEXT_CAPSULE_NAME         ("GTFoldPython.GTFoldContext")
+
+void AcquireGTFoldEngineLock(void);
+void ReleaseGTFoldEngineLock(void);
+PyObject * ReturnFromGTFoldEngine(PyObject *pyObjReturn);
+
+/* The long running computations release the GIL while they hold the engine lock.
+ * Any Python objects are built inside with PyGILState_Ensure/Release:
+ */
+PyThreadState * BeginGTFoldEngineCompute(void);
+void EndGTFoldEngineCompute(PyThreadState *pyThreadState);
+
+/* Defined with the keyword table in GTFoldPython.c: */
+void SaveGTFoldExtraSettings(GTFoldExtraSettings_t *extraSettings);
+void RestoreGTFoldExtraSettings(const GTFoldExtraSettings_t *extraSettings);
+
+void SaveGTFoldEngineState(GTFoldEngineState_t *engineState);
+void RestoreGTFoldEngineState(const GTFoldEngineState_t *engineState);
+
+GTFoldContext_t * AllocGTFoldContext(void);
+void FreeGTFoldContext(GTFoldContext_t *gtfCtx);
+int ActivateGTFoldContext(GTFoldContext_t *gtfCtx);
+int DeactivateGTFoldContext(GTFoldContext_t *gtfCtx);
+
+GTFoldContext_t * GTFoldContextFromCapsule(PyObject *ctxCapsule);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif
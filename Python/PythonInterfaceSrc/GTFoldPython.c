@@ -29,9 +29,11 @@
 #include "MFEStruct.h"
 #include "Utils.h"
 #include "StructureTypes.h"
+#include "SuboptStructs.h"
 #include "BoltzmannSampling.h"
 #include "PartitionFunction.h"
 #include "LoadThermoParams.h"
+#include "GTFoldContext.h"
 #include "GTFoldDataDir.c"
 
 int  *CONFIG_QUIET = &SILENT;
@@ -50,6 +52,7 @@ char outputDir_cstr[STR_BUFFER_SIZE] = { '\0' };
 //const char *seq = "";
 
 PyObject * GTFoldPythonInit(void) {
+     AcquireGTFoldEngineLock();
      PyGILState_STATE pgState = PyGILState_Ensure();
      if (!PyEval_ThreadsInitialized()) {
           PyEval_InitThreads(); 
@@ -195,21 +198,8 @@ PyObject * GTFoldPythonInit(void) {
      gflag = 0;
      //memset(FM1, 0, 1500 * 1500 * sizeof(int));
      //memset(FM, 0, 1500 * 1500 * sizeof(int));
-     Free(V);
-     Free(W);
-     Free(VBI);
-     Free(VM);
-     Free(indx);
-     if(WM != NULL && WMPrime != NULL && PP != NULL) {
-          for(int wmIdx = 0; wmIdx <= lastBaseSequenceLength; wmIdx++) {
-               Free(WM[wmIdx]);
-               Free(WMPrime[wmIdx]);
-               Free(PP[wmIdx]);
-          }
-     }
-     Free(WM);
-     Free(WMPrime);
-     Free(PP);
+     // the MFE tables are kept between folds, so this is where they are freed:
+     release_tables();
      //int partFuncLength = lastBaseSequenceLength + 2;
      //if(u != NULL) freeTwoD(u, partFuncLength, partFuncLength);
      //if(up != NULL) freeTwoD(up, partFuncLength, partFuncLength);
@@ -229,10 +219,11 @@ PyObject * GTFoldPythonInit(void) {
      //UNIQUE_MULTILOOP_DECOMPOSITION = 0;
      //max_structure_count = -1;
      lastBaseSequenceLength = -1;
-     return ReturnPythonNone();
+     return ReturnFromGTFoldEngine(ReturnPythonNone());
 }
 
 PyObject * GTFoldPythonConfig(int quietSpec, int verboseSpec, int debugSpec, const char *stdmsgoutSpec) {
+     AcquireGTFoldEngineLock();
      *CONFIG_QUIET = SILENT = quietSpec;
      *CONFIG_VERBOSE = VERBOSE = verbose = g_verbose = ss_verbose = verboseSpec;
      *CONFIG_DEBUGGING = DEBUG = debugSpec;
@@ -252,7 +243,7 @@ PyObject * GTFoldPythonConfig(int quietSpec, int verboseSpec, int debugSpec, con
 	     fprintf(CONFIG_STDMSGOUT, "  >> CONFIG_STDMSGOUT = %s\n", 
 	     CONFIG_STDMSGOUT == stderr ? "stderr" : "stdout");
      }
-     return ReturnPythonNone();
+     return ReturnFromGTFoldEngine(ReturnPythonNone());
 }
 
 static const GTFoldKeywordSpec_t GTFoldPythonConfigSettings_kwlist[] = {
@@ -596,12 +587,92 @@ static const GTFoldKeywordSpec_t GTFoldPythonConfigSettings_kwlist[] = {
 	     { &is_check_for_duplicates_enabled, NULL, NULL, NULL, NULL, NULL }, 
           NULL
      },
+     {
+	     "maxcount", 
+	     INT,
+	     "--maxcount INT", 
+	     "     Generate only INT suboptimal structures within the requested range.\n"
+	     "     A value of zero or less (the default is -1) means that there is no\n"
+	     "     restriction on the number of structures.",
+	     NULL, 
+	     { &max_structure_count, NULL, NULL, NULL, NULL, NULL }, 
+          NULL
+     },
 };
 
+/* Visit every engine global set by the keyword table (and the ones derived from them 
+ * in GTFoldPythonConfigSettings), copying each into extraSettings or back out of it: 
+ */
+static void CopyGTFoldExtraSettings(GTFoldExtraSettings_t *extraSettings, bool saveSettings) {
+     int intIdx = 0, doubleIdx = 0, stringIdx = 0;
+     int numOptions = GetArrayLength(GTFoldPythonConfigSettings_kwlist);
+     for(int opt = 0; opt < numOptions; opt++) {
+          const GTFoldKeywordSpec_t *kwSpec = &GTFoldPythonConfigSettings_kwlist[opt];
+          void *varRefs[8];
+          int numVarRefs = 0;
+          GetArrayLengthByNonNULL(kwSpec->dataRef, &numVarRefs);
+          memcpy(varRefs, kwSpec->dataRef, numVarRefs * sizeof(void *));
+          if(kwSpec->dataPtrRef != NULL) {
+               varRefs[numVarRefs++] = *(kwSpec->dataPtrRef);
+          }
+          for(int i = 0; i < numVarRefs; i++) {
+               if(kwSpec->ctype == DOUBLE && doubleIdx < GTFOLD_EXTRA_SETTINGS_MAXVARS) {
+                    double *varPtr = (double *) varRefs[i];
+                    if(saveSettings) extraSettings->doubleValues[doubleIdx++] = *varPtr;
+                    else *varPtr = extraSettings->doubleValues[doubleIdx++];
+               }
+               else if(kwSpec->ctype == STRING && stringIdx < GTFOLD_EXTRA_SETTINGS_MAXSTRINGS) {
+                    char *varPtr = (char *) varRefs[i];
+                    if(saveSettings) {
+                         strncpy(extraSettings->stringValues[stringIdx], varPtr, STR_BUFFER_SIZE - 1);
+                         extraSettings->stringValues[stringIdx][STR_BUFFER_SIZE - 1] = '\0';
+                    }
+                    else {
+                         // The saved string was read out of this same buffer:
+                         strcpy(varPtr, extraSettings->stringValues[stringIdx]);
+                    }
+                    stringIdx++;
+               }
+               else if(kwSpec->ctype != DOUBLE && kwSpec->ctype != STRING && 
+                       intIdx < GTFOLD_EXTRA_SETTINGS_MAXVARS) {
+                    int *varPtr = (int *) varRefs[i];
+                    if(saveSettings) extraSettings->intValues[intIdx++] = *varPtr;
+                    else *varPtr = extraSettings->intValues[intIdx++];
+               }
+          }
+          if(kwSpec->boolTruthVar != NULL && intIdx < GTFOLD_EXTRA_SETTINGS_MAXVARS) {
+               if(saveSettings) extraSettings->intValues[intIdx++] = *(kwSpec->boolTruthVar);
+               else *(kwSpec->boolTruthVar) = extraSettings->intValues[intIdx++];
+          }
+     }
+     if(saveSettings) {
+          strncpy(extraSettings->outputDir, outputDir, sizeof(outputDir) - 1);
+          extraSettings->outputDir[sizeof(outputDir) - 1] = '\0';
+          extraSettings->pfD2UpApproxEnabled = PF_D2_UP_APPROX_ENABLED;
+     }
+     else {
+          strcpy(outputDir, extraSettings->outputDir);
+          PF_D2_UP_APPROX_ENABLED = extraSettings->pfD2UpApproxEnabled;
+     }
+}
+
+void SaveGTFoldExtraSettings(GTFoldExtraSettings_t *extraSettings) {
+     if(extraSettings != NULL) {
+          CopyGTFoldExtraSettings(extraSettings, true);
+     }
+}
+
+void RestoreGTFoldExtraSettings(const GTFoldExtraSettings_t *extraSettings) {
+     if(extraSettings != NULL) {
+          CopyGTFoldExtraSettings((GTFoldExtraSettings_t *) extraSettings, false);
+     }
+}
+
 PyObject * GTFoldPythonConfigSettings(PyObject *kwargs) {
+     AcquireGTFoldEngineLock();
      if(!PyDict_Check(kwargs)) {
 	  SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_PYARGS, NULL);
-	  return ReturnPythonNone();
+	  return ReturnFromGTFoldEngine(ReturnPythonNone());
      }
      int numOptions = GetArrayLength(GTFoldPythonConfigSettings_kwlist);
      int truthValue = 0;
@@ -717,11 +788,11 @@ PyObject * GTFoldPythonConfigSettings(PyObject *kwargs) {
      if(PF_ST_D2_ADVANCED_DOUBLE_SPECIFIER < 0 || PF_ST_D2_ADVANCED_DOUBLE_SPECIFIER > 4) {
           SetLastErrorCode(GTFPYTHON_ERRNO_RUNCFG, 
 			            "--advancedouble (PF_ST_D2_ADVANCED_DOUBLE_SPECIFIER) out of range");
-	     return ReturnPythonNone();
+	     return ReturnFromGTFoldEngine(ReturnPythonNone());
      }
      ConfigureOutputFileSettings();
      ValidateOptions();
-     return ReturnPythonNone();
+     return ReturnFromGTFoldEngine(ReturnPythonNone());
 }
 
 PyObject * PrintGTFoldRunConfiguration(int verboseParamPrint) {
@@ -825,9 +896,10 @@ PyObject * PrintGTFoldRunConfiguration(int verboseParamPrint) {
 }
 
 PyObject * SetGTFoldDataDirectory(const char *dataDir, int chLength) {
+     AcquireGTFoldEngineLock();
      if(dataDir == NULL || chLength <= 0) {
 	     SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
-	     return ReturnPythonNone();
+	     return ReturnFromGTFoldEngine(ReturnPythonNone());
      }
      else if(chLength >= STR_BUFFER_SIZE) {
 	     SetLastErrorCode(GTFPYTHON_ERRNO_STRLEN, NULL);
@@ -846,64 +918,161 @@ PyObject * SetGTFoldDataDirectory(const char *dataDir, int chLength) {
                fprintf(CONFIG_STDMSGOUT, ">> Changed GTFold data directory to \"%s\" ...\n", GTFOLD_DATADIR);
           }
      }
-     return ReturnPythonNone();
+     return ReturnFromGTFoldEngine(ReturnPythonNone());
 }
 
 PyObject * SetThermodynamicParameters(const char *energyModelSpec, 
 		                            const char *thermoParamsDir) {
+     AcquireGTFoldEngineLock();
      if(energyModelSpec == NULL) {
           SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
-	     return ReturnPythonNone();
+	     return ReturnFromGTFoldEngine(ReturnPythonNone());
      } 
      if(SetThermodynamicMode(energyModelSpec) != GTFPYTHON_ERRNO_OK) {
-          return ReturnPythonNone();
+          return ReturnFromGTFoldEngine(ReturnPythonNone());
+     }
+     // The shared tables (which are never reloaded while attached) would otherwise 
+     // keep being used in place of the energy model set here:
+     DetachSharedThermodynamicTables(false);
+     if(thermoParamsDir != NULL && IsRegularFile(thermoParamsDir)) {
+          if(strlen(thermoParamsDir) >= STR_BUFFER_SIZE) {
+	          SetLastErrorCode(GTFPYTHON_ERRNO_STRLEN, NULL);
+	     }
+	     else if(LoadThermodynamicParametersBlob(thermoParamsDir) == GTFPYTHON_ERRNO_OK) {
+	          strcpy(GTFOLD_DATADIR, thermoParamsDir);
+	     }
+	     return ReturnFromGTFoldEngine(ReturnPythonNone());
+     }
+     else if(thermoParamsDir != NULL) {
+	     return ReturnFromGTFoldEngine(SetGTFoldDataDirectory(thermoParamsDir, strlen(thermoParamsDir)));
+     }
+     return ReturnFromGTFoldEngine(ReturnPythonNone());
+}
+
+PyObject * CompileThermodynamicParameters(const char *energyModelSpec, 
+		                                const char *thermoParamsDir, const char *outPath) {
+     AcquireGTFoldEngineLock();
+     if(energyModelSpec == NULL || thermoParamsDir == NULL || outPath == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+	     return ReturnFromGTFoldEngine(ReturnPythonNone());
      }
-     if(thermoParamsDir != NULL) {
-	     return SetGTFoldDataDirectory(thermoParamsDir, strlen(thermoParamsDir));
+     CompileThermodynamicParametersBlob(energyModelSpec, thermoParamsDir, outPath);
+     return ReturnFromGTFoldEngine(ReturnPythonNone());
+}
+
+PyObject * LockThermodynamicParameters(void) {
+     AcquireGTFoldEngineLock();
+     if(!THERMO_PARAMS_RESIDENT && 
+        LoadThermodynamicParameters(ACTIVE_THERMO_PARAMS, GTFOLD_DATADIR) != GTFPYTHON_ERRNO_OK) {
+          return ReturnFromGTFoldEngine(ReturnPythonNone());
+     }
+     THERMO_PARAMS_LOCKED = true;
+     return ReturnFromGTFoldEngine(ReturnPythonNone());
+}
+
+PyObject * UnlockThermodynamicParameters(void) {
+     AcquireGTFoldEngineLock();
+     THERMO_PARAMS_LOCKED = false;
+     return ReturnFromGTFoldEngine(ReturnPythonNone());
+}
+
+PyObject * ReloadThermodynamicParameters(void) {
+     AcquireGTFoldEngineLock();
+     ForceLoadThermodynamicParameters(ACTIVE_THERMO_PARAMS, GTFOLD_DATADIR);
+     return ReturnFromGTFoldEngine(ReturnPythonNone());
+}
+
+PyObject * PublishSharedThermodynamicParameters(const char *shmName) {
+     AcquireGTFoldEngineLock();
+     if(shmName == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+	     return ReturnFromGTFoldEngine(ReturnPythonNone());
      }
-     return ReturnPythonNone();
+     else if(!THERMO_PARAMS_RESIDENT && 
+        LoadThermodynamicParameters(ACTIVE_THERMO_PARAMS, GTFOLD_DATADIR) != GTFPYTHON_ERRNO_OK) {
+          return ReturnFromGTFoldEngine(ReturnPythonNone());
+     }
+     PublishSharedThermodynamicTables(shmName);
+     return ReturnFromGTFoldEngine(ReturnPythonNone());
+}
+
+PyObject * AttachSharedThermodynamicParameters(const char *shmName) {
+     AcquireGTFoldEngineLock();
+     if(shmName == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+	     return ReturnFromGTFoldEngine(ReturnPythonNone());
+     }
+     AttachSharedThermodynamicTables(shmName);
+     return ReturnFromGTFoldEngine(ReturnPythonNone());
+}
+
+PyObject * DetachSharedThermodynamicParameters(int unlinkSegment) {
+     AcquireGTFoldEngineLock();
+     DetachSharedThermodynamicTables(unlinkSegment != 0);
+     return ReturnFromGTFoldEngine(ReturnPythonNone());
+}
+
+PyObject * GetThermodynamicParametersDigest(void) {
+     AcquireGTFoldEngineLock();
+     if(LoadThermodynamicParameters(ACTIVE_THERMO_PARAMS, GTFOLD_DATADIR) != GTFPYTHON_ERRNO_OK) {
+          return ReturnFromGTFoldEngine(ReturnPythonNone());
+     }
+     uint64_t tablesDigest = 0;
+     if(ComputeThermodynamicTablesDigest(&tablesDigest) != GTFPYTHON_ERRNO_OK) {
+          return ReturnFromGTFoldEngine(ReturnPythonNone());
+     }
+     char digestStr[24];
+     snprintf(digestStr, 24, "%016llx", (unsigned long long) tablesDigest);
+     PyGILState_STATE pgState = PyGILState_Ensure();
+     PyObject *digestObj = PyUnicode_FromString(digestStr);
+     PyGILState_Release(pgState);
+     return ReturnFromGTFoldEngine(digestObj);
 }
 
 PyObject * SetDangleParameter(int dangle) {
+     AcquireGTFoldEngineLock();
      if(dangle < 0 || dangle > 2) {
           //SetLastErrorCode(GTFPYTHON_ERRNO_DANGLE, NULL);
 	     dangles = -1;
-          return ReturnPythonNone();
+          return ReturnFromGTFoldEngine(ReturnPythonNone());
      }
      *DANGLE = dangle;
      dangles = dangle;
      //g_dangles = dangle;
-     return ReturnPythonNone();
+     return ReturnFromGTFoldEngine(ReturnPythonNone());
 }
 
 PyObject * SetTerminalMismatch(int enable) {
+     AcquireGTFoldEngineLock();
      T_MISMATCH = *TMISMATCH = g_mismatch = (enable != 0 ? 1 : 0);
-     return ReturnPythonNone();
+     return ReturnFromGTFoldEngine(ReturnPythonNone());
 }
 
 PyObject * SetLimitContactDistance(int lcDist) {
+     AcquireGTFoldEngineLock();
      if(lcDist < 0) {
           if(lcDist != -1) {
                SetLastErrorCode(GTFPYTHON_ERRNO_INVDIST, NULL);
           }
           LIMIT_DISTANCE = g_LIMIT_DISTANCE = 0;
-          return ReturnPythonNone();
+          return ReturnFromGTFoldEngine(ReturnPythonNone());
      }
      contactDistance = g_contactDistance = lcDist;
      LIMIT_DISTANCE = g_LIMIT_DISTANCE = 1;
-     return ReturnPythonNone();
+     return ReturnFromGTFoldEngine(ReturnPythonNone());
 }
 
 PyObject * SetPrefilterParameter(int prefilter) {
+     AcquireGTFoldEngineLock();
      if(prefilter <= 0) {
-	     return ReturnPythonNone();
+	     return ReturnFromGTFoldEngine(ReturnPythonNone());
      }
      prefilter1 = prefilter2 = g_prefilter1 = g_prefilter2 = prefilter;
      //g_prefilter_mode = b_prefilter = 1;
-     return ReturnPythonNone();
+     return ReturnFromGTFoldEngine(ReturnPythonNone());
 }
 
-PyObject * GetPFuncCount(const char *baseSeq, ConsListCType_t consList, int consLength) {
+static PyObject * GetPFuncCountLocked(const char *baseSeq, ConsListCType_t consList, int consLength) {
      if(baseSeq == NULL || consList == NULL || consLength < 0) {
           SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
 	     return ReturnPythonNone();
@@ -949,7 +1118,14 @@ PyObject * GetPFuncCount(const char *baseSeq, ConsListCType_t consList, int cons
      return pfuncDbl;
 }
 
-PyObject * GetPFuncCountSHAPE(const char *baseSeq, SHAPEConstraint_t *scList, int sconsLength) {
+PyObject * GetPFuncCount(const char *baseSeq, ConsListCType_t consList, int consLength) {
+     PyThreadState *pyThreadState = BeginGTFoldEngineCompute();
+     PyObject *pyObjReturn = GetPFuncCountLocked(baseSeq, consList, consLength);
+     EndGTFoldEngineCompute(pyThreadState);
+     return pyObjReturn;
+}
+
+static PyObject * GetPFuncCountSHAPELocked(const char *baseSeq, SHAPEConstraint_t *scList, int sconsLength) {
      if(baseSeq == NULL || scList == NULL || sconsLength < 0) {
           SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
 	  return ReturnPythonNone();
@@ -995,7 +1171,15 @@ PyObject * GetPFuncCountSHAPE(const char *baseSeq, SHAPEConstraint_t *scList, in
      return pfuncDbl;
 }
 
-PyObject * ComputeBPP(const char *baseSeq, ConsListCType_t consList, int consLength) {
+PyObject * GetPFuncCountSHAPE(const char *baseSeq, SHAPEConstraint_t *scList, int sconsLength) {
+     PyThreadState *pyThreadState = BeginGTFoldEngineCompute();
+     PyObject *pyObjReturn = GetPFuncCountSHAPELocked(baseSeq, scList, sconsLength);
+     EndGTFoldEngineCompute(pyThreadState);
+     return pyObjReturn;
+}
+
+static PyObject * ComputeBPPLocked(const char *baseSeq, ConsListCType_t consList, int consLength, 
+		                   const BPPOutputFormat_t *bppFormat) {
      if(baseSeq == NULL || consList == NULL || consLength < 0) {
           SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
 	  return ReturnPythonNone();
@@ -1015,13 +1199,39 @@ PyObject * ComputeBPP(const char *baseSeq, ConsListCType_t consList, int consLen
 	  FreeGTFoldMFEStructureData(rtArgs.numBases);
 	  return ReturnPythonNone();
      }
-     PyObject *pyObjReturn = HandleBPP(&rtArgs); // ??? : Release/Acquire the GIL? 
+     PyObject *pyObjReturn = HandleBPPOutput(&rtArgs, bppFormat);
      FreeMFEStructRuntimeArgs(&rtArgs);
      FreeGTFoldMFEStructureData(rtArgs.numBases);
      return pyObjReturn;
 }
 
-PyObject * ComputeBPPSHAPE(const char *baseSeq, SHAPEConstraint_t *scList, int sconsLength) {
+PyObject * ComputeBPP(const char *baseSeq, ConsListCType_t consList, int consLength) {
+     PyThreadState *pyThreadState = BeginGTFoldEngineCompute();
+     PyObject *pyObjReturn = ComputeBPPLocked(baseSeq, consList, consLength, NULL);
+     EndGTFoldEngineCompute(pyThreadState);
+     return pyObjReturn;
+}
+
+PyObject * ComputeBPPMatrix(const char *baseSeq, ConsListCType_t consList, int consLength, 
+		            int matrixFormat) {
+     BPPOutputFormat_t bppFormat = { BPP_OUTPUT_MATRIX, matrixFormat & 0x03, 0.0, 0 };
+     PyThreadState *pyThreadState = BeginGTFoldEngineCompute();
+     PyObject *pyObjReturn = ComputeBPPLocked(baseSeq, consList, consLength, &bppFormat);
+     EndGTFoldEngineCompute(pyThreadState);
+     return pyObjReturn;
+}
+
+PyObject * ComputeBPPSparse(const char *baseSeq, ConsListCType_t consList, int consLength, 
+		            double cutoff, int topKPerBase) {
+     BPPOutputFormat_t bppFormat = { BPP_OUTPUT_SPARSE, 0, cutoff, topKPerBase };
+     PyThreadState *pyThreadState = BeginGTFoldEngineCompute();
+     PyObject *pyObjReturn = ComputeBPPLocked(baseSeq, consList, consLength, &bppFormat);
+     EndGTFoldEngineCompute(pyThreadState);
+     return pyObjReturn;
+}
+
+static PyObject * ComputeBPPSHAPELocked(const char *baseSeq, SHAPEConstraint_t *scList, int sconsLength, 
+		                        const BPPOutputFormat_t *bppFormat) {
      if(baseSeq == NULL || scList == NULL || sconsLength < 0) {
           SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
 	  return ReturnPythonNone();
@@ -1041,13 +1251,38 @@ PyObject * ComputeBPPSHAPE(const char *baseSeq, SHAPEConstraint_t *scList, int s
 	  FreeGTFoldMFEStructureData(rtArgs.numBases);
 	  return ReturnPythonNone();
      }
-     PyObject *pyObjReturn = HandleBPP(&rtArgs); // ??? : Release/Acquire the GIL?
+     PyObject *pyObjReturn = HandleBPPOutput(&rtArgs, bppFormat);
      FreeMFEStructRuntimeArgs(&rtArgs);
      FreeGTFoldMFEStructureData(rtArgs.numBases);
      return pyObjReturn;
 }
 
-PyObject * GetMFEStructure(const char *baseSeq, ConsListCType_t consList, int consLength) {
+PyObject * ComputeBPPSHAPE(const char *baseSeq, SHAPEConstraint_t *scList, int sconsLength) {
+     PyThreadState *pyThreadState = BeginGTFoldEngineCompute();
+     PyObject *pyObjReturn = ComputeBPPSHAPELocked(baseSeq, scList, sconsLength, NULL);
+     EndGTFoldEngineCompute(pyThreadState);
+     return pyObjReturn;
+}
+
+PyObject * ComputeBPPMatrixSHAPE(const char *baseSeq, SHAPEConstraint_t *scList, int sconsLength, 
+		                 int matrixFormat) {
+     BPPOutputFormat_t bppFormat = { BPP_OUTPUT_MATRIX, matrixFormat & 0x03, 0.0, 0 };
+     PyThreadState *pyThreadState = BeginGTFoldEngineCompute();
+     PyObject *pyObjReturn = ComputeBPPSHAPELocked(baseSeq, scList, sconsLength, &bppFormat);
+     EndGTFoldEngineCompute(pyThreadState);
+     return pyObjReturn;
+}
+
+PyObject * ComputeBPPSparseSHAPE(const char *baseSeq, SHAPEConstraint_t *scList, int sconsLength, 
+		                 double cutoff, int topKPerBase) {
+     BPPOutputFormat_t bppFormat = { BPP_OUTPUT_SPARSE, 0, cutoff, topKPerBase };
+     PyThreadState *pyThreadState = BeginGTFoldEngineCompute();
+     PyObject *pyObjReturn = ComputeBPPSHAPELocked(baseSeq, scList, sconsLength, &bppFormat);
+     EndGTFoldEngineCompute(pyThreadState);
+     return pyObjReturn;
+}
+
+static PyObject * GetMFEStructureLocked(const char *baseSeq, ConsListCType_t consList, int consLength) {
      if(baseSeq == NULL || consList == NULL || consLength < 0) {
           SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
 	  return ReturnPythonNone();
@@ -1078,7 +1313,7 @@ PyObject * GetMFEStructure(const char *baseSeq, ConsListCType_t consList, int co
           save_ct_file(outputFile, baseSeq, mfe);
      }
      char *dbMFEStruct = ComputeDOTStructureResult(rtArgs.numBases);
-     PyObject *mfeTupleRes = PrepareMFETupleResult(mfe, dbMFEStruct); // ??? : Release/Acquire the GIL?
+     PyObject *mfeTupleRes = PrepareMFETupleResult(mfe, dbMFEStruct);
      Free(dbMFEStruct);
      FreeMFEStructRuntimeArgs(&rtArgs);
      FreeGTFoldMFEStructureData(rtArgs.numBases);
@@ -1088,7 +1323,14 @@ PyObject * GetMFEStructure(const char *baseSeq, ConsListCType_t consList, int co
      return mfeTupleRes;
 }
 
-PyObject * GetMFEStructureSHAPE(const char *baseSeq, SHAPEConstraint_t *scList, int scLength) {
+PyObject * GetMFEStructure(const char *baseSeq, ConsListCType_t consList, int consLength) {
+     PyThreadState *pyThreadState = BeginGTFoldEngineCompute();
+     PyObject *pyObjReturn = GetMFEStructureLocked(baseSeq, consList, consLength);
+     EndGTFoldEngineCompute(pyThreadState);
+     return pyObjReturn;
+}
+
+static PyObject * GetMFEStructureSHAPELocked(const char *baseSeq, SHAPEConstraint_t *scList, int scLength) {
      if(baseSeq == NULL || scList == NULL || scLength < 0) {
           SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
 	  return ReturnPythonNone();
@@ -1116,7 +1358,7 @@ PyObject * GetMFEStructureSHAPE(const char *baseSeq, SHAPEConstraint_t *scList,
           save_ct_file(outputFile, baseSeq, mfe);
      }
      char *dbMFEStruct = ComputeDOTStructureResult(rtArgs.numBases);
-     PyObject *mfeTupleRes = PrepareMFETupleResult(mfe, dbMFEStruct); // ??? : Release/Acquire the GIL?
+     PyObject *mfeTupleRes = PrepareMFETupleResult(mfe, dbMFEStruct);
      Free(dbMFEStruct);
      FreeMFEStructRuntimeArgs(&rtArgs);
      FreeGTFoldMFEStructureData(rtArgs.numBases);
@@ -1126,15 +1368,155 @@ PyObject * GetMFEStructureSHAPE(const char *baseSeq, SHAPEConstraint_t *scList,
      return mfeTupleRes;
 }
 
-PyObject * GetSuboptStructuresWithinRange(const char *baseSeq, double delta) {
-     if(baseSeq == NULL) {
-          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+PyObject * GetMFEStructureSHAPE(const char *baseSeq, SHAPEConstraint_t *scList, int scLength) {
+     PyThreadState *pyThreadState = BeginGTFoldEngineCompute();
+     PyObject *pyObjReturn = GetMFEStructureSHAPELocked(baseSeq, scList, scLength);
+     EndGTFoldEngineCompute(pyThreadState);
+     return pyObjReturn;
+}
+
+static void FreeMFEStructureBatchData(char **baseSeqs, Constraint_t **consArrs, int *consLengths, 
+		                      char **dbMFEStructs, int numSeqs) {
+     for(int si = 0; si < numSeqs; si++) {
+          Free(baseSeqs[si]);
+	  Free(consArrs[si]);
+	  Free(dbMFEStructs[si]);
+     }
+     Free(baseSeqs);
+     Free(consArrs);
+     Free(consLengths);
+     Free(dbMFEStructs);
+}
+
+static PyObject * GetMFEStructureBatchLocked(PyObject *baseSeqList, PyObject *consListsObj, int threadsPerFold) {
+     PyGILState_STATE pgState = PyGILState_Ensure();
+     PyObject *baseSeqsFast = PySequence_Fast(baseSeqList, "Expected a list of sequences");
+     PyObject *consListsFast = consListsObj == NULL || consListsObj == Py_None ? NULL : 
+	                       PySequence_Fast(consListsObj, "Expected a list of constraint lists");
+     PyGILState_Release(pgState);
+     if(baseSeqsFast == NULL || (consListsObj != NULL && consListsObj != Py_None && consListsFast == NULL)) {
+          pgState = PyGILState_Ensure();
+	  Py_XDECREF(baseSeqsFast);
+	  PyGILState_Release(pgState);
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_PYARGS, NULL);
 	  return ReturnPythonNone();
      }
-     SUBOPT_ENABLED = 1;
-     suboptDelta = delta;
-     ValidateOptions();
-     int baseSeqLength = strlen(baseSeq);
+     int numSeqs = (int) PySequence_Fast_GET_SIZE(baseSeqsFast);
+     if(consListsFast != NULL && PySequence_Fast_GET_SIZE(consListsFast) != numSeqs) {
+          pgState = PyGILState_Ensure();
+	  Py_DECREF(baseSeqsFast);
+	  Py_DECREF(consListsFast);
+	  PyGILState_Release(pgState);
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_PYARGS, "Need one constraints list per sequence");
+	  return ReturnPythonNone();
+     }
+     // Copy all of the inputs up front so that the engine runs without the GIL:
+     char **baseSeqs = (char **) calloc(numSeqs + 1, sizeof(char *));
+     Constraint_t **consArrs = (Constraint_t **) calloc(numSeqs + 1, sizeof(Constraint_t *));
+     int *consLengths = (int *) calloc(numSeqs + 1, sizeof(int));
+     char **dbMFEStructs = (char **) calloc(numSeqs + 1, sizeof(char *));
+     double *mfeValues = (double *) calloc(numSeqs + 1, sizeof(double));
+     if(baseSeqs == NULL || consArrs == NULL || consLengths == NULL || dbMFEStructs == NULL || 
+        mfeValues == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+     }
+     pgState = PyGILState_Ensure();
+     for(int si = 0; si < numSeqs && GetLastErrorCode() == GTFPYTHON_ERRNO_OK; si++) {
+          const char *baseSeq = PyUnicode_AsUTF8(PySequence_Fast_GET_ITEM(baseSeqsFast, si));
+	  if(baseSeq == NULL) {
+	       SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_PYARGS, "Expected a list of sequences");
+	       break;
+	  }
+	  baseSeqs[si] = strdup(baseSeq);
+	  if(consListsFast != NULL) {
+	       consArrs[si] = ParsePythonConstraintsList(PySequence_Fast_GET_ITEM(consListsFast, si), 
+			                                 &consLengths[si]);
+	  }
+     }
+     Py_DECREF(baseSeqsFast);
+     Py_XDECREF(consListsFast);
+     PyGILState_Release(pgState);
+     if(GetLastErrorCode() != GTFPYTHON_ERRNO_OK) {
+	  if(baseSeqs != NULL && consArrs != NULL && consLengths != NULL && dbMFEStructs != NULL) {
+               FreeMFEStructureBatchData(baseSeqs, consArrs, consLengths, dbMFEStructs, numSeqs);
+	  }
+	  Free(mfeValues);
+	  return ReturnPythonNone();
+     }
+     // The thermodynamic parameters and settings are set up once for the whole batch. The 
+     // engine arrays are global, so the sequences are folded one after the other (each fold 
+     // may still use threadsPerFold OpenMP threads):
+     int savedNumThreads = nThreads, savedGlobalNumThreads = g_nthreads;
+     if(threadsPerFold > 0) {
+          nThreads = threadsPerFold;
+     }
+     int foldStatus = LoadThermodynamicParameters(ACTIVE_THERMO_PARAMS, GTFOLD_DATADIR);
+     for(int si = 0; si < numSeqs && foldStatus == GTFPYTHON_ERRNO_OK; si++) {
+          MFEStructRuntimeArgs_t rtArgs;
+	  InitMFEStructRuntimeArgs(&rtArgs);
+	  rtArgs.baseSeq = baseSeqs[si];
+	  SetRTArgsSequenceLength(rtArgs, strlen(baseSeqs[si]));
+	  rtArgs.mfeConstraints = consArrs[si];
+	  rtArgs.numConstraints = consLengths[si];
+	  // Each sequence starts out with a clean error state, as with GetMFEStructure:
+	  SetLastErrorCode(GTFPYTHON_ERRNO_OK, NULL);
+	  if((foldStatus = InitGTFoldMFEStructureData(&rtArgs)) != GTFPYTHON_ERRNO_OK) {
+	       break;
+	  }
+	  if(*CONFIG_DEBUGGING) {
+	       fprintf(CONFIG_STDMSGOUT, "BASE SEQUENCE: [#%d] %s\n", rtArgs.numBases, rtArgs.baseSeq);
+	       fprintf(CONFIG_STDMSGOUT, "CONSTRAINTS:\n");
+	       PrintGTFoldConstraints(rtArgs.mfeConstraints, rtArgs.numConstraints);
+	  }
+	  mfeValues[si] = ComputeMFEStructure(&rtArgs);
+	  if((foldStatus = GetLastErrorCode()) != GTFPYTHON_ERRNO_OK) {
+	       free_fold(rtArgs.numBases);
+	       break;
+	  }
+	  if(WRITEAUXFILES) {
+	       ConfigureOutputFileSettings();
+	       save_ct_file(outputFile, baseSeqs[si], mfeValues[si]);
+	  }
+	  dbMFEStructs[si] = ComputeDOTStructureResult(rtArgs.numBases);
+	  FreeGTFoldMFEStructureData(rtArgs.numBases);
+     }
+     nThreads = savedNumThreads;
+     g_nthreads = savedGlobalNumThreads;
+     PyObject *batchResult = NULL;
+     if(foldStatus == GTFPYTHON_ERRNO_OK) {
+          pgState = PyGILState_Ensure();
+          PyObject *mfeList = PyList_New(numSeqs);
+          PyObject *mfeStructList = PyList_New(numSeqs);
+          for(int si = 0; si < numSeqs && mfeList != NULL && mfeStructList != NULL; si++) {
+	       PyList_SET_ITEM(mfeList, si, PyFloat_FromDouble(mfeValues[si]));
+	       PyList_SET_ITEM(mfeStructList, si, PyUnicode_FromString(dbMFEStructs[si]));
+	  }
+	  if(mfeList != NULL && mfeStructList != NULL) {
+	       batchResult = PyTuple_Pack(2, mfeList, mfeStructList);
+	  }
+	  Py_XDECREF(mfeList);
+	  Py_XDECREF(mfeStructList);
+          PyGILState_Release(pgState);
+	  if(batchResult == NULL) {
+	       SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+	  }
+     }
+     FreeMFEStructureBatchData(baseSeqs, consArrs, consLengths, dbMFEStructs, numSeqs);
+     Free(mfeValues);
+     if(batchResult == NULL) {
+          return ReturnPythonNone();
+     }
+     return batchResult;
+}
+
+PyObject * GetMFEStructureBatch(PyObject *baseSeqList, PyObject *consListsObj, int threadsPerFold) {
+     PyThreadState *pyThreadState = BeginGTFoldEngineCompute();
+     PyObject *pyObjReturn = GetMFEStructureBatchLocked(baseSeqList, consListsObj, threadsPerFold);
+     EndGTFoldEngineCompute(pyThreadState);
+     return pyObjReturn;
+}
+
+static void ConfigureSuboptDefaults(int baseSeqLength) {
      if(UNIQUE_MULTILOOP_DECOMPOSITION == -1){
           if(baseSeqLength <= 2000){
                UNIQUE_MULTILOOP_DECOMPOSITION = 1;
@@ -1151,19 +1533,14 @@ PyObject * GetSuboptStructuresWithinRange(const char *baseSeq, double delta) {
                is_check_for_duplicates_enabled = 1;
           }
      }
-     MFEStructRuntimeArgs_t rtArgs;
-     InitMFEStructRuntimeArgs(&rtArgs);
-     rtArgs.baseSeq = baseSeq;
-     SetRTArgsSequenceLength(rtArgs, strlen(baseSeq));
-     if(InitGTFoldMFEStructureData(&rtArgs) != GTFPYTHON_ERRNO_OK) { // in place of: init_fold(baseSeq);
-          FreeMFEStructRuntimeArgs(&rtArgs);
-          return ReturnPythonNone();
-     } 
-     g_dangles = 2;
-     if(LoadThermodynamicParameters(ACTIVE_THERMO_PARAMS, GTFOLD_DATADIR) != GTFPYTHON_ERRNO_OK) {
-          return ReturnPythonNone();
-     }
-     int energy = calculate(baseSeqLength);
+}
+
+/* Traces back the structures within suboptDelta kcal/mol of the MFE (energy, in 
+ * units of 10 cal/mol) from the MFE arrays filled by calculate with numThreads threads 
+ * (one is the sequential traceback). Returns NULL on error: 
+ */
+static PyObject * TracebackSuboptStructures(const char *baseSeq, int baseSeqLength, int energy, 
+		                            int numThreads) {
      if(WRITEAUXFILES) {
           ConfigureOutputFileSettings();
 	  write_header_subopt_file(suboptFile, baseSeq, energy);
@@ -1171,9 +1548,9 @@ PyObject * GetSuboptStructuresWithinRange(const char *baseSeq, double delta) {
      double t1 = get_seconds();
      int ssArrCount = 0;
      errno = EXIT_SUCCESS;
-     ss_ctype_t *suboptDataArr = SuboptTraceback(baseSeqLength, 100.0 * suboptDelta, suboptFile, WRITEAUXFILES, 
-		                                 is_check_for_duplicates_enabled, max_structure_count, 
-						 &ssArrCount);
+     ss_ctype_t *suboptDataArr = SuboptTracebackParallel(baseSeqLength, 100.0 * suboptDelta, suboptFile, 
+		                                         WRITEAUXFILES, is_check_for_duplicates_enabled, 
+							 max_structure_count, numThreads, &ssArrCount);
      t1 = get_seconds() - t1;
      if(errno == EDOM) {
           SetLastErrorCode(GTFPYTHON_ERRNO_SUBOPT, "Duplicate structure calculated!");
@@ -1186,23 +1563,300 @@ PyObject * GetSuboptStructuresWithinRange(const char *baseSeq, double delta) {
      }
      if(suboptDataArr == NULL) {
           SetLastErrorCode(GTFPYTHON_ERRNO_SUBOPT, NULL);
-	  free_fold(baseSeqLength);
-	  return ReturnPythonNone();
+	  return NULL;
      }
-     // ??? : Release/Acquire the GIL?
      PyObject *pyStructsList = StructureListToPythonTupleList((StructData_t *) suboptDataArr, ssArrCount);
      FreeSSMapStructure(suboptDataArr, ssArrCount);
+     return pyStructsList;
+}
+
+/* Fills the MFE arrays of baseSeq for a traceback of the structures within delta 
+ * kcal/mol of the MFE, and sets energy to the MFE (in units of 10 cal/mol). The 
+ * arrays are freed with FreeGTFoldMFEStructureData (after FreeMFEStructRuntimeArgs): 
+ */
+static int PrepareSuboptTraceback(const char *baseSeq, double delta, 
+		                  MFEStructRuntimeArgs_t *rtArgs, int *energy) {
+     SUBOPT_ENABLED = 1;
+     suboptDelta = delta;
+     ValidateOptions();
+     int baseSeqLength = strlen(baseSeq);
+     ConfigureSuboptDefaults(baseSeqLength);
+     InitMFEStructRuntimeArgs(rtArgs);
+     rtArgs->baseSeq = baseSeq;
+     SetRTArgsSequenceLength((*rtArgs), baseSeqLength);
+     int errorCode = InitGTFoldMFEStructureData(rtArgs);
+     if(errorCode != GTFPYTHON_ERRNO_OK) { // in place of: init_fold(baseSeq);
+          FreeMFEStructRuntimeArgs(rtArgs);
+          return errorCode;
+     } 
+     g_dangles = 2;
+     errorCode = LoadThermodynamicParameters(ACTIVE_THERMO_PARAMS, GTFOLD_DATADIR);
+     if(errorCode != GTFPYTHON_ERRNO_OK) {
+          return errorCode;
+     }
+     *energy = calculate(baseSeqLength);
+     return GTFPYTHON_ERRNO_OK;
+}
+
+static PyObject * GetSuboptStructuresWithinRangeLocked(const char *baseSeq, double delta, int numThreads) {
+     if(baseSeq == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+	  return ReturnPythonNone();
+     }
+     MFEStructRuntimeArgs_t rtArgs;
+     int energy = 0;
+     if(PrepareSuboptTraceback(baseSeq, delta, &rtArgs, &energy) != GTFPYTHON_ERRNO_OK) {
+          return ReturnPythonNone();
+     }
+     int baseSeqLength = strlen(baseSeq);
+     if(numThreads <= 0) { // the "numthreads" setting (where -1 is all of the threads available):
+          numThreads = nThreads;
+     }
+     PyObject *pyStructsList = TracebackSuboptStructures(baseSeq, baseSeqLength, energy, numThreads);
+     if(pyStructsList == NULL) {
+	  free_fold(baseSeqLength);
+	  return ReturnPythonNone();
+     }
      FreeMFEStructRuntimeArgs(&rtArgs);
      FreeGTFoldMFEStructureData(rtArgs.numBases);
      return pyStructsList;
 }
 
-PyObject * SampleBoltzmannStructures(const char *baseSeq, ConsListCType_t consList, 
-		                           int consLength, int N) {
+PyObject * GetSuboptStructuresWithinRange(const char *baseSeq, double delta, int numThreads) {
+     PyThreadState *pyThreadState = BeginGTFoldEngineCompute();
+     PyObject *pyObjReturn = GetSuboptStructuresWithinRangeLocked(baseSeq, delta, numThreads);
+     EndGTFoldEngineCompute(pyThreadState);
+     return pyObjReturn;
+}
+
+typedef struct {
+     PyObject *visitFunc;
+     int pyError;
+} SuboptStreamVisitor_t;
+
+/* Passes one structure of the subopt traceback to the Python callback (with the GIL), 
+ * and stops the traceback if it returns a false value or raises an exception: 
+ */
+static int VisitSuboptStructure(const char *dotStruct, int energy, void *visitArg) {
+     SuboptStreamVisitor_t *visitor = (SuboptStreamVisitor_t *) visitArg;
+     PyGILState_STATE pgState = PyGILState_Ensure();
+     int continueTraceback = 0;
+     PyObject *pyResult = PyObject_CallFunction(visitor->visitFunc, "si", dotStruct, energy);
+     if(pyResult != NULL) {
+          continueTraceback = PyObject_IsTrue(pyResult);
+          Py_DECREF(pyResult);
+     }
+     if(pyResult == NULL || continueTraceback < 0) {
+          visitor->pyError = 1;
+	  continueTraceback = 0;
+     }
+     PyGILState_Release(pgState);
+     return continueTraceback;
+}
+
+static PyObject * GetSuboptStructuresStreamLocked(const char *baseSeq, double delta, int maxCount, 
+		                                  PyObject *visitFunc) {
+     PyGILState_STATE pgState = PyGILState_Ensure();
+     bool validVisitFunc = visitFunc != NULL && PyCallable_Check(visitFunc);
+     PyGILState_Release(pgState);
+     if(baseSeq == NULL || !validVisitFunc) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+	  return ReturnPythonNone();
+     }
+     MFEStructRuntimeArgs_t rtArgs;
+     int energy = 0;
+     if(PrepareSuboptTraceback(baseSeq, delta, &rtArgs, &energy) != GTFPYTHON_ERRNO_OK) {
+          return ReturnPythonNone();
+     }
+     double t1 = get_seconds();
+     SuboptStreamVisitor_t visitor = { visitFunc, 0 };
+     int structCount = subopt_traceback_visit(strlen(baseSeq), 100.0 * suboptDelta, 
+		                              maxCount > 0 ? maxCount : max_structure_count, 
+					      VisitSuboptStructure, &visitor);
+     t1 = get_seconds() - t1;
+     if(!SILENT) {
+          fprintf(CONFIG_STDMSGOUT, "Subopt traceback running time: %9.6f seconds\n", t1);
+	  fprintf(CONFIG_STDMSGOUT, "Counts of structure generated=%d\n\n", structCount);
+     }
+     FreeMFEStructRuntimeArgs(&rtArgs);
+     FreeGTFoldMFEStructureData(rtArgs.numBases);
+     if(visitor.pyError) {
+          return NULL; // raises the exception of the callback
+     }
+     return ReturnPythonInt(structCount);
+}
+
+PyObject * GetSuboptStructuresStream(const char *baseSeq, double delta, int maxCount, PyObject *visitFunc) {
+     PyThreadState *pyThreadState = BeginGTFoldEngineCompute();
+     PyObject *pyObjReturn = GetSuboptStructuresStreamLocked(baseSeq, delta, maxCount, visitFunc);
+     EndGTFoldEngineCompute(pyThreadState);
+     return pyObjReturn;
+}
+
+typedef struct {
+     ss_ctype_t *structs;
+     int count;
+     int noMemory;
+} KBestStructures_t;
+
+static int CollectKBestStructure(const char *dotStruct, int energy, void *visitArg) {
+     KBestStructures_t *kbest = (KBestStructures_t *) visitArg;
+     char *dotStructCopy = strdup(dotStruct);
+     if(dotStructCopy == NULL) {
+          kbest->noMemory = 1;
+	  return 0;
+     }
+     kbest->structs[kbest->count].dotStruct = dotStructCopy;
+     kbest->structs[kbest->count].energy = energy;
+     kbest->count++;
+     return 1;
+}
+
+static PyObject * GetKBestStructuresLocked(const char *baseSeq, int k) {
+     if(baseSeq == NULL || k <= 0) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+	  return ReturnPythonNone();
+     }
+     KBestStructures_t kbest = { (ss_ctype_t *) calloc(k, sizeof(ss_ctype_t)), 0, 0 };
+     if(kbest.structs == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+	  return ReturnPythonNone();
+     }
+     MFEStructRuntimeArgs_t rtArgs;
+     int energy = 0;
+     if(PrepareSuboptTraceback(baseSeq, 0.0, &rtArgs, &energy) != GTFPYTHON_ERRNO_OK) {
+          Free(kbest.structs);
+          return ReturnPythonNone();
+     }
+     double t1 = get_seconds();
+     int structCount = subopt_kbest_visit(strlen(baseSeq), k, CollectKBestStructure, &kbest);
+     t1 = get_seconds() - t1;
+     if(!SILENT) {
+          fprintf(CONFIG_STDMSGOUT, "K-best traceback running time: %9.6f seconds\n\n", t1);
+     }
+     FreeMFEStructRuntimeArgs(&rtArgs);
+     FreeGTFoldMFEStructureData(rtArgs.numBases);
+     PyObject *pyStructsList = NULL;
+     if(structCount < 0) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_SUBOPT, "Sequence too long for the k-best traceback");
+     }
+     else if(kbest.noMemory) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+     }
+     else {
+          pyStructsList = StructureListToPythonTupleList((StructData_t *) kbest.structs, kbest.count);
+     }
+     FreeSSMapStructure(kbest.structs, k);
+     return pyStructsList == NULL ? ReturnPythonNone() : pyStructsList;
+}
+
+PyObject * GetKBestStructures(const char *baseSeq, int k) {
+     PyThreadState *pyThreadState = BeginGTFoldEngineCompute();
+     PyObject *pyObjReturn = GetKBestStructuresLocked(baseSeq, k);
+     EndGTFoldEngineCompute(pyThreadState);
+     return pyObjReturn;
+}
+
+/* Converts the decimal count strings of subopt_energy_band_counts to a Python list of ints, 
+ * and frees them: 
+ */
+static PyObject * BandCountsToPythonList(char **bandCounts, int numBins) {
+     PyGILState_STATE pgState = PyGILState_Ensure();
+     PyObject *pyCountsList = PyList_New(numBins);
+     for(int b = 0; b < numBins; b++) {
+          PyObject *pyCount = pyCountsList != NULL ? PyLong_FromString(bandCounts[b], NULL, 10) : NULL;
+          if(pyCount != NULL) {
+               PyList_SET_ITEM(pyCountsList, b, pyCount);
+          }
+          else if(pyCountsList != NULL) {
+               Py_DECREF(pyCountsList);
+               pyCountsList = NULL;
+          }
+          Free(bandCounts[b]);
+     }
+     Free(bandCounts);
+     if(pyCountsList == NULL) {
+          PyErr_Clear();
+          SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+     }
+     PyGILState_Release(pgState);
+     return pyCountsList;
+}
+
+static PyObject * GetEnergyBandHistogramLocked(const char *baseSeq, double delta, double binWidth) {
+     int binWidthUnits = (int) lround(100.0 * binWidth);
+     if(baseSeq == NULL || delta < 0.0 || binWidthUnits <= 0) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+	  return ReturnPythonNone();
+     }
+     MFEStructRuntimeArgs_t rtArgs;
+     int energy = 0;
+     if(PrepareSuboptTraceback(baseSeq, delta, &rtArgs, &energy) != GTFPYTHON_ERRNO_OK) {
+          return ReturnPythonNone();
+     }
+     double t1 = get_seconds();
+     int numBins = 0;
+     errno = EXIT_SUCCESS;
+     char **bandCounts = subopt_energy_band_counts(strlen(baseSeq), 100.0 * suboptDelta, binWidthUnits, &numBins);
+     int countErrno = errno;
+     t1 = get_seconds() - t1;
+     if(!SILENT) {
+          fprintf(CONFIG_STDMSGOUT, "Energy band counts running time: %9.6f seconds\n\n", t1);
+     }
+     FreeMFEStructRuntimeArgs(&rtArgs);
+     FreeGTFoldMFEStructureData(rtArgs.numBases);
+     if(bandCounts == NULL && countErrno == ERANGE) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_SUBOPT, "Sequence too long for the energy band counts");
+	  return ReturnPythonNone();
+     }
+     else if(bandCounts == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+	  return ReturnPythonNone();
+     }
+     PyObject *pyCountsList = BandCountsToPythonList(bandCounts, numBins);
+     return pyCountsList == NULL ? ReturnPythonNone() : pyCountsList;
+}
+
+PyObject * GetEnergyBandHistogram(const char *baseSeq, double delta, double binWidth) {
+     PyThreadState *pyThreadState = BeginGTFoldEngineCompute();
+     PyObject *pyObjReturn = GetEnergyBandHistogramLocked(baseSeq, delta, binWidth);
+     EndGTFoldEngineCompute(pyThreadState);
+     return pyObjReturn;
+}
+
+/* Restricts the next sampling batch to the shard shardIndex of shardCount of a batch of 
+ * N samples, i.e., to its samples floor(N * shardIndex / shardCount) + 1, ..., 
+ * floor(N * (shardIndex + 1) / shardCount), so that the shards of one seed together 
+ * draw exactly the samples of the whole batch (shardCount = 0 for the whole batch). 
+ * Returns the number of samples in the shard, or -1 if the shard is invalid: 
+ */
+static int ConfigureSampleShard(int N, int shardIndex, int shardCount) {
+     if(shardCount == 0) {
+          g_sample_index_offset = 0;
+          return N;
+     }
+     else if(shardCount < 0 || shardCount > N || shardIndex < 0 || shardIndex >= shardCount) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, "Invalid sample shard (index, count)");
+          return -1;
+     }
+     long long firstSample = (long long) N * shardIndex / shardCount;
+     long long lastSample = (long long) N * (shardIndex + 1) / shardCount;
+     g_sample_index_offset = firstSample;
+     return (int) (lastSample - firstSample);
+}
+
+static PyObject * SampleBoltzmannStructuresLocked(const char *baseSeq, ConsListCType_t consList, 
+		                                  int consLength, int N, long long seed, 
+						  int shardIndex, int shardCount) {
      if(baseSeq == NULL || consLength < 0 || N <= 0) {
           SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
 	     return ReturnPythonNone();
      }
+     g_sample_seed = seed;
+     if((N = ConfigureSampleShard(N, shardIndex, shardCount)) <= 0) {
+	     return ReturnPythonNone();
+     }
+     int outputFormat = shardCount > 0 ? SAMPLE_OUTPUT_SUMMARY : SAMPLE_OUTPUT_LIST;
      //CALC_PART_FUNC = 0;
      PF_COUNT_MODE = 1;
      CALC_PF_DO = g_dangles == 0;
@@ -1246,22 +1900,39 @@ PyObject * SampleBoltzmannStructures(const char *baseSeq, ConsListCType_t consLi
      PyObject *sampleStructsListObj = NULL;
      if(CALC_PF_D2) {
           ST_D2_ENABLE_SCATTER_PLOT = 1;
-          sampleStructsListObj = HandleD2Sample(PF_ST_D2_ADVANCED_DOUBLE_SPECIFIER, N, &rtArgs);
+          sampleStructsListObj = HandleD2Sample(PF_ST_D2_ADVANCED_DOUBLE_SPECIFIER, N, &rtArgs, outputFormat);
      }
      else {
-          sampleStructsListObj = HandleDsSample(N, &rtArgs);
+          sampleStructsListObj = HandleDsSample(N, &rtArgs, outputFormat);
      }
      FreeMFEStructRuntimeArgs(&rtArgs);
      FreeGTFoldMFEStructureData(rtArgs.numBases);
      return sampleStructsListObj;
 }
 
-PyObject * SampleBoltzmannStructuresSHAPE(const char *baseSeq, SHAPEConstraint_t *scList, 
-		                                int scLength, int N) {
+PyObject * SampleBoltzmannStructures(const char *baseSeq, ConsListCType_t consList, 
+		                           int consLength, int N, long long seed, 
+					   int shardIndex, int shardCount) {
+     PyThreadState *pyThreadState = BeginGTFoldEngineCompute();
+     PyObject *pyObjReturn = SampleBoltzmannStructuresLocked(baseSeq, consList, consLength, N, seed, 
+		                                             shardIndex, shardCount);
+     g_sample_index_offset = 0;
+     EndGTFoldEngineCompute(pyThreadState);
+     return pyObjReturn;
+}
+
+static PyObject * SampleBoltzmannStructuresSHAPELocked(const char *baseSeq, SHAPEConstraint_t *scList, 
+		                                       int scLength, int N, long long seed, 
+						       int shardIndex, int shardCount) {
      if(baseSeq == NULL || scLength < 0 || N <= 0) {
           SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
 	     return ReturnPythonNone();
      }
+     g_sample_seed = seed;
+     if((N = ConfigureSampleShard(N, shardIndex, shardCount)) <= 0) {
+	     return ReturnPythonNone();
+     }
+     int outputFormat = shardCount > 0 ? SAMPLE_OUTPUT_SUMMARY : SAMPLE_OUTPUT_LIST;
      //CALC_PART_FUNC = 0;
      PF_COUNT_MODE = 1;
      CALC_PF_DO = g_dangles == 0;
@@ -1302,16 +1973,278 @@ PyObject * SampleBoltzmannStructuresSHAPE(const char *baseSeq, SHAPEConstraint_t
      PyObject *sampleStructsListObj = NULL;
      if(CALC_PF_D2) {
           ST_D2_ENABLE_SCATTER_PLOT = 1;
-          sampleStructsListObj = HandleD2Sample(PF_ST_D2_ADVANCED_DOUBLE_SPECIFIER, N, &rtArgs);
+          sampleStructsListObj = HandleD2Sample(PF_ST_D2_ADVANCED_DOUBLE_SPECIFIER, N, &rtArgs, outputFormat);
      }
      else {
-          sampleStructsListObj = HandleDsSample(N, &rtArgs);
+          sampleStructsListObj = HandleDsSample(N, &rtArgs, outputFormat);
      }
      FreeMFEStructRuntimeArgs(&rtArgs);
      FreeGTFoldMFEStructureData(rtArgs.numBases);
      return sampleStructsListObj;
 }
 
+PyObject * SampleBoltzmannStructuresSHAPE(const char *baseSeq, SHAPEConstraint_t *scList, 
+		                                int scLength, int N, long long seed, 
+						int shardIndex, int shardCount) {
+     PyThreadState *pyThreadState = BeginGTFoldEngineCompute();
+     PyObject *pyObjReturn = SampleBoltzmannStructuresSHAPELocked(baseSeq, scList, scLength, N, seed, 
+		                                                  shardIndex, shardCount);
+     g_sample_index_offset = 0;
+     EndGTFoldEngineCompute(pyThreadState);
+     return pyObjReturn;
+}
+
+/* Each of the MFE and the -d2 partition function arrays is filled once, and the 
+ * stages share them: the MFE (which also sets the scale factor of the partition 
+ * function) and subopt stages use the MFE fill, and the PF, BPP and sampling 
+ * stages use the partition function fill (::seealso HandleD2Analysis): 
+ */
+static PyObject * AnalyzeLocked(const char *baseSeq, ConsListCType_t consList, int consLength, 
+		                int wantFlags, int N, double delta, int bppMatrixFormat, long long seed) {
+     if(baseSeq == NULL || consLength < 0 || wantFlags == 0 || 
+        ((wantFlags & ANALYZE_WANT_SAMPLES) && N <= 0)) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+	     return ReturnPythonNone();
+     }
+     else if(g_dangles != 2) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_DANGLE, "Analyze requires the -d2 dangle model");
+	     return ReturnPythonNone();
+     }
+     PF_COUNT_MODE = 0;
+     CALC_PF_DO = CALC_PF_DS = 0;
+     CALC_PF_D2 = 1;
+     RND_SAMPLE = (wantFlags & ANALYZE_WANT_SAMPLES) != 0;
+     num_rnd = N;
+     // The same settings as SampleBoltzmannStructures (batch_sample only counts 
+     // the sampled structures with ST_D2_ENABLE_SCATTER_PLOT set):
+     ST_D2_ENABLE_BPP_PROBABILITY = 1;
+     ST_D2_ENABLE_SCATTER_PLOT = 1;
+     g_sample_seed = seed;
+     int baseSeqLength = strlen(baseSeq);
+     if(wantFlags & ANALYZE_WANT_SUBOPT) {
+          SUBOPT_ENABLED = 1;
+          suboptDelta = delta;
+          ConfigureSuboptDefaults(baseSeqLength);
+     }
+     MFEStructRuntimeArgs_t rtArgs;
+     InitMFEStructRuntimeArgs(&rtArgs);
+     rtArgs.baseSeq = baseSeq;
+     SetRTArgsSequenceLength(rtArgs, baseSeqLength);
+     if(ParseGetMFEStructureArgs(consList, consLength, &rtArgs) != GTFPYTHON_ERRNO_OK) {
+          FreeMFEStructRuntimeArgs(&rtArgs);
+	     return ReturnPythonNone();
+     }
+     double mfe = 0.0;
+     if(!ConfigureBoltzmannRuntimeParametersWithMFE(&rtArgs, &mfe)) {
+          FreeMFEStructRuntimeArgs(&rtArgs);
+	     FreeGTFoldMFEStructureData(rtArgs.numBases);
+	     return ReturnPythonNone();
+     }
+     PyObject *mfeTupleObj = NULL, *suboptListObj = NULL, *pfTupleObj = NULL;
+     bool stagesOK = true;
+     if(wantFlags & ANALYZE_WANT_MFE) {
+          char *dbMFEStruct = ComputeDOTStructureResult(rtArgs.numBases);
+          mfeTupleObj = PrepareMFETupleResult(mfe, dbMFEStruct);
+          Free(dbMFEStruct);
+          stagesOK = mfeTupleObj != NULL;
+     }
+     if(stagesOK && (wantFlags & ANALYZE_WANT_SUBOPT)) {
+          suboptListObj = TracebackSuboptStructures(baseSeq, baseSeqLength, (int) round(100.0 * mfe), 1);
+          stagesOK = suboptListObj != NULL;
+     }
+     if(stagesOK && (wantFlags & (ANALYZE_WANT_PF | ANALYZE_WANT_BPP | ANALYZE_WANT_SAMPLES))) {
+          pfTupleObj = HandleD2Analysis(&rtArgs, wantFlags, N, bppMatrixFormat);
+          stagesOK = pfTupleObj != NULL && pfTupleObj != Py_None;
+     }
+     FreeMFEStructRuntimeArgs(&rtArgs);
+     FreeGTFoldMFEStructureData(rtArgs.numBases);
+     PyGILState_STATE pgState = PyGILState_Ensure();
+     PyObject *resultTuple = NULL;
+     if(stagesOK) {
+          resultTuple = Py_BuildValue("(NNN)", 
+                                      mfeTupleObj == NULL ? Py_BuildValue("") : mfeTupleObj, 
+                                      suboptListObj == NULL ? Py_BuildValue("") : suboptListObj, 
+                                      pfTupleObj == NULL ? Py_BuildValue("(OOO)", Py_None, Py_None, Py_None) : 
+                                                           pfTupleObj);
+     }
+     else {
+          Py_XDECREF(mfeTupleObj);
+          Py_XDECREF(suboptListObj);
+          Py_XDECREF(pfTupleObj);
+     }
+     PyGILState_Release(pgState);
+     if(resultTuple == NULL) {
+          if(GetLastErrorCode() == GTFPYTHON_ERRNO_OK) {
+               SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+          }
+          return ReturnPythonNone();
+     }
+     return resultTuple;
+}
+
+PyObject * Analyze(const char *baseSeq, ConsListCType_t consList, int consLength, 
+		   int wantFlags, int N, double delta, int bppMatrixFormat, long long seed) {
+     PyThreadState *pyThreadState = BeginGTFoldEngineCompute();
+     PyObject *pyObjReturn = AnalyzeLocked(baseSeq, consList, consLength, wantFlags, 
+		                           N, delta, bppMatrixFormat, seed);
+     EndGTFoldEngineCompute(pyThreadState);
+     return pyObjReturn;
+}
+
+static void BoltzmannSamplerCapsuleDestructor(PyObject *samplerCapsule) {
+     BoltzmannSampler_t *sampler = (BoltzmannSampler_t *) 
+	                              PyCapsule_GetPointer(samplerCapsule, BOLTZMANN_SAMPLER_CAPSULE_NAME);
+     FreeBoltzmannSampler(sampler);
+}
+
+static BoltzmannSampler_t * BoltzmannSamplerFromCapsule(PyObject *samplerCapsule) {
+     BoltzmannSampler_t *sampler = NULL;
+     PyGILState_STATE pgState = PyGILState_Ensure();
+     if(samplerCapsule != NULL && PyCapsule_IsValid(samplerCapsule, BOLTZMANN_SAMPLER_CAPSULE_NAME)) {
+          sampler = (BoltzmannSampler_t *) PyCapsule_GetPointer(samplerCapsule, BOLTZMANN_SAMPLER_CAPSULE_NAME);
+     }
+     PyGILState_Release(pgState);
+     if(sampler == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_PYARGS, NULL);
+     }
+     return sampler;
+}
+
+static PyObject * BoltzmannSamplerNewLocked(const char *baseSeq, ConsListCType_t consList, int consLength) {
+     if(baseSeq == NULL || consLength < 0) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+	     return ReturnPythonNone();
+     }
+     // The same settings as SampleBoltzmannStructures: 
+     PF_COUNT_MODE = 1;
+     CALC_PF_DO = g_dangles == 0;
+     CALC_PF_D2 = g_dangles == 2;
+     CALC_PF_DS = g_dangles != 0 && g_dangles != 2;
+     RND_SAMPLE = 1;
+     ST_D2_ENABLE_BPP_PROBABILITY = 1;
+     ST_D2_ENABLE_SCATTER_PLOT = 1;
+     MFEStructRuntimeArgs_t rtArgs;
+     InitMFEStructRuntimeArgs(&rtArgs);
+     rtArgs.baseSeq = baseSeq;
+     SetRTArgsSequenceLength(rtArgs, strlen(baseSeq));
+     if(ParseGetMFEStructureArgs(consList, consLength, &rtArgs) != GTFPYTHON_ERRNO_OK) {
+          FreeMFEStructRuntimeArgs(&rtArgs);
+	     return ReturnPythonNone();
+     }
+     BoltzmannSampler_t *sampler = AllocBoltzmannSampler(&rtArgs);
+     FreeMFEStructRuntimeArgs(&rtArgs);
+     if(sampler == NULL) {
+	     return ReturnPythonNone();
+     }
+     PyGILState_STATE pgState = PyGILState_Ensure();
+     PyObject *samplerCapsule = PyCapsule_New(sampler, BOLTZMANN_SAMPLER_CAPSULE_NAME, 
+		                              BoltzmannSamplerCapsuleDestructor);
+     PyGILState_Release(pgState);
+     if(samplerCapsule == NULL) {
+          FreeBoltzmannSampler(sampler);
+	     SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+	     return ReturnPythonNone();
+     }
+     return samplerCapsule;
+}
+
+PyObject * BoltzmannSamplerNew(const char *baseSeq, ConsListCType_t consList, int consLength) {
+     PyThreadState *pyThreadState = BeginGTFoldEngineCompute();
+     PyObject *pyObjReturn = BoltzmannSamplerNewLocked(baseSeq, consList, consLength);
+     EndGTFoldEngineCompute(pyThreadState);
+     return pyObjReturn;
+}
+
+PyObject * BoltzmannSamplerSample(PyObject *samplerCapsule, int N, long long seed) {
+     BoltzmannSampler_t *sampler = BoltzmannSamplerFromCapsule(samplerCapsule);
+     if(sampler == NULL) {
+          return ReturnPythonNone();
+     }
+     PyThreadState *pyThreadState = BeginGTFoldEngineCompute();
+     g_sample_seed = seed;
+     PyObject *pyObjReturn = SampleFromBoltzmannSampler(sampler, N);
+     EndGTFoldEngineCompute(pyThreadState);
+     return pyObjReturn;
+}
+
+PyObject * BoltzmannSamplerSampleBatch(PyObject *samplerCapsule, int N, long long seed, long long firstIndex) {
+     BoltzmannSampler_t *sampler = BoltzmannSamplerFromCapsule(samplerCapsule);
+     if(sampler == NULL) {
+          return ReturnPythonNone();
+     }
+     PyThreadState *pyThreadState = BeginGTFoldEngineCompute();
+     g_sample_seed = seed;
+     PyObject *pyObjReturn = SampleBatchFromBoltzmannSampler(sampler, N, firstIndex);
+     EndGTFoldEngineCompute(pyThreadState);
+     return pyObjReturn;
+}
+
+PyObject * BoltzmannSamplerClose(PyObject *samplerCapsule) {
+     BoltzmannSampler_t *sampler = BoltzmannSamplerFromCapsule(samplerCapsule);
+     if(sampler != NULL) {
+          // Waits for a sampling call on another thread to return first: 
+          PyThreadState *pyThreadState = BeginGTFoldEngineCompute();
+          CloseBoltzmannSampler(sampler);
+          EndGTFoldEngineCompute(pyThreadState);
+     }
+     return ReturnPythonNone();
+}
+
+static void GTFoldContextCapsuleDestructor(PyObject *ctxCapsule) {
+     GTFoldContext_t *gtfCtx = (GTFoldContext_t *) 
+	                          PyCapsule_GetPointer(ctxCapsule, GTFOLD_CONTEXT_CAPSULE_NAME);
+     FreeGTFoldContext(gtfCtx);
+}
+
+PyObject * GTFoldContextNew(void) {
+     GTFoldContext_t *gtfCtx = AllocGTFoldContext();
+     if(gtfCtx == NULL) {
+          return ReturnPythonNone();
+     }
+     PyGILState_STATE pgState = PyGILState_Ensure();
+     PyObject *ctxCapsule = PyCapsule_New(gtfCtx, GTFOLD_CONTEXT_CAPSULE_NAME, 
+		                          GTFoldContextCapsuleDestructor);
+     PyGILState_Release(pgState);
+     if(ctxCapsule == NULL) {
+          FreeGTFoldContext(gtfCtx);
+	     SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+	     return ReturnPythonNone();
+     }
+     return ctxCapsule;
+}
+
+PyObject * GTFoldContextEnter(PyObject *ctxCapsule) {
+     GTFoldContext_t *gtfCtx = GTFoldContextFromCapsule(ctxCapsule);
+     if(gtfCtx != NULL) {
+          ActivateGTFoldContext(gtfCtx);
+     }
+     return ReturnPythonNone();
+}
+
+PyObject * GTFoldContextExit(PyObject *ctxCapsule) {
+     GTFoldContext_t *gtfCtx = GTFoldContextFromCapsule(ctxCapsule);
+     if(gtfCtx == NULL || DeactivateGTFoldContext(gtfCtx) != GTFPYTHON_ERRNO_OK) {
+          return ReturnPythonNone();
+     }
+     // The restored (outer) error state belongs to the caller, so do not re-raise it here:
+     PyGILState_STATE pgState = PyGILState_Ensure();
+     Py_INCREF(Py_None);
+     PyGILState_Release(pgState);
+     return Py_None;
+}
+
+PyObject * GTFoldContextGetLastError(PyObject *ctxCapsule) {
+     GTFoldContext_t *gtfCtx = GTFoldContextFromCapsule(ctxCapsule);
+     if(gtfCtx == NULL) {
+          return ReturnPythonNone();
+     }
+     const ErrorCode_t *lastError = gtfCtx->isActive ? &ErrorCodeErrno : &(gtfCtx->settings.lastError);
+     PyGILState_STATE pgState = PyGILState_Ensure();
+     PyObject *errorTuple = Py_BuildValue("(is)", lastError->errorCode, lastError->errorMsg);
+     PyGILState_Release(pgState);
+     return errorTuple;
+}
+
 const PyMethodDef GTFoldPython_Methods[] = {
      { 
 	     "GTFoldPythonInit",   
@@ -1374,7 +2307,8 @@ const PyMethodDef GTFoldPython_Methods[] = {
              "         advancedouble    : 1,\n"
              "         bignumprecision  : 512,\n"
              "         uniquemultiloop  : True,\n"
-             "         duplicatecheck   : True\n"
+             "         duplicatecheck   : True,\n"
+             "         maxcount         : 1000\n"
              "};\n"
              ">>> GTFP.ConfigExtraSettings(**cfgSettings)\n"
 	     ">>> GTFP.PrintRunConfiguration()\n"
@@ -1427,7 +2361,100 @@ const PyMethodDef GTFoldPython_Methods[] = {
 	     "   Note that there is currently no way to specify a custom energy model data set with\n"
 	     "   data files named anything but the default names given above. (Request this feature as\n"
 	     "   a new issue if this lack of a non-default naming convention bothers you, or otherwise\n"
-	     "   impedes progress on your application using our library!)"
+	     "   impedes progress on your application using our library!)\n"
+	     "How to load a compiled (binary) energy model data set:\n"
+	     "   The dataDir argument may also be the path to a file written by\n"
+	     "   CompileThermodynamicParameters(...). In this case the tables are mapped directly\n"
+	     "   from the file and the energy model stored in the file takes precedence over emodelSpec."
+     },
+     {
+	     "CompileThermodynamicParameters", 
+	     CompileThermodynamicParameters, 
+	     METH_COEXIST, 
+	     "Description: Parse all of the *.DAT files for an energy model once and save the\n"
+	     "             resulting tables to a single versioned and checksummed binary file\n"
+	     "Python Args: CompileThermodynamicParameters(emodelSpec, outPath, dataDir = None)\n"
+	     "             Pass outPath as the dataDir argument to SetThermodynamicParameters\n"
+	     "             to load the compiled tables with mmap instead of parsing the text files.\n"
+	     "             The compiled file is only valid on machines with the same byte order\n"
+	     "             and build of this library. The energy model tables in use are not\n"
+	     "             changed by compiling another model\n"
+	     "See Also:    SetThermodynamicParameters(emodelSpec, dataDir = None)"
+     },
+     {
+	     "LockThermodynamicParameters", 
+	     LockThermodynamicParameters, 
+	     METH_NOARGS, 
+	     "Description: Keep the currently loaded energy model tables resident and skip all\n"
+	     "             further checks of the *.DAT files until they are unlocked\n"
+	     "Python Args: LockThermodynamicParameters()\n"
+	     "             Changes made with SetThermodynamicParameters(...) do not take effect\n"
+	     "             while the parameters are locked\n"
+	     "See Also:    UnlockThermodynamicParameters(), ReloadThermodynamicParameters()"
+     },
+     {
+	     "UnlockThermodynamicParameters", 
+	     UnlockThermodynamicParameters, 
+	     METH_NOARGS, 
+	     "Description: Resume checking the energy model settings and *.DAT file timestamps\n"
+	     "             before each computation (parameter sets are still cached when unchanged)\n"
+	     "Python Args: UnlockThermodynamicParameters()\n"
+	     "See Also:    LockThermodynamicParameters(), ReloadThermodynamicParameters()"
+     },
+     {
+	     "ReloadThermodynamicParameters", 
+	     ReloadThermodynamicParameters, 
+	     METH_NOARGS, 
+	     "Description: Discard all cached energy model tables and re-read the *.DAT files\n"
+	     "             for the active energy model\n"
+	     "Python Args: ReloadThermodynamicParameters()\n"
+	     "See Also:    LockThermodynamicParameters(), UnlockThermodynamicParameters()"
+     },
+     {
+	     "PublishSharedThermodynamicParameters", 
+	     PublishSharedThermodynamicParameters, 
+	     METH_COEXIST, 
+	     "Description: Copy the active energy model tables into a named POSIX shared memory\n"
+	     "             segment and use that single read-only copy from this process\n"
+	     "Python Args: PublishSharedThermodynamicParameters(shmName)\n"
+	     "             Worker processes call AttachSharedThermodynamicParameters(shmName)\n"
+	     "             to map the same physical pages instead of loading their own copy.\n"
+	     "             Publishing again under the same name replaces the segment: the\n"
+	     "             processes attached to the old one keep its tables until they reattach\n"
+	     "See Also:    AttachSharedThermodynamicParameters(shmName), \n"
+	     "             DetachSharedThermodynamicParameters(unlink = False)"
+     },
+     {
+	     "AttachSharedThermodynamicParameters", 
+	     AttachSharedThermodynamicParameters, 
+	     METH_COEXIST, 
+	     "Description: Map the energy model tables published under shmName read-only and\n"
+	     "             use them in place of the *.DAT files until detached\n"
+	     "             (SetThermodynamicParameters(...) also detaches this process)\n"
+	     "Python Args: AttachSharedThermodynamicParameters(shmName)\n"
+	     "See Also:    PublishSharedThermodynamicParameters(shmName), \n"
+	     "             DetachSharedThermodynamicParameters(unlink = False)"
+     },
+     {
+	     "DetachSharedThermodynamicParameters", 
+	     DetachSharedThermodynamicParameters, 
+	     METH_COEXIST, 
+	     "Description: Unmap the shared energy model tables (the next computation reloads\n"
+	     "             the active energy model), optionally removing the shared segment\n"
+	     "Python Args: DetachSharedThermodynamicParameters(unlink = False)\n"
+	     "See Also:    PublishSharedThermodynamicParameters(shmName), \n"
+	     "             AttachSharedThermodynamicParameters(shmName)"
+     },
+     {
+	     "GetThermodynamicParametersDigest", 
+	     GetThermodynamicParametersDigest, 
+	     METH_NOARGS, 
+	     "Description: Hash of the energy model tables in use (loading the active energy\n"
+	     "             model first if necessary). Results computed with the same digest\n"
+	     "             used the same energy parameters. The hash is only computed again\n"
+	     "             after the tables have changed (e.g., the *.DAT files were edited)\n"
+	     "Python Args: GetThermodynamicParametersDigest()\n"
+	     "Return Value: A hex string"
      },
      { 
 	     "SetDangleParameter",     
@@ -1509,6 +2536,52 @@ const PyMethodDef GTFoldPython_Methods[] = {
 	     "Return Value: A list of tuples of the form (i, j, probability)\n"
 	     "See Also:     Help topic \"constraints\" and \"settings\"" 
      },
+     { 
+	     "ComputeBPPMatrix", 
+	     ComputeBPPMatrix, 
+	     METH_COEXIST, 
+	     "Description:  Calculate the base pair probabilities as a raw matrix of doubles (or\n"
+	     "              floats) without creating a Python object per entry\n"
+	     "Python Args:  ComputeBPP(baseSeq, consList = [], format = \"numpy\" | \"packed\",\n"
+	     "                         dtype = \"float64\")\n"
+	     "Return Value: A bytearray holding the symmetric n x n matrix (row major), or\n"
+	     "              the n(n-1)/2 upper triangular entries (i < j, row by row)\n"
+	     "See Also:     ComputeBPP(baseSeq, consList = [])"
+     },
+     { 
+	     "ComputeBPPMatrixSHAPE", 
+	     ComputeBPPMatrixSHAPE, 
+	     METH_COEXIST, 
+	     "Description:  Calculate the base pair probabilities as a raw matrix --\n"
+	     "              with SHAPE constraints\n"
+	     "Python Args:  ComputeBPPSHAPE(baseSeq, consList = [], format = \"numpy\" | \"packed\",\n"
+	     "                              dtype = \"float64\")\n"
+	     "Return Value: A bytearray (see ComputeBPPMatrix)\n"
+	     "See Also:     Help topic \"constraints\" and \"settings\"" 
+     },
+     { 
+	     "ComputeBPPSparse", 
+	     ComputeBPPSparse, 
+	     METH_COEXIST, 
+	     "Description:  Calculate the base pair probabilities, keeping only the pairs with\n"
+	     "              probability >= cutoff (and among the topKPerBase most likely pairs\n"
+	     "              of either base), together with the unpaired probability of each base\n"
+	     "Python Args:  ComputeBPPSparse(baseSeq, consList = [], cutoff = 1e-4,\n"
+	     "                               topKPerBase = None, format = \"coo\" | \"scipy\")\n"
+	     "Return Value: A tuple of bytearrays (i indices, j indices, probabilities,\n"
+	     "              unpaired probabilities) with 0-based int32 indices i < j\n"
+	     "See Also:     ComputeBPP(baseSeq, consList = [])"
+     },
+     { 
+	     "ComputeBPPSparseSHAPE", 
+	     ComputeBPPSparseSHAPE, 
+	     METH_COEXIST, 
+	     "Description:  Sparse base pair probabilities -- with SHAPE constraints\n"
+	     "Python Args:  ComputeBPPSparseSHAPE(baseSeq, consList = [], cutoff = 1e-4,\n"
+	     "                                    topKPerBase = None, format = \"coo\" | \"scipy\")\n"
+	     "Return Value: A tuple of bytearrays (see ComputeBPPSparse)\n"
+	     "See Also:     Help topic \"constraints\" and \"settings\"" 
+     },
      { 
 	     "GetMFEStructure", 
 	     GetMFEStructure,    
@@ -1527,21 +2600,70 @@ const PyMethodDef GTFoldPython_Methods[] = {
 	     "Return Value: A tuple (mfe, mfeStruct) where the MFE structure is string in DOT notation\n"
 	     "See Also:     Help topic \"constraints\""
      }, 
+     { 
+	     "GetMFEStructureBatch", 
+	     GetMFEStructureBatch, 
+	     METH_COEXIST, 
+	     "Description:  Get the MFE and the MFE DotBracket structure of every sequence in a list\n"
+	     "              with a single call into the library. The sequences are folded one after\n"
+	     "              the other: the batch only saves the per-call overhead\n"
+	     "Python Args:  GetMFEStructureBatch(baseSeqs, consLists = None, threadsPerFold = 0)\n"
+	     "Return Value: A tuple (mfeArray, mfeStructList) with one entry per input sequence\n"
+	     "See Also:     GetMFEStructure"
+     }, 
      { 
 	     "GetSuboptStructures", 
 	     GetSuboptStructuresWithinRange, 
 	     METH_COEXIST, 
-	     "Description: Compute suboptimal structures within DOUBLE kcal/mole of MFE\n"
-	     "Python Args: GetSuboptStructures(baseSeq, delta)\n"
+	     "Description: Compute suboptimal structures within DOUBLE kcal/mole of MFE (with the\n"
+	     "             traceback split over numThreads threads when it is not one, where zero\n"
+	     "             means the \"numthreads\" setting)\n"
+	     "Python Args: GetSuboptStructures(baseSeq, delta, numThreads = 1)\n"
 	     "See Also:    Help topic \"settings\"" 
      }, 
+     { 
+	     "IterSuboptStructures", 
+	     GetSuboptStructuresStream, 
+	     METH_COEXIST, 
+	     "Description:  Generate the suboptimal structures within DOUBLE kcal/mole of MFE one at a\n"
+	     "              time as the traceback finds them (without collecting them in memory)\n"
+	     "Python Args:  IterSuboptStructures(baseSeq, delta, maxCount = None)\n"
+	     "Return Value: A generator of (dotStruct, energy) tuples, which stops the traceback\n"
+	     "              when it is closed (e.g., by a break out of the loop over it)\n"
+	     "See Also:     GetSuboptStructures, and the \"maxcount\" setting in help topic \"settings\""
+     }, 
+     { 
+	     "GetKBestStructures", 
+	     GetKBestStructures, 
+	     METH_COEXIST, 
+	     "Description:  Compute the k lowest energy structures (instead of the structures within\n"
+	     "              an energy range of the MFE)\n"
+	     "Python Args:  GetKBestStructures(baseSeq, k)\n"
+	     "Return Value: A list of k tuples of the form (dotStruct, energy) in the order of\n"
+	     "              increasing energy (fewer if the sequence has fewer structures)\n"
+	     "See Also:     GetSuboptStructures"
+     }, 
+     { 
+	     "GetEnergyBandHistogram", 
+	     GetEnergyBandHistogram, 
+	     METH_COEXIST, 
+	     "Description:  Count the suboptimal structures within DOUBLE kcal/mole of MFE in bands of\n"
+	     "              binWidth kcal/mole above the MFE (without enumerating the structures)\n"
+	     "Python Args:  GetEnergyBandHistogram(baseSeq, delta, binWidth = 0.1)\n"
+	     "Return Value: A list of (exact) counts, where entry k counts the structures with the\n"
+	     "              energies in [MFE + k * binWidth, MFE + (k + 1) * binWidth)\n"
+	     "See Also:     GetSuboptStructures"
+     }, 
      { 
 	     "SampleBoltzmannStructures", 
 	     SampleBoltzmannStructures, 
 	     METH_COEXIST, 
-	     "Description:  Sample N structures from the Boltzmann distribution\n"
-	     "Python Args:  SampleBoltzmannStructures(baseSeq, N, consList = [])\n"
-	     "Return Value: A list of tuples of the form (estProb, actualProb, energy, dotStruct)\n"
+	     "Description:  Sample N structures from the Boltzmann distribution (the same samples for\n"
+	     "              the same integer seed, independently of the thread count)\n"
+	     "Python Args:  SampleBoltzmannStructures(baseSeq, N, consList = [], seed = None, shard = None)\n"
+	     "Return Value: A list of tuples of the form (estProb, actualProb, energy, dotStruct), or\n"
+	     "              with shard = (k, K), the mergeable summary of the k-th of K shards of the\n"
+	     "              N samples (::seealso MergeSampleSummaries)\n"
 	     "See Also:     Help topics \"constraints\" and \"settings\""
      }, 
      { 
@@ -1549,10 +2671,98 @@ const PyMethodDef GTFoldPython_Methods[] = {
 	     SampleBoltzmannStructuresSHAPE, 
 	     METH_COEXIST, 
 	     "Description:  Sample N structures from the Boltzmann distributions -- with SHAPE constraints\n"
-             "Python Args:  SampleBoltzmannStructuresSHAPE(baseSeq, N, consList = [])\n"
+             "Python Args:  SampleBoltzmannStructuresSHAPE(baseSeq, N, consList = [], seed = None, shard = None)\n"
              "Return Value: A list of tuples of the form (estProb, actualProb, energy, dotStruct)\n"
              "See Also:     Help topics \"constraints\" and \"settings\"" 
      }, 
+     { 
+	     "Analyze", 
+	     Analyze, 
+	     METH_COEXIST, 
+	     "Description:  Compute any of the MFE structure, the suboptimal structures, the partition\n"
+	     "              function, the base pair probabilities and N Boltzmann samples with one\n"
+	     "              MFE fill and one -d2 partition function fill shared between them\n"
+	     "Python Args:  Analyze(baseSeq, want = (\"mfe\", \"pf\", \"bpp\"), consList = [],\n"
+	     "                      bppFormat = \"packed\", dtype = \"float64\", seed = None)\n"
+	     "Return Value: A dict with one entry per stage in want (the pf stage adds the\n"
+	     "              \"ensemble_energy\" entry), in the format of the individual functions\n"
+	     "See Also:     GetMFEStructure, GetSuboptStructures, ComputeBPP, SampleBoltzmannStructures"
+     }, 
+     { 
+	     "BoltzmannSamplerNew", 
+	     BoltzmannSamplerNew, 
+	     METH_COEXIST, 
+	     "Description:  Compute the -d2 partition function of baseSeq once, and keep it (with the\n"
+	     "              current settings) to sample structures from with repeated calls\n"
+	     "Python Args:  GTFoldBoltzmannSampler(baseSeq, consList = [])\n"
+	     "Return Value: The sampler handle\n"
+	     "See Also:     BoltzmannSamplerSample(sampler, N), BoltzmannSamplerClose(sampler)"
+     }, 
+     { 
+	     "BoltzmannSamplerSample", 
+	     BoltzmannSamplerSample, 
+	     METH_COEXIST, 
+	     "Description:  Sample N structures from the Boltzmann distribution of the sampler\n"
+	     "Python Args:  sampler.sample(N, seed = None)\n"
+	     "Return Value: A list of tuples of the form (estProb, actualProb, energy, dotStruct)\n"
+	     "See Also:     SampleBoltzmannStructures"
+     }, 
+     { 
+	     "BoltzmannSamplerSampleBatch", 
+	     BoltzmannSamplerSampleBatch, 
+	     METH_COEXIST, 
+	     "Description:  Sample the structures firstIndex+1, ..., firstIndex+N of the seed one by one\n"
+	     "              (without collecting the unique structures) as pair tables\n"
+	     "Python Args:  sampler.IterSamples(N, batch = 1024, seed = None), or\n"
+	     "              IterBoltzmannSamples(baseSeq, N, batch = 1024, consList = [], seed = None)\n"
+	     "Return Value: The tuple (pairTables, energies) of bytes objects (int and double arrays)\n"
+	     "See Also:     BoltzmannSamplerSample"
+     }, 
+     { 
+	     "BoltzmannSamplerClose", 
+	     BoltzmannSamplerClose, 
+	     METH_O, 
+	     "Description:  Free the partition function arrays of the sampler\n"
+	     "Python Args:  sampler.close() (or leaving a with sampler: block)\n"
+	     "See Also:     BoltzmannSamplerNew"
+     }, 
+     {
+	     "GTFoldContextNew", 
+	     GTFoldContextNew, 
+	     METH_NOARGS, 
+	     "Description: Create a folding context with its own copy of the current settings\n"
+	     "             (energy model, dangle, mismatch, extra settings, ...) and error state\n"
+	     "Python Args: GTFoldContext(energyModelName = None, baseDataDir = None, dangle = None, ...)\n"
+	     "             Contexts only isolate the settings of each call: the engine is switched over\n"
+	     "             to a context for the length of one call, and the folds are still serialized\n"
+	     "See Also:    GTFoldContextEnter(ctx), GTFoldContextExit(ctx)"
+     },
+     {
+	     "GTFoldContextEnter", 
+	     GTFoldContextEnter, 
+	     METH_O, 
+	     "Description: Wait for the GTFold engine and switch it over to the settings of ctx\n"
+	     "             (the engine is held until the matching GTFoldContextExit)\n"
+	     "Python Args: Called around each library call made while a GTFoldContext is active\n"
+	     "See Also:    GTFoldContextExit(ctx)"
+     },
+     {
+	     "GTFoldContextExit", 
+	     GTFoldContextExit, 
+	     METH_O, 
+	     "Description: Save the (possibly modified) settings and last error back into ctx,\n"
+	     "             restore the previous engine settings and release the engine\n"
+	     "Python Args: Called around each library call made while a GTFoldContext is active\n"
+	     "See Also:    GTFoldContextEnter(ctx)"
+     },
+     {
+	     "GTFoldContextGetLastError", 
+	     GTFoldContextGetLastError, 
+	     METH_O, 
+	     "Description: Get the last error raised while ctx was active\n"
+	     "Python Args: ctx.GetLastError()\n"
+	     "Return Value: A tuple of the form (errorCode, errorMsg)"
+     },
      {
 	     "DisplayDetailedHelp", 
 	     DisplayDetailedHelp, 
@@ -1733,6 +2943,15 @@ void ModuleInterfaceDeps(void) {
      GTFoldPythonConfig(0, 0, 0, NULL);
      PrintGTFoldRunConfiguration(true);
      SetGTFoldDataDirectory(NULL, 0);
+     SetThermodynamicParameters(NULL, NULL);
+     CompileThermodynamicParameters(NULL, NULL, NULL);
+     LockThermodynamicParameters();
+     UnlockThermodynamicParameters();
+     ReloadThermodynamicParameters();
+     PublishSharedThermodynamicParameters(NULL);
+     AttachSharedThermodynamicParameters(NULL);
+     DetachSharedThermodynamicParameters(0);
+     GetThermodynamicParametersDigest();
      SetDangleParameter(-1);
      SetTerminalMismatch(0);
      SetLimitContactDistance(-1);
@@ -1741,11 +2960,28 @@ void ModuleInterfaceDeps(void) {
      GetPFuncCountSHAPE(NULL, nullSHAPEConsList, 0);
      ComputeBPP(NULL, nullConsList, 0);
      ComputeBPPSHAPE(NULL, nullSHAPEConsList, 0);
+     ComputeBPPMatrix(NULL, nullConsList, 0, 0);
+     ComputeBPPMatrixSHAPE(NULL, nullSHAPEConsList, 0, 0);
+     ComputeBPPSparse(NULL, nullConsList, 0, 0.0, 0);
+     ComputeBPPSparseSHAPE(NULL, nullSHAPEConsList, 0, 0.0, 0);
      GetMFEStructure(NULL, nullConsList, 0);
      GetMFEStructureSHAPE(NULL, nullSHAPEConsList, 0);
-     GetSuboptStructuresWithinRange(NULL, 0.0);
-     SampleBoltzmannStructures(NULL, nullConsList, 0, 0);
-     SampleBoltzmannStructuresSHAPE(NULL, nullSHAPEConsList, 0, 0);
+     GetMFEStructureBatch(NULL, NULL, 0);
+     GetSuboptStructuresWithinRange(NULL, 0.0, 0);
+     GetSuboptStructuresStream(NULL, 0.0, 0, NULL);
+     GetKBestStructures(NULL, 0);
+     GetEnergyBandHistogram(NULL, 0.0, 0.0);
+     SampleBoltzmannStructures(NULL, nullConsList, 0, 0, 0, 0, 0);
+     SampleBoltzmannStructuresSHAPE(NULL, nullSHAPEConsList, 0, 0, 0, 0, 0);
+     Analyze(NULL, nullConsList, 0, 0, 0, 0.0, 0, 0);
+     BoltzmannSamplerNew(NULL, nullConsList, 0);
+     BoltzmannSamplerSample(NULL, 0, 0);
+     BoltzmannSamplerSampleBatch(NULL, 0, 0, 0);
+     BoltzmannSamplerClose(NULL);
+     GTFoldContextNew();
+     GTFoldContextEnter(NULL);
+     GTFoldContextExit(NULL);
+     GTFoldContextGetLastError(NULL);
      DisplayDetailedHelp();
      DisplayHelp(NULL);
 }
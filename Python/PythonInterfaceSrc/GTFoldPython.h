@@ -23,7 +23,10 @@ typedef ConsListCType_t      __CONSLIST__;
 typedef SHAPEConstraint_t *  __SHAPECONSLIST__;
 typedef int                  __INTLEN__;
 typedef double               __DELTA__;
+typedef double               __DOUBLE__;
 typedef int                  __INTNUM__;
+typedef long long            __SEED__;
+typedef long long            __INDEX__;
 typedef const char *         __FILENO__;
 typedef PyObject *           __PYOBJ__;
 typedef PyObject *           __PYARGS__;
@@ -35,6 +38,14 @@ PyObject * __EXPORT__ GTFoldPythonConfigSettings( __PYOBJ__ );
 PyObject * __EXPORT__ PrintGTFoldRunConfiguration( __INT__);
 PyObject * __EXPORT__ SetGTFoldDataDirectory( __CSTR__, __INTLEN__ );
 PyObject * __EXPORT__ SetThermodynamicParameters( __CSTR__, __CSTR__ );
+PyObject * __EXPORT__ CompileThermodynamicParameters( __CSTR__, __CSTR__, __FILENO__ );
+PyObject * __EXPORT__ LockThermodynamicParameters( __VOID__ );
+PyObject * __EXPORT__ UnlockThermodynamicParameters( __VOID__ );
+PyObject * __EXPORT__ ReloadThermodynamicParameters( __VOID__ );
+PyObject * __EXPORT__ PublishSharedThermodynamicParameters( __CSTR__ );
+PyObject * __EXPORT__ AttachSharedThermodynamicParameters( __CSTR__ );
+PyObject * __EXPORT__ DetachSharedThermodynamicParameters( __INT__ );
+PyObject * __EXPORT__ GetThermodynamicParametersDigest( __VOID__ );
 PyObject * __EXPORT__ SetDangleParameter( __INT__ );
 PyObject * __EXPORT__ SetTerminalMismatch( __INT__ );
 PyObject * __EXPORT__ SetLimitContactDistance( __INT__ );
@@ -43,12 +54,32 @@ PyObject * __EXPORT__ GetPFuncCount( __BASESEQ__, __CONSLIST__, __INTLEN__ );
 PyObject * __EXPORT__ GetPFuncCountSHAPE( __BASESEQ__, __SHAPECONSLIST__, __INTLEN__ );
 PyObject * __EXPORT__ ComputeBPP( __BASESEQ__, __CONSLIST__, __INTLEN__ );
 PyObject * __EXPORT__ ComputeBPPSHAPE( __BASESEQ__, __SHAPECONSLIST__, __INTLEN__ );
+PyObject * __EXPORT__ ComputeBPPMatrix( __BASESEQ__, __CONSLIST__, __INTLEN__, __INT__ );
+PyObject * __EXPORT__ ComputeBPPMatrixSHAPE( __BASESEQ__, __SHAPECONSLIST__, __INTLEN__, __INT__ );
+PyObject * __EXPORT__ ComputeBPPSparse( __BASESEQ__, __CONSLIST__, __INTLEN__, __DOUBLE__, __INT__ );
+PyObject * __EXPORT__ ComputeBPPSparseSHAPE( __BASESEQ__, __SHAPECONSLIST__, __INTLEN__, 
+		                             __DOUBLE__, __INT__ );
 PyObject * __EXPORT__ GetMFEStructure( __BASESEQ__, __CONSLIST__, __INTLEN__ );
 PyObject * __EXPORT__ GetMFEStructureSHAPE( __BASESEQ__, __SHAPECONSLIST__, __INTLEN__ );
-PyObject * __EXPORT__ GetSuboptStructuresWithinRange( __BASESEQ__, __DELTA__ );
-PyObject * __EXPORT__ SampleBoltzmannStructures( __BASESEQ__, __CONSLIST__, __INTLEN__, __INTNUM__ );
+PyObject * __EXPORT__ GetMFEStructureBatch( __PYOBJ__, __PYOBJ__, __INT__ );
+PyObject * __EXPORT__ GetSuboptStructuresWithinRange( __BASESEQ__, __DELTA__, __INT__ );
+PyObject * __EXPORT__ GetSuboptStructuresStream( __BASESEQ__, __DELTA__, __INTNUM__, __PYOBJ__ );
+PyObject * __EXPORT__ GetKBestStructures( __BASESEQ__, __INTNUM__ );
+PyObject * __EXPORT__ GetEnergyBandHistogram( __BASESEQ__, __DELTA__, __DOUBLE__ );
+PyObject * __EXPORT__ SampleBoltzmannStructures( __BASESEQ__, __CONSLIST__, __INTLEN__, __INTNUM__, __SEED__, 
+		                                 __INT__, __INT__ );
 PyObject * __EXPORT__ SampleBoltzmannStructuresSHAPE( __BASESEQ__, __SHAPECONSLIST__, 
-		                                      __INTLEN__, __INTNUM__ );
+		                                      __INTLEN__, __INTNUM__, __SEED__, __INT__, __INT__ );
+PyObject * __EXPORT__ Analyze( __BASESEQ__, __CONSLIST__, __INTLEN__, __INT__, __INTNUM__, 
+		               __DELTA__, __INT__, __SEED__ );
+PyObject * __EXPORT__ BoltzmannSamplerNew( __BASESEQ__, __CONSLIST__, __INTLEN__ );
+PyObject * __EXPORT__ BoltzmannSamplerSample( __PYOBJ__, __INTNUM__, __SEED__ );
+PyObject * __EXPORT__ BoltzmannSamplerSampleBatch( __PYOBJ__, __INTNUM__, __SEED__, __INDEX__ );
+PyObject * __EXPORT__ BoltzmannSamplerClose( __PYOBJ__ );
+PyObject * __EXPORT__ GTFoldContextNew( __VOID__ );
+PyObject * __EXPORT__ GTFoldContextEnter( __PYOBJ__ );
+PyObject * __EXPORT__ GTFoldContextExit( __PYOBJ__ );
+PyObject * __EXPORT__ GTFoldContextGetLastError( __PYOBJ__ );
 
 extern const PyMethodDef GTFoldPython_Methods[];
 
@@ -5,7 +5,12 @@
 
 #include <sys/types.h>
 #include <sys/stat.h>
+#include <sys/mman.h>
+#include <fcntl.h>
+#include <unistd.h>
+#include <string.h>
 
+#include "include/data.h"
 #include "include/loader.h"
 #include "include/options.h"
 
@@ -170,7 +175,13 @@ int CheckThermodynamicConfig(const ThermoParams_t *tparams, const char *baseSear
      return GTFPYTHON_ERRNO_OK;
 }
 
-int LoadThermodynamicParameters(const ThermoParams_t *tparams, const char *baseSearchDir) {
+// Counts the changes to the energy tables used by the engine, so that the digest of 
+// the tables is only computed again after they have changed: 
+static unsigned long THERMO_PARAMS_GENERATION = 0;
+static unsigned long THERMO_PARAMS_DIGEST_GENERATION = 0;
+static uint64_t THERMO_PARAMS_DIGEST = 0;
+
+static int ReadThermodynamicParameterFiles(const ThermoParams_t *tparams, const char *baseSearchDir) {
      if(tparams == NULL || baseSearchDir == NULL) {
           SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
 	  return GetLastErrorCode();
@@ -196,6 +207,8 @@ int LoadThermodynamicParameters(const ThermoParams_t *tparams, const char *baseS
      strcpy(GTFOLD_DATADIR, EN_DATADIR);
      fprintf(stderr, "GTFOLD-DATA-DIR: %s\n", GTFOLD_DATADIR);
 
+     resetEnergyTablePointers();
+     THERMO_PARAMS_GENERATION++;
      initMiscloopValues(tparams->miscLoop,   thermoDataDir);
      initDangleValues(tparams->dangleValues, thermoDataDir);
      initStackValues(tparams->stackValues,   thermoDataDir);
@@ -232,6 +245,693 @@ int LoadThermodynamicParameters(const ThermoParams_t *tparams, const char *baseS
      return GTFPYTHON_ERRNO_OK;
 }
 
+bool THERMO_PARAMS_LOCKED = false;
+bool THERMO_PARAMS_RESIDENT = false;
+
+static void  *SHARED_THERMO_PARAMS_DATA = NULL;
+static size_t SHARED_THERMO_PARAMS_SIZE = 0;
+static char   SHARED_THERMO_PARAMS_NAME[STR_BUFFER_SIZE] = { '\0' };
+
+static ThermoParamsRegistryEntry_t *THERMO_PARAMS_REGISTRY[THERMO_PARAMS_REGISTRY_SIZE] = { NULL };
+static ThermoParamsKey_t RESIDENT_THERMO_PARAMS_KEY;
+static unsigned long THERMO_PARAMS_REGISTRY_CLOCK = 0;
+
+#define SaveThermoTable(tables, field, table)        memcpy(tables->field, table, sizeof(tables->field))
+#define RestoreThermoTable(table, tables, field)     memcpy(table, tables->field, sizeof(tables->field))
+
+void SaveThermodynamicTables(ThermoParamsTables_t *tables) {
+     if(tables == NULL) {
+          return;
+     }
+     SaveThermoTable(tables, poppen, poppen);
+     tables->maxpen = maxpen;
+     SaveThermoTable(tables, eparam, eparam);
+     SaveThermoTable(tables, multConst, multConst);
+     SaveThermoTable(tables, dangle, dangle);
+     SaveThermoTable(tables, inter, inter);
+     SaveThermoTable(tables, bulge, bulge);
+     SaveThermoTable(tables, hairpin, hairpin);
+     SaveThermoTable(tables, stack, _stack);
+     SaveThermoTable(tables, tstkh, tstkh);
+     SaveThermoTable(tables, tstki, tstki);
+     SaveThermoTable(tables, tloop, tloop);
+     tables->numoftloops = numoftloops;
+     SaveThermoTable(tables, iloop22, iloop22);
+     SaveThermoTable(tables, iloop21, iloop21);
+     SaveThermoTable(tables, iloop11, iloop11);
+     SaveThermoTable(tables, tstackm, tstackm);
+     SaveThermoTable(tables, tstacke, tstacke);
+     SaveThermoTable(tables, tstacki23, tstacki23);
+     tables->auend = auend;
+     tables->gubonus = gubonus;
+     tables->cint = cint;
+     tables->cslope = cslope;
+     tables->c3 = c3;
+     tables->efn2a = efn2a;
+     tables->efn2b = efn2b;
+     tables->efn2c = efn2c;
+     SaveThermoTable(tables, triloop, triloop);
+     tables->numoftriloops = numoftriloops;
+     tables->init = init;
+     tables->gail = gail;
+     tables->prelog = prelog;
+}
+
+void RestoreThermodynamicTables(const ThermoParamsTables_t *tables) {
+     if(tables == NULL) {
+          return;
+     }
+     resetEnergyTablePointers();
+     THERMO_PARAMS_GENERATION++;
+     RestoreThermoTable(poppen, tables, poppen);
+     maxpen = tables->maxpen;
+     RestoreThermoTable(eparam, tables, eparam);
+     RestoreThermoTable(multConst, tables, multConst);
+     RestoreThermoTable(dangle, tables, dangle);
+     RestoreThermoTable(inter, tables, inter);
+     RestoreThermoTable(bulge, tables, bulge);
+     RestoreThermoTable(hairpin, tables, hairpin);
+     RestoreThermoTable(_stack, tables, stack);
+     RestoreThermoTable(tstkh, tables, tstkh);
+     RestoreThermoTable(tstki, tables, tstki);
+     RestoreThermoTable(tloop, tables, tloop);
+     numoftloops = tables->numoftloops;
+     RestoreThermoTable(iloop22, tables, iloop22);
+     RestoreThermoTable(iloop21, tables, iloop21);
+     RestoreThermoTable(iloop11, tables, iloop11);
+     RestoreThermoTable(tstackm, tables, tstackm);
+     RestoreThermoTable(tstacke, tables, tstacke);
+     RestoreThermoTable(tstacki23, tables, tstacki23);
+     auend = tables->auend;
+     gubonus = tables->gubonus;
+     cint = tables->cint;
+     cslope = tables->cslope;
+     c3 = tables->c3;
+     efn2a = tables->efn2a;
+     efn2b = tables->efn2b;
+     efn2c = tables->efn2c;
+     RestoreThermoTable(triloop, tables, triloop);
+     numoftriloops = tables->numoftriloops;
+     init = tables->init;
+     gail = tables->gail;
+     prelog = tables->prelog;
+}
+
+void BindThermodynamicTables(const ThermoParamsTables_t *tables) {
+     if(tables == NULL) {
+          return;
+     }
+     // The engine only ever reads from the tables, so it is safe to point them 
+     // directly at (read-only) memory that we do not own:
+     THERMO_PARAMS_GENERATION++;
+     poppen = (int *) tables->poppen;
+     maxpen = tables->maxpen;
+     eparam = (int *) tables->eparam;
+     multConst = (int *) tables->multConst;
+     dangle = (int (*)[4][4][2]) tables->dangle;
+     inter = (int *) tables->inter;
+     bulge = (int *) tables->bulge;
+     hairpin = (int *) tables->hairpin;
+     _stack = (int *) tables->stack;
+     tstkh = (int *) tables->tstkh;
+     tstki = (int *) tables->tstki;
+     tloop = (int (*)[2]) tables->tloop;
+     numoftloops = tables->numoftloops;
+     iloop22 = (int (*)[5][5][5][5][5][5][5]) tables->iloop22;
+     iloop21 = (int (*)[5][5][5][5][5][5]) tables->iloop21;
+     iloop11 = (int (*)[5][5][5][5][5]) tables->iloop11;
+     tstackm = (int (*)[5][6][6]) tables->tstackm;
+     tstacke = (int (*)[5][6][6]) tables->tstacke;
+     tstacki23 = (int (*)[5][5][5]) tables->tstacki23;
+     auend = tables->auend;
+     gubonus = tables->gubonus;
+     cint = tables->cint;
+     cslope = tables->cslope;
+     c3 = tables->c3;
+     efn2a = tables->efn2a;
+     efn2b = tables->efn2b;
+     efn2c = tables->efn2c;
+     triloop = (int (*)[2]) tables->triloop;
+     numoftriloops = tables->numoftriloops;
+     init = tables->init;
+     gail = tables->gail;
+     prelog = tables->prelog;
+}
+
+static const ThermoParamsTables_t * MappedThermoParamsTables(const ThermoParamsRegistryEntry_t *regEntry) {
+     const ThermoParamsBlobHeader_t *blobHeader = (const ThermoParamsBlobHeader_t *) regEntry->mappedData;
+     return (const ThermoParamsTables_t *) ((const char *) regEntry->mappedData + blobHeader->headerSize);
+}
+
+static void UseThermoParamsRegistryEntry(ThermoParamsRegistryEntry_t *regEntry) {
+     if(regEntry->mappedData != NULL) {
+          BindThermodynamicTables(MappedThermoParamsTables(regEntry));
+     }
+     else {
+          RestoreThermodynamicTables(&(regEntry->tables));
+     }
+     regEntry->lastUsed = ++THERMO_PARAMS_REGISTRY_CLOCK;
+}
+
+static void UnmapThermoParamsRegistryEntry(ThermoParamsRegistryEntry_t *regEntry) {
+     if(regEntry != NULL && regEntry->mappedData != NULL) {
+          munmap(regEntry->mappedData, regEntry->mappedSize);
+	     regEntry->mappedData = NULL;
+	     regEntry->mappedSize = 0;
+     }
+}
+
+void ClearThermodynamicParametersRegistry(void) {
+     // The engine may be bound to one of the mappings, so point it back at its own 
+     // arrays first (the tables are reloaded before the next fold):
+     resetEnergyTablePointers();
+     THERMO_PARAMS_GENERATION++;
+     for(int ridx = 0; ridx < THERMO_PARAMS_REGISTRY_SIZE; ridx++) {
+          UnmapThermoParamsRegistryEntry(THERMO_PARAMS_REGISTRY[ridx]);
+          Free(THERMO_PARAMS_REGISTRY[ridx]);
+     }
+     memset(&RESIDENT_THERMO_PARAMS_KEY, 0, sizeof(ThermoParamsKey_t));
+     THERMO_PARAMS_RESIDENT = false;
+}
+
+static void BuildThermoParamsKey(const ThermoParams_t *tparams, const char *thermoDataDir, 
+		                 ThermoParamsKey_t *tpKey) {
+     memset(tpKey, 0, sizeof(ThermoParamsKey_t));
+     strncpy(tpKey->configName, tparams->configName, 47);
+     strncpy(tpKey->dataDir, thermoDataDir, STR_BUFFER_SIZE - 1);
+     tpKey->unaMode = UNAMODE;
+     tpKey->rnaMode = RNAMODE;
+     tpKey->tMismatch = *TMISMATCH;
+     const char *datFileNames[THERMO_PARAMS_NUM_FILES] = {
+          tparams->miscLoop, tparams->dangleValues, tparams->stackValues, 
+	     tparams->loopValues, tparams->tloopValues, tparams->tstackhValues, 
+	     tparams->tstackiValues, tparams->tstackmValues, tparams->tstackeValues, 
+	     tparams->tstack23Values, tparams->int21Values, tparams->int22Values, 
+	     tparams->int11Values
+     };
+     char datFilePath[STR_BUFFER_SIZE];
+     struct stat statBuf;
+     for(int fidx = 0; fidx < THERMO_PARAMS_NUM_FILES; fidx++) {
+          if(datFileNames[fidx][0] == '\0') {
+	          continue;
+	     }
+	     snprintf(datFilePath, STR_BUFFER_SIZE, "%s%s", thermoDataDir, datFileNames[fidx]);
+	     if(stat(datFilePath, &statBuf) == 0) {
+	          tpKey->fileMTimes[fidx] = statBuf.st_mtime;
+		  tpKey->fileSizes[fidx] = statBuf.st_size;
+	     }
+	     else {
+	          tpKey->fileSizes[fidx] = -1;
+	     }
+     }
+}
+
+static ThermoParamsRegistryEntry_t * LookupThermoParamsRegistry(const ThermoParamsKey_t *tpKey) {
+     for(int ridx = 0; ridx < THERMO_PARAMS_REGISTRY_SIZE; ridx++) {
+          ThermoParamsRegistryEntry_t *regEntry = THERMO_PARAMS_REGISTRY[ridx];
+	     if(regEntry != NULL && regEntry->isValid && 
+	        !memcmp(&(regEntry->key), tpKey, sizeof(ThermoParamsKey_t))) {
+	          return regEntry;
+	     }
+     }
+     return NULL;
+}
+
+/* Add the tables in use to the registry: a copy of them, or for a compiled parameter file 
+ * the mapping (whose tables the engine must already be bound to) which the entry then owns. 
+ * The least recently used entry is replaced (the engine is never bound to its tables here):
+ */
+static bool InsertThermoParamsRegistry(const ThermoParamsKey_t *tpKey, void *mappedData, size_t mappedSize) {
+     int lruIdx = 0;
+     for(int ridx = 0; ridx < THERMO_PARAMS_REGISTRY_SIZE; ridx++) {
+          if(THERMO_PARAMS_REGISTRY[ridx] == NULL || !THERMO_PARAMS_REGISTRY[ridx]->isValid) {
+	          lruIdx = ridx;
+		  break;
+	     }
+	     else if(THERMO_PARAMS_REGISTRY[ridx]->lastUsed < THERMO_PARAMS_REGISTRY[lruIdx]->lastUsed) {
+	          lruIdx = ridx;
+	     }
+     }
+     if(THERMO_PARAMS_REGISTRY[lruIdx] == NULL) {
+          THERMO_PARAMS_REGISTRY[lruIdx] = (ThermoParamsRegistryEntry_t *) 
+		                           malloc(sizeof(ThermoParamsRegistryEntry_t));
+	     if(THERMO_PARAMS_REGISTRY[lruIdx] == NULL) {
+	          return false;
+	     }
+	     THERMO_PARAMS_REGISTRY[lruIdx]->mappedData = NULL;
+	     THERMO_PARAMS_REGISTRY[lruIdx]->mappedSize = 0;
+     }
+     ThermoParamsRegistryEntry_t *regEntry = THERMO_PARAMS_REGISTRY[lruIdx];
+     UnmapThermoParamsRegistryEntry(regEntry);
+     memcpy(&(regEntry->key), tpKey, sizeof(ThermoParamsKey_t));
+     if(mappedData != NULL) {
+          regEntry->mappedData = mappedData;
+	     regEntry->mappedSize = mappedSize;
+     }
+     else {
+          SaveThermodynamicTables(&(regEntry->tables));
+     }
+     regEntry->lastUsed = ++THERMO_PARAMS_REGISTRY_CLOCK;
+     regEntry->isValid = true;
+     return true;
+}
+
+int LoadThermodynamicParameters(const ThermoParams_t *tparams, const char *baseSearchDir) {
+     if(tparams == NULL || baseSearchDir == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+	  return GetLastErrorCode();
+     }
+     else if((THERMO_PARAMS_LOCKED && THERMO_PARAMS_RESIDENT) || SHARED_THERMO_PARAMS_DATA != NULL) {
+          return GTFPYTHON_ERRNO_OK;
+     }
+     struct stat blobStatBuf;
+     if(stat(baseSearchDir, &blobStatBuf) == 0 && S_ISREG(blobStatBuf.st_mode)) {
+          return LoadThermodynamicParametersBlob(baseSearchDir);
+     }
+     char thermoDataDir[STR_BUFFER_SIZE];
+     strncpy(thermoDataDir, baseSearchDir, STR_BUFFER_SIZE - 2);
+     thermoDataDir[STR_BUFFER_SIZE - 2] = '\0';
+     if(strlen(thermoDataDir) > 0 && thermoDataDir[strlen(thermoDataDir) - 1] != '/') {
+          strcat(thermoDataDir, "/");
+     }
+     ThermoParamsKey_t tpKey;
+     BuildThermoParamsKey(tparams, thermoDataDir, &tpKey);
+     if(THERMO_PARAMS_RESIDENT && 
+        !memcmp(&RESIDENT_THERMO_PARAMS_KEY, &tpKey, sizeof(ThermoParamsKey_t))) {
+          strcpy(EN_DATADIR, thermoDataDir);
+	     strcpy(GTFOLD_DATADIR, thermoDataDir);
+          return GTFPYTHON_ERRNO_OK;
+     }
+     ThermoParamsRegistryEntry_t *regEntry = LookupThermoParamsRegistry(&tpKey);
+     if(regEntry != NULL) {
+          UseThermoParamsRegistryEntry(regEntry);
+	     memcpy(&RESIDENT_THERMO_PARAMS_KEY, &tpKey, sizeof(ThermoParamsKey_t));
+	     THERMO_PARAMS_RESIDENT = true;
+          strcpy(EN_DATADIR, thermoDataDir);
+	     strcpy(GTFOLD_DATADIR, thermoDataDir);
+	     if(*CONFIG_DEBUGGING) {
+	          fprintf(stderr, "GTFOLD-DATA-DIR: %s (cached)\n", GTFOLD_DATADIR);
+	     }
+          return GTFPYTHON_ERRNO_OK;
+     }
+     THERMO_PARAMS_RESIDENT = false;
+     int loadStatus = ReadThermodynamicParameterFiles(tparams, baseSearchDir);
+     if(loadStatus != GTFPYTHON_ERRNO_OK) {
+          return loadStatus;
+     }
+     InsertThermoParamsRegistry(&tpKey, NULL, 0);
+     memcpy(&RESIDENT_THERMO_PARAMS_KEY, &tpKey, sizeof(ThermoParamsKey_t));
+     THERMO_PARAMS_RESIDENT = true;
+     return GTFPYTHON_ERRNO_OK;
+}
+
+int ForceLoadThermodynamicParameters(const ThermoParams_t *tparams, const char *baseSearchDir) {
+     bool tpLocked = THERMO_PARAMS_LOCKED;
+     DetachSharedThermodynamicTables(false);
+     ClearThermodynamicParametersRegistry();
+     THERMO_PARAMS_LOCKED = false;
+     int loadStatus = LoadThermodynamicParameters(tparams, baseSearchDir);
+     THERMO_PARAMS_LOCKED = tpLocked;
+     return loadStatus;
+}
+
+uint64_t ComputeThermoParamsChecksum(const void *data, size_t numBytes) {
+     // 64-bit FNV-1a hash of the raw table bytes:
+     const unsigned char *dataBytes = (const unsigned char *) data;
+     uint64_t hashValue = UINT64_C(0xcbf29ce484222325);
+     for(size_t bidx = 0; bidx < numBytes; bidx++) {
+          hashValue ^= (uint64_t) dataBytes[bidx];
+	     hashValue *= UINT64_C(0x100000001b3);
+     }
+     return hashValue;
+}
+
+int ComputeThermodynamicTablesDigest(uint64_t *tablesDigest) {
+     if(tablesDigest == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+	     return GetLastErrorCode();
+     }
+     else if(THERMO_PARAMS_DIGEST_GENERATION != THERMO_PARAMS_GENERATION || 
+             THERMO_PARAMS_DIGEST_GENERATION == 0) {
+          ThermoParamsTables_t *tables = (ThermoParamsTables_t *) malloc(sizeof(ThermoParamsTables_t));
+	     if(tables == NULL) {
+	          SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+		  return GTFPYTHON_ERRNO_NOMEM;
+	     }
+	     memset(tables, 0, sizeof(ThermoParamsTables_t));
+	     SaveThermodynamicTables(tables);
+	     THERMO_PARAMS_DIGEST = ComputeThermoParamsChecksum(tables, sizeof(ThermoParamsTables_t));
+	     THERMO_PARAMS_DIGEST_GENERATION = THERMO_PARAMS_GENERATION;
+	     Free(tables);
+     }
+     *tablesDigest = THERMO_PARAMS_DIGEST;
+     return GTFPYTHON_ERRNO_OK;
+}
+
+static const char * ValidateThermoParamsBlob(const void *blobData, size_t blobSize) {
+     const ThermoParamsBlobHeader_t *blobHeader = (const ThermoParamsBlobHeader_t *) blobData;
+     if(blobSize < sizeof(ThermoParamsBlobHeader_t) || 
+        memcmp(blobHeader->magic, THERMO_PARAMS_BLOB_MAGIC, 8)) {
+          return "Not a compiled thermodynamic parameters file";
+     }
+     else if(blobHeader->byteOrderMark != THERMO_PARAMS_BLOB_BYTE_ORDER) {
+          return "Compiled thermodynamic parameters file has the wrong byte order";
+     }
+     else if(blobHeader->version != THERMO_PARAMS_BLOB_VERSION || 
+             blobHeader->headerSize != sizeof(ThermoParamsBlobHeader_t) || 
+             blobHeader->tablesSize != sizeof(ThermoParamsTables_t)) {
+          return "Unsupported compiled thermodynamic parameters file version";
+     }
+     else if(blobSize < blobHeader->headerSize + blobHeader->tablesSize) {
+          return "Compiled thermodynamic parameters file is truncated";
+     }
+     const char *tablesData = (const char *) blobData + blobHeader->headerSize;
+     if(ComputeThermoParamsChecksum(tablesData, blobHeader->tablesSize) != blobHeader->checksum) {
+          return "Compiled thermodynamic parameters file checksum mismatch";
+     }
+     return NULL;
+}
+
+static void BuildThermoParamsBlobKey(const char *blobPath, const struct stat *blobStat, 
+		                     ThermoParamsKey_t *tpKey) {
+     memset(tpKey, 0, sizeof(ThermoParamsKey_t));
+     strncpy(tpKey->configName, ACTIVE_THERMO_PARAMS->configName, 47);
+     strncpy(tpKey->dataDir, blobPath, STR_BUFFER_SIZE - 1);
+     tpKey->unaMode = UNAMODE;
+     tpKey->rnaMode = RNAMODE;
+     tpKey->tMismatch = *TMISMATCH;
+     tpKey->fileMTimes[0] = blobStat->st_mtime;
+     tpKey->fileSizes[0] = blobStat->st_size;
+}
+
+int CompileThermodynamicParametersBlob(const char *presetConfigName, const char *baseSearchDir, 
+		                       const char *outPath) {
+     if(presetConfigName == NULL || baseSearchDir == NULL || outPath == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+	     return GetLastErrorCode();
+     }
+     // The DAT files are parsed into the engine arrays, so keep a copy of the tables in 
+     // use and of their key, and put them back (or rebind the shared segment) afterwards. 
+     // This way compiling never changes the resident (and possibly locked) parameters:
+     ThermoParamsTables_t *residentTables = NULL;
+     if(THERMO_PARAMS_RESIDENT && SHARED_THERMO_PARAMS_DATA == NULL) {
+          residentTables = (ThermoParamsTables_t *) malloc(sizeof(ThermoParamsTables_t));
+	     if(residentTables == NULL) {
+	          SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+		  return GTFPYTHON_ERRNO_NOMEM;
+	     }
+	     SaveThermodynamicTables(residentTables);
+     }
+     ThermoParamsKey_t residentKey;
+     memcpy(&residentKey, &RESIDENT_THERMO_PARAMS_KEY, sizeof(ThermoParamsKey_t));
+     bool prevResident = THERMO_PARAMS_RESIDENT;
+     char prevDataDir[STR_BUFFER_SIZE], prevEnDataDir[256];
+     strcpy(prevDataDir, GTFOLD_DATADIR);
+     strcpy(prevEnDataDir, EN_DATADIR);
+     const ThermoParams_t *prevThermoParams = ACTIVE_THERMO_PARAMS;
+     int prevUNAMODE = UNAMODE, prevRNAMODE = RNAMODE, prevTMismatch = *TMISMATCH;
+     int compileStatus = SetThermodynamicMode(presetConfigName);
+     if(compileStatus == GTFPYTHON_ERRNO_OK) {
+          // Read the optional terminal mismatch tables whenever they are available so that 
+          // the compiled file is complete for either setting of the mismatch flag:
+          if(FileExists(ACTIVE_THERMO_PARAMS->tstackmValues, baseSearchDir) && 
+             FileExists(ACTIVE_THERMO_PARAMS->tstackeValues, baseSearchDir)) {
+               *TMISMATCH = 1;
+          }
+          compileStatus = ReadThermodynamicParameterFiles(ACTIVE_THERMO_PARAMS, baseSearchDir);
+     }
+     ThermoParamsTables_t *tables = NULL;
+     ThermoParamsBlobHeader_t blobHeader;
+     if(compileStatus == GTFPYTHON_ERRNO_OK) {
+          tables = (ThermoParamsTables_t *) malloc(sizeof(ThermoParamsTables_t));
+	     if(tables == NULL) {
+	          SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+		  compileStatus = GTFPYTHON_ERRNO_NOMEM;
+	     }
+     }
+     if(compileStatus == GTFPYTHON_ERRNO_OK) {
+          memset(tables, 0, sizeof(ThermoParamsTables_t));
+          SaveThermodynamicTables(tables);
+	     memset(&blobHeader, 0, sizeof(ThermoParamsBlobHeader_t));
+	     memcpy(blobHeader.magic, THERMO_PARAMS_BLOB_MAGIC, 8);
+	     blobHeader.version = THERMO_PARAMS_BLOB_VERSION;
+	     blobHeader.byteOrderMark = THERMO_PARAMS_BLOB_BYTE_ORDER;
+	     blobHeader.headerSize = sizeof(ThermoParamsBlobHeader_t);
+	     blobHeader.tablesSize = sizeof(ThermoParamsTables_t);
+	     blobHeader.checksum = ComputeThermoParamsChecksum(tables, sizeof(ThermoParamsTables_t));
+	     strncpy(blobHeader.configName, ACTIVE_THERMO_PARAMS->configName, 47);
+	     blobHeader.unaMode = UNAMODE;
+	     blobHeader.rnaMode = RNAMODE;
+	     blobHeader.tMismatch = *TMISMATCH;
+	     char tempOutPath[STR_BUFFER_SIZE];
+	     snprintf(tempOutPath, STR_BUFFER_SIZE, "%s.tmp", outPath);
+	     FILE *blobFP = fopen(tempOutPath, "wb");
+	     if(blobFP == NULL) {
+	          SetLastErrorCode(GTFPYTHON_ERRNO_FNOEXIST, outPath);
+		  compileStatus = GTFPYTHON_ERRNO_FNOEXIST;
+	     }
+	     else {
+	          bool writeOK = fwrite(&blobHeader, sizeof(ThermoParamsBlobHeader_t), 1, blobFP) == 1 && 
+			         fwrite(tables, sizeof(ThermoParamsTables_t), 1, blobFP) == 1;
+		  writeOK = (fclose(blobFP) == 0) && writeOK;
+		  if(!writeOK || rename(tempOutPath, outPath) != 0) {
+		       unlink(tempOutPath);
+		       SetLastErrorCode(GTFPYTHON_ERRNO_OTHER, "Unable to write the compiled parameters file");
+		       compileStatus = GTFPYTHON_ERRNO_OTHER;
+		  }
+	     }
+     }
+     Free(tables);
+     if(SHARED_THERMO_PARAMS_DATA != NULL) {
+          BindThermodynamicTables((const ThermoParamsTables_t *) ((const char *) SHARED_THERMO_PARAMS_DATA + 
+			                                          sizeof(ThermoParamsBlobHeader_t)));
+     }
+     else {
+          RestoreThermodynamicTables(residentTables);
+     }
+     Free(residentTables);
+     memcpy(&RESIDENT_THERMO_PARAMS_KEY, &residentKey, sizeof(ThermoParamsKey_t));
+     THERMO_PARAMS_RESIDENT = prevResident;
+     strcpy(GTFOLD_DATADIR, prevDataDir);
+     strcpy(EN_DATADIR, prevEnDataDir);
+     ACTIVE_THERMO_PARAMS = prevThermoParams;
+     UNAMODE = prevUNAMODE;
+     RNAMODE = prevRNAMODE;
+     *TMISMATCH = prevTMismatch;
+     return compileStatus;
+}
+
+int LoadThermodynamicParametersBlob(const char *blobPath) {
+     if(blobPath == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+	     return GetLastErrorCode();
+     }
+     else if((THERMO_PARAMS_LOCKED && THERMO_PARAMS_RESIDENT) || SHARED_THERMO_PARAMS_DATA != NULL) {
+          return GTFPYTHON_ERRNO_OK;
+     }
+     struct stat blobStat;
+     if(stat(blobPath, &blobStat) == -1 || !S_ISREG(blobStat.st_mode)) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_FNOEXIST, blobPath);
+	     return GTFPYTHON_ERRNO_FNOEXIST;
+     }
+     ThermoParamsKey_t tpKey;
+     BuildThermoParamsBlobKey(blobPath, &blobStat, &tpKey);
+     if(THERMO_PARAMS_RESIDENT && 
+        !memcmp(&RESIDENT_THERMO_PARAMS_KEY, &tpKey, sizeof(ThermoParamsKey_t))) {
+          return GTFPYTHON_ERRNO_OK;
+     }
+     ThermoParamsRegistryEntry_t *regEntry = LookupThermoParamsRegistry(&tpKey);
+     if(regEntry != NULL) {
+          UseThermoParamsRegistryEntry(regEntry);
+     }
+     else {
+          int blobFD = open(blobPath, O_RDONLY);
+	     if(blobFD == -1) {
+	          SetLastErrorCode(GTFPYTHON_ERRNO_FNOEXIST, blobPath);
+		  return GTFPYTHON_ERRNO_FNOEXIST;
+	     }
+	     void *blobData = mmap(NULL, blobStat.st_size, PROT_READ, MAP_PRIVATE, blobFD, 0);
+	     close(blobFD);
+	     if(blobData == MAP_FAILED) {
+	          SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, "Unable to mmap the compiled parameters file");
+		  return GTFPYTHON_ERRNO_NOMEM;
+	     }
+	     const char *blobErrorMsg = ValidateThermoParamsBlob(blobData, blobStat.st_size);
+	     if(blobErrorMsg != NULL) {
+	          munmap(blobData, blobStat.st_size);
+		  SetLastErrorCode(GTFPYTHON_ERRNO_INVTHERMOPARAMS, blobErrorMsg);
+		  return GTFPYTHON_ERRNO_INVTHERMOPARAMS;
+	     }
+	     const ThermoParamsBlobHeader_t *blobHeader = (const ThermoParamsBlobHeader_t *) blobData;
+	     if(strcasecmp(ACTIVE_THERMO_PARAMS->configName, blobHeader->configName) && 
+	        SetThermodynamicMode(blobHeader->configName) != GTFPYTHON_ERRNO_OK) {
+	          munmap(blobData, blobStat.st_size);
+		  return GetLastErrorCode();
+	     }
+	     // Bind the engine to the tables in the mapping (no copy), which the registry 
+	     // entry keeps alive. The file is replaced by a rename when it is recompiled, so 
+	     // the mapped (old) contents never change underneath the engine:
+	     const ThermoParamsTables_t *blobTables = (const ThermoParamsTables_t *) 
+		                                      ((const char *) blobData + blobHeader->headerSize);
+	     BindThermodynamicTables(blobTables);
+	     BuildThermoParamsBlobKey(blobPath, &blobStat, &tpKey);
+	     if(!InsertThermoParamsRegistry(&tpKey, blobData, blobStat.st_size)) {
+	          RestoreThermodynamicTables(blobTables);
+		  munmap(blobData, blobStat.st_size);
+	     }
+     }
+     memcpy(&RESIDENT_THERMO_PARAMS_KEY, &tpKey, sizeof(ThermoParamsKey_t));
+     THERMO_PARAMS_RESIDENT = true;
+     if(*CONFIG_DEBUGGING) {
+          fprintf(stderr, "GTFOLD-DATA-FILE: %s\n", blobPath);
+     }
+     return GTFPYTHON_ERRNO_OK;
+}
+
+static void BuildSharedThermoParamsName(const char *shmName, char *fullShmName) {
+     // POSIX shared memory object names must begin with a single slash:
+     snprintf(fullShmName, STR_BUFFER_SIZE, "%s%s", shmName[0] == '/' ? "" : "/", shmName);
+}
+
+int PublishSharedThermodynamicTables(const char *shmName) {
+     if(shmName == NULL || shmName[0] == '\0') {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+	     return GetLastErrorCode();
+     }
+     else if(!THERMO_PARAMS_RESIDENT) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVTHERMOPARAMS, "No thermodynamic parameters are loaded");
+	     return GTFPYTHON_ERRNO_INVTHERMOPARAMS;
+     }
+     // Take a private copy first: the resident tables may themselves live in 
+     // the segment we are about to replace:
+     ThermoParamsTables_t *tables = (ThermoParamsTables_t *) malloc(sizeof(ThermoParamsTables_t));
+     if(tables == NULL) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, NULL);
+	     return GTFPYTHON_ERRNO_NOMEM;
+     }
+     memset(tables, 0, sizeof(ThermoParamsTables_t));
+     SaveThermodynamicTables(tables);
+     DetachSharedThermodynamicTables(false);
+     char fullShmName[STR_BUFFER_SIZE];
+     BuildSharedThermoParamsName(shmName, fullShmName);
+     size_t shmSize = sizeof(ThermoParamsBlobHeader_t) + sizeof(ThermoParamsTables_t);
+     // Never rewrite a segment in place: processes which still have an earlier segment 
+     // of this name mapped keep its (unchanged) tables, and attach to the new one later:
+     int shmFD = -1;
+     if(shm_unlink(fullShmName) == 0 || errno == ENOENT) {
+          shmFD = shm_open(fullShmName, O_CREAT | O_EXCL | O_RDWR, 0644);
+     }
+     if(shmFD == -1 || ftruncate(shmFD, shmSize) == -1) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_OTHER, strerror(errno));
+	     if(shmFD != -1) {
+	          close(shmFD);
+	     }
+	     RestoreThermodynamicTables(tables);
+	     THERMO_PARAMS_RESIDENT = true;
+	     Free(tables);
+	     return GTFPYTHON_ERRNO_OTHER;
+     }
+     void *shmData = mmap(NULL, shmSize, PROT_READ | PROT_WRITE, MAP_SHARED, shmFD, 0);
+     close(shmFD);
+     if(shmData == MAP_FAILED) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, "Unable to mmap the shared parameters segment");
+	     RestoreThermodynamicTables(tables);
+	     THERMO_PARAMS_RESIDENT = true;
+	     Free(tables);
+	     return GTFPYTHON_ERRNO_NOMEM;
+     }
+     // Use the same layout as the compiled parameter files so that attaching 
+     // processes can validate the segment before binding to it:
+     ThermoParamsBlobHeader_t *shmHeader = (ThermoParamsBlobHeader_t *) shmData;
+     ThermoParamsTables_t *shmTables = (ThermoParamsTables_t *) 
+	                               ((char *) shmData + sizeof(ThermoParamsBlobHeader_t));
+     memset(shmData, 0, shmSize);
+     memcpy(shmTables, tables, sizeof(ThermoParamsTables_t));
+     Free(tables);
+     memcpy(shmHeader->magic, THERMO_PARAMS_BLOB_MAGIC, 8);
+     shmHeader->version = THERMO_PARAMS_BLOB_VERSION;
+     shmHeader->byteOrderMark = THERMO_PARAMS_BLOB_BYTE_ORDER;
+     shmHeader->headerSize = sizeof(ThermoParamsBlobHeader_t);
+     shmHeader->tablesSize = sizeof(ThermoParamsTables_t);
+     shmHeader->checksum = ComputeThermoParamsChecksum(shmTables, sizeof(ThermoParamsTables_t));
+     strncpy(shmHeader->configName, ACTIVE_THERMO_PARAMS->configName, 47);
+     shmHeader->unaMode = UNAMODE;
+     shmHeader->rnaMode = RNAMODE;
+     shmHeader->tMismatch = *TMISMATCH;
+     munmap(shmData, shmSize);
+     return AttachSharedThermodynamicTables(fullShmName);
+}
+
+int AttachSharedThermodynamicTables(const char *shmName) {
+     if(shmName == NULL || shmName[0] == '\0') {
+          SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
+	     return GetLastErrorCode();
+     }
+     char fullShmName[STR_BUFFER_SIZE];
+     BuildSharedThermoParamsName(shmName, fullShmName);
+     int shmFD = shm_open(fullShmName, O_RDONLY, 0);
+     if(shmFD == -1) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_FNOEXIST, fullShmName);
+	     return GTFPYTHON_ERRNO_FNOEXIST;
+     }
+     struct stat shmStat;
+     if(fstat(shmFD, &shmStat) == -1) {
+          close(shmFD);
+	     SetLastErrorCode(GTFPYTHON_ERRNO_FNOEXIST, fullShmName);
+	     return GTFPYTHON_ERRNO_FNOEXIST;
+     }
+     size_t shmSize = shmStat.st_size;
+     void *shmData = shmSize == 0 ? MAP_FAILED : 
+	             mmap(NULL, shmSize, PROT_READ, MAP_SHARED, shmFD, 0);
+     close(shmFD);
+     if(shmData == MAP_FAILED) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_NOMEM, "Unable to mmap the shared parameters segment");
+	     return GTFPYTHON_ERRNO_NOMEM;
+     }
+     const char *shmErrorMsg = ValidateThermoParamsBlob(shmData, shmSize);
+     if(shmErrorMsg != NULL) {
+          munmap(shmData, shmSize);
+	     SetLastErrorCode(GTFPYTHON_ERRNO_INVTHERMOPARAMS, shmErrorMsg);
+	     return GTFPYTHON_ERRNO_INVTHERMOPARAMS;
+     }
+     const ThermoParamsBlobHeader_t *shmHeader = (const ThermoParamsBlobHeader_t *) shmData;
+     if(strcasecmp(ACTIVE_THERMO_PARAMS->configName, shmHeader->configName) && 
+        SetThermodynamicMode(shmHeader->configName) != GTFPYTHON_ERRNO_OK) {
+          munmap(shmData, shmSize);
+	     return GetLastErrorCode();
+     }
+     DetachSharedThermodynamicTables(false);
+     BindThermodynamicTables((const ThermoParamsTables_t *) 
+		             ((const char *) shmData + shmHeader->headerSize));
+     SHARED_THERMO_PARAMS_DATA = shmData;
+     SHARED_THERMO_PARAMS_SIZE = shmSize;
+     strcpy(SHARED_THERMO_PARAMS_NAME, fullShmName);
+     THERMO_PARAMS_RESIDENT = true;
+     if(*CONFIG_DEBUGGING) {
+          fprintf(stderr, "GTFOLD-DATA-SHM: %s\n", fullShmName);
+     }
+     return GTFPYTHON_ERRNO_OK;
+}
+
+int DetachSharedThermodynamicTables(bool unlinkSegment) {
+     if(SHARED_THERMO_PARAMS_DATA == NULL) {
+          return GTFPYTHON_ERRNO_OK;
+     }
+     resetEnergyTablePointers();
+     THERMO_PARAMS_GENERATION++;
+     munmap(SHARED_THERMO_PARAMS_DATA, SHARED_THERMO_PARAMS_SIZE);
+     SHARED_THERMO_PARAMS_DATA = NULL;
+     SHARED_THERMO_PARAMS_SIZE = 0;
+     THERMO_PARAMS_RESIDENT = false;
+     if(unlinkSegment && shm_unlink(SHARED_THERMO_PARAMS_NAME) == -1) {
+          SetLastErrorCode(GTFPYTHON_ERRNO_OTHER, strerror(errno));
+	     SHARED_THERMO_PARAMS_NAME[0] = '\0';
+	     return GTFPYTHON_ERRNO_OTHER;
+     }
+     SHARED_THERMO_PARAMS_NAME[0] = '\0';
+     return GTFPYTHON_ERRNO_OK;
+}
+
 int SetThermodynamicMode(const char *presetConfigName) {
      if(presetConfigName == NULL) {
           SetLastErrorCode(GTFPYTHON_ERRNO_INVALID_CARGS, NULL);
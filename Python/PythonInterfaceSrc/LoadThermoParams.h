@@ -6,7 +6,10 @@
 #ifndef __LOAD_THERMO_PARAMS_H__
 #define __LOAD_THERMO_PARAMS_H__ 
 
+#include <sys/types.h>
+
 #include "PythonConfig.h"
+#include "include/constants.h"
 
 #ifdef __cplusplus
 extern "C" {
@@ -33,10 +36,120 @@ typedef struct {
 extern const ThermoParams_t STATIC_THERMO_PARAMS_CONFIG[];
 extern const ThermoParams_t *ACTIVE_THERMO_PARAMS;
 
+/* A copy of all of the GTFold energy tables (see include/data.h) that are 
+ * populated by the init*Values(...) readers in loader.cc:
+ */
+typedef struct {
+     int   poppen[5];
+     int   maxpen;
+     int   eparam[11];
+     int   multConst[3];
+     int   dangle[4][4][4][2];
+     int   inter[31];
+     int   bulge[31];
+     int   hairpin[31];
+     int   stack[256];
+     int   tstkh[256];
+     int   tstki[256];
+     int   tloop[maxtloop + 1][2];
+     int   numoftloops;
+     int   iloop22[5][5][5][5][5][5][5][5];
+     int   iloop21[5][5][5][5][5][5][5];
+     int   iloop11[5][5][5][5][5][5];
+     int   tstackm[5][5][6][6];
+     int   tstacke[5][5][6][6];
+     int   tstacki23[5][5][5][5];
+     int   auend;
+     int   gubonus;
+     int   cint;
+     int   cslope;
+     int   c3;
+     int   efn2a;
+     int   efn2b;
+     int   efn2c;
+     int   triloop[maxtloop + 1][2];
+     int   numoftriloops;
+     int   init;
+     int   gail;
+     float prelog;
+} ThermoParamsTables_t;
+
+#define THERMO_PARAMS_NUM_FILES             (13)
+#define THERMO_PARAMS_REGISTRY_SIZE         (4)
+
+/* Everything that determines the contents of the loaded tables: the preset, 
+ * the data directory, the mode flags, and the state of the DAT files on disk:
+ */
+typedef struct {
+     char   configName[48];
+     char   dataDir[STR_BUFFER_SIZE];
+     int    unaMode;
+     int    rnaMode;
+     int    tMismatch;
+     time_t fileMTimes[THERMO_PARAMS_NUM_FILES];
+     off_t  fileSizes[THERMO_PARAMS_NUM_FILES];
+} ThermoParamsKey_t;
+
+/* The entries for compiled parameter files keep the file mapped, and the engine is bound 
+ * to the tables in the mapping (mappedData != NULL) instead of a copy of them in tables:
+ */
+typedef struct {
+     bool                 isValid;
+     unsigned long        lastUsed;
+     ThermoParamsKey_t    key;
+     void                 *mappedData;
+     size_t               mappedSize;
+     ThermoParamsTables_t tables;
+} ThermoParamsRegistryEntry_t;
+
+/* Layout of the compiled (binary) thermodynamic parameter files: the header below 
+ * is immediately followed by a ThermoParamsTables_t in native byte order:
+ */
+#define THERMO_PARAMS_BLOB_MAGIC            ("GTFPTPRM")
+#define THERMO_PARAMS_BLOB_VERSION          (1)
+#define THERMO_PARAMS_BLOB_BYTE_ORDER       (0x01020304)
+
+typedef struct {
+     char     magic[8];
+     uint32_t version;
+     uint32_t byteOrderMark;
+     uint32_t headerSize;
+     uint32_t reserved;
+     uint64_t tablesSize;
+     uint64_t checksum;
+     char     configName[48];
+     int32_t  unaMode;
+     int32_t  rnaMode;
+     int32_t  tMismatch;
+     int32_t  padding;
+} ThermoParamsBlobHeader_t;
+
+extern bool THERMO_PARAMS_LOCKED;
+extern bool THERMO_PARAMS_RESIDENT;
+
 int CheckThermodynamicConfig(const ThermoParams_t *tparams, const char *baseSearchDir);
 int LoadThermodynamicParameters(const ThermoParams_t *tparams, const char *baseSearchDir);
+int ForceLoadThermodynamicParameters(const ThermoParams_t *tparams, const char *baseSearchDir);
 int SetThermodynamicMode(const char *presetConfigName);
 
+void SaveThermodynamicTables(ThermoParamsTables_t *tables);
+void RestoreThermodynamicTables(const ThermoParamsTables_t *tables);
+void ClearThermodynamicParametersRegistry(void);
+
+uint64_t ComputeThermoParamsChecksum(const void *data, size_t numBytes);
+int ComputeThermodynamicTablesDigest(uint64_t *tablesDigest);
+int CompileThermodynamicParametersBlob(const char *presetConfigName, const char *baseSearchDir, 
+		                       const char *outPath);
+int LoadThermodynamicParametersBlob(const char *blobPath);
+
+/* Energy tables shared read-only between processes through a POSIX shared memory 
+ * segment (laid out like the compiled parameter files above): 
+ */
+void BindThermodynamicTables(const ThermoParamsTables_t *tables);
+int PublishSharedThermodynamicTables(const char *shmName);
+int AttachSharedThermodynamicTables(const char *shmName);
+int DetachSharedThermodynamicTables(bool unlinkSegment);
+
 #ifdef __cplusplus
 }
 #endif
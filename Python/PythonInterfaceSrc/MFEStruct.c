@@ -105,12 +105,14 @@ int InitGTFoldMFEStructureData(MFEStructRuntimeArgs_t *rtArgs) {
      // wrapper around global.cc::init_fold(char * seq):
      init_global_params(rtArgs->numBases);
      if(!encodeSequence(rtArgs->baseSeq)) {
+          free_global_params(rtArgs->numBases);
           SetLastErrorCode(GTFPYTHON_ERRNO_BASESEQ, NULL);
 	     return ErrorCodeErrno.errorCode;
      }
      create_tables(rtArgs->numBases);
      //readThermodynamicParameters(GTFOLD_DATADIR, 1, UNAMODE, RNAMODE, T_MISMATCH);
      if(LoadThermodynamicParameters(ACTIVE_THERMO_PARAMS, GTFOLD_DATADIR) != GTFPYTHON_ERRNO_OK) {
+          free_global_params(rtArgs->numBases);
           return GetLastErrorCode();
      }
      int initStatus = InitGTFoldConstraints(rtArgs);
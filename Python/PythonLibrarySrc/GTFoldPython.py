@@ -8,10 +8,236 @@ from _ctypes import dlclose as __dlclose
 import ctypes
 from ctypes import POINTER, pointer
 import os
+import array
+import math
+import threading
+import queue
+import hashlib
+import sys
+import sqlite3
+import json
+import zlib
+from collections import OrderedDict
 
 from GTFoldPythonConfig import GTFoldPythonConfig as GTFPConfig
 from GTFoldPythonCTypes import GTFoldPythonCTypes as GTFPTypes
 
+class GTFoldResultCache:
+    """
+    GTFoldResultCache : a size bounded LRU cache of folding results. Entries are keyed 
+    by a hash of the function name, its arguments (sequence, constraint or SHAPE list, 
+    subopt delta) and the active energy model settings, and the least recently used 
+    entries are evicted once the (estimated) size of the stored results exceeds the 
+    byte budget. 
+    ::seealso GTFoldPython.EnableResultCache
+    """
+
+    DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, maxBytes = DEFAULT_MAX_BYTES):
+        self._cacheLock = threading.Lock()
+        self._cacheEntries = OrderedDict()
+        self._maxBytes = int(maxBytes)
+        self._curBytes = 0
+        self._numHits = 0
+        self._numMisses = 0
+        self._numEvictions = 0
+    ##
+
+    @staticmethod
+    def MakeKey(funcName, *funcArgs):
+        """The key of a call with the settings seen by the calling thread (those of the 
+           GTFoldContext active in the thread, if any, ::seealso GTFoldPython._GetConfig)
+        """
+        keyData = repr((funcName, funcArgs, GTFoldPython._EnergyModelSettingsKey()))
+        return hashlib.sha1(keyData.encode("utf-8")).digest()
+    ##
+
+    @staticmethod
+    def EstimateBytes(resultObj):
+        """Approximate memory used by a result (nested lists and tuples of numbers and strings)"""
+        numBytes = sys.getsizeof(resultObj)
+        if isinstance(resultObj, (list, tuple)):
+            numBytes += sum([ GTFoldResultCache.EstimateBytes(item) for item in resultObj ])
+        return numBytes
+    ##
+
+    @staticmethod
+    def _CopyResult(resultObj):
+        # Callers get their own copy of list results to modify:
+        return list(resultObj) if isinstance(resultObj, list) else resultObj
+    ##
+
+    def _EvictEntries(self):
+        while self._curBytes > self._maxBytes and len(self._cacheEntries) > 0:
+            (cacheKey, (resultObj, numBytes)) = self._cacheEntries.popitem(last = False)
+            self._curBytes -= numBytes
+            self._numEvictions += 1
+    ##
+
+    def Get(self, cacheKey):
+        """Return the cached result for the key, or None if it is not stored"""
+        with self._cacheLock:
+            cacheEntry = self._cacheEntries.get(cacheKey)
+            if cacheEntry == None:
+                self._numMisses += 1
+                return None
+            self._cacheEntries.move_to_end(cacheKey)
+            self._numHits += 1
+            return GTFoldResultCache._CopyResult(cacheEntry[0])
+    ##
+
+    def Put(self, cacheKey, resultObj):
+        """Store a result (results larger than the whole budget are not cached) and 
+           return a copy of it for the caller
+        """
+        numBytes = GTFoldResultCache.EstimateBytes(resultObj) + sys.getsizeof(cacheKey)
+        with self._cacheLock:
+            if cacheKey in self._cacheEntries:
+                self._curBytes -= self._cacheEntries.pop(cacheKey)[1]
+            if numBytes <= self._maxBytes:
+                self._cacheEntries[cacheKey] = (resultObj, numBytes)
+                self._curBytes += numBytes
+                self._EvictEntries()
+        return GTFoldResultCache._CopyResult(resultObj)
+    ##
+
+    def Resize(self, maxBytes):
+        """Change the byte budget, evicting the least recently used results to fit"""
+        with self._cacheLock:
+            self._maxBytes = int(maxBytes)
+            self._EvictEntries()
+    ##
+
+    def Clear(self):
+        """Drop all of the cached results (the hit and miss counts are kept)"""
+        with self._cacheLock:
+            self._cacheEntries.clear()
+            self._curBytes = 0
+    ##
+
+    def GetStats(self):
+        """:return: A dict with the hits, misses, evictions, entries, bytes and maxbytes counts"""
+        with self._cacheLock:
+            return { 
+                "hits"      : self._numHits, 
+                "misses"    : self._numMisses, 
+                "evictions" : self._numEvictions, 
+                "entries"   : len(self._cacheEntries), 
+                "bytes"     : self._curBytes, 
+                "maxbytes"  : self._maxBytes, 
+            }
+    ##
+
+## class GTFoldResultCache
+
+class GTFoldResultStore:
+    """
+    GTFoldResultStore : a persistent SQLite database of folding results which can be 
+    shared between runs and between processes. The key of an entry adds a digest of 
+    the energy model tables actually loaded from the DAT files to the GTFoldResultCache 
+    key, so results computed with different parameter files never match. The results 
+    are stored as zlib compressed JSON (the BPP matrices are stored as their zlib 
+    compressed raw bytes, ::seealso GTFoldPython._ComputeBPPMatrix). The database is opened in WAL mode so that 
+    any number of processes can read while one of them writes. 
+    ::seealso GTFoldPython.EnableResultStore
+    """
+
+    BUSY_TIMEOUT = 60.0
+
+    def __init__(self, dbPath):
+        self._dbPath = os.path.abspath(dbPath)
+        self._localConn = threading.local()
+        self._numHits = 0
+        self._numMisses = 0
+        self._numWrites = 0
+        dbConn = self._GetConnection()
+        dbConn.execute("CREATE TABLE IF NOT EXISTS GTFoldResults (" + 
+                       "resultKey TEXT PRIMARY KEY, funcName TEXT, resultData BLOB)")
+    ##
+
+    def _GetConnection(self):
+        """SQLite connections cannot be shared between threads or forked processes"""
+        dbConn = getattr(self._localConn, "dbConn", None)
+        if dbConn == None or self._localConn.ownerPid != os.getpid():
+            dbConn = sqlite3.connect(self._dbPath, timeout = GTFoldResultStore.BUSY_TIMEOUT, 
+                                     isolation_level = None)
+            dbConn.execute("PRAGMA journal_mode=WAL")
+            dbConn.execute("PRAGMA synchronous=NORMAL")
+            self._localConn.dbConn = dbConn
+            self._localConn.ownerPid = os.getpid()
+        return dbConn
+    ##
+
+    @staticmethod
+    def MakeKey(cacheKey):
+        """:param cacheKey: The GTFoldResultCache key for the same call"""
+        tablesDigest = GTFoldPython.GetThermodynamicParametersDigest()
+        return hashlib.sha1(cacheKey + str(tablesDigest).encode("utf-8")).hexdigest()
+    ##
+
+    @staticmethod
+    def _IsRawResult(funcName):
+        return funcName.startswith("ComputeBPPMatrix")
+    ##
+
+    @staticmethod
+    def _DecodeResult(funcName, resultObj):
+        # JSON turns the result tuples into lists:
+        if funcName.startswith("GetMFEStructure"):
+            return tuple(resultObj)
+        elif funcName == "GetEnergyBandHistogram":
+            return resultObj
+        elif isinstance(resultObj, list):
+            return [ tuple(item) if isinstance(item, list) else item for item in resultObj ]
+        return resultObj
+    ##
+
+    def Get(self, funcName, cacheKey):
+        """Return the stored result of the call, or None if it is not stored"""
+        resultKey = GTFoldResultStore.MakeKey(cacheKey)
+        dbRow = self._GetConnection().execute("SELECT resultData FROM GTFoldResults WHERE resultKey = ?", 
+                                              (resultKey, )).fetchone()
+        if dbRow == None:
+            self._numMisses += 1
+            return None
+        self._numHits += 1
+        if GTFoldResultStore._IsRawResult(funcName):
+            return bytes(dbRow[0])
+        resultObj = json.loads(zlib.decompress(dbRow[0]).decode("utf-8"))
+        return GTFoldResultStore._DecodeResult(funcName, resultObj)
+    ##
+
+    def Put(self, funcName, cacheKey, resultObj):
+        """Store (or replace) the result of the call in the database"""
+        resultKey = GTFoldResultStore.MakeKey(cacheKey)
+        if GTFoldResultStore._IsRawResult(funcName):
+            resultData = resultObj
+        else:
+            resultData = zlib.compress(json.dumps(resultObj).encode("utf-8"))
+        self._GetConnection().execute("INSERT OR REPLACE INTO GTFoldResults VALUES (?, ?, ?)", 
+                                      (resultKey, funcName, sqlite3.Binary(resultData)))
+        self._numWrites += 1
+    ##
+
+    def Clear(self):
+        """Delete all of the stored results (for every process using the database)"""
+        self._GetConnection().execute("DELETE FROM GTFoldResults")
+    ##
+
+    def GetStats(self):
+        """:return: A dict with the hits, misses, writes (by this process) and entries counts"""
+        numEntries = self._GetConnection().execute("SELECT COUNT(*) FROM GTFoldResults").fetchone()[0]
+        return { 
+            "hits"      : self._numHits, 
+            "misses"    : self._numMisses, 
+            "writes"    : self._numWrites, 
+            "entries"   : numEntries, 
+        }
+    ##
+
+## class GTFoldResultStore
+
 class GTFoldPython:
     """
     GTFoldPython : defines an interface for calling the GTFold C library functions
@@ -32,26 +258,91 @@ class GTFoldPython:
     _configDataDir = ""
     _configEnergyModelName = GTFPConfig.THERMO_PARAMS_SPEC_TURNER04
     _configEnergyModelDataDir = None
-    _configDangle = 0
-    _configTerminalMismatch = False
-    _configLimitContactDistance = 0
-    _configPrefilter = 0
+    _configDangle = None
+    _configTerminalMismatch = None
+    _configLimitContactDistance = None
+    _configPrefilter = None
+
+    _resultCache = None
+    _resultStore = None
+
+    # The settings which each GTFoldContext keeps for itself, and the (thread-local) context 
+    # and settings active in each thread:
+    _contextConfigNames = ( "_configDataDir", "_configEnergyModelName", "_configEnergyModelDataDir", 
+                            "_configDangle", "_configTerminalMismatch", "_configLimitContactDistance", 
+                            "_configPrefilter", "_configExtraSettingsDict" )
+    _contextThreadState = threading.local()
+
+    # The threads iterating over IterSuboptStructures generators (whose tracebacks hold the 
+    # engine lock), with the number of open generators in each:
+    _engineStreamThreads = dict([])
+
+    # The Analyze stages (and their C flags) and the defaults of their parameters:
+    _analyzeStageFlags = { "mfe" : 0x01, "subopt" : 0x02, "pf" : 0x04, "bpp" : 0x08, "samples" : 0x10 }
+    ANALYZE_DEFAULT_SAMPLES = 1000
+    ANALYZE_DEFAULT_SUBOPT_DELTA = 1.0
 
     # Static helper methods:
+    @staticmethod
+    def _GetConfig(attrName):
+        """The value of the _config* setting attrName as seen by the calling thread, i.e., 
+           the value kept by the GTFoldContext active in the thread if there is one
+        """
+        ctxConfig = getattr(GTFoldPython._contextThreadState, "activeConfig", None)
+        if ctxConfig != None and attrName in ctxConfig:
+            return ctxConfig[attrName]
+        return getattr(GTFoldPython, attrName)
+    ##
+
+    @staticmethod
+    def _SetConfig(attrName, attrValue):
+        """Record a _config* setting (in the GTFoldContext active in the calling thread if it keeps it)"""
+        ctxConfig = getattr(GTFoldPython._contextThreadState, "activeConfig", None)
+        if ctxConfig != None and attrName in ctxConfig:
+            ctxConfig[attrName] = attrValue
+        else:
+            setattr(GTFoldPython, attrName, attrValue)
+    ##
+
+    @staticmethod
+    def _ConfigSnapshot():
+        """All of the _config* settings as seen by the calling thread"""
+        return dict([ (attrName, GTFoldPython._GetConfig(attrName)) for attrName in \
+                      vars(GTFoldPython).keys() if attrName.startswith("_config") ])
+    ##
+
+    @staticmethod
+    def _CheckEngineStreamThread():
+        """Raise a RuntimeError in a thread which is iterating over an IterSuboptStructures 
+           generator: its traceback holds the engine lock until the structures are consumed, 
+           so a library call from the consumer would wait on it forever
+        """
+        if GTFoldPython._engineStreamThreads.get(threading.get_ident(), 0) > 0:
+            raise RuntimeError("The GTFold library is in use by an open IterSuboptStructures " + 
+                               "generator in this thread (close it before calling the library)")
+    ##
+
     @staticmethod
     def _WrapCTypesFunction(funcname, restype=None, argtypes=None):
-        """Simplify wrapping ctypes functions"""
+        """Simplify wrapping ctypes functions. Functions wrapped while a GTFoldContext is 
+           active in the calling thread switch the engine over to its settings for each call.
+        """
+        GTFoldPython._CheckEngineStreamThread()
         func = GTFoldPython._libGTFoldHandle.__getattr__(funcname)
         if restype != None:
             func.restype = restype
         if argtypes != None:
             func.argtypes = argtypes
+        activeContext = getattr(GTFoldPython._contextThreadState, "activeContext", None)
+        if activeContext != None and not funcname.startswith("GTFoldContext"):
+            return lambda *args: activeContext._CallInEngine(func, *args)
         return func
     ##
 
     @staticmethod
     def _ConstructLibGTFold(reinit = False):
         """Run this before calling any LibGTFold methods"""
+        GTFoldPython._CheckEngineStreamThread()
         if not GTFoldPython._libGTFoldIsInit or reinit:
             #if reinit: GTFoldPython._CloseCTypesLibrary()
             if GTFoldPython._libGTFoldHandle == None or reinit:
@@ -138,6 +429,50 @@ class GTFoldPython:
             GTFoldPython._libGTFoldIsInit = False
     ##
 
+    @staticmethod
+    def _EnergyModelSettingsKey():
+        """The settings which change the results of the folding computations"""
+        getConfig = GTFoldPython._GetConfig
+        return (getConfig("_configEnergyModelName"), getConfig("_configEnergyModelDataDir"), 
+                getConfig("_configDangle"), getConfig("_configTerminalMismatch"), 
+                getConfig("_configLimitContactDistance"), getConfig("_configPrefilter"), 
+                repr(sorted(getConfig("_configExtraSettingsDict").items())))
+    ##
+
+    @staticmethod
+    def _LookupCachedResult(funcName, *funcArgs):
+        """Look in the in-memory cache first, then in the persistent result store
+        :return: A tuple (cache key, cached result or None)
+        """
+        (resultCache, resultStore) = (GTFoldPython._resultCache, GTFoldPython._resultStore)
+        if resultCache == None and resultStore == None:
+            return (None, None)
+        cacheKey = (funcName, GTFoldResultCache.MakeKey(funcName, *funcArgs))
+        if resultCache != None:
+            cachedResult = resultCache.Get(cacheKey[1])
+            if cachedResult != None:
+                return (cacheKey, cachedResult)
+        if resultStore != None:
+            cachedResult = resultStore.Get(*cacheKey)
+            if cachedResult != None:
+                if resultCache != None:
+                    cachedResult = resultCache.Put(cacheKey[1], cachedResult)
+                return (cacheKey, cachedResult)
+        return (cacheKey, None)
+    ##
+
+    @staticmethod
+    def _StoreCachedResult(cacheKey, resultObj):
+        (resultCache, resultStore) = (GTFoldPython._resultCache, GTFoldPython._resultStore)
+        if cacheKey == None:
+            return resultObj
+        if resultStore != None:
+            resultStore.Put(cacheKey[0], cacheKey[1], resultObj)
+        if resultCache != None:
+            return resultCache.Put(cacheKey[1], resultObj)
+        return resultObj
+    ##
+
     # The actual interface for users:
     @staticmethod
     def Init(reinitLibrary = False):
@@ -230,18 +565,19 @@ class GTFoldPython:
                 advancedouble    : 1, 
                 bignumprecision  : 512,
                 uniquemultiloop  : True,
-                duplicatecheck   : True
+                duplicatecheck   : True,
+                maxcount         : 1000
         };
         >>> GTFP.ConfigSettings(**cfgSettings)
         """
-        curConfigDict = GTFoldPython._configExtraSettingsDict
+        curConfigDict = dict(GTFoldPython._GetConfig("_configExtraSettingsDict"))
         curConfigDict.update(kwargs)
-        GTFoldPython._configExtraSettingsDict = curConfigDict
+        GTFoldPython._SetConfig("_configExtraSettingsDict", curConfigDict)
         GTFoldPython._ConstructLibGTFold(False)
         resType = ctypes.py_object
         argTypes = [ ctypes.py_object ]
         libGTFoldFunc = GTFoldPython._WrapCTypesFunction("GTFoldPythonConfigSettings", resType, argTypes)
-        return libGTFoldFunc(GTFoldPython._configExtraSettingsDict)
+        return libGTFoldFunc(curConfigDict)
     ##
 
     @staticmethod
@@ -261,7 +597,7 @@ class GTFoldPython:
            See options: -p, --paramdir DIR
            Also can be set by exporting the env variable GTFOLDDATADIR at runtime
         """
-        GTFoldPython._configDataDir = relDirPath
+        GTFoldPython._SetConfig("_configDataDir", relDirPath)
         GTFoldPython._ConstructLibGTFold(False)
         #absDataPath = os.path.abspath(os.path.join(os.path.abspath(os.path.dirname(__file__)), relDirPath)) 
         absDataPath = relDirPath
@@ -286,8 +622,8 @@ class GTFoldPython:
         """
         if baseDataDir == None or baseDataDir == '':
             return GTFoldPython.SetThermodynamicParametersFromDefaults(energyModelName)
-        GTFoldPython._configEnergyModelName = energyModelName
-        GTFoldPython._configEnergyModelBaseDataDir = baseDataDir
+        GTFoldPython._SetConfig("_configEnergyModelName", energyModelName)
+        GTFoldPython._SetConfig("_configEnergyModelDataDir", baseDataDir)
         GTFoldPython._ConstructLibGTFold(False)
         resType = ctypes.py_object
         argTypes = [ GTFPTypes.CStringType, GTFPTypes.CStringType ]
@@ -307,6 +643,135 @@ class GTFoldPython:
         return GTFoldPython.SetThermodynamicParameters(energyModelName, defaultDataDir)
     ##
 
+    @staticmethod
+    def CompileThermodynamicParameters(energyModelName, outPath, baseDataDir = None):
+        """Parse the DAT files for the named energy model once and write all of the 
+           resulting tables to a single versioned, checksummed binary file at outPath. 
+           Passing outPath as the data directory to SetThermodynamicParameters loads the 
+           tables by mmap'ing this file instead of parsing the text files again. 
+           The tables in use (locked or not) are left unchanged.
+
+           :EXAMPLE:
+           >>> from GTFoldPythonImportAll import *
+           >>> GTFP.CompileThermodynamicParameters(TURNER99, "Turner99.gtfpbin")
+           >>> GTFP.SetThermodynamicParameters(TURNER99, "Turner99.gtfpbin")
+        """
+        if baseDataDir == None or baseDataDir == '':
+            baseDataDir = GTFPConfig.GetThermodynamicParametersDirectory(energyModelName)
+        GTFoldPython._ConstructLibGTFold(False)
+        resType = ctypes.py_object
+        argTypes = [ GTFPTypes.CStringType, GTFPTypes.CStringType, GTFPTypes.CStringType ]
+        libGTFoldFunc = GTFoldPython._WrapCTypesFunction("CompileThermodynamicParameters", resType, argTypes)
+        return libGTFoldFunc(GTFPTypes.CString(energyModelName), GTFPTypes.CString(baseDataDir), 
+                             GTFPTypes.CString(outPath))
+    ##
+
+    @staticmethod
+    def LockThermodynamicParameters():
+        """Keep the currently loaded energy model tables resident in memory and skip 
+           re-checking the DAT files before each computation until unlocked. 
+           Changes to the energy model do not take effect while the tables are locked.
+           ::seealso GTFoldPython.UnlockThermodynamicParameters
+        """
+        GTFoldPython._ConstructLibGTFold(False)
+        resType = ctypes.py_object
+        argTypes = []
+        libGTFoldFunc = GTFoldPython._WrapCTypesFunction("LockThermodynamicParameters", resType, argTypes)
+        return libGTFoldFunc()
+    ##
+
+    @staticmethod
+    def UnlockThermodynamicParameters():
+        """Resume checking the energy model settings and DAT file timestamps before each 
+           computation. Unchanged parameter sets are still reused without re-parsing the files.
+           ::seealso GTFoldPython.LockThermodynamicParameters
+        """
+        GTFoldPython._ConstructLibGTFold(False)
+        resType = ctypes.py_object
+        argTypes = []
+        libGTFoldFunc = GTFoldPython._WrapCTypesFunction("UnlockThermodynamicParameters", resType, argTypes)
+        return libGTFoldFunc()
+    ##
+
+    @staticmethod
+    def ReloadThermodynamicParameters():
+        """Discard all cached energy model tables and force the DAT files for the 
+           active energy model to be parsed again.
+        """
+        GTFoldPython._ConstructLibGTFold(False)
+        resType = ctypes.py_object
+        argTypes = []
+        libGTFoldFunc = GTFoldPython._WrapCTypesFunction("ReloadThermodynamicParameters", resType, argTypes)
+        return libGTFoldFunc()
+    ##
+
+    @staticmethod
+    def PublishSharedThermodynamicParameters(shmName):
+        """Copy the active energy model tables into the named POSIX shared memory segment 
+           and switch this process over to that single read-only copy. Worker processes 
+           then call AttachSharedThermodynamicParameters with the same name so that they 
+           all map the same physical pages instead of each keeping a private copy. 
+           Publishing again under the same name creates a new segment (the processes 
+           attached to the old one keep using its tables until they attach again).
+
+           :EXAMPLE:
+           >>> from GTFoldPythonImportAll import *
+           >>> GTFP.SetThermodynamicParameters(TURNER04)
+           >>> GTFP.PublishSharedThermodynamicParameters("gtfp-turner04")
+           >>> # ... then in each worker process:
+           >>> GTFP.AttachSharedThermodynamicParameters("gtfp-turner04")
+           ::seealso GTFoldPython.DetachSharedThermodynamicParameters
+        """
+        GTFoldPython._ConstructLibGTFold(False)
+        resType = ctypes.py_object
+        argTypes = [ GTFPTypes.CStringType ]
+        libGTFoldFunc = GTFoldPython._WrapCTypesFunction("PublishSharedThermodynamicParameters", resType, argTypes)
+        return libGTFoldFunc(GTFPTypes.CString(shmName))
+    ##
+
+    @staticmethod
+    def AttachSharedThermodynamicParameters(shmName):
+        """Map the energy model tables published under shmName read-only and use them 
+           in place of the DAT files (the energy model stored in the segment is made active) 
+           until DetachSharedThermodynamicParameters is called. Calling SetThermodynamicParameters 
+           also detaches the process from the segment.
+           ::seealso GTFoldPython.PublishSharedThermodynamicParameters
+        """
+        GTFoldPython._ConstructLibGTFold(False)
+        resType = ctypes.py_object
+        argTypes = [ GTFPTypes.CStringType ]
+        libGTFoldFunc = GTFoldPython._WrapCTypesFunction("AttachSharedThermodynamicParameters", resType, argTypes)
+        return libGTFoldFunc(GTFPTypes.CString(shmName))
+    ##
+
+    @staticmethod
+    def DetachSharedThermodynamicParameters(unlink = False):
+        """Stop using the shared energy model tables in this process. The active energy 
+           model is reloaded before the next computation. If unlink is True the shared 
+           memory segment is also removed (processes still attached keep their mapping).
+           ::seealso GTFoldPython.AttachSharedThermodynamicParameters
+        """
+        GTFoldPython._ConstructLibGTFold(False)
+        resType = ctypes.py_object
+        argTypes = [ ctypes.c_int ]
+        libGTFoldFunc = GTFoldPython._WrapCTypesFunction("DetachSharedThermodynamicParameters", resType, argTypes)
+        return libGTFoldFunc(ctypes.c_int(1 if unlink else 0))
+    ##
+
+    @staticmethod
+    def GetThermodynamicParametersDigest():
+        """Get a hash (as a hex string) of the energy model tables that the computations 
+           use, loading the active energy model first if necessary (so that edits to the 
+           DAT files are picked up as usual). The library only hashes the tables again 
+           after they have been changed.
+        """
+        GTFoldPython._ConstructLibGTFold(False)
+        resType = ctypes.py_object
+        argTypes = []
+        libGTFoldFunc = GTFoldPython._WrapCTypesFunction("GetThermodynamicParametersDigest", resType, argTypes)
+        return str(libGTFoldFunc())
+    ##
+
     @staticmethod
     def SetDangleParameter(dangle):
         """Restricts treatment of dangling energies
@@ -323,7 +788,7 @@ class GTFoldPython:
 
            See options: -d, --dangle INT
         """
-        GTFoldPython._configDangle = dangle
+        GTFoldPython._SetConfig("_configDangle", dangle)
         GTFoldPython._ConstructLibGTFold(False)
         resType = ctypes.py_object
         argTypes = [ ctypes.c_int ]
@@ -338,7 +803,7 @@ class GTFoldPython:
         """
         if type(enable) == bool:
             enable = 1 if enable else 0
-        GTFoldPython._configTerminalMismatch = enable
+        GTFoldPython._SetConfig("_configTerminalMismatch", enable)
         GTFoldPython._ConstructLibGTFold(False)
         resType = ctypes.py_object
         argTypes = [ ctypes.c_int ]
@@ -362,7 +827,7 @@ class GTFoldPython:
            base pairs can be over any distance.
            See options: -l, --limitcd INT
         """
-        GTFoldPython._configLimitContactDist = lcDist
+        GTFoldPython._SetConfig("_configLimitContactDistance", lcDist)
         GTFoldPython._ConstructLibGTFold(False)
         resType = ctypes.py_object
         argTypes = [ ctypes.c_int ]
@@ -376,7 +841,7 @@ class GTFoldPython:
            nucleotides such that it could be part of a helix of length INT.
            See options: --prefilter INT
         """
-        GTFoldPython._configPrefilter = prefilter
+        GTFoldPython._SetConfig("_configPrefilter", prefilter)
         GTFoldPython._ConstructLibGTFold(False)
         resType = ctypes.py_object
         argTypes = [ ctypes.c_int ]
@@ -384,11 +849,71 @@ class GTFoldPython:
         return libGTFoldFunc(ctypes.c_int(prefilter))
     ##
 
+    @staticmethod
+    def EnableResultCache(maxBytes = GTFoldResultCache.DEFAULT_MAX_BYTES):
+        """Memoize the results of GetMFEStructure, GetPFuncCount, ComputeBPP and 
+           GetSuboptStructures (and their SHAPE variants) in memory. Results are keyed 
+           by the sequence, constraints and current energy model settings, and the least 
+           recently used results are dropped to keep the cache within maxBytes.
+        """
+        if GTFoldPython._resultCache == None:
+            GTFoldPython._resultCache = GTFoldResultCache(maxBytes)
+        else:
+            GTFoldPython._resultCache.Resize(maxBytes)
+    ##
+
+    @staticmethod
+    def DisableResultCache():
+        """Stop memoizing results and drop the in-memory cache"""
+        GTFoldPython._resultCache = None
+    ##
+
+    @staticmethod
+    def ClearResultCache():
+        """Drop all of the results in the in-memory cache, but keep it enabled"""
+        if GTFoldPython._resultCache != None:
+            GTFoldPython._resultCache.Clear()
+    ##
+
+    @staticmethod
+    def GetResultCacheStats():
+        """::seealso GTFoldResultCache.GetStats"""
+        if GTFoldPython._resultCache == None:
+            return None
+        return GTFoldPython._resultCache.GetStats()
+    ##
+
+    @staticmethod
+    def EnableResultStore(dbPath):
+        """Keep the results of the cached functions (::seealso GTFoldPython.EnableResultCache) 
+           in the SQLite database at dbPath (created if it does not exist), so that later 
+           runs, and other processes using the same file, do not need to recompute them.
+        """
+        GTFoldPython._resultStore = GTFoldResultStore(dbPath)
+    ##
+
+    @staticmethod
+    def DisableResultStore():
+        """Stop using the SQLite result store (the database file is left in place)"""
+        GTFoldPython._resultStore = None
+    ##
+
+    @staticmethod
+    def GetResultStoreStats():
+        """::seealso GTFoldResultStore.GetStats"""
+        if GTFoldPython._resultStore == None:
+            return None
+        return GTFoldPython._resultStore.GetStats()
+    ##
+
     @staticmethod
     def GetPFuncCount(baseSeq, consList = []):
         """Output the number of possibles structures (using the partition function)
            See options: --pfcount (with gtboltzmann), -c, --constraints FILE
         """
+        (cacheKey, cachedResult) = GTFoldPython._LookupCachedResult("GetPFuncCount", baseSeq, consList)
+        if cachedResult != None:
+            return cachedResult
         GTFoldPython._ConstructLibGTFold()
         resType = ctypes.py_object
         argTypes = [ GTFPTypes.CStringType, GTFPTypes.FPConstraintsListType(consList), 
@@ -396,7 +921,7 @@ class GTFoldPython:
         libGTFoldFunc = GTFoldPython._WrapCTypesFunction("GetPFuncCount", resType, argTypes)
         pfCount = libGTFoldFunc(GTFPTypes.CString(baseSeq), GTFPTypes.FPConstraintsList(consList), 
                                 len(consList))
-        return str(pfCount)
+        return GTFoldPython._StoreCachedResult(cacheKey, str(pfCount))
     ##
     
     @staticmethod
@@ -405,6 +930,9 @@ class GTFoldPython:
            using SHAPE style constraints
            See options: --pfcount (with gtboltzmann), --useSHAPE FILE
         """
+        (cacheKey, cachedResult) = GTFoldPython._LookupCachedResult("GetPFuncCountSHAPE", baseSeq, consList)
+        if cachedResult != None:
+            return cachedResult
         GTFoldPython._ConstructLibGTFold()
         resType = ctypes.py_object
         argTypes = [ GTFPTypes.CStringType, GTFPTypes.SHAPEConstraintsListType(consList), 
@@ -413,14 +941,61 @@ class GTFoldPython:
         pfCount = libGTFoldFunc(GTFPTypes.CString(baseSeq), 
                                 GTFPTypes.SHAPEConstraintsList(consList), 
                                 len(consList))
-        return str(pfCount)
+        return GTFoldPython._StoreCachedResult(cacheKey, str(pfCount))
+    ##
+
+    @staticmethod
+    def _BPPMatrixFormatFlags(format, dtype):
+        if format not in [ "numpy", "packed" ] or dtype not in [ "float64", "float32" ]:
+            raise ValueError("Unsupported BPP format (%s) or dtype (%s)" % (format, dtype))
+        return (1 if format == "packed" else 0) | (2 if dtype == "float32" else 0)
+    ##
+
+    @staticmethod
+    def _BPPMatrixResult(bppMatrixData, numBases, format, dtype):
+        """Wrap the raw matrix bytes without copying them. Without numpy installed, an 
+           array.array with the same (flattened) layout is returned instead.
+        """
+        try:
+            import numpy
+        except ImportError:
+            return array.array('f' if dtype == "float32" else 'd', bppMatrixData)
+        bppMatrix = numpy.frombuffer(bppMatrixData, dtype = numpy.dtype(dtype))
+        return bppMatrix if format == "packed" else bppMatrix.reshape((numBases, numBases))
+    ##
+
+    @staticmethod
+    def _SampleBatchResult(pairTableData, energyData, numBases):
+        """The (pairTables, energies) of a batch of samples: a (batch x numBases) numpy array 
+           of the 1-based partners of the bases (zero if unpaired), and the vector of the 
+           sample energies. Without numpy installed, flat array.array objects are returned.
+        """
+        try:
+            import numpy
+        except ImportError:
+            return (array.array('i', pairTableData), array.array('d', energyData))
+        pairTables = numpy.frombuffer(pairTableData, dtype = numpy.intc).reshape((-1, numBases))
+        return (pairTables, numpy.frombuffer(energyData, dtype = numpy.float64))
     ##
 
     @staticmethod
-    def ComputeBPP(baseSeq, consList = []):
+    def ComputeBPP(baseSeq, consList = [], format = "list", dtype = "float64"):
         """Calculate base pair probabilities and unpaired probabilities (Beta feature)
            See options: --bpp (for use with gtboltzmann), -c, --constraints FILE
+
+        :param format: "list" for a list of (i, j, probability) tuples, "numpy" for the 
+                       symmetric n x n matrix as a numpy.ndarray, or "packed" for a 1D 
+                       ndarray of the n(n-1)/2 upper triangular entries (i < j, row by row)
+        :param dtype: "float64" or "float32" (for the "numpy" and "packed" formats)
         """
+        if format != "list":
+            return GTFoldPython._ComputeBPPMatrix("ComputeBPPMatrix", baseSeq, consList, 
+                                                  GTFPTypes.FPConstraintsListType(consList), 
+                                                  GTFPTypes.FPConstraintsList(consList), 
+                                                  format, dtype)
+        (cacheKey, cachedResult) = GTFoldPython._LookupCachedResult("ComputeBPP", baseSeq, consList)
+        if cachedResult != None:
+            return cachedResult
         GTFoldPython._ConstructLibGTFold()
         resType = ctypes.py_object
         argTypes = [ GTFPTypes.CStringType, GTFPTypes.FPConstraintsListType(consList), 
@@ -428,15 +1003,25 @@ class GTFoldPython:
         libGTFoldFunc = GTFoldPython._WrapCTypesFunction("ComputeBPP", resType, argTypes)
         bppTuple = libGTFoldFunc(GTFPTypes.CString(baseSeq), GTFPTypes.FPConstraintsList(consList), 
                                  len(consList))
-        return [ (int(i), int(j), float(p)) for (i, j, p) in bppTuple ]
+        bppList = [ (int(i), int(j), float(p)) for (i, j, p) in bppTuple ]
+        return GTFoldPython._StoreCachedResult(cacheKey, bppList)
    ##
 
     @staticmethod
-    def ComputeBPPSHAPE(baseSeq, consList = []):
+    def ComputeBPPSHAPE(baseSeq, consList = [], format = "list", dtype = "float64"):
         """Calculate base pair probabilities and unpaired probabilities (Beta feature) -- 
            use with with SHAPE style constraints 
            See options: --bpp (for use with gtboltzmann), --useSHAPE FILE
+           ::seealso GTFoldPython.ComputeBPP (for the format and dtype parameters)
         """
+        if format != "list":
+            return GTFoldPython._ComputeBPPMatrix("ComputeBPPMatrixSHAPE", baseSeq, consList, 
+                                                  GTFPTypes.SHAPEConstraintsListType(consList), 
+                                                  GTFPTypes.SHAPEConstraintsList(consList), 
+                                                  format, dtype)
+        (cacheKey, cachedResult) = GTFoldPython._LookupCachedResult("ComputeBPPSHAPE", baseSeq, consList)
+        if cachedResult != None:
+            return cachedResult
         GTFoldPython._ConstructLibGTFold()
         resType = ctypes.py_object
         argTypes = [ GTFPTypes.CStringType, GTFPTypes.SHAPEConstraintsListType(consList), 
@@ -444,7 +1029,93 @@ class GTFoldPython:
         libGTFoldFunc = GTFoldPython._WrapCTypesFunction("ComputeBPP", resType, argTypes)
         bppTuple = libGTFoldFunc(GTFPTypes.CString(baseSeq), GTFPTypes.SHAPEConstraintsList(consList), 
                                  len(consList))
-        return [ (int(i), int(j), float(p)) for (i, j, p) in bppTuple ]
+        bppList = [ (int(i), int(j), float(p)) for (i, j, p) in bppTuple ]
+        return GTFoldPython._StoreCachedResult(cacheKey, bppList)
+    ##
+
+    @staticmethod
+    def _ComputeBPPMatrix(funcName, baseSeq, consList, consListType, consListParam, format, dtype):
+        """The matrix results are cached as their zlib compressed raw bytes (most of the 
+           entries of a BPP matrix are zero), and the array is rebuilt on a cache hit
+        """
+        formatFlags = GTFoldPython._BPPMatrixFormatFlags(format, dtype)
+        (cacheKey, cachedResult) = GTFoldPython._LookupCachedResult(funcName, baseSeq, consList, 
+                                                                    format, dtype)
+        if cachedResult != None:
+            bppMatrixData = bytearray(zlib.decompress(cachedResult))
+            return GTFoldPython._BPPMatrixResult(bppMatrixData, len(baseSeq), format, dtype)
+        GTFoldPython._ConstructLibGTFold()
+        resType = ctypes.py_object
+        argTypes = [ GTFPTypes.CStringType, consListType, ctypes.c_int, ctypes.c_int ]
+        libGTFoldFunc = GTFoldPython._WrapCTypesFunction(funcName, resType, argTypes)
+        bppMatrixData = libGTFoldFunc(GTFPTypes.CString(baseSeq), consListParam, len(consList), 
+                                      ctypes.c_int(formatFlags))
+        if cacheKey != None:
+            GTFoldPython._StoreCachedResult(cacheKey, zlib.compress(bytes(bppMatrixData)))
+        return GTFoldPython._BPPMatrixResult(bppMatrixData, len(baseSeq), format, dtype)
+    ##
+
+    @staticmethod
+    def _ComputeBPPSparse(funcName, baseSeq, consListType, consListParam, numCons, 
+                          cutoff, topKPerBase, format):
+        if format not in [ "coo", "scipy" ]:
+            raise ValueError("Unsupported sparse BPP format (%s)" % format)
+        GTFoldPython._ConstructLibGTFold()
+        resType = ctypes.py_object
+        argTypes = [ GTFPTypes.CStringType, consListType, ctypes.c_int, ctypes.c_double, ctypes.c_int ]
+        libGTFoldFunc = GTFoldPython._WrapCTypesFunction(funcName, resType, argTypes)
+        topKPerBase = 0 if topKPerBase == None else int(topKPerBase)
+        (iData, jData, pData, unpairedData) = libGTFoldFunc(GTFPTypes.CString(baseSeq), consListParam, 
+                                                            numCons, ctypes.c_double(cutoff), 
+                                                            ctypes.c_int(topKPerBase))
+        try:
+            import numpy
+            (iIndices, jIndices) = (numpy.frombuffer(iData, dtype = numpy.intc), 
+                                    numpy.frombuffer(jData, dtype = numpy.intc))
+            (pairProbs, unpairedProbs) = (numpy.frombuffer(pData, dtype = numpy.float64), 
+                                          numpy.frombuffer(unpairedData, dtype = numpy.float64))
+        except ImportError:
+            (iIndices, jIndices) = (array.array('i', iData), array.array('i', jData))
+            (pairProbs, unpairedProbs) = (array.array('d', pData), array.array('d', unpairedData))
+        if format == "scipy":
+            import scipy.sparse
+            bppMatrix = scipy.sparse.coo_matrix((pairProbs, (iIndices, jIndices)), 
+                                                shape = (len(baseSeq), len(baseSeq)))
+            return (bppMatrix, unpairedProbs)
+        return (iIndices, jIndices, pairProbs, unpairedProbs)
+    ##
+
+    @staticmethod
+    def ComputeBPPSparse(baseSeq, consList = [], cutoff = 1e-4, topKPerBase = None, format = "coo"):
+        """Calculate the significant base pair probabilities only. The pairs are filtered 
+           in the library, so the cost of the result scales with the number of pairs kept 
+           instead of with n^2. 
+
+        :param cutoff: Only keep the pairs with probability >= cutoff
+        :param topKPerBase: If set, only keep the pairs that are among the topKPerBase most 
+                            likely pairs of (at least) one of their two bases
+        :param format: "coo" or "scipy"
+        :return: For "coo", a tuple (i, j, p, unpaired) of numpy arrays (array.array objects 
+                 when numpy is not installed) with the 0-based positions i < j of each pair 
+                 kept, its probability p, and the unpaired probability of every base. 
+                 For "scipy", a tuple (scipy.sparse.coo_matrix of the upper triangle, unpaired)
+        ::seealso GTFoldPython.ComputeBPP
+        """
+        return GTFoldPython._ComputeBPPSparse("ComputeBPPSparse", baseSeq, 
+                                              GTFPTypes.FPConstraintsListType(consList), 
+                                              GTFPTypes.FPConstraintsList(consList), len(consList), 
+                                              cutoff, topKPerBase, format)
+    ##
+
+    @staticmethod
+    def ComputeBPPSparseSHAPE(baseSeq, consList = [], cutoff = 1e-4, topKPerBase = None, format = "coo"):
+        """Sparse base pair probabilities with SHAPE style constraints
+           ::seealso GTFoldPython.ComputeBPPSparse
+        """
+        return GTFoldPython._ComputeBPPSparse("ComputeBPPSparseSHAPE", baseSeq, 
+                                              GTFPTypes.SHAPEConstraintsListType(consList), 
+                                              GTFPTypes.SHAPEConstraintsList(consList), len(consList), 
+                                              cutoff, topKPerBase, format)
     ##
 
     @staticmethod
@@ -456,18 +1127,24 @@ class GTFoldPython:
         :return: A tuple (MFE as double, MFE structure as string in DOTBracket notation)
         :rtype: tuple
         """
+        (cacheKey, cachedResult) = GTFoldPython._LookupCachedResult("GetMFEStructure", baseSeq, consList)
+        if cachedResult != None:
+            return cachedResult
         GTFoldPython._ConstructLibGTFold()
         resType = ctypes.py_object
         argTypes = [ GTFPTypes.CStringType, GTFPTypes.FPConstraintsListType(consList), ctypes.c_int ]
         libGTFoldFunc = GTFoldPython._WrapCTypesFunction("GetMFEStructure", resType, argTypes)
         (mfe, mfeStruct) = libGTFoldFunc(GTFPTypes.CString(baseSeq), GTFPTypes.FPConstraintsList(consList), 
                                          len(consList))
-        return (float(mfe), str(mfeStruct))
+        return GTFoldPython._StoreCachedResult(cacheKey, (float(mfe), str(mfeStruct)))
     ##
 
     @staticmethod
     def GetMFEStructureSHAPE(baseSeq, shapeConsList = []):
         """Compute the MFE and MFE structure using SHAPE based constraints"""
+        (cacheKey, cachedResult) = GTFoldPython._LookupCachedResult("GetMFEStructureSHAPE", baseSeq, shapeConsList)
+        if cachedResult != None:
+            return cachedResult
         GTFoldPython._ConstructLibGTFold()
         resType = ctypes.py_object
         argTypes = [ GTFPTypes.CStringType, GTFPTypes.SHAPEConstraintsListType(shapeConsList), ctypes.c_int ]
@@ -476,59 +1153,407 @@ class GTFoldPython:
         shapeConsParam = GTFPTypes.SHAPEConstraintsList(shapeConsList)
         numConsParam = len(shapeConsList)
         (mfe, mfeStruct) = libGTFoldFunc(baseSeqParam, shapeConsParam, numConsParam)
-        return (float(mfe), str(mfeStruct))
+        return GTFoldPython._StoreCachedResult(cacheKey, (float(mfe), str(mfeStruct)))
+    ##
+
+    @staticmethod
+    def GetMFEStructureBatch(baseSeqs, consLists = None, threadsPerFold = 0):
+        """Compute the MFE and MFE structure of every sequence in a list (or other iterable) 
+           with one call into the library. The energy model and settings are only set up 
+           once, and the GIL is released for the whole batch. The sequences are still folded 
+           one after the other, so the batch only saves the per-call overhead (to fold them 
+           in parallel, ::seealso GTFoldPythonPool). 
+
+        :param baseSeqs: An iterable of strings of valid bases (ATGU/X)
+        :param consLists: None, or one list of constraints per sequence
+        :param threadsPerFold: Number of OpenMP threads used by the engine within each fold 
+                               (0 keeps the current setting)
+        :return: A tuple (array.array('d') of MFEs, list of MFE structures in DOTBracket notation). 
+                 The MFE array supports the buffer protocol, e.g., numpy.frombuffer(mfeArray)
+        :rtype: tuple
+        ::seealso GTFoldPython.GetMFEStructure
+        """
+        GTFoldPython._ConstructLibGTFold()
+        baseSeqs = list(baseSeqs)
+        if consLists != None:
+            consLists = list(consLists)
+        resType = ctypes.py_object
+        argTypes = [ ctypes.py_object, ctypes.py_object, ctypes.c_int ]
+        libGTFoldFunc = GTFoldPython._WrapCTypesFunction("GetMFEStructureBatch", resType, argTypes)
+        (mfeList, mfeStructList) = libGTFoldFunc(baseSeqs, consLists, ctypes.c_int(threadsPerFold))
+        return (array.array('d', mfeList), mfeStructList)
     ##
 
     @staticmethod
-    def GetSuboptStructures(baseSeq, delta):
+    def GetSuboptStructures(baseSeq, delta, numThreads = 1):
         """Compute suboptimal structures within DOUBLE kcal/mole of MFE.
+           With numThreads other than one, the traceback is split over that many threads 
+           (zero uses the numthreads setting), which returns the same structures, except 
+           that with the maxcount setting which of them are kept can vary between runs. 
            - Dangle option can only be set to INT=2
            See options: --delta DOUBLE (for use with gtsubopt)
         """
+        if int(numThreads) < 0:
+            raise ValueError("Invalid number of threads (%s)" % numThreads)
+        (cacheKey, cachedResult) = GTFoldPython._LookupCachedResult("GetSuboptStructures", baseSeq, delta)
+        if cachedResult != None:
+            return cachedResult
         GTFoldPython._ConstructLibGTFold()
         resType = ctypes.py_object
-        argTypes = [ GTFPTypes.CStringType, ctypes.c_double ]
+        argTypes = [ GTFPTypes.CStringType, ctypes.c_double, ctypes.c_int ]
         libGTFoldFunc = GTFoldPython._WrapCTypesFunction("GetSuboptStructuresWithinRange", resType, argTypes)
-        structTupleLst = libGTFoldFunc(GTFPTypes.CString(baseSeq), ctypes.c_double(delta))
+        structTupleLst = libGTFoldFunc(GTFPTypes.CString(baseSeq), ctypes.c_double(delta), ctypes.c_int(int(numThreads)))
         structTupleLst = [ (str(struct), int(e)) for (struct, e) in structTupleLst ]
-        return structTupleLst
+        return GTFoldPython._StoreCachedResult(cacheKey, structTupleLst)
+    ##
+
+    @staticmethod
+    def GetKBestStructures(baseSeq, k):
+        """Compute the INT (param k > 0) lowest energy structures, as (dotStruct, energy) tuples 
+           in the order of increasing energy, instead of all structures within an energy range. 
+           Memory use is bounded by k rather than by the number of structures in the range. 
+           - Dangle option can only be set to INT=2
+           - Always uses the unique multiloop decomposition (so for sequences under 1500 nt)
+        """
+        if int(k) <= 0:
+            raise ValueError("Invalid number of structures (%s)" % k)
+        (cacheKey, cachedResult) = GTFoldPython._LookupCachedResult("GetKBestStructures", baseSeq, k)
+        if cachedResult != None:
+            return cachedResult
+        GTFoldPython._ConstructLibGTFold()
+        resType = ctypes.py_object
+        argTypes = [ GTFPTypes.CStringType, ctypes.c_int ]
+        libGTFoldFunc = GTFoldPython._WrapCTypesFunction("GetKBestStructures", resType, argTypes)
+        structTupleLst = libGTFoldFunc(GTFPTypes.CString(baseSeq), ctypes.c_int(int(k)))
+        structTupleLst = [ (str(struct), int(e)) for (struct, e) in structTupleLst ]
+        return GTFoldPython._StoreCachedResult(cacheKey, structTupleLst)
+    ##
+
+    @staticmethod
+    def GetEnergyBandHistogram(baseSeq, delta, binWidth = 0.1):
+        """Count the suboptimal structures within DOUBLE kcal/mole of MFE by energy, without 
+           enumerating them: entry k of the list is the (exact) number of structures with the 
+           energies in [MFE + k * binWidth, MFE + (k + 1) * binWidth), so that the sum of the 
+           list is the number of structures GetSuboptStructures(baseSeq, delta) would return. 
+           The counts are computed over the MFE arrays in time polynomial in the sequence 
+           length and delta / 0.01 (however many structures there are). 
+           - Dangle option can only be set to INT=2
+           - Always uses the unique multiloop decomposition (so for sequences under 1500 nt)
+        """
+        if delta < 0 or binWidth <= 0:
+            raise ValueError("Invalid energy band histogram range (%s) or bin width (%s)" % (delta, binWidth))
+        (cacheKey, cachedResult) = GTFoldPython._LookupCachedResult("GetEnergyBandHistogram", baseSeq, delta, binWidth)
+        if cachedResult != None:
+            return cachedResult
+        GTFoldPython._ConstructLibGTFold()
+        resType = ctypes.py_object
+        argTypes = [ GTFPTypes.CStringType, ctypes.c_double, ctypes.c_double ]
+        libGTFoldFunc = GTFoldPython._WrapCTypesFunction("GetEnergyBandHistogram", resType, argTypes)
+        bandCounts = libGTFoldFunc(GTFPTypes.CString(baseSeq), ctypes.c_double(delta), ctypes.c_double(binWidth))
+        return GTFoldPython._StoreCachedResult(cacheKey, [ int(count) for count in bandCounts ])
     ##
 
     @staticmethod
-    def SampleBoltzmannStructures(baseSeq, N, consList = []):
+    def IterSuboptStructures(baseSeq, delta, maxCount = None):
+        """Generate the suboptimal structures within DOUBLE kcal/mole of MFE as (dotStruct, energy) 
+           tuples in the order the traceback finds them, without collecting them in memory. 
+           Closing the generator (e.g., with a break out of the loop over it) stops the traceback. 
+           - Dangle option can only be set to INT=2
+           - There is no check for duplicate structures (--duplicatecheck is ignored), and the 
+             structures are not written to the subopt file
+           - The library is in use until the generator is exhausted or closed, so the loop over 
+             it cannot call other GTFoldPython functions (a RuntimeError is raised if it does)
+           See options: --delta DOUBLE, --maxcount INT (for use with gtsubopt)
+        :param maxCount: Stop after INT structures (None for the "maxcount" setting)
+        """
+        if maxCount != None and int(maxCount) <= 0:
+            raise ValueError("Invalid maximum structure count (%s)" % maxCount)
+        GTFoldPython._ConstructLibGTFold()
+        resType = ctypes.py_object
+        argTypes = [ GTFPTypes.CStringType, ctypes.c_double, ctypes.c_int, ctypes.py_object ]
+        libGTFoldFunc = GTFoldPython._WrapCTypesFunction("GetSuboptStructuresStream", resType, argTypes)
+        def TracebackStructures(emitFunc):
+            libGTFoldFunc(GTFPTypes.CString(baseSeq), ctypes.c_double(delta), 
+                          ctypes.c_int(0 if maxCount == None else int(maxCount)), 
+                          lambda struct, e: emitFunc((str(struct), int(e))))
+        consumerThread = threading.get_ident()
+        streamThreads = GTFoldPython._engineStreamThreads
+        streamThreads[consumerThread] = streamThreads.get(consumerThread, 0) + 1
+        try:
+            for structTuple in GTFoldPython._BackgroundIterator(TracebackStructures, 256):
+                yield structTuple
+        finally:
+            streamThreads[consumerThread] -= 1
+            if streamThreads[consumerThread] == 0:
+                del streamThreads[consumerThread]
+    ##
+
+    @staticmethod
+    def _BackgroundIterator(produceFunc, maxPending = 1):
+        """Generate the items which produceFunc(emitFunc) passes to emitFunc in a background 
+           thread, with at most maxPending of them waiting to be consumed. Once the generator 
+           is closed, emitFunc returns False (and the producer should stop). Exceptions 
+           raised by produceFunc are raised in the consumer. 
+        """
+        itemQueue, stopEvent = queue.Queue(maxsize = maxPending), threading.Event()
+        producerDone = object()
+        def PutItem(item):
+            while not stopEvent.is_set():
+                try:
+                    itemQueue.put(item, timeout = 0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+        def ProduceItems():
+            try:
+                produceFunc(lambda item: PutItem((item, None)))
+                PutItem((producerDone, None))
+            except Exception as excInst:
+                PutItem((None, excInst))
+        producerThread = threading.Thread(target = ProduceItems, daemon = True)
+        producerThread.start()
+        try:
+            while True:
+                (item, excInst) = itemQueue.get()
+                if excInst != None:
+                    raise excInst
+                elif item is producerDone:
+                    return
+                yield item
+        finally:
+            stopEvent.set()
+            producerThread.join()
+    ##
+
+    @staticmethod
+    def _SamplingSeed(seed):
+        """The seed argument of the sampling functions as passed to the library (where a 
+           negative seed means a new one from the clock for each call)
+        """
+        if seed == None:
+            return ctypes.c_longlong(-1)
+        elif int(seed) < 0:
+            raise ValueError("The sampling seed must be a non-negative integer (%s)" % seed)
+        return ctypes.c_longlong(int(seed) & 0x7fffffffffffffff)
+    ##
+
+    @staticmethod
+    def _SampleShard(shard, N):
+        """The (index, count) arguments of the sampling functions for shard = None or (k, K)"""
+        if shard == None:
+            return (ctypes.c_int(0), ctypes.c_int(0))
+        (shardIndex, shardCount) = shard
+        if shardCount <= 0 or not 0 <= shardIndex < shardCount:
+            raise ValueError("Invalid sample shard (%s of %s)" % (shardIndex, shardCount))
+        elif shardCount > N:
+            raise ValueError("More sample shards than samples (%s > %s)" % (shardCount, N))
+        return (ctypes.c_int(shardIndex), ctypes.c_int(shardCount))
+    ##
+
+    @staticmethod
+    def _SamplePairCounts(structures):
+        """The number of samples in which each pair (i, j) (1 <= i < j) occurs"""
+        pairCounts = dict([])
+        for (dotStruct, (count, energy)) in structures.items():
+            unpairedStack = [ ]
+            for (pidx, pairCh) in enumerate(dotStruct):
+                if pairCh == "(":
+                    unpairedStack.append(pidx + 1)
+                elif pairCh == ")":
+                    basePair = (unpairedStack.pop(), pidx + 1)
+                    pairCounts[basePair] = pairCounts.get(basePair, 0) + count
+        return pairCounts
+    ##
+
+    @staticmethod
+    def _SampleSummary(summaryTupleLst, N, seed, shard, pairCounts):
+        structures = dict([ (str(struct), (int(count), float(e))) for (struct, count, e) in summaryTupleLst ])
+        return {
+            "seed"        : seed, 
+            "batch_size"  : N, 
+            "shards"      : [ (seed, ) + tuple(shard) ], 
+            "num_samples" : sum([ count for (count, e) in structures.values() ]), 
+            "structures"  : structures, 
+            "pair_counts" : GTFoldPython._SamplePairCounts(structures) if pairCounts else None, 
+        }
+    ##
+
+    @staticmethod
+    def MergeSampleSummaries(summaries):
+        """Combine the summaries of the shards of one or more sampling runs (returned by 
+           SampleBoltzmannStructures with shard = (k, K)) into one summary of the same form. 
+           The counts are added exactly, so merging all K shards of N samples with the same 
+           seed gives the summary of the whole batch of N samples. Each shard is identified 
+           by (seed, k, K) in "shards" (with N in "batch_size"), so shards of different seeds 
+           can be merged, but all summaries must be for the same N. The "pair_counts" are only 
+           kept if every summary has them. 
+        """
+        summaries = list(summaries)
+        if len(summaries) == 0:
+            raise ValueError("No sample summaries to merge")
+        batchSizes = set([ summary["batch_size"] for summary in summaries ])
+        if len(batchSizes) != 1:
+            raise ValueError("The sample summaries are for different batch sizes (%s)" % sorted(batchSizes))
+        mergedShards, structures = [ ], dict([])
+        pairCounts = dict([]) if all([ s["pair_counts"] != None for s in summaries ]) else None
+        for summary in summaries:
+            for shard in summary["shards"]:
+                if shard in mergedShards:
+                    raise ValueError("Sample shard %s of %s (seed %s) is merged more than once" % \
+                                     (shard[1], shard[2], shard[0]))
+                mergedShards.append(shard)
+            for (dotStruct, (count, energy)) in summary["structures"].items():
+                (prevCount, prevEnergy) = structures.get(dotStruct, (0, energy))
+                structures[dotStruct] = (prevCount + count, prevEnergy)
+            if pairCounts != None:
+                for (basePair, count) in summary["pair_counts"].items():
+                    pairCounts[basePair] = pairCounts.get(basePair, 0) + count
+        seeds = set([ summary["seed"] for summary in summaries ])
+        return {
+            "seed"        : seeds.pop() if len(seeds) == 1 else None, 
+            "batch_size"  : batchSizes.pop(), 
+            "shards"      : sorted(mergedShards, key = lambda shard: \
+                                   (-1 if shard[0] == None else shard[0], shard[2], shard[1])), 
+            "num_samples" : sum([ summary["num_samples"] for summary in summaries ]), 
+            "structures"  : structures, 
+            "pair_counts" : pairCounts, 
+        }
+    ##
+
+    @staticmethod
+    def SampleBoltzmannStructures(baseSeq, N, consList = [], seed = None, shard = None, 
+                                  pairCounts = False):
         """Sample INT (param N > 0) structures from Boltzmann distribution 
            See options: -s, --sample INT (for use with gtboltzman), -c, --constraints FILE
+
+        :param seed: An integer seed to make the samples reproducible: the k-th sample only 
+                     depends on the seed and on k (not on the number of threads used), or 
+                     None for a new seed from the clock on each call
+        :param shard: None, or (k, K) to only draw the k-th (0 <= k < K <= N) of K equal parts 
+                      of the N samples (e.g., on different nodes). All K shards of one seed 
+                      together draw exactly the N samples of the unsharded call
+        :param pairCounts: Whether the summary of a shard includes the pair frequencies
+        :return: A list of (estProb, actualProb, energy, dotStruct) tuples, or for a shard, a 
+                 summary dict with "seed", "batch_size" (N), "shards", "num_samples", "structures" (a dict 
+                 which maps each sampled dotStruct to (count, energy)) and "pair_counts" 
+                 (a dict which maps (i, j) to the number of samples with the pair, or None) 
+                 ::seealso GTFoldPython.MergeSampleSummaries
         """
+        (shardIndex, shardCount) = GTFoldPython._SampleShard(shard, N)
         GTFoldPython._ConstructLibGTFold()
         resType = ctypes.py_object
         argTypes = [ GTFPTypes.CStringType, GTFPTypes.FPConstraintsListType(consList), 
-                     ctypes.c_int, ctypes.c_int ]
+                     ctypes.c_int, ctypes.c_int, ctypes.c_longlong, ctypes.c_int, ctypes.c_int ]
         libGTFoldFunc = GTFoldPython._WrapCTypesFunction("SampleBoltzmannStructures", resType, argTypes)
         structTupleLst = libGTFoldFunc(GTFPTypes.CString(baseSeq), GTFPTypes.FPConstraintsList(consList), 
-                                       ctypes.c_int(len(consList)), ctypes.c_int(N))
+                                       ctypes.c_int(len(consList)), ctypes.c_int(N), 
+                                       GTFoldPython._SamplingSeed(seed), shardIndex, shardCount)
+        if shard != None:
+            return GTFoldPython._SampleSummary(structTupleLst, N, seed, shard, pairCounts)
         structTupleLst = [ (float(ep), float(ap), float(e), str(struct)) for \
                                 (ep, ap, e, struct) in structTupleLst ]
         return structTupleLst
     ##
 
     @staticmethod
-    def SampleBoltzmannStructuresSHAPE(baseSeq, N, consList = []):
+    def SampleBoltzmannStructuresSHAPE(baseSeq, N, consList = [], seed = None, shard = None, 
+                                       pairCounts = False):
         """Sample INT (param N > 0) structures from Boltzmann distribution -- 
            using SHAPE style constraints 
            See options: -s, --sample INT (for use with gtboltzman), --useSHAPE FILE
+           ::seealso GTFoldPython.SampleBoltzmannStructures (for the seed, shard and pairCounts parameters)
         """
+        (shardIndex, shardCount) = GTFoldPython._SampleShard(shard, N)
         GTFoldPython._ConstructLibGTFold()
         resType = ctypes.py_object
         argTypes = [ GTFPTypes.CStringType, GTFPTypes.SHAPEConstraintsListType(consList), 
-                     ctypes.c_int, ctypes.c_int ]
+                     ctypes.c_int, ctypes.c_int, ctypes.c_longlong, ctypes.c_int, ctypes.c_int ]
         libGTFoldFunc = GTFoldPython._WrapCTypesFunction("SampleBoltzmannStructuresSHAPE", resType, argTypes)
         structTupleLst = libGTFoldFunc(GTFPTypes.CString(baseSeq), GTFPTypes.SHAPEConstraintsList(consList), 
-                                       c_types.c_int(len(consList)), ctypes.c_int(N))
+                                       ctypes.c_int(len(consList)), ctypes.c_int(N), 
+                                       GTFoldPython._SamplingSeed(seed), shardIndex, shardCount)
+        if shard != None:
+            return GTFoldPython._SampleSummary(structTupleLst, N, seed, shard, pairCounts)
         structTupleLst = [ (float(ep), float(ap), float(e), str(struct)) for \
                                 (ep, ap, e, struct) in structTupleLst ]
         return structTupleLst
     ##
 
+    @staticmethod
+    def IterBoltzmannSamples(baseSeq, N, batch = 1024, consList = [], seed = None, prefetch = True):
+        """Generate N samples from the Boltzmann distribution in batches of (at most) batch 
+           samples, without collecting them: memory use is bounded by a few batches 
+           ::seealso GTFoldBoltzmannSampler.IterSamples
+        """
+        with GTFoldBoltzmannSampler(baseSeq, consList) as sampler:
+            for batchResult in sampler.IterSamples(N, batch, seed, prefetch):
+                yield batchResult
+    ##
+
+    @staticmethod
+    def Analyze(baseSeq, want = ("mfe", "pf", "bpp"), consList = [], bppFormat = "packed", 
+                dtype = "float64", seed = None):
+        """Compute several results for one sequence with a single call into the library. 
+           The MFE arrays and the (-d2) partition function arrays are each only filled once: 
+           the "mfe" and "subopt" stages share the MFE fill, and the "pf", "bpp" and 
+           "samples" stages share the partition function fill. Requires dangle = 2. 
+
+        :param want: The stages to compute, as an iterable of stage names, or as a dict 
+                     which maps the stage names to True, except for "samples" which maps to 
+                     the number of samples N, and "subopt" which maps to delta (in kcal/mol), 
+                     e.g., { "mfe" : True, "bpp" : True, "samples" : 1000, "subopt" : 2.0 }
+        :param bppFormat: "numpy" or "packed" (::seealso GTFoldPython.ComputeBPP)
+        :param seed: The seed of the "samples" stage (::seealso GTFoldPython.SampleBoltzmannStructures)
+        :return: A dict with an entry for each stage in want: "mfe" as in GetMFEStructure, 
+                 "subopt" as in GetSuboptStructures, "pf" (the partition function, together 
+                 with "ensemble_energy", the ensemble free energy in kcal/mol), "bpp" as in 
+                 ComputeBPP, and "samples" as in SampleBoltzmannStructures
+        :rtype: dict
+        """
+        stageParams = dict(want) if isinstance(want, dict) else dict([ (stage, True) for stage in want ])
+        wantFlags = 0
+        for (stage, stageParam) in stageParams.items():
+            if stage not in GTFoldPython._analyzeStageFlags:
+                raise ValueError("Unsupported Analyze stage (%s)" % stage)
+            elif stageParam not in [ None, False ]:
+                wantFlags |= GTFoldPython._analyzeStageFlags[stage]
+        numSamples = stageParams.get("samples", None)
+        numSamples = GTFoldPython.ANALYZE_DEFAULT_SAMPLES if numSamples in [ None, True ] else int(numSamples)
+        suboptDelta = stageParams.get("subopt", None)
+        suboptDelta = GTFoldPython.ANALYZE_DEFAULT_SUBOPT_DELTA if suboptDelta in [ None, True ] else \
+                      float(suboptDelta)
+        bppFormatFlags = GTFoldPython._BPPMatrixFormatFlags(bppFormat, dtype)
+        GTFoldPython._ConstructLibGTFold()
+        resType = ctypes.py_object
+        argTypes = [ GTFPTypes.CStringType, GTFPTypes.FPConstraintsListType(consList), ctypes.c_int, 
+                     ctypes.c_int, ctypes.c_int, ctypes.c_double, ctypes.c_int, ctypes.c_longlong ]
+        libGTFoldFunc = GTFoldPython._WrapCTypesFunction("Analyze", resType, argTypes)
+        (mfeTuple, suboptList, (pfTuple, bppMatrixData, sampleList)) = \
+             libGTFoldFunc(GTFPTypes.CString(baseSeq), GTFPTypes.FPConstraintsList(consList), 
+                           ctypes.c_int(len(consList)), ctypes.c_int(wantFlags), 
+                           ctypes.c_int(numSamples), ctypes.c_double(suboptDelta), 
+                           ctypes.c_int(bppFormatFlags), GTFoldPython._SamplingSeed(seed))
+        analysis = dict([])
+        if mfeTuple != None:
+            analysis["mfe"] = (float(mfeTuple[0]), str(mfeTuple[1]))
+        if suboptList != None:
+            analysis["subopt"] = [ (str(struct), int(e)) for (struct, e) in suboptList ]
+        if pfTuple != None and wantFlags & GTFoldPython._analyzeStageFlags["pf"]:
+            (logPFunc, ensembleEnergy) = pfTuple
+            try:
+                analysis["pf"] = math.exp(logPFunc)
+            except OverflowError:
+                analysis["pf"] = float("inf")
+            analysis["ensemble_energy"] = float(ensembleEnergy)
+        if bppMatrixData != None:
+            analysis["bpp"] = GTFoldPython._BPPMatrixResult(bppMatrixData, len(baseSeq), bppFormat, dtype)
+        if sampleList != None:
+            analysis["samples"] = [ (float(ep), float(ap), float(e), str(struct)) for \
+                                         (ep, ap, e, struct) in sampleList ]
+        return analysis
+    ##
+
     @staticmethod
     def DisplayDetailedHelp():
         """Display detailed help message. Includes examples and additional options useful to developers.
@@ -555,3 +1580,303 @@ class GTFoldPython:
     ##
 
 ## class GTFoldPython
+
+class GTFoldContext:
+    """
+    GTFoldContext : per-call settings isolation. A context keeps its own copy of the 
+    GTFold settings (energy model, dangle, terminal mismatch, contact distance, 
+    prefilter and the ConfigExtraSettings options) together with its own last error 
+    state. Calls made through a context (or inside its with block) do not see (or 
+    change) the process-wide settings, and the result cache keys use the context 
+    settings. There is still only one GTFold engine, so the folds are serialized: 
+    the engine is switched over to the context settings for the length of each 
+    library call, and any other thread calling into the library waits for it. The 
+    with block itself does not hold the engine between calls.
+
+    Usage:
+    >>> ctx = GTFoldContext("Turner99", dangle=2)
+    >>> (mfe, mfeStruct) = ctx.GetMFEStructure(baseSeq)
+    >>> with ctx:
+    ...     GTFoldPython.SetPrefilterParameter(2)
+    ...     (mfe, mfeStruct) = GTFoldPython.GetMFEStructure(baseSeq)
+    """
+
+    def __init__(self, energyModelName = None, baseDataDir = None, dangle = None, 
+                 tmismatch = None, limitcdist = None, prefilter = None):
+        GTFoldPython._ConstructLibGTFold(False)
+        resType = ctypes.py_object
+        argTypes = []
+        libGTFoldFunc = GTFoldPython._WrapCTypesFunction("GTFoldContextNew", resType, argTypes)
+        self._ctxHandle = libGTFoldFunc()
+        # Like the library settings, the Python side settings start out as the current ones:
+        self._pyConfig = dict([ (attrName, GTFoldPython._GetConfig(attrName)) for attrName in \
+                                GTFoldPython._contextConfigNames ])
+        self._savedThreadStates = dict([])
+        self._engineThreads = set([])
+        with self:
+            if energyModelName != None:
+                GTFoldPython.SetThermodynamicParameters(energyModelName, baseDataDir)
+            if dangle != None:
+                GTFoldPython.SetDangleParameter(dangle)
+            if tmismatch != None:
+                GTFoldPython.SetTerminalMismatch(tmismatch)
+            if limitcdist != None:
+                GTFoldPython.SetLimitContactDistance(limitcdist)
+            if prefilter != None:
+                GTFoldPython.SetPrefilterParameter(prefilter)
+    ##
+
+    def __enter__(self):
+        """Make this context the active one for the calling thread: until the matching 
+           __exit__ (from the same thread), the GTFoldPython setters and library calls 
+           made by the thread use the settings of this context.
+        """
+        threadIdent = threading.get_ident()
+        if threadIdent in self._savedThreadStates:
+            raise RuntimeError("The GTFoldContext is already active in this thread")
+        GTFoldPython._ConstructLibGTFold(False)
+        ctxThreadState = GTFoldPython._contextThreadState
+        self._savedThreadStates[threadIdent] = (getattr(ctxThreadState, "activeContext", None), 
+                                                getattr(ctxThreadState, "activeConfig", None))
+        ctxThreadState.activeContext = self
+        ctxThreadState.activeConfig = self._pyConfig
+        return self
+    ##
+
+    def __exit__(self, excType, excValue, excTraceback):
+        threadIdent = threading.get_ident()
+        if threadIdent not in self._savedThreadStates:
+            raise RuntimeError("A GTFoldContext can only be exited by the thread which entered it")
+        ctxThreadState = GTFoldPython._contextThreadState
+        (ctxThreadState.activeContext, ctxThreadState.activeConfig) = \
+                self._savedThreadStates.pop(threadIdent)
+        return False
+    ##
+
+    def _CallInContext(self, gtfpFunc, *args, **kwargs):
+        if threading.get_ident() in self._savedThreadStates:
+            return gtfpFunc(*args, **kwargs)
+        with self:
+            return gtfpFunc(*args, **kwargs)
+    ##
+
+    def _CallInEngine(self, libGTFoldFunc, *args):
+        """Run one library call with the engine switched over to the settings of this context"""
+        threadIdent = threading.get_ident()
+        if threadIdent in self._engineThreads:
+            return libGTFoldFunc(*args)
+        resType = ctypes.py_object
+        argTypes = [ ctypes.py_object ]
+        enterFunc = GTFoldPython._WrapCTypesFunction("GTFoldContextEnter", resType, argTypes)
+        exitFunc = GTFoldPython._WrapCTypesFunction("GTFoldContextExit", resType, argTypes)
+        enterFunc(self._ctxHandle)
+        self._engineThreads.add(threadIdent)
+        try:
+            return libGTFoldFunc(*args)
+        finally:
+            self._engineThreads.discard(threadIdent)
+            exitFunc(self._ctxHandle)
+    ##
+
+    def GetLastError(self):
+        """Get the last error raised by a call made in this context.
+        :return: A tuple (error code as int, error message as string)
+        """
+        GTFoldPython._ConstructLibGTFold(False)
+        resType = ctypes.py_object
+        argTypes = [ ctypes.py_object ]
+        libGTFoldFunc = GTFoldPython._WrapCTypesFunction("GTFoldContextGetLastError", resType, argTypes)
+        (errorCode, errorMsg) = libGTFoldFunc(self._ctxHandle)
+        return (int(errorCode), str(errorMsg))
+    ##
+
+    def SetThermodynamicParameters(self, energyModelName, baseDataDir = None):
+        """::seealso GTFoldPython.SetThermodynamicParameters"""
+        return self._CallInContext(GTFoldPython.SetThermodynamicParameters, energyModelName, baseDataDir)
+    ##
+
+    def SetDangleParameter(self, dangle):
+        """::seealso GTFoldPython.SetDangleParameter"""
+        return self._CallInContext(GTFoldPython.SetDangleParameter, dangle)
+    ##
+
+    def SetTerminalMismatch(self, enable):
+        """::seealso GTFoldPython.SetTerminalMismatch"""
+        return self._CallInContext(GTFoldPython.SetTerminalMismatch, enable)
+    ##
+
+    def SetLimitContactDistance(self, lcDist):
+        """::seealso GTFoldPython.SetLimitContactDistance"""
+        return self._CallInContext(GTFoldPython.SetLimitContactDistance, lcDist)
+    ##
+
+    def SetPrefilterParameter(self, prefilter):
+        """::seealso GTFoldPython.SetPrefilterParameter"""
+        return self._CallInContext(GTFoldPython.SetPrefilterParameter, prefilter)
+    ##
+
+    def ConfigExtraSettings(self, kwargs):
+        """::seealso GTFoldPython.ConfigExtraSettings"""
+        return self._CallInContext(GTFoldPython.ConfigExtraSettings, kwargs)
+    ##
+
+    def GetPFuncCount(self, baseSeq, consList = []):
+        """::seealso GTFoldPython.GetPFuncCount"""
+        return self._CallInContext(GTFoldPython.GetPFuncCount, baseSeq, consList)
+    ##
+
+    def ComputeBPP(self, baseSeq, consList = [], format = "list", dtype = "float64"):
+        """::seealso GTFoldPython.ComputeBPP"""
+        return self._CallInContext(GTFoldPython.ComputeBPP, baseSeq, consList, format, dtype)
+    ##
+
+    def ComputeBPPSparse(self, baseSeq, consList = [], cutoff = 1e-4, topKPerBase = None, format = "coo"):
+        """::seealso GTFoldPython.ComputeBPPSparse"""
+        return self._CallInContext(GTFoldPython.ComputeBPPSparse, baseSeq, consList, cutoff, 
+                                   topKPerBase, format)
+    ##
+
+    def GetMFEStructure(self, baseSeq, consList = []):
+        """::seealso GTFoldPython.GetMFEStructure"""
+        return self._CallInContext(GTFoldPython.GetMFEStructure, baseSeq, consList)
+    ##
+
+    def GetMFEStructureSHAPE(self, baseSeq, shapeConsList = []):
+        """::seealso GTFoldPython.GetMFEStructureSHAPE"""
+        return self._CallInContext(GTFoldPython.GetMFEStructureSHAPE, baseSeq, shapeConsList)
+    ##
+
+    def GetSuboptStructures(self, baseSeq, delta, numThreads = 1):
+        """::seealso GTFoldPython.GetSuboptStructures"""
+        return self._CallInContext(GTFoldPython.GetSuboptStructures, baseSeq, delta, numThreads)
+    ##
+
+    def GetKBestStructures(self, baseSeq, k):
+        """::seealso GTFoldPython.GetKBestStructures"""
+        return self._CallInContext(GTFoldPython.GetKBestStructures, baseSeq, k)
+    ##
+
+    def GetEnergyBandHistogram(self, baseSeq, delta, binWidth = 0.1):
+        """::seealso GTFoldPython.GetEnergyBandHistogram"""
+        return self._CallInContext(GTFoldPython.GetEnergyBandHistogram, baseSeq, delta, binWidth)
+    ##
+
+    def SampleBoltzmannStructures(self, baseSeq, N, consList = [], seed = None, shard = None, 
+                                  pairCounts = False):
+        """::seealso GTFoldPython.SampleBoltzmannStructures"""
+        return self._CallInContext(GTFoldPython.SampleBoltzmannStructures, baseSeq, N, consList, seed, 
+                                   shard, pairCounts)
+    ##
+
+    def Analyze(self, baseSeq, want = ("mfe", "pf", "bpp"), consList = [], bppFormat = "packed", 
+                dtype = "float64", seed = None):
+        """::seealso GTFoldPython.Analyze"""
+        return self._CallInContext(GTFoldPython.Analyze, baseSeq, want, consList, bppFormat, dtype, seed)
+    ##
+
+    def BoltzmannSampler(self, baseSeq, consList = []):
+        """A GTFoldBoltzmannSampler which uses the settings of this context"""
+        return self._CallInContext(GTFoldBoltzmannSampler, baseSeq, consList)
+    ##
+
+## class GTFoldContext
+
+class GTFoldBoltzmannSampler:
+    """
+    GTFoldBoltzmannSampler : computes the (-d2) partition function of one sequence once, 
+    and keeps the filled arrays to sample structures from with repeated calls to Sample. 
+    The arrays are computed with the settings (energy model, dangle, ...) current when the 
+    sampler is created, and are only freed by Close (or at the end of a with block). 
+
+    Usage:
+    >>> with GTFoldBoltzmannSampler(baseSeq) as sampler:
+    ...     for m in range(repeatM):
+    ...         boltzmannSamples = sampler.Sample(N)
+    """
+
+    def __init__(self, baseSeq, consList = []):
+        GTFoldPython._ConstructLibGTFold()
+        resType = ctypes.py_object
+        argTypes = [ GTFPTypes.CStringType, GTFPTypes.FPConstraintsListType(consList), ctypes.c_int ]
+        libGTFoldFunc = GTFoldPython._WrapCTypesFunction("BoltzmannSamplerNew", resType, argTypes)
+        self.baseSeq = baseSeq
+        self._samplerHandle = libGTFoldFunc(GTFPTypes.CString(baseSeq), 
+                                            GTFPTypes.FPConstraintsList(consList), 
+                                            ctypes.c_int(len(consList)))
+    ##
+
+    def __enter__(self):
+        return self
+    ##
+
+    def __exit__(self, excType, excValue, excTraceback):
+        self.Close()
+        return False
+    ##
+
+    def Sample(self, N, seed = None):
+        """Sample INT (param N > 0) structures from the Boltzmann distribution
+           ::seealso GTFoldPython.SampleBoltzmannStructures (for the seed and the format of the result)
+        """
+        if self._samplerHandle == None:
+            raise ValueError("Sampling from a closed GTFoldBoltzmannSampler")
+        resType = ctypes.py_object
+        argTypes = [ ctypes.py_object, ctypes.c_int, ctypes.c_longlong ]
+        libGTFoldFunc = GTFoldPython._WrapCTypesFunction("BoltzmannSamplerSample", resType, argTypes)
+        structTupleLst = libGTFoldFunc(self._samplerHandle, ctypes.c_int(N), GTFoldPython._SamplingSeed(seed))
+        structTupleLst = [ (float(ep), float(ap), float(e), str(struct)) for \
+                                (ep, ap, e, struct) in structTupleLst ]
+        return structTupleLst
+    ##
+
+    def _SampleBatch(self, N, firstIndex, seed):
+        resType = ctypes.py_object
+        argTypes = [ ctypes.py_object, ctypes.c_int, ctypes.c_longlong, ctypes.c_longlong ]
+        libGTFoldFunc = GTFoldPython._WrapCTypesFunction("BoltzmannSamplerSampleBatch", resType, argTypes)
+        (pairTableData, energyData) = libGTFoldFunc(self._samplerHandle, ctypes.c_int(N), 
+                                                    GTFoldPython._SamplingSeed(seed), 
+                                                    ctypes.c_longlong(firstIndex))
+        return GTFoldPython._SampleBatchResult(pairTableData, energyData, len(self.baseSeq))
+    ##
+
+    def IterSamples(self, N, batch = 1024, seed = None, prefetch = True):
+        """Generate INT (param N > 0) samples from the Boltzmann distribution in batches of 
+           (at most) batch samples. Each batch is a (pairTables, energies) tuple 
+           (::seealso GTFoldPython._SampleBatchResult). With prefetch, the next batch is 
+           sampled in the background while the current one is processed. For the same 
+           seed, the samples are those of Sample(N, seed) (which only returns their counts). 
+        """
+        if self._samplerHandle == None:
+            raise ValueError("Sampling from a closed GTFoldBoltzmannSampler")
+        elif batch <= 0:
+            raise ValueError("Invalid sample batch size (%s)" % batch)
+        batchStarts = range(0, N, batch)
+        if not prefetch:
+            for firstIndex in batchStarts:
+                yield self._SampleBatch(min(batch, N - firstIndex), firstIndex, seed)
+            return
+        def SampleBatches(emitFunc):
+            for firstIndex in batchStarts:
+                if not emitFunc(self._SampleBatch(min(batch, N - firstIndex), firstIndex, seed)):
+                    return
+        for batchResult in GTFoldPython._BackgroundIterator(SampleBatches):
+            yield batchResult
+    ##
+
+    def Close(self):
+        """Free the partition function arrays (the sampler cannot be used afterwards)"""
+        if self._samplerHandle == None:
+            return
+        resType = ctypes.py_object
+        argTypes = [ ctypes.py_object ]
+        libGTFoldFunc = GTFoldPython._WrapCTypesFunction("BoltzmannSamplerClose", resType, argTypes)
+        libGTFoldFunc(self._samplerHandle)
+        self._samplerHandle = None
+    ##
+
+    # File-like aliases:
+    sample = Sample
+    iter_samples = IterSamples
+    close = Close
+
+## class GTFoldBoltzmannSampler
@@ -0,0 +1 @@
+../../../GTFoldPythonAio.py
\ No newline at end of file
@@ -0,0 +1 @@
+../../../GTFoldPythonPool.py
\ No newline at end of file
@@ -0,0 +1,186 @@
+#### GTFoldPythonAio.py : asyncio front-end for the GTFold folding functions
+
+import asyncio
+import concurrent.futures
+
+from GTFoldPython import GTFoldPython
+from GTFoldPythonPool import GTFoldPythonPool
+
+_GTFP_AIO_JOBS = {
+    "mfe"       : GTFoldPython.GetMFEStructure, 
+    "bpp"       : GTFoldPython.ComputeBPP, 
+    "pfcount"   : GTFoldPython.GetPFuncCount, 
+    "sample"    : GTFoldPython.SampleBoltzmannStructures, 
+    "subopt"    : GTFoldPython.GetSuboptStructures, 
+}
+
+class GTFoldPythonAio(object):
+    """
+    GTFoldPythonAio : awaitable versions of the folding functions for asyncio code. 
+    The calls run on an executor (a single worker thread by default, or any 
+    concurrent.futures.Executor such as a GTFoldPythonPool) so the event loop stays 
+    responsive. At most MAX_IN_FLIGHT jobs are handed to the executor at once, and 
+    identical requests (same job, arguments and energy model settings) that are in 
+    flight at the same time share one computation. Jobs awaited inside a with block of 
+    a GTFoldContext run (on the worker thread) with the settings of that context. 
+
+    Usage:
+    >>> (mfe, mfeStruct) = await GTFPAio.mfe(baseSeq)
+    >>> async for (pairTables, energies) in GTFPAio.sample(baseSeq, 10000, batch=1000):
+    ...     print(energies.mean())
+
+    Cancelling the awaiting task drops a job that has not started yet. A job that is 
+    already running in the engine finishes, and its result is discarded.
+    """
+
+    MAX_IN_FLIGHT = 16
+
+    _executor = None
+    _loopState = None
+
+    @staticmethod
+    def Configure(executor = None, maxInFlight = None):
+        """Set the executor the jobs run on and the bound on the number of jobs 
+           submitted to it at once (requests beyond this wait their turn)
+        """
+        if executor != None:
+            GTFoldPythonAio._executor = executor
+        if maxInFlight != None:
+            GTFoldPythonAio.MAX_IN_FLIGHT = max(1, int(maxInFlight))
+        GTFoldPythonAio._loopState = None
+    ##
+
+    @staticmethod
+    def _GetLoopState():
+        """The semaphore and the table of in flight jobs belong to the running event loop"""
+        runningLoop = asyncio.get_running_loop()
+        if GTFoldPythonAio._loopState == None or GTFoldPythonAio._loopState[0] is not runningLoop:
+            GTFoldPythonAio._loopState = (runningLoop, asyncio.Semaphore(GTFoldPythonAio.MAX_IN_FLIGHT), 
+                                          dict([]))
+        if GTFoldPythonAio._executor == None:
+            # The engine runs one computation at a time, so a single thread is enough:
+            GTFoldPythonAio._executor = concurrent.futures.ThreadPoolExecutor(max_workers = 1)
+        return GTFoldPythonAio._loopState
+    ##
+
+    @staticmethod
+    def _HashableArgs(jobArgs):
+        if isinstance(jobArgs, (list, tuple)):
+            return tuple([ GTFoldPythonAio._HashableArgs(arg) for arg in jobArgs ])
+        return jobArgs
+    ##
+
+    @staticmethod
+    def _ActiveContext():
+        """The GTFoldContext active in the event loop thread (the jobs run in it on the worker), 
+           after checking that the loop thread can wait on the engine at all
+        """
+        GTFoldPython._CheckEngineStreamThread()
+        activeContext = getattr(GTFoldPython._contextThreadState, "activeContext", None)
+        if activeContext != None and isinstance(GTFoldPythonAio._executor, GTFoldPythonPool):
+            raise RuntimeError("The GTFoldPythonPool workers use the settings of the pool, " + 
+                               "not those of the active GTFoldContext")
+        return activeContext
+    ##
+
+    @staticmethod
+    def _JobCall(activeContext, jobFunc, *jobArgs):
+        if activeContext == None:
+            return (jobFunc,) + jobArgs
+        return (activeContext._CallInContext, jobFunc) + jobArgs
+    ##
+
+    @staticmethod
+    async def _DispatchJob(loopState, jobName, jobArgs, activeContext):
+        (runningLoop, inFlightSem, inFlightJobs) = loopState
+        executor = GTFoldPythonAio._executor
+        async with inFlightSem:
+            if isinstance(executor, GTFoldPythonPool):
+                return await runningLoop.run_in_executor(executor, jobName, *jobArgs)
+            return await runningLoop.run_in_executor(executor, *GTFoldPythonAio._JobCall(
+                    activeContext, _GTFP_AIO_JOBS[jobName], *jobArgs))
+    ##
+
+    @staticmethod
+    async def _RunJob(jobName, *jobArgs):
+        loopState = GTFoldPythonAio._GetLoopState()
+        (runningLoop, inFlightSem, inFlightJobs) = loopState
+        activeContext = GTFoldPythonAio._ActiveContext()
+        jobKey = (jobName, GTFoldPythonAio._HashableArgs(jobArgs), GTFoldPython._EnergyModelSettingsKey())
+        jobEntry = inFlightJobs.get(jobKey)
+        if jobEntry == None:
+            jobTask = runningLoop.create_task(GTFoldPythonAio._DispatchJob(loopState, jobName, jobArgs, 
+                                                                          activeContext))
+            jobEntry = [ jobTask, 0 ]
+            inFlightJobs[jobKey] = jobEntry
+            def _RemoveJobEntry(doneTask):
+                if inFlightJobs.get(jobKey) is jobEntry:
+                    del inFlightJobs[jobKey]
+            jobTask.add_done_callback(_RemoveJobEntry)
+        jobEntry[1] += 1
+        try:
+            return await asyncio.shield(jobEntry[0])
+        except asyncio.CancelledError:
+            # Only give up on the shared job when nobody else is waiting for it:
+            if jobEntry[1] == 1 and not jobEntry[0].done():
+                if inFlightJobs.get(jobKey) is jobEntry:
+                    del inFlightJobs[jobKey]
+                jobEntry[0].cancel()
+            raise
+        finally:
+            jobEntry[1] -= 1
+    ##
+
+    @staticmethod
+    async def mfe(baseSeq, consList = []):
+        """::seealso GTFoldPython.GetMFEStructure"""
+        return await GTFoldPythonAio._RunJob("mfe", baseSeq, consList)
+    ##
+
+    @staticmethod
+    async def bpp(baseSeq, consList = []):
+        """::seealso GTFoldPython.ComputeBPP"""
+        return await GTFoldPythonAio._RunJob("bpp", baseSeq, consList)
+    ##
+
+    @staticmethod
+    async def pfcount(baseSeq, consList = []):
+        """::seealso GTFoldPython.GetPFuncCount"""
+        return await GTFoldPythonAio._RunJob("pfcount", baseSeq, consList)
+    ##
+
+    @staticmethod
+    async def subopt(baseSeq, delta):
+        """::seealso GTFoldPython.GetSuboptStructures"""
+        return await GTFoldPythonAio._RunJob("subopt", baseSeq, delta)
+    ##
+
+    @staticmethod
+    async def sample(baseSeq, N, consList = [], batch = 1024, seed = None):
+        """Asynchronous iterator over N samples from the Boltzmann distribution, in batches of 
+           (at most) batch samples: each batch is yielded as soon as it is sampled, as a 
+           (pairTables, energies) tuple. Needs a thread executor (not a GTFoldPythonPool).
+           ::seealso GTFoldPython.IterBoltzmannSamples
+        """
+        loopState = GTFoldPythonAio._GetLoopState()
+        (runningLoop, inFlightSem, inFlightJobs) = loopState
+        activeContext = GTFoldPythonAio._ActiveContext()
+        executor = GTFoldPythonAio._executor
+        if isinstance(executor, GTFoldPythonPool):
+            raise RuntimeError("Streaming samples from a GTFoldPythonPool is not supported")
+        batchIter = GTFoldPython.IterBoltzmannSamples(baseSeq, N, batch, consList, seed, prefetch = False)
+        batchesDone = object()
+        try:
+            while True:
+                async with inFlightSem:
+                    batchResult = await runningLoop.run_in_executor(executor, *GTFoldPythonAio._JobCall(
+                            activeContext, next, batchIter, batchesDone))
+                if batchResult is batchesDone:
+                    break
+                yield batchResult
+        finally:
+            # Frees the sampler (on the worker, as the engine may still be busy with it):
+            runningLoop.run_in_executor(executor, *GTFoldPythonAio._JobCall(activeContext, batchIter.close))
+    ##
+
+## class GTFoldPythonAio
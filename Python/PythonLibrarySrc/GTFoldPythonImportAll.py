@@ -78,6 +78,14 @@ PrintRunConfiguration                  = GTFP.PrintRunConfiguration
 SetGTFoldDataDirectory                 = GTFP.SetGTFoldDataDirectory
 SetThermodynamicParameters             = GTFP.SetThermodynamicParameters
 SetThermodynamicParametersFromDefaults = GTFP.SetThermodynamicParametersFromDefaults
+CompileThermodynamicParameters         = GTFP.CompileThermodynamicParameters
+LockThermodynamicParameters            = GTFP.LockThermodynamicParameters
+UnlockThermodynamicParameters          = GTFP.UnlockThermodynamicParameters
+ReloadThermodynamicParameters          = GTFP.ReloadThermodynamicParameters
+PublishSharedThermodynamicParameters   = GTFP.PublishSharedThermodynamicParameters
+AttachSharedThermodynamicParameters    = GTFP.AttachSharedThermodynamicParameters
+DetachSharedThermodynamicParameters    = GTFP.DetachSharedThermodynamicParameters
+GetThermodynamicParametersDigest       = GTFP.GetThermodynamicParametersDigest
 SetDangleParameter                     = GTFP.SetDangleParameter
 EnableTerminalMismatch                 = GTFP.EnableTerminalMismatch
 DisableTerminalMismatch                = GTFP.DisableTerminalMismatch
@@ -87,11 +95,43 @@ GetPFuncCount                          = GTFP.GetPFuncCount
 GetPFuncCountSHAPE                     = GTFP.GetPFuncCountSHAPE
 ComputeBPP                             = GTFP.ComputeBPP
 ComputeBPPSHAPE                        = GTFP.ComputeBPPSHAPE
+ComputeBPPSparse                       = GTFP.ComputeBPPSparse
+ComputeBPPSparseSHAPE                  = GTFP.ComputeBPPSparseSHAPE
 GetMFEStructure                        = GTFP.GetMFEStructure
 GetMFEStructureSHAPE                   = GTFP.GetMFEStructureSHAPE
+GetMFEStructureBatch                   = GTFP.GetMFEStructureBatch
 GetSuboptStructures                    = GTFP.GetSuboptStructures
+IterSuboptStructures                   = GTFP.IterSuboptStructures
+iter_subopt                            = GTFP.IterSuboptStructures
+GetKBestStructures                     = GTFP.GetKBestStructures
+GetEnergyBandHistogram                 = GTFP.GetEnergyBandHistogram
 GetBoltzmannStructures                 = GTFP.SampleBoltzmannStructures
 GetBoltzmannStructuresSHAPE            = GTFP.SampleBoltzmannStructuresSHAPE
+Analyze                                = GTFP.Analyze
+MergeSampleSummaries                   = GTFP.MergeSampleSummaries
+IterBoltzmannSamples                   = GTFP.IterBoltzmannSamples
+iter_boltzmann_samples                 = GTFP.IterBoltzmannSamples
 DisplayDetailedHelp                    = GTFP.DisplayDetailedHelp
 DisplayHelp                            = GTFP.DisplayHelp
+EnableResultCache                      = GTFP.EnableResultCache
+DisableResultCache                     = GTFP.DisableResultCache
+ClearResultCache                       = GTFP.ClearResultCache
+GetResultCacheStats                    = GTFP.GetResultCacheStats
+EnableResultStore                      = GTFP.EnableResultStore
+DisableResultStore                     = GTFP.DisableResultStore
+GetResultStoreStats                    = GTFP.GetResultStoreStats
+
+from GTFoldPython import GTFoldContext
+from GTFoldPython import GTFoldResultCache
+from GTFoldPython import GTFoldResultStore
+from GTFoldPython import GTFoldBoltzmannSampler
+BoltzmannSampler = GTFoldBoltzmannSampler
+
+## GTFoldPythonPool:
+from GTFoldPythonPool import GTFoldPythonPool as GTFPPool
+Pool = GTFPPool
+
+## GTFoldPythonAio:
+from GTFoldPythonAio import GTFoldPythonAio as GTFPAio
+aio = GTFPAio
 
@@ -0,0 +1,187 @@
+#### GTFoldPythonPool.py : A process pool executor whose workers keep a configured 
+####                       GTFold library instance loaded between jobs
+
+import concurrent.futures
+import multiprocessing
+import time
+
+from GTFoldPython import GTFoldPython
+
+## The folding jobs the workers know how to run by name:
+_GTFP_POOL_JOBS = {
+    "mfe"       : GTFoldPython.GetMFEStructure, 
+    "mfeshape"  : GTFoldPython.GetMFEStructureSHAPE, 
+    "bpp"       : GTFoldPython.ComputeBPP, 
+    "pfcount"   : GTFoldPython.GetPFuncCount, 
+    "sample"    : GTFoldPython.SampleBoltzmannStructures, 
+    "subopt"    : GTFoldPython.GetSuboptStructures, 
+}
+
+def _InitPoolWorker(configState):
+    """Runs once in each new worker: replay the parent's settings into a freshly 
+       initialized library instance (this is also what makes a forked worker safe to use)
+    """
+    for (attrName, attrValue) in configState.items():
+        setattr(GTFoldPython, attrName, attrValue)
+    GTFoldPython.Init(True)
+##
+
+def _RunPoolJob(jobName, jobArgs, jobKwargs):
+    return _GTFP_POOL_JOBS[jobName](*jobArgs, **jobKwargs)
+##
+
+def _RunPoolJobChunk(jobName, argsChunk):
+    return [ _GTFP_POOL_JOBS[jobName](*jobArgs) for jobArgs in argsChunk ]
+##
+
+class GTFoldPythonPool(concurrent.futures.Executor):
+    """
+    GTFoldPythonPool : a concurrent.futures.Executor that runs GTFold jobs in worker 
+    processes. Each worker loads the library and applies the settings once at startup: 
+    the settings made through the GTFoldPython setters in this process (including the 
+    ConfigExtraSettings dictionary) are replayed, followed by any overrides passed in here. 
+
+    Jobs are given by name ("mfe", "mfeshape", "bpp", "pfcount", "sample", "subopt"), 
+    and take the same arguments as the corresponding GTFoldPython function. 
+
+    Usage:
+    >>> with GTFoldPythonPool(4, energyModelName="Turner99") as pool:
+    ...     mfeTuples = list(pool.map("mfe", baseSeqs, chunksize=16))
+    ...     sampleFuture = pool.submit("sample", baseSeq, 1000)
+    """
+
+    JOB_NAMES = list(_GTFP_POOL_JOBS.keys())
+
+    def __init__(self, numWorkers = None, energyModelName = None, baseDataDir = None, 
+                 dangle = None, tmismatch = None, limitcdist = None, prefilter = None, 
+                 extraSettings = None, mpContext = None):
+        configState = GTFoldPython._ConfigSnapshot()
+        configState["_configExtraSettingsDict"] = dict(configState["_configExtraSettingsDict"])
+        if energyModelName != None:
+            configState["_configEnergyModelName"] = energyModelName
+            configState["_configEnergyModelDataDir"] = baseDataDir
+        configOverrides = [ ("_configDangle", dangle), ("_configTerminalMismatch", tmismatch), 
+                            ("_configLimitContactDistance", limitcdist), ("_configPrefilter", prefilter) ]
+        for (attrName, attrValue) in configOverrides:
+            if attrValue != None:
+                configState[attrName] = attrValue
+        if extraSettings != None:
+            configState["_configExtraSettingsDict"].update(extraSettings)
+        if isinstance(mpContext, str):
+            mpContext = multiprocessing.get_context(mpContext)
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers = numWorkers, 
+                mp_context = mpContext, 
+                initializer = _InitPoolWorker, 
+                initargs = (configState,)
+        )
+    ##
+
+    @staticmethod
+    def _JobArgsTuple(jobArgs):
+        return (jobArgs,) if isinstance(jobArgs, str) else tuple(jobArgs)
+    ##
+
+    @staticmethod
+    def _JobCost(jobArgs):
+        """The cost of the folding algorithms grows like the cube of the sequence length"""
+        if len(jobArgs) > 0 and isinstance(jobArgs[0], str):
+            return len(jobArgs[0]) ** 3
+        return 1
+    ##
+
+    @staticmethod
+    def _MakeJobChunks(argsList, chunksize, lengthAware):
+        """Split the (index, args) pairs into chunks of at most chunksize jobs. If lengthAware 
+           is set, the longest jobs come first and no chunk costs more than the single most 
+           expensive job, so short sequences are batched together while long ones run alone.
+        """
+        indexedArgs = list(enumerate(argsList))
+        chunksize = max(1, int(chunksize))
+        if not lengthAware:
+            return [ indexedArgs[ci:ci + chunksize] for ci in range(0, len(indexedArgs), chunksize) ]
+        indexedArgs.sort(key = lambda idxArgs: GTFoldPythonPool._JobCost(idxArgs[1]), reverse = True)
+        maxChunkCost = GTFoldPythonPool._JobCost(indexedArgs[0][1]) if len(indexedArgs) > 0 else 0
+        (jobChunks, curChunk, curChunkCost) = ([], [], 0)
+        for (argIdx, jobArgs) in indexedArgs:
+            jobCost = GTFoldPythonPool._JobCost(jobArgs)
+            if len(curChunk) > 0 and (len(curChunk) >= chunksize or curChunkCost + jobCost > maxChunkCost):
+                jobChunks.append(curChunk)
+                (curChunk, curChunkCost) = ([], 0)
+            curChunk.append((argIdx, jobArgs))
+            curChunkCost += jobCost
+        if len(curChunk) > 0:
+            jobChunks.append(curChunk)
+        return jobChunks
+    ##
+
+    def _SubmitJobChunks(self, jobName, argsList, chunksize, lengthAware):
+        if jobName not in _GTFP_POOL_JOBS:
+            raise ValueError("Unknown GTFold pool job \"%s\" (expected one of %s)" % \
+                             (jobName, ", ".join(GTFoldPythonPool.JOB_NAMES)))
+        jobChunks = GTFoldPythonPool._MakeJobChunks(argsList, chunksize, lengthAware)
+        chunkFutures = [ self._executor.submit(_RunPoolJobChunk, jobName, 
+                                               [ jobArgs for (argIdx, jobArgs) in jobChunk ]) \
+                         for jobChunk in jobChunks ]
+        return (jobChunks, chunkFutures)
+    ##
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedule a job (by name) or a picklable callable to run in one of the workers
+        :return: A concurrent.futures.Future
+        """
+        if isinstance(fn, str):
+            if fn not in _GTFP_POOL_JOBS:
+                raise ValueError("Unknown GTFold pool job \"%s\" (expected one of %s)" % \
+                                 (fn, ", ".join(GTFoldPythonPool.JOB_NAMES)))
+            return self._executor.submit(_RunPoolJob, fn, args, kwargs)
+        return self._executor.submit(fn, *args, **kwargs)
+    ##
+
+    def map(self, fn, *iterables, timeout = None, chunksize = 1, lengthAware = True):
+        """Run the named job over the zipped iterables and return an iterator over the 
+           results in the order of the inputs
+        """
+        if not isinstance(fn, str):
+            return self._executor.map(fn, *iterables, timeout = timeout, chunksize = chunksize)
+        argsList = list(zip(*iterables))
+        (jobChunks, chunkFutures) = self._SubmitJobChunks(fn, argsList, chunksize, lengthAware)
+        resultPos = [ None ] * len(argsList)
+        for (chunkIdx, jobChunk) in enumerate(jobChunks):
+            for (posInChunk, (argIdx, jobArgs)) in enumerate(jobChunk):
+                resultPos[argIdx] = (chunkIdx, posInChunk)
+        endTime = None if timeout == None else timeout + time.monotonic()
+        def _OrderedResultsIterator():
+            chunkResults = dict([])
+            try:
+                for (chunkIdx, posInChunk) in resultPos:
+                    if chunkIdx not in chunkResults:
+                        waitTime = None if endTime == None else endTime - time.monotonic()
+                        chunkResults[chunkIdx] = chunkFutures[chunkIdx].result(waitTime)
+                    yield chunkResults[chunkIdx][posInChunk]
+            finally:
+                for chunkFuture in chunkFutures:
+                    chunkFuture.cancel()
+        return _OrderedResultsIterator()
+    ##
+
+    def imap_unordered(self, fn, iterable, chunksize = 1, lengthAware = True):
+        """Run the named job on each item of iterable (a sequence string or a tuple of 
+           arguments) and yield the results as soon as they are ready
+        """
+        argsList = [ GTFoldPythonPool._JobArgsTuple(jobArgs) for jobArgs in iterable ]
+        (jobChunks, chunkFutures) = self._SubmitJobChunks(fn, argsList, chunksize, lengthAware)
+        try:
+            for chunkFuture in concurrent.futures.as_completed(chunkFutures):
+                for jobResult in chunkFuture.result():
+                    yield jobResult
+        finally:
+            for chunkFuture in chunkFutures:
+                chunkFuture.cancel()
+    ##
+
+    def shutdown(self, wait = True, **kwargs):
+        self._executor.shutdown(wait = wait, **kwargs)
+    ##
+
+## class GTFoldPythonPool
@@ -13,6 +13,11 @@ import re
 import os
 import os.path
 import inspect
+import tempfile
+import shutil
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from enum import Flag
 
 class GTFPTestSuiteTypes(Flag):
@@ -295,6 +300,403 @@ class GTFoldPythonUnitTests(unittest.TestCase):
         GTFoldPythonUnitTests.RunTestTypeV1_NoConstraints(self, "5S/E.coli.fa")
     ##
      
+    @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
+    def test_MFE_test1_16S_K00421_background_thread(self):
+        self.setUpMFEBaseTest()
+        inputSeqBaseName = GTFoldPythonUnitTests.TESTDATADIR + "/16S/K00421"
+        (orgName, baseSeq) = GTFoldPythonUnitTests.LoadInputSequenceFromFile(inputSeqBaseName + ".fasta")
+        (mfe, mfeStruct) = (GTFoldPythonUnitTests.LoadOutputMFEFromFile(inputSeqBaseName + ".mfe"), 
+                            GTFoldPythonUnitTests.LoadOutputStructFromFile(inputSeqBaseName + ".mfestruct.dot"))
+        with ThreadPoolExecutor(max_workers=1) as tpExec:
+            mfeFuture = tpExec.submit(GTFoldPython.GetMFEStructure, baseSeq)
+            # The main thread keeps running Python code while the fold is computed:
+            while not mfeFuture.done():
+                time.sleep(0.001)
+            self.assertEqual(mfeFuture.result(), (mfe, mfeStruct))
+    ##
+
+    @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
+    def test_MFE_batch_5S_tRNA_human(self):
+        self.setUpMFEBaseTest()
+        (baseSeqs, expectedMFEs, expectedStructs) = ([], [], [])
+        for inputSeqBaseName in [ "5S/E.coli.fa", "tRNA/yeast.fa", "other/human.fa" ]:
+            inputSeqBaseName = GTFoldPythonUnitTests.TESTDATADIR + "/" + inputSeqBaseName
+            (orgName, baseSeq) = GTFoldPythonUnitTests.LoadInputSequenceFromFile(inputSeqBaseName + ".fasta")
+            baseSeqs += [ baseSeq ]
+            expectedMFEs += [ GTFoldPythonUnitTests.LoadOutputMFEFromFile(inputSeqBaseName + ".mfe") ]
+            expectedStructs += [ GTFoldPythonUnitTests.LoadOutputStructFromFile(inputSeqBaseName + ".mfestruct.dot") ]
+        (mfeArray, mfeStructs) = GTFoldPython.GetMFEStructureBatch(baseSeqs)
+        self.assertEqual(list(mfeArray), expectedMFEs)
+        self.assertEqual(mfeStructs, expectedStructs)
+        (mfeArray, mfeStructs) = GTFoldPython.GetMFEStructureBatch(iter(baseSeqs), [ [] ] * len(baseSeqs), 
+                                                                   threadsPerFold=2)
+        self.assertEqual(list(mfeArray), expectedMFEs)
+        self.assertEqual(mfeStructs, expectedStructs)
+        # A sequence which can not be folded fails the whole batch, but not the next one:
+        self.assertRaises(Exception, GTFoldPython.GetMFEStructureBatch, baseSeqs[:1] + [ "ACGXXU" ])
+        (mfeArray, mfeStructs) = GTFoldPython.GetMFEStructureBatch(baseSeqs)
+        self.assertEqual(list(mfeArray), expectedMFEs)
+    ##
+
+    @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
+    def test_MFE_reused_tables_16S_5S_tRNA(self):
+        self.setUpMFEBaseTest()
+        # The MFE tables are kept from one fold to the next, so shorter sequences
+        # are folded in the tables of a longer one (and then the longer one again):
+        for inputSeqBaseName in [ "16S/K00421", "5S/E.coli.fa", "tRNA/yeast.fa", "16S/K00421", "5S/E.coli.fa" ]:
+            inputSeqBaseName = GTFoldPythonUnitTests.TESTDATADIR + "/" + inputSeqBaseName
+            (orgName, baseSeq) = GTFoldPythonUnitTests.LoadInputSequenceFromFile(inputSeqBaseName + ".fasta")
+            (mfe, mfeStruct) = (GTFoldPythonUnitTests.LoadOutputMFEFromFile(inputSeqBaseName + ".mfe"),
+                                GTFoldPythonUnitTests.LoadOutputStructFromFile(inputSeqBaseName + ".mfestruct.dot"))
+            self.assertEqual(GTFoldPython.GetMFEStructure(baseSeq), (mfe, mfeStruct))
+    ##
+
+    @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
+    def test_MFE_pool_5S_tRNA_human(self):
+        self.setUpMFEBaseTest()
+        (baseSeqs, expectedMFETuples) = ([], [])
+        for inputSeqBaseName in [ "5S/E.coli.fa", "tRNA/yeast.fa", "other/human.fa" ] * 2:
+            inputSeqBaseName = GTFoldPythonUnitTests.TESTDATADIR + "/" + inputSeqBaseName
+            (orgName, baseSeq) = GTFoldPythonUnitTests.LoadInputSequenceFromFile(inputSeqBaseName + ".fasta")
+            baseSeqs += [ baseSeq ]
+            expectedMFETuples += [ (GTFoldPythonUnitTests.LoadOutputMFEFromFile(inputSeqBaseName + ".mfe"), 
+                                    GTFoldPythonUnitTests.LoadOutputStructFromFile(inputSeqBaseName + ".mfestruct.dot")) ]
+        with GTFPPool(2) as pool:
+            self.assertEqual(list(pool.map("mfe", baseSeqs, chunksize=2)), expectedMFETuples)
+            self.assertEqual(sorted(pool.imap_unordered("mfe", baseSeqs)), sorted(expectedMFETuples))
+            self.assertEqual(pool.submit("mfe", baseSeqs[0]).result(), expectedMFETuples[0])
+    ##
+
+    @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
+    def test_BPP_matrix_formats_5S_EColiFa(self):
+        self.setUpMFEBaseTest()
+        inputSeqBaseName = GTFoldPythonUnitTests.TESTDATADIR + "/5S/E.coli.fa"
+        (orgName, baseSeq) = GTFoldPythonUnitTests.LoadInputSequenceFromFile(inputSeqBaseName + ".fasta")
+        n = len(baseSeq)
+        bppList = GTFP.ComputeBPP(baseSeq)
+        bppPacked = GTFP.ComputeBPP(baseSeq, format="packed")
+        self.assertEqual(len(bppPacked), n * (n - 1) // 2)
+        for (j, i, p) in bppList:
+            if j - i > 3:
+                self.assertAlmostEqual(bppPacked[(i - 1) * n - (i - 1) * i // 2 + (j - i - 1)], p)
+        bppFloat32 = GTFP.ComputeBPP(baseSeq, format="packed", dtype="float32")
+        self.assertEqual(len(bppFloat32), len(bppPacked))
+        self.assertAlmostEqual(max(bppFloat32), max(bppPacked), places=5)
+    ##
+
+    @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
+    def test_BPP_sparse_5S_EColiFa(self):
+        self.setUpMFEBaseTest()
+        inputSeqBaseName = GTFoldPythonUnitTests.TESTDATADIR + "/5S/E.coli.fa"
+        (orgName, baseSeq) = GTFoldPythonUnitTests.LoadInputSequenceFromFile(inputSeqBaseName + ".fasta")
+        n = len(baseSeq)
+        bppPacked = GTFP.ComputeBPP(baseSeq, format="packed")
+        (iIdx, jIdx, pairProbs, unpairedProbs) = GTFP.ComputeBPPSparse(baseSeq, cutoff=1e-3)
+        self.assertEqual(len(unpairedProbs), n)
+        self.assertEqual(len(pairProbs), len([ p for p in bppPacked if p >= 1e-3 ]))
+        for (i, j, p) in zip(iIdx, jIdx, pairProbs):
+            self.assertTrue(i < j and p >= 1e-3)
+            self.assertAlmostEqual(bppPacked[i * n - i * (i + 1) // 2 + (j - i - 1)], p)
+        (iTopIdx, jTopIdx, topProbs, unpairedTop) = GTFP.ComputeBPPSparse(baseSeq, cutoff=1e-3, topKPerBase=1)
+        self.assertTrue(len(topProbs) <= min(len(pairProbs), n))
+        self.assertEqual(list(unpairedTop), list(unpairedProbs))
+    ##
+
+    @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
+    def test_BPP_outside_5S_EColiFa(self):
+        self.setUpMFEBaseTest()
+        inputSeqBaseName = GTFoldPythonUnitTests.TESTDATADIR + "/5S/E.coli.fa"
+        (orgName, baseSeq) = GTFoldPythonUnitTests.LoadInputSequenceFromFile(inputSeqBaseName + ".fasta")
+        n = len(baseSeq)
+        bppPacked = GTFP.ComputeBPP(baseSeq, format="packed")
+        pairedProbs = [ 0.0 ] * n
+        for i in range(n):
+            for j in range(i + 1, n):
+                p = bppPacked[i * n - i * (i + 1) // 2 + (j - i - 1)]
+                self.assertTrue(0.0 <= p <= 1.0 + 1e-9)
+                if j - i <= 3:
+                    self.assertEqual(p, 0.0)
+                pairedProbs[i] += p
+                pairedProbs[j] += p
+        self.assertTrue(max(pairedProbs) <= 1.0 + 1e-6)
+        self.assertTrue(sum(pairedProbs) > 0.0)
+        # The pair frequencies in the Boltzmann samples (drawn from the same -d2 partition 
+        # function arrays) estimate the probabilities to within a few standard deviations:
+        numSamples = 4000
+        sampleSummary = GTFP.SampleBoltzmannStructures(baseSeq, numSamples, seed=11, shard=(0, 1), 
+                                                       pairCounts=True)
+        for i in range(n):
+            for j in range(i + 1, n):
+                p = bppPacked[i * n - i * (i + 1) // 2 + (j - i - 1)]
+                pairFreq = sampleSummary["pair_counts"].get((i + 1, j + 1), 0) / numSamples
+                self.assertAlmostEqual(p, pairFreq, delta=0.05)
+        # With --exactintloop the legacy (O(n^4)) recursions are used instead. On a sequence too 
+        # short for an internal loop to exceed MAXLOOP both compute the same -d2 probabilities:
+        shortSeq = baseSeq[:30]
+        exactLoopCtx = GTFoldContext()
+        exactLoopCtx.ConfigExtraSettings({ "exactintloop" : True })
+        legacyPacked = exactLoopCtx.ComputeBPP(shortSeq, format="packed")
+        outsidePacked = GTFP.ComputeBPP(shortSeq, format="packed")
+        self.assertEqual(len(legacyPacked), len(outsidePacked))
+        for (p, q) in zip(outsidePacked, legacyPacked):
+            self.assertAlmostEqual(p, q, places=6)
+    ##
+
+    @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
+    def test_Analyze_5S_EColiFa(self):
+        self.setUpMFEBaseTest()
+        inputSeqBaseName = GTFoldPythonUnitTests.TESTDATADIR + "/5S/E.coli.fa"
+        (orgName, baseSeq) = GTFoldPythonUnitTests.LoadInputSequenceFromFile(inputSeqBaseName + ".fasta")
+        analysis = GTFP.Analyze(baseSeq, want={ "mfe" : True, "pf" : True, "bpp" : True, "samples" : 25 })
+        self.assertEqual(analysis["mfe"], GTFP.GetMFEStructure(baseSeq))
+        self.assertTrue(analysis["pf"] > 0.0)
+        self.assertTrue(analysis["ensemble_energy"] <= analysis["mfe"][0] + 1e-6)
+        bppPacked = GTFP.ComputeBPP(baseSeq, format="packed")
+        self.assertTrue(max([ abs(p - q) for (p, q) in zip(analysis["bpp"], bppPacked) ]) < 1e-9)
+        self.assertTrue(len(analysis["samples"]) > 0)
+        self.assertEqual(sum([ round(ep * 25) for (ep, ap, e, struct) in analysis["samples"] ]), 25)
+        self.assertTrue(all([ len(struct) == len(baseSeq) for (ep, ap, e, struct) in analysis["samples"] ]))
+    ##
+
+    @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
+    def test_BoltzmannSampler_5S_EColiFa(self):
+        self.setUpMFEBaseTest()
+        inputSeqBaseName = GTFoldPythonUnitTests.TESTDATADIR + "/5S/E.coli.fa"
+        (orgName, baseSeq) = GTFoldPythonUnitTests.LoadInputSequenceFromFile(inputSeqBaseName + ".fasta")
+        with BoltzmannSampler(baseSeq) as sampler:
+            for M in range(3):
+                boltzmannSamples = sampler.Sample(20)
+                self.assertEqual(sum([ round(ep * 20) for (ep, ap, e, struct) in boltzmannSamples ]), 20)
+                self.assertTrue(all([ len(struct) == len(baseSeq) for (ep, ap, e, struct) in boltzmannSamples ]))
+        self.assertRaises(ValueError, sampler.Sample, 20)
+    ##
+
+    @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
+    def test_SampleBoltzmann_seed_5S_EColiFa(self):
+        self.setUpMFEBaseTest()
+        inputSeqBaseName = GTFoldPythonUnitTests.TESTDATADIR + "/5S/E.coli.fa"
+        (orgName, baseSeq) = GTFoldPythonUnitTests.LoadInputSequenceFromFile(inputSeqBaseName + ".fasta")
+        seededSamples = GTFP.SampleBoltzmannStructures(baseSeq, 50, seed=1234)
+        self.assertEqual(GTFP.SampleBoltzmannStructures(baseSeq, 50, seed=1234), seededSamples)
+        with BoltzmannSampler(baseSeq) as sampler:
+            self.assertEqual(sampler.Sample(50, seed=1234), sampler.Sample(50, seed=1234))
+        self.assertRaises(ValueError, GTFP.SampleBoltzmannStructures, baseSeq, 50, [], -1)
+    ##
+
+    @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
+    def test_SampleBoltzmann_shards_5S_EColiFa(self):
+        self.setUpMFEBaseTest()
+        inputSeqBaseName = GTFoldPythonUnitTests.TESTDATADIR + "/5S/E.coli.fa"
+        (orgName, baseSeq) = GTFoldPythonUnitTests.LoadInputSequenceFromFile(inputSeqBaseName + ".fasta")
+        wholeBatch = GTFP.SampleBoltzmannStructures(baseSeq, 60, seed=7)
+        shardSummaries = [ GTFP.SampleBoltzmannStructures(baseSeq, 60, seed=7, shard=(k, 4), pairCounts=True) \
+                           for k in range(4) ]
+        self.assertEqual([ summary["num_samples"] for summary in shardSummaries ], [ 15 ] * 4)
+        mergedSummary = MergeSampleSummaries(shardSummaries)
+        self.assertEqual(mergedSummary["num_samples"], 60)
+        self.assertEqual(mergedSummary["shards"], [ (7, k, 4) for k in range(4) ])
+        self.assertEqual(dict([ (struct, round(ep * 60)) for (ep, ap, e, struct) in wholeBatch ]), 
+                         dict([ (struct, count) for (struct, (count, e)) in mergedSummary["structures"].items() ]))
+        self.assertEqual(sum(mergedSummary["pair_counts"].values()), 
+                         sum([ count * struct.count("(") for (struct, (count, e)) in mergedSummary["structures"].items() ]))
+        self.assertRaises(ValueError, MergeSampleSummaries, [ shardSummaries[0], shardSummaries[0] ])
+        otherSeedSummary = GTFP.SampleBoltzmannStructures(baseSeq, 60, seed=8, shard=(0, 4))
+        self.assertEqual(MergeSampleSummaries([ shardSummaries[0], otherSeedSummary ])["num_samples"], 30)
+        otherSizeSummary = GTFP.SampleBoltzmannStructures(baseSeq, 80, seed=7, shard=(1, 4))
+        self.assertRaises(ValueError, MergeSampleSummaries, [ shardSummaries[0], otherSizeSummary ])
+        self.assertRaises(ValueError, GTFP.SampleBoltzmannStructures, baseSeq, 3, [], 7, (0, 4))
+    ##
+
+    @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
+    def test_IterBoltzmannSamples_5S_EColiFa(self):
+        self.setUpMFEBaseTest()
+        inputSeqBaseName = GTFoldPythonUnitTests.TESTDATADIR + "/5S/E.coli.fa"
+        (orgName, baseSeq) = GTFoldPythonUnitTests.LoadInputSequenceFromFile(inputSeqBaseName + ".fasta")
+        n = len(baseSeq)
+        with BoltzmannSampler(baseSeq) as sampler:
+            sampleCounts = dict([ (struct, round(ep * 50)) for (ep, ap, e, struct) in sampler.Sample(50, seed=11) ])
+            (iterCounts, batchSizes) = (dict([]), [ ])
+            for (pairTables, energies) in sampler.IterSamples(50, batch=16, seed=11):
+                batchSizes.append(len(energies))
+                pairTables = list(pairTables.flatten()) if hasattr(pairTables, "flatten") else list(pairTables)
+                self.assertEqual(len(pairTables), n * len(energies))
+                for s in range(len(energies)):
+                    pairTable = pairTables[s * n:(s + 1) * n]
+                    struct = "".join([ "." if j == 0 else "(" if j > i + 1 else ")" for (i, j) in enumerate(pairTable) ])
+                    iterCounts[struct] = iterCounts.get(struct, 0) + 1
+        self.assertEqual(batchSizes, [ 16, 16, 16, 2 ])
+        self.assertEqual(iterCounts, sampleCounts)
+    ##
+
+    @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
+    def test_IterSuboptStructures_5S_EColiFa(self):
+        self.setUpMFEBaseTest()
+        inputSeqBaseName = GTFoldPythonUnitTests.TESTDATADIR + "/5S/E.coli.fa"
+        (orgName, baseSeq) = GTFoldPythonUnitTests.LoadInputSequenceFromFile(inputSeqBaseName + ".fasta")
+        suboptStructs = GTFP.GetSuboptStructures(baseSeq, 1.0)
+        self.assertEqual(sorted(iter_subopt(baseSeq, 1.0)), sorted(suboptStructs))
+        self.assertEqual(len(list(iter_subopt(baseSeq, 1.0, 3))), min(3, len(suboptStructs)))
+        firstStructs = [ ]
+        for structTuple in iter_subopt(baseSeq, 1.0):
+            firstStructs.append(structTuple)
+            if len(firstStructs) == 2:
+                break
+        self.assertEqual(firstStructs, list(iter_subopt(baseSeq, 1.0, 2)))
+        sampler = BoltzmannSampler(baseSeq)
+        suboptIter = iter_subopt(baseSeq, 1.0)
+        next(suboptIter)
+        self.assertRaises(RuntimeError, GTFP.GetMFEStructure, baseSeq)
+        self.assertRaises(RuntimeError, sampler.Sample, 10)
+        self.assertRaises(RuntimeError, sampler.Close)
+        suboptIter.close()
+        self.assertEqual(len(GTFP.GetMFEStructure(baseSeq)), 2)
+        sampler.Close()
+    ##
+
+    @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
+    def test_GetSuboptStructuresParallel_5S_EColiFa(self):
+        self.setUpMFEBaseTest()
+        inputSeqBaseName = GTFoldPythonUnitTests.TESTDATADIR + "/5S/E.coli.fa"
+        (orgName, baseSeq) = GTFoldPythonUnitTests.LoadInputSequenceFromFile(inputSeqBaseName + ".fasta")
+        suboptStructs = GTFP.GetSuboptStructures(baseSeq, 2.0)
+        self.assertEqual(GTFP.GetSuboptStructures(baseSeq, 2.0, numThreads = 4), suboptStructs)
+        self.assertEqual(GTFP.GetSuboptStructures(baseSeq, 2.0, numThreads = 0), suboptStructs)
+        self.assertRaises(ValueError, GTFP.GetSuboptStructures, baseSeq, 2.0, -1)
+    ##
+
+    @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
+    def test_GetKBestStructures_5S_EColiFa(self):
+        self.setUpMFEBaseTest()
+        inputSeqBaseName = GTFoldPythonUnitTests.TESTDATADIR + "/5S/E.coli.fa"
+        (orgName, baseSeq) = GTFoldPythonUnitTests.LoadInputSequenceFromFile(inputSeqBaseName + ".fasta")
+        suboptEnergies = dict(GTFP.GetSuboptStructures(baseSeq, 2.0))
+        k = min(5, len(suboptEnergies))
+        kbestStructs = GTFP.GetKBestStructures(baseSeq, k)
+        self.assertEqual([ e for (struct, e) in kbestStructs ], sorted(suboptEnergies.values())[:k])
+        self.assertEqual(len(set([ struct for (struct, e) in kbestStructs ])), k)
+        for (struct, e) in kbestStructs:
+            self.assertEqual(suboptEnergies.get(struct), e)
+        self.assertEqual(kbestStructs[0][0], GTFP.GetMFEStructure(baseSeq)[1])
+        self.assertRaises(ValueError, GTFP.GetKBestStructures, baseSeq, 0)
+    ##
+
+    @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
+    def test_GetEnergyBandHistogram_5S_EColiFa(self):
+        self.setUpMFEBaseTest()
+        inputSeqBaseName = GTFoldPythonUnitTests.TESTDATADIR + "/5S/E.coli.fa"
+        (orgName, baseSeq) = GTFoldPythonUnitTests.LoadInputSequenceFromFile(inputSeqBaseName + ".fasta")
+        suboptEnergies = [ e for (struct, e) in GTFP.GetSuboptStructures(baseSeq, 2.0) ]
+        mfeEnergy = min(suboptEnergies)
+        expectedCounts = [ 0 ] * 21
+        for e in suboptEnergies:
+            expectedCounts[(e - mfeEnergy) // 10] += 1
+        self.assertEqual(GTFP.GetEnergyBandHistogram(baseSeq, 2.0, 0.1), expectedCounts)
+        self.assertEqual(GTFP.GetEnergyBandHistogram(baseSeq, 2.0, 1.0), 
+                         [ sum(expectedCounts[:10]), sum(expectedCounts[10:20]), expectedCounts[20] ])
+        self.assertRaises(ValueError, GTFP.GetEnergyBandHistogram, baseSeq, 2.0, 0.0)
+        with tempfile.TemporaryDirectory() as tempDir:
+            dbPath = os.path.join(tempDir, "results.db")
+            GTFP.EnableResultStore(dbPath)
+            try:
+                self.assertEqual(GTFP.GetEnergyBandHistogram(baseSeq, 2.0, 0.1), expectedCounts)
+                GTFP.EnableResultStore(dbPath)
+                self.assertEqual(GTFP.GetEnergyBandHistogram(baseSeq, 2.0, 0.1), expectedCounts)
+                self.assertEqual(GTFP.GetResultStoreStats()["hits"], 1)
+            finally:
+                GTFP.DisableResultStore()
+    ##
+
+    @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
+    def test_MFE_result_cache_5S_EColiFa(self):
+        self.setUpMFEBaseTest()
+        inputSeqBaseName = GTFoldPythonUnitTests.TESTDATADIR + "/5S/E.coli.fa"
+        (orgName, baseSeq) = GTFoldPythonUnitTests.LoadInputSequenceFromFile(inputSeqBaseName + ".fasta")
+        expectedMFETuple = (GTFoldPythonUnitTests.LoadOutputMFEFromFile(inputSeqBaseName + ".mfe"), 
+                            GTFoldPythonUnitTests.LoadOutputStructFromFile(inputSeqBaseName + ".mfestruct.dot"))
+        GTFP.EnableResultCache()
+        try:
+            self.assertEqual(GTFP.GetMFEStructure(baseSeq), expectedMFETuple)
+            self.assertEqual(GTFP.GetMFEStructure(baseSeq), expectedMFETuple)
+            cacheStats = GTFP.GetResultCacheStats()
+            self.assertEqual((cacheStats["hits"], cacheStats["misses"], cacheStats["entries"]), (1, 1, 1))
+            # The keys of the calls made through a context use the context settings:
+            dangleCtx = GTFoldContext(dangle=(0 if GTFoldPython._configDangle == 2 else 2))
+            dangleCtx.GetMFEStructure(baseSeq)
+            self.assertEqual(GTFP.GetResultCacheStats()["misses"], 2)
+            dangleCtx.GetMFEStructure(baseSeq)
+            self.assertEqual(GTFP.GetResultCacheStats()["hits"], 2)
+            GTFP.EnableResultCache(maxBytes=GTFoldResultCache.EstimateBytes(expectedMFETuple))
+            self.assertEqual(GTFP.GetResultCacheStats()["entries"], 0)
+            self.assertTrue(GTFP.GetResultCacheStats()["evictions"] >= 2)
+        finally:
+            GTFP.DisableResultCache()
+    ##
+
+    @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
+    def test_MFE_result_store_5S_EColiFa(self):
+        self.setUpMFEBaseTest()
+        inputSeqBaseName = GTFoldPythonUnitTests.TESTDATADIR + "/5S/E.coli.fa"
+        (orgName, baseSeq) = GTFoldPythonUnitTests.LoadInputSequenceFromFile(inputSeqBaseName + ".fasta")
+        expectedMFETuple = (GTFoldPythonUnitTests.LoadOutputMFEFromFile(inputSeqBaseName + ".mfe"), 
+                            GTFoldPythonUnitTests.LoadOutputStructFromFile(inputSeqBaseName + ".mfestruct.dot"))
+        with tempfile.TemporaryDirectory() as tempDir:
+            dbPath = os.path.join(tempDir, "results.db")
+            GTFP.EnableResultStore(dbPath)
+            try:
+                self.assertEqual(GTFP.GetMFEStructure(baseSeq), expectedMFETuple)
+                bppList = GTFP.ComputeBPP(baseSeq)
+                bppPacked = GTFP.ComputeBPP(baseSeq, format="packed", dtype="float32")
+                # A new store on the same file (as in a later run) sees the saved results:
+                GTFP.EnableResultStore(dbPath)
+                self.assertEqual(GTFP.GetMFEStructure(baseSeq), expectedMFETuple)
+                self.assertEqual(GTFP.ComputeBPP(baseSeq), bppList)
+                self.assertEqual(list(GTFP.ComputeBPP(baseSeq, format="packed", dtype="float32")), 
+                                 list(bppPacked))
+                storeStats = GTFP.GetResultStoreStats()
+                self.assertEqual((storeStats["hits"], storeStats["misses"], storeStats["entries"]), (3, 0, 3))
+            finally:
+                GTFP.DisableResultStore()
+    ##
+
+    @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
+    def test_MFE_aio_5S_tRNA(self):
+        self.setUpMFEBaseTest()
+        (baseSeqs, expectedMFETuples) = ([], [])
+        for inputSeqBaseName in [ "5S/E.coli.fa", "tRNA/yeast.fa" ]:
+            inputSeqBaseName = GTFoldPythonUnitTests.TESTDATADIR + "/" + inputSeqBaseName
+            (orgName, baseSeq) = GTFoldPythonUnitTests.LoadInputSequenceFromFile(inputSeqBaseName + ".fasta")
+            baseSeqs += [ baseSeq ]
+            expectedMFETuples += [ (GTFoldPythonUnitTests.LoadOutputMFEFromFile(inputSeqBaseName + ".mfe"), 
+                                    GTFoldPythonUnitTests.LoadOutputStructFromFile(inputSeqBaseName + ".mfestruct.dot")) ]
+        async def RunAioJobs():
+            cancelledTask = asyncio.ensure_future(GTFPAio.mfe(baseSeqs[1]))
+            mfeTasks = [ asyncio.ensure_future(GTFPAio.mfe(baseSeq)) for baseSeq in baseSeqs + baseSeqs ]
+            # Let the first job reach the executor before one of the tasks sharing it is cancelled:
+            for _ in range(3):
+                await asyncio.sleep(0)
+            self.assertTrue(GTFPAio._loopState[1].locked())
+            cancelledTask.cancel()
+            mfeTuples = await asyncio.gather(*mfeTasks)
+            self.assertTrue(cancelledTask.cancelled())
+            return mfeTuples
+        prevMaxInFlight = GTFPAio.MAX_IN_FLIGHT
+        GTFPAio.Configure(maxInFlight=1)
+        try:
+            self.assertEqual(asyncio.run(RunAioJobs()), expectedMFETuples + expectedMFETuples)
+        finally:
+            GTFPAio.Configure(maxInFlight=prevMaxInFlight)
+        # The jobs awaited in a context run with its settings, and the samples are streamed:
+        dangleCtx = GTFoldContext(dangle=(0 if GTFoldPython._configDangle == 2 else 2))
+        async def RunAioContextJobs():
+            with dangleCtx:
+                mfeTuple = await GTFPAio.mfe(baseSeqs[0])
+            batchSizes = [ len(energies) async for (pairTables, energies) in \
+                           GTFPAio.sample(baseSeqs[0], 10, batch=4, seed=1) ]
+            return (mfeTuple, batchSizes)
+        self.assertEqual(asyncio.run(RunAioContextJobs()), 
+                         (dangleCtx.GetMFEStructure(baseSeqs[0]), [ 4, 4, 2 ]))
+    ##
+
     @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
     def test_MFE_test2_5S_EColiFa_withcons_RNAfold(self):
         GTFoldPythonUnitTests.RunTestTypeV2_WithConstraints(self, "5S/E.coli.fa")
@@ -330,6 +732,136 @@ class GTFoldPythonUnitTests(unittest.TestCase):
         GTFoldPythonUnitTests.RunTestTypeV2_WithConstraints(self, "other/P.syringae")
     ##
 
+    @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
+    def test_MFE_test2_5S_EColiFa_locked_thermo_params(self):
+        GTFoldPythonUnitTests.RunTestTypeV1_NoConstraints(self, "5S/E.coli.fa")
+        GTFoldPython.LockThermodynamicParameters()
+        GTFoldPythonUnitTests.RunTestTypeV1_NoConstraints(self, "5S/E.coli.fa")
+        GTFoldPython.UnlockThermodynamicParameters()
+        GTFoldPython.ReloadThermodynamicParameters()
+        GTFoldPythonUnitTests.RunTestTypeV1_NoConstraints(self, "5S/E.coli.fa")
+    ##
+
+    @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
+    def test_MFE_test2_5S_EColiFa_shared_thermo_params(self):
+        shmName = "gtfp-unittest-%d" % os.getpid()
+        GTFoldPythonUnitTests.RunTestTypeV1_NoConstraints(self, "5S/E.coli.fa")
+        inputSeqBaseName = GTFoldPythonUnitTests.TESTDATADIR + "/5S/E.coli.fa"
+        (orgName, baseSeq) = GTFoldPythonUnitTests.LoadInputSequenceFromFile(inputSeqBaseName + ".fasta")
+        (mfe, mfeStruct) = (GTFoldPythonUnitTests.LoadOutputMFEFromFile(inputSeqBaseName + ".mfe"), 
+                            GTFoldPythonUnitTests.LoadOutputStructFromFile(inputSeqBaseName + ".mfestruct.dot"))
+        GTFoldPython.PublishSharedThermodynamicParameters(shmName)
+        try:
+            self.assertEqual(GTFoldPython.GetMFEStructure(baseSeq), (mfe, mfeStruct))
+            GTFoldPython.DetachSharedThermodynamicParameters()
+            GTFoldPython.AttachSharedThermodynamicParameters(shmName)
+            self.assertEqual(GTFoldPython.GetMFEStructure(baseSeq), (mfe, mfeStruct))
+            GTFoldPython.PublishSharedThermodynamicParameters(shmName)
+            self.assertEqual(GTFoldPython.GetMFEStructure(baseSeq), (mfe, mfeStruct))
+        finally:
+            GTFoldPython.DetachSharedThermodynamicParameters(unlink = True)
+        GTFoldPythonUnitTests.RunTestTypeV1_NoConstraints(self, "5S/E.coli.fa")
+    ##
+
+    @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
+    def test_MFE_test2_5S_EColiFa_folding_contexts(self):
+        GTFoldPythonUnitTests.RunTestTypeV1_NoConstraints(self, "5S/E.coli.fa")
+        inputSeqBaseName = GTFoldPythonUnitTests.TESTDATADIR + "/5S/E.coli.fa"
+        (orgName, baseSeq) = GTFoldPythonUnitTests.LoadInputSequenceFromFile(inputSeqBaseName + ".fasta")
+        (mfe, mfeStruct) = (GTFoldPythonUnitTests.LoadOutputMFEFromFile(inputSeqBaseName + ".mfe"), 
+                            GTFoldPythonUnitTests.LoadOutputStructFromFile(inputSeqBaseName + ".mfestruct.dot"))
+        defaultCtx = GTFoldContext()
+        dangleCtx = GTFoldContext(dangle=2, prefilter=2)
+        dangleMFETuple = dangleCtx.GetMFEStructure(baseSeq)
+        with ThreadPoolExecutor(max_workers=4) as tpExec:
+            mfeFutures = [ tpExec.submit(gtfCtx.GetMFEStructure, baseSeq) for \
+                           gtfCtx in [ defaultCtx, dangleCtx ] * 4 ]
+            mfeResults = [ mfeFuture.result() for mfeFuture in mfeFutures ]
+        self.assertEqual(mfeResults[0::2], [ (mfe, mfeStruct) ] * 4)
+        self.assertEqual(mfeResults[1::2], [ dangleMFETuple ] * 4)
+        self.assertEqual(dangleCtx.GetLastError()[0], 0)
+        globalDangle = GTFoldPython._configDangle
+        globalExtraSettings = dict(GTFoldPython._configExtraSettingsDict)
+        dangleCtx.ConfigExtraSettings({ "maxcount" : 3 })
+        self.assertEqual(GTFoldPython._configExtraSettingsDict, globalExtraSettings)
+        with dangleCtx:
+            self.assertEqual(GTFoldPython._EnergyModelSettingsKey()[2], 2)
+            self.assertIn("'maxcount', 3", GTFoldPython._EnergyModelSettingsKey()[6])
+            with ThreadPoolExecutor(max_workers=1) as tpExec:
+                exitFuture = tpExec.submit(dangleCtx.__exit__, None, None, None)
+                self.assertRaises(RuntimeError, exitFuture.result)
+                # The with block does not hold the engine between calls:
+                mfeFuture = tpExec.submit(defaultCtx.GetMFEStructure, baseSeq)
+                self.assertEqual(mfeFuture.result(timeout=60), (mfe, mfeStruct))
+            self.assertEqual(GTFoldPython.GetMFEStructure(baseSeq), dangleMFETuple)
+        self.assertEqual(GTFoldPython._configDangle, globalDangle)
+        self.assertEqual(GTFoldPython._configExtraSettingsDict, globalExtraSettings)
+        GTFoldPythonUnitTests.RunTestTypeV1_NoConstraints(self, "5S/E.coli.fa")
+    ##
+
+    @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
+    def test_MFE_test2_5S_EColiFa_compiled_thermo_params(self):
+        with tempfile.TemporaryDirectory() as tempDir:
+            compiledParamsPath = os.path.join(tempDir, "Turner99.gtfpbin")
+            GTFoldPython.CompileThermodynamicParameters("Turner99", compiledParamsPath)
+            self.assertTrue(os.path.isfile(compiledParamsPath))
+            self.setUpMFEBaseTest()
+            GTFoldPython.SetThermodynamicParameters("Turner99", compiledParamsPath)
+            (orgName, baseSeq) = GTFoldPythonUnitTests.LoadInputSequenceFromFile(
+                    GTFoldPythonUnitTests.TESTDATADIR + "/5S/E.coli.fa.fasta")
+            self.DescribeUnitTest("Basic MFE calculation with compiled thermodynamic parameters")
+            self.NameOrganism(orgName)
+            self.OrganismBaseSequence(baseSeq)
+            self.DefineConstraints([])
+            self.ComputeMFEData()
+            (mfe, mfeStruct) = (self._lastMFE, self._lastMFEStruct)
+            # Switching back to the file binds the engine to its (still mapped) registry entry:
+            GTFoldPython.SetThermodynamicParameters("Turner99")
+            GTFoldPython.SetThermodynamicParameters("Turner99", compiledParamsPath)
+            self.assertEqual(GTFoldPython.GetMFEStructure(baseSeq), (mfe, mfeStruct))
+        GTFoldPythonUnitTests.RunTestTypeV1_NoConstraints(self, "5S/E.coli.fa")
+        self.AssertLastMFETupleEquals(mfe, mfeStruct)
+    ##
+
+    @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
+    def test_thermo_params_digest_after_DAT_edit(self):
+        self.setUpMFEBaseTest()
+        with tempfile.TemporaryDirectory() as tempDir:
+            paramsDir = os.path.join(tempDir, "Turner99")
+            shutil.copytree(GTFPConfig.GetThermodynamicParametersDirectory("Turner99"), paramsDir)
+            GTFoldPython.SetThermodynamicParameters("Turner99", paramsDir)
+            origDigest = GTFoldPython.GetThermodynamicParametersDigest()
+            self.assertEqual(GTFoldPython.GetThermodynamicParametersDigest(), origDigest)
+            miscLoopPath = os.path.join(paramsDir, "miscloop.DAT")
+            with open(miscLoopPath, "r") as fp:
+                miscLoopLines = fp.readlines()
+            miscLoopLines[1] = "3.10\n"
+            with open(miscLoopPath, "w") as fp:
+                fp.writelines(miscLoopLines)
+            miscLoopMTime = os.stat(miscLoopPath).st_mtime + 10
+            os.utime(miscLoopPath, (miscLoopMTime, miscLoopMTime))
+            self.assertNotEqual(GTFoldPython.GetThermodynamicParametersDigest(), origDigest)
+        self.setUpMFEBaseTest()
+        self.assertEqual(GTFoldPython.GetThermodynamicParametersDigest(), origDigest)
+    ##
+
+    @unittest.skipIf(*UnitTestDecorArgs(MFE_BASE_TESTS))
+    def test_MFE_test2_5S_EColiFa_compile_locked_thermo_params(self):
+        GTFoldPythonUnitTests.RunTestTypeV1_NoConstraints(self, "5S/E.coli.fa")
+        inputSeqBaseName = GTFoldPythonUnitTests.TESTDATADIR + "/5S/E.coli.fa"
+        (orgName, baseSeq) = GTFoldPythonUnitTests.LoadInputSequenceFromFile(inputSeqBaseName + ".fasta")
+        (mfe, mfeStruct) = (GTFoldPythonUnitTests.LoadOutputMFEFromFile(inputSeqBaseName + ".mfe"), 
+                            GTFoldPythonUnitTests.LoadOutputStructFromFile(inputSeqBaseName + ".mfestruct.dot"))
+        GTFoldPython.LockThermodynamicParameters()
+        try:
+            with tempfile.TemporaryDirectory() as tempDir:
+                GTFoldPython.CompileThermodynamicParameters("Turner04", os.path.join(tempDir, "Turner04.gtfpbin"))
+            self.assertEqual(GTFoldPython.GetMFEStructure(baseSeq), (mfe, mfeStruct))
+        finally:
+            GTFoldPython.UnlockThermodynamicParameters()
+        self.assertEqual(GTFoldPython.GetMFEStructure(baseSeq), (mfe, mfeStruct))
+    ##
+
     @unittest.skipIf(*UnitTestDecorArgs(MFE_RNADB_TESTS))
     def test_MFE_test6_RogersRNADB_verify_Aalbopictus6(self):
         GTFoldPythonUnitTests.RunTestTypeV3_NoConstraints(self, "rnadb_historical/A.albopictus.6")
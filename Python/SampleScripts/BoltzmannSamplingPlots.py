@@ -112,8 +112,11 @@ def GetHelixClassCounts(baseSeq, dbStruct):
 
 # Get the points as shown in Figure 1 of the following article: 
 # https://www.cell.com/biophysj/fulltext/S0006-3495(17)30565-9
-def GetFrequencyDistributionLocal(N, baseSeq, constraintsList=[]):
-    boltzmannSamples = GTFP.SampleBoltzmannStructures(baseSeq, N, constraintsList)
+def GetFrequencyDistributionLocal(N, baseSeq, constraintsList=[], sampler=None):
+    if sampler != None:
+        boltzmannSamples = sampler.Sample(N)
+    else:
+        boltzmannSamples = GTFP.SampleBoltzmannStructures(baseSeq, N, constraintsList)
     #if DEBUG: print("LENGTH: ", len(boltzmannSamples))
     helixClassFreqDict, maxHelixClassFreqDict = dict([]), dict([])
     freqToStdDevPoints = []
@@ -150,8 +153,11 @@ def GetFrequencyDistributionLocal(N, baseSeq, constraintsList=[]):
 def GetFrequencyDistribution(N, repeatM, baseSeq, constraintsList=[]):
     helixClassFreqDict = dict([])
     freqToStdDevPoints = []
-    for M in range(0, repeatM):
-        localHelixClassFreqDict = GetFrequencyDistributionLocal(N, baseSeq, constraintsList=constraintsList)
+    # The partition function is computed once, and sampled from repeatM times:
+    with BoltzmannSampler(baseSeq, constraintsList) as sampler:
+        localHelixClassFreqDicts = [ GetFrequencyDistributionLocal(N, baseSeq, sampler=sampler) \
+                                     for M in range(0, repeatM) ]
+    for localHelixClassFreqDict in localHelixClassFreqDicts:
         for helixClass in localHelixClassFreqDict.keys():
             hcLocalFreq = localHelixClassFreqDict[helixClass]
             if helixClass in helixClassFreqDict:
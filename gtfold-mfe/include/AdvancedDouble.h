@@ -19,7 +19,10 @@ class AdvancedDouble_Native{
 		     sprintf(dblstr, "%.20f", value);
 		     return strdup(dblstr);
 		}
-		
+		inline double getNativeValue() const {
+		     return value;
+		}
+
 		AdvancedDouble_Native(){
 			value=0.0;
 		}
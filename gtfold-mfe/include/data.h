@@ -24,22 +24,27 @@
 
 #include "constants.h"
 
-extern int poppen[5];
+/* The energy tables below are accessed through pointers to their rows so that they 
+ * can be bound to an external read-only copy of the tables (for example, a shared 
+ * memory segment). By default they point to the local storage in loader.cc, see 
+ * resetEnergyTablePointers() in loader.h.
+ */
+extern int *poppen; /* [5] */
 extern int maxpen;
-extern int eparam[11];
-extern int multConst[3]; /* for multiloop penalties. */
-extern int dangle[4][4][4][2]; /* Contain dangling energy values */
-extern int inter[31]; /* Contains size penalty for internal loops */
-extern int bulge[31]; /* Contain the size penalty for bulges */
-extern int hairpin[31]; /* Contains the size penalty for hairpin loops */
-extern int _stack[256]; /* Stacking energy used to calculate energy of stack loops */
-extern int tstkh[256]; /* Terminal mismatch energy used in the calculations of hairpin loops */
-extern int tstki[256]; /* Terminal mismatch energy used in the calculations of internal loops */
-extern int tloop[maxtloop + 1][2];
+extern int *eparam; /* [11] */
+extern int *multConst; /* [3] for multiloop penalties. */
+extern int (*dangle)[4][4][2]; /* [4][4][4][2] Contain dangling energy values */
+extern int *inter; /* [31] Contains size penalty for internal loops */
+extern int *bulge; /* [31] Contain the size penalty for bulges */
+extern int *hairpin; /* [31] Contains the size penalty for hairpin loops */
+extern int *_stack; /* [256] Stacking energy used to calculate energy of stack loops */
+extern int *tstkh; /* [256] Terminal mismatch energy used in the calculations of hairpin loops */
+extern int *tstki; /* [256] Terminal mismatch energy used in the calculations of internal loops */
+extern int (*tloop)[2]; /* [maxtloop + 1][2] */
 extern int numoftloops;
-extern int iloop22[5][5][5][5][5][5][5][5]; /* 2*2 internal looops */
-extern int iloop21[5][5][5][5][5][5][5]; /* 2*1 internal loops */
-extern int iloop11[5][5][5][5][5][5]; /* 1*1 internal loops */
+extern int (*iloop22)[5][5][5][5][5][5][5]; /* [5]^8 2*2 internal looops */
+extern int (*iloop21)[5][5][5][5][5][5]; /* [5]^7 2*1 internal loops */
+extern int (*iloop11)[5][5][5][5][5]; /* [5]^6 1*1 internal loops */
 extern int coax[6][6][6][6];
 extern int tstackcoax[6][6][6][6];
 extern int coaxstack[6][6][6][6];
@@ -53,15 +58,15 @@ extern int c3;
 extern int efn2a;
 extern int efn2b;
 extern int efn2c;
-extern int triloop[maxtloop + 1][2];
+extern int (*triloop)[2]; /* [maxtloop + 1][2] */
 extern int numoftriloops;
 extern int init;
 extern int gail; /* It is either 0 or 1. It is used for grosely asymmetric internal loops */
 extern float prelog;
 
-extern int tstackm[5][5][6][6];
-extern int tstacke[5][5][6][6];
-extern int tstacki23[5][5][5][5];
+extern int (*tstackm)[5][6][6]; /* [5][5][6][6] */
+extern int (*tstacke)[5][6][6]; /* [5][5][6][6] */
+extern int (*tstacki23)[5][5][5]; /* [5][5][5][5] */
 
 
 #define fourBaseIndex(a, b, c, d) (((a) << 6) + ((b) << 4) + ((c) << 2) + (d))
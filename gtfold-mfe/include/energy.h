@@ -46,6 +46,7 @@ int Estacke(int i, int j);
 void create_tables(int len);
 void init_tables(int len);
 void free_tables(int len);
+void release_tables(void);
 #ifdef __cplusplus
 }
 #endif
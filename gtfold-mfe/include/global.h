@@ -26,6 +26,8 @@ extern int SHAPE_ENABLED;//0 means false and 1 means true
 extern int g_LIMIT_DISTANCE;
 extern int g_contactDistance;
 extern int g_bignumprecision;
+extern long long g_sample_seed;
+extern long long g_sample_index_offset;
 
 
 // The possible base pairs are (A,U), (U,A), (C,G), (G,C), (G,U) 
@@ -44,11 +44,14 @@
      int	initTstkeValues(const char *fileName, const char *dirPath);
      int	initTstk23Values(const char *fileName, const char *dirPath);
 
+     void resetEnergyTablePointers(void);
+
      extern char EN_DATADIR[256];
 }
 #else 
      void readThermodynamicParameters(const char *userdatadir,bool userdatalogic, 
 		                      int unamode, int rnamode, int t_mismatch);
+     void resetEnergyTablePointers(void);
      extern char EN_DATADIR[256];
 #endif
 
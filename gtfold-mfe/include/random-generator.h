@@ -0,0 +1,104 @@
+#ifndef _RANDOM_GENERATOR_H
+#define _RANDOM_GENERATOR_H
+
+/*
+ * Per-thread xoshiro256** generator used by the stochastic tracebacks in place
+ * of the C library rand() (which is shared by all threads and takes a lock on
+ * every call). Each sample of a batch reseeds the generator of the thread that
+ * draws it from the pair (batch seed, sample index), so the sampled structures
+ * only depend on the seed and not on how the samples are spread over threads
+ * or over separate runs (a run which draws the samples first+1, ..., first+N of
+ * a larger batch sets g_sample_index_offset = first).
+ */
+
+#include <stdint.h>
+#include <time.h>
+
+typedef struct {
+	uint64_t s[4];
+} rng_state_t;
+
+/* Defined in global.cc (one generator per thread): */
+extern __thread rng_state_t g_rng_state;
+
+/* Base seed of the sampling batches: negative means a new seed from the clock for each batch: */
+extern long long g_sample_seed;
+
+/* The global index of the first sample of a batch, minus one: */
+extern long long g_sample_index_offset;
+
+static inline uint64_t rng_splitmix64(uint64_t *x)
+{
+	uint64_t z = (*x += 0x9E3779B97F4A7C15ULL);
+	z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9ULL;
+	z = (z ^ (z >> 27)) * 0x94D049BB133111EBULL;
+	return z ^ (z >> 31);
+}
+
+static inline uint64_t rng_rotl(uint64_t x, int k)
+{
+	return (x << k) | (x >> (64 - k));
+}
+
+/* Seeds state with the stream'th independent sequence of the given seed: */
+static inline void rng_seed_state(rng_state_t *state, uint64_t seed, uint64_t stream)
+{
+	uint64_t x = seed;
+	rng_splitmix64(&x);
+	x ^= stream * 0xD1B54A32D192ED03ULL;
+	for (int k = 0; k < 4; k++)
+		state->s[k] = rng_splitmix64(&x);
+}
+
+static inline uint64_t rng_next(rng_state_t *state)
+{
+	uint64_t *s = state->s;
+	uint64_t result = rng_rotl(s[1] * 5, 7) * 9;
+	uint64_t t = s[1] << 17;
+	s[2] ^= s[0];
+	s[3] ^= s[1];
+	s[1] ^= s[2];
+	s[0] ^= s[3];
+	s[2] ^= t;
+	s[3] = rng_rotl(s[3], 45);
+	return result;
+}
+
+/* Uniform in [0,1) with 53 random bits: */
+static inline double rng_next_double(rng_state_t *state)
+{
+	return (rng_next(state) >> 11) * (1.0 / 9007199254740992.0);
+}
+
+static inline void rng_seed_thread(uint64_t seed, uint64_t stream)
+{
+	rng_seed_state(&g_rng_state, seed, stream);
+}
+
+/* Seeds the generator of the calling thread for the count'th sample of the batch: */
+static inline void rng_seed_sample(uint64_t seed, long long count)
+{
+	rng_seed_thread(seed, (uint64_t) (g_sample_index_offset + count));
+}
+
+static inline double rng_thread_double()
+{
+	return rng_next_double(&g_rng_state);
+}
+
+/* The seed of a new sampling batch: g_sample_seed if it is set, otherwise one
+ * mixed from the clock and a counter (so that two batches started in the same
+ * second still differ):
+ */
+static inline uint64_t rng_batch_seed()
+{
+	static uint64_t batch_counter = 0;
+	if (g_sample_seed >= 0)
+		return (uint64_t) g_sample_seed;
+	uint64_t x = ((uint64_t) time(NULL) << 20) ^ (uint64_t) clock() ^
+		     (uint64_t) (uintptr_t) &batch_counter;
+	x += __sync_add_and_fetch(&batch_counter, 1) * 0x9E3779B97F4A7C15ULL;
+	return rng_splitmix64(&x);
+}
+
+#endif
@@ -9,9 +9,14 @@
 #include <stdlib.h>
 #include "partition-func-d2.h"
 #include "energy.h"
+#include "random-generator.h"
+#include "structure_table.h"
 #include <math.h>
 
 using namespace std;
+
+/* The distinct sampled structures with their (count, energy): */
+typedef StructureTable< std::pair<int,double> > sample_table_t;
 //#include "MyDouble.cc"
 /*
 #ifdef __cplusplus
@@ -114,9 +119,13 @@ public:
 	public:
 		void initialize(int length1, int PF_COUNT_MODE1, int NO_DANGLE_MODE1, int print_energy_decompose, bool PF_D2_UP_APPROX_ENABLED, bool checkFraction1, std::string energy_decompose_output_file, double scaleFactor);
 		void free_traceback();
-		std::map< std::string,std::pair<int,double> > batch_sample(int num_rnd, bool ST_D2_ENABLE_SCATTER_PLOT, bool ST_D2_ENABLE_ONE_SAMPLE_PARALLELIZATION, bool ST_D2_ENABLE_UNIFORM_SAMPLE, double ST_D2_UNIFORM_SAMPLE_ENERGY, bool ST_D2_ENABLE_BPP_PROBABILITY, std::string sampleOutFile, std::string estimateBppOutputFile, std::string scatterPlotOutputFile);
-		std::map< std::string,std::pair<int,double> > batch_sample_parallel(int num_rnd, bool ST_D2_ENABLE_SCATTER_PLOT, bool ST_D2_ENABLE_ONE_SAMPLE_PARALLELIZATION, bool ST_D2_ENABLE_BPP_PROBABILITY, std::string sampleOutFile, std::string estimateBppOutputFile, std::string scatterPlotOutputFile);
-		std::map< std::string,std::pair<int,double> > batch_sample_and_dump(int num_rnd, std::string ctFileDumpDir, std::string stochastic_summery_file_name, std::string seq, std::string seqfile);
+		//The (inside) partition function arrays, valid between initialize and free_traceback:
+		PartitionFunctionD2<MyDouble> & get_partition_function() { return pf_d2; }
+		//Draws one structure (structure[i] = j for the pairs, zero elsewhere, with length+1 entries) and returns its energy:
+		double sample_structure(int* structure) { return rnd_structure(structure); }
+		sample_table_t batch_sample(int num_rnd, bool ST_D2_ENABLE_SCATTER_PLOT, bool ST_D2_ENABLE_ONE_SAMPLE_PARALLELIZATION, bool ST_D2_ENABLE_UNIFORM_SAMPLE, double ST_D2_UNIFORM_SAMPLE_ENERGY, bool ST_D2_ENABLE_BPP_PROBABILITY, std::string sampleOutFile, std::string estimateBppOutputFile, std::string scatterPlotOutputFile);
+		sample_table_t batch_sample_parallel(int num_rnd, bool ST_D2_ENABLE_SCATTER_PLOT, bool ST_D2_ENABLE_ONE_SAMPLE_PARALLELIZATION, bool ST_D2_ENABLE_BPP_PROBABILITY, std::string sampleOutFile, std::string estimateBppOutputFile, std::string scatterPlotOutputFile);
+		sample_table_t batch_sample_and_dump(int num_rnd, std::string ctFileDumpDir, std::string stochastic_summery_file_name, std::string seq, std::string seqfile);
 		void printPfMatrixesToFile(std::string pfArraysOutputFile);
 };
 
@@ -178,7 +187,7 @@ void StochasticTracebackD2<MyDouble>::free_traceback(){
 template <class MyDouble>
 inline MyDouble StochasticTracebackD2<MyDouble>::randdouble()
 {
-	return MyDouble( rand()/(double(RAND_MAX)+1) );
+	return MyDouble( rng_thread_double() );
 }
 
 template <class MyDouble>
@@ -749,7 +758,6 @@ template <class MyDouble>
 double StochasticTracebackD2<MyDouble>::rnd_structure(int* structure)
 {
 	//printf("%lf %lf %lf\n", EA_new(), EB_new(), EC_new());
-	srand(rand());
 	//MyDouble U = pf_d2.get_u(1,len);
 	base_pair first(1,length,U);
 	std::stack<base_pair> g_stack;
@@ -784,7 +792,6 @@ template <class MyDouble>
 double StochasticTracebackD2<MyDouble>::rnd_structure_parallel(int* structure, int threads_for_one_sample)
 {
 	//printf("%lf %lf %lf\n", EA_new(), EB_new(), EC_new());
-	srand(rand());
 	//MyDouble U = pf_d2.get_u(1,len);
 	base_pair first(1,length,U);
 	//std::stack<base_pair> g_stack;
@@ -819,6 +826,9 @@ double StochasticTracebackD2<MyDouble>::rnd_structure_parallel(int* structure, i
 				g_deque.push_back(bp);
 			}
 			int index;
+			// Each item is sampled from its own stream (drawn from the generator of
+			// the calling thread), so the result does not depend on the scheduling:
+			uint64_t itemSeed = rng_next(&g_rng_state);
 			
 			#ifdef _OPENMP
 			//#pragma omp parallel for private(index) shared(energy_threads, g_stack_threads, structure) schedule(guided) num_threads(threads_for_one_sample)
@@ -827,6 +837,8 @@ double StochasticTracebackD2<MyDouble>::rnd_structure_parallel(int* structure, i
 			#endif
 			for (index = 0; index < (int)g_deque.size(); ++index) {
 				int thdId = omp_get_thread_num();
+				rng_state_t threadState = g_rng_state;
+				rng_seed_thread(itemSeed, index);
 				base_pair bp = g_deque[index];
 				if (bp.type() == U)
 					rnd_u(bp.i,bp.j, structure, energy_threads[thdId], g_stack_threads[thdId]);
@@ -836,6 +848,7 @@ double StochasticTracebackD2<MyDouble>::rnd_structure_parallel(int* structure, i
 				}
 				else if (bp.type() == U1)
 					rnd_u1(bp.i,bp.j, structure, energy_threads[thdId], g_stack_threads[thdId]);
+				g_rng_state = threadState;
 			}
 
 			for(index=0; index<threads_for_one_sample; ++index){
@@ -927,7 +940,7 @@ delete [] structure;
  */
 
 template <class MyDouble>
-std::map< std::string,std::pair<int,double> > StochasticTracebackD2<MyDouble>::batch_sample(int num_rnd, bool ST_D2_ENABLE_SCATTER_PLOT, bool ST_D2_ENABLE_ONE_SAMPLE_PARALLELIZATION ,bool ST_D2_ENABLE_UNIFORM_SAMPLE, double ST_D2_UNIFORM_SAMPLE_ENERGY, bool ST_D2_ENABLE_BPP_PROBABILITY, std::string samplesOutputFile, std::string estimateBppOutputFile, std::string scatterPlotOutputFile)
+sample_table_t StochasticTracebackD2<MyDouble>::batch_sample(int num_rnd, bool ST_D2_ENABLE_SCATTER_PLOT, bool ST_D2_ENABLE_ONE_SAMPLE_PARALLELIZATION ,bool ST_D2_ENABLE_UNIFORM_SAMPLE, double ST_D2_UNIFORM_SAMPLE_ENERGY, bool ST_D2_ENABLE_BPP_PROBABILITY, std::string samplesOutputFile, std::string estimateBppOutputFile, std::string scatterPlotOutputFile)
 {cout<<"ST_D2_ENABLE_UNIFORM_SAMPLE="<<ST_D2_ENABLE_UNIFORM_SAMPLE<<",ST_D2_UNIFORM_SAMPLE_ENERGY="<<ST_D2_UNIFORM_SAMPLE_ENERGY<<endl;
 	MyDouble U;
 	
@@ -951,7 +964,7 @@ std::map< std::string,std::pair<int,double> > StochasticTracebackD2<MyDouble>::b
 	  else U = pf_d2.get_u(1,length);*/
 	//U = pf_d2.get_u(1,length);
 	U = pf_d2.unscale(1,length,pf_d2.get_u(1,length));
-	srand(time(NULL));
+	uint64_t seed = rng_batch_seed();
 
 	int threads_for_one_sample = 1;
 	#ifdef _OPENMP
@@ -967,7 +980,7 @@ std::map< std::string,std::pair<int,double> > StochasticTracebackD2<MyDouble>::b
 	#endif
 	if(ST_D2_ENABLE_ONE_SAMPLE_PARALLELIZATION) fprintf(stdout,"Stochastic Traceback: Thread count for one sample parallelization: %3d \n",threads_for_one_sample);
 
-	std::map<std::string,std::pair<int,double> >  uniq_structs;
+	sample_table_t uniq_structs;
 	int* structure = new int[length+1];
 
 	if (num_rnd > 0 ) {
@@ -976,6 +989,9 @@ std::map< std::string,std::pair<int,double> > StochasticTracebackD2<MyDouble>::b
 		for (count = 1; count <= num_rnd; ++count) 
 		{
 			nsamples++;
+			// Seed by attempt rather than by count: a sample rejected by the uniform
+			// sampling check below is retried with the same count
+			rng_seed_sample(seed, nsamples);
 			memset(structure, 0, (length+1)*sizeof(int));
 			double energy;
 			if(ST_D2_ENABLE_ONE_SAMPLE_PARALLELIZATION){
@@ -1000,15 +1016,15 @@ std::map< std::string,std::pair<int,double> > StochasticTracebackD2<MyDouble>::b
 				if (fabs(energy-ST_D2_UNIFORM_SAMPLE_ENERGY)>0.0001){ count--;continue;} //TODO: debug
 			}
 
-			std::map<std::string,std::pair<int,double> >::iterator iter ;
-			if ((iter =uniq_structs.find(ensemble.substr(1))) != uniq_structs.end())
+			std::pair<int,double>* pp = uniq_structs.find(ensemble.c_str()+1);
+			if (pp != NULL)
 			{
-				std::pair<int,double>& pp = iter->second;
-				pp.first++;
-				assert(energy==pp.second);
+				pp->first++;
+				assert(energy==pp->second);
 			}
 			else {
-				if(ST_D2_ENABLE_SCATTER_PLOT) uniq_structs.insert(make_pair(ensemble.substr(1),std::pair<int,double>(1,energy))); 
+				bool inserted;
+				if(ST_D2_ENABLE_SCATTER_PLOT) uniq_structs.insert(ensemble.c_str()+1,std::pair<int,double>(1,energy),inserted); 
 			}
 
 			//if(!ST_D2_ENABLE_SCATTER_PLOT){
@@ -1031,13 +1047,13 @@ std::map< std::string,std::pair<int,double> > StochasticTracebackD2<MyDouble>::b
 			fprintf(scatterPlotoutfile, "nsamples=%d\n",nsamples);
 			fprintf(scatterPlotoutfile, "%s,%s,%s","structure","energy","boltzman_probability");
                         fprintf(scatterPlotoutfile, ",%s,%s\t%s\n","estimated_probability","frequency","structure in triplet notation");
-			std::map<std::string,std::pair<int,double> >::iterator iter ;
+			std::vector<size_t> order = uniq_structs.sorted_indices();
 			int index=0;
-			for (iter = uniq_structs.begin(); iter != uniq_structs.end();  ++iter)
+			for (size_t e = 0; e < order.size();  ++e)
 			{
 				index++;
-				const std::string& ss = iter->first;
-				const std::pair<int,double>& pp = iter->second;
+				const std::string ss = uniq_structs.structure(order[e]);
+				const std::pair<int,double>& pp = uniq_structs.value(order[e]);
 				const double& estimated_p =  (double)pp.first/(double)num_rnd;
 				const double& energy = pp.second;
 				//MyDouble actual_p = (MyDouble(pow(2.718281,-1.0*energy/RT_)))/U;
@@ -1082,11 +1098,11 @@ std::map< std::string,std::pair<int,double> > StochasticTracebackD2<MyDouble>::b
 			for(int p=1; p<=length; ++p) for(int q=p+1; q<=length; ++q) bpp_freq[p][q]=0;
 			//for(int p=1; p<=length; ++p) for(int q=1; q<=length; ++q) bpp_freq[p][q]=0;
 			int total_bpp_freq=0;
-			std::map<std::string,std::pair<int,double> >::iterator iter ;
-			for (iter = uniq_structs.begin(); iter != uniq_structs.end();  ++iter)
+			std::string struc_str;
+			for (size_t e = 0; e < uniq_structs.size();  ++e)
 			{
-				const std::string& struc_str = iter->first;
-				const std::pair<int,double>& pp = iter->second;
+				uniq_structs.structure(e, struc_str);
+				const std::pair<int,double>& pp = uniq_structs.value(e);
 				const int& struc_freq =  pp.first;
 				updateBppFreq(struc_str, struc_freq, bpp_freq, length, total_bpp_freq);
 			}
@@ -1131,7 +1147,7 @@ void StochasticTracebackD2<MyDouble>::updateBppFreq(std::string struc_str, int s
 }
 
 template <class MyDouble>
-std::map< std::string,std::pair<int,double> > StochasticTracebackD2<MyDouble>::batch_sample_parallel(int num_rnd, bool ST_D2_ENABLE_SCATTER_PLOT, bool ST_D2_ENABLE_ONE_SAMPLE_PARALLELIZATION, bool ST_D2_ENABLE_BPP_PROBABILITY, std::string samplesOutputFile, std::string estimateBppOutputFile, std::string scatterPlotOutputFile)
+sample_table_t StochasticTracebackD2<MyDouble>::batch_sample_parallel(int num_rnd, bool ST_D2_ENABLE_SCATTER_PLOT, bool ST_D2_ENABLE_ONE_SAMPLE_PARALLELIZATION, bool ST_D2_ENABLE_BPP_PROBABILITY, std::string samplesOutputFile, std::string estimateBppOutputFile, std::string scatterPlotOutputFile)
 {
 	//MyDouble U = pf_d2.get_u(1,length);
 	MyDouble U;
@@ -1156,7 +1172,7 @@ std::map< std::string,std::pair<int,double> > StochasticTracebackD2<MyDouble>::b
 	//U = pf_d2.get_u(1,length);
 	U = pf_d2.unscale(1,length,pf_d2.get_u(1,length));
 
-	srand(time(NULL));
+	uint64_t seed = rng_batch_seed();
 	/*
 	//OPTIMIZED CODE STARTS
 	#ifdef _OPENMP
@@ -1224,11 +1240,11 @@ std::map< std::string,std::pair<int,double> > StochasticTracebackD2<MyDouble>::b
 
 
 
-	std::map<std::string,std::pair<int,double> >  uniq_structs;
+	sample_table_t uniq_structs;
 	//std::map<std::string,std::pair<int,double> >  uniq_structs_thread[g_nthreads];
 	//g_nthreads=4;//TODO remove this line
 	//cout<<"Manoj after: g_nthreads="<<g_nthreads<<endl;
-	std::map<std::string,std::pair<int,double> > *  uniq_structs_thread = new std::map<std::string,std::pair<int,double> >[threads_for_counts];
+	sample_table_t *  uniq_structs_thread = new sample_table_t[threads_for_counts];
 	int* structures_thread = new int[threads_for_counts*(length+1)];
 
 	if (num_rnd > 0 ) {
@@ -1245,6 +1261,7 @@ std::map< std::string,std::pair<int,double> > StochasticTracebackD2<MyDouble>::b
 			//nsamples++;
 			int thdId = omp_get_thread_num();
 			countArr[thdId]++;
+			rng_seed_sample(seed, count);
 			//cout<<"thdId="<<thdId<<endl;
 			int* structure = structures_thread + thdId*(length+1);
 			memset(structure, 0, (length+1)*sizeof(int));
@@ -1272,18 +1289,11 @@ std::map< std::string,std::pair<int,double> > StochasticTracebackD2<MyDouble>::b
 			 */
 
 			if(ST_D2_ENABLE_SCATTER_PLOT){
-				std::map<std::string,std::pair<int,double> >::iterator iter ;
-				if ((iter =uniq_structs_thread[thdId].find(ensemble.substr(1))) != uniq_structs_thread[thdId].end())
-				{
-					std::pair<int,double>& pp = iter->second;
-					pp.first++;
-					//cout<<"energy="<<energy<<",pp.second="<<pp.second<<endl;
-					assert(energy==pp.second);
-				}
-				else{
-					std::pair< std::string, std::pair<int,double> > new_pp = make_pair(ensemble.substr(1),std::pair<int,double>(1,energy));
-					uniq_structs_thread[thdId].insert(new_pp); 
-				}
+				bool inserted;
+				std::pair<int,double>& pp = uniq_structs_thread[thdId].insert(ensemble.c_str()+1,std::pair<int,double>(0,energy),inserted);
+				pp.first++;
+				//cout<<"energy="<<energy<<",pp.second="<<pp.second<<endl;
+				assert(energy==pp.second);
 			}
 			//uniq_structs_thread[thdId].insert(make_pair(ensemble.substr(1),std::pair<int,double>(1,energy))); 
 
@@ -1301,6 +1311,7 @@ std::map< std::string,std::pair<int,double> > StochasticTracebackD2<MyDouble>::b
 			//nsamples++;
 			int thdId = 0;//omp_get_thread_num();
 			//countArr[thdId]++;
+			rng_seed_sample(seed, count);
 			//cout<<"thdId="<<thdId<<endl;
 			int* structure = structures_thread + thdId*(length+1);
 			memset(structure, 0, (length+1)*sizeof(int));
@@ -1327,18 +1338,17 @@ std::map< std::string,std::pair<int,double> > StochasticTracebackD2<MyDouble>::b
 			if (fabs(energy-myEnegry)>0.0001){ count--;continue;} //TODO: debug
 			 */
 
-			std::map<std::string,std::pair<int,double> >::iterator iter ;
-			if ((iter =uniq_structs_thread[thdId].find(ensemble.substr(1))) != uniq_structs_thread[thdId].end())
+			std::pair<int,double>* pp = uniq_structs_thread[thdId].find(ensemble.c_str()+1);
+			if (pp != NULL)
 			{
-				std::pair<int,double>& pp = iter->second;
-				pp.first++;
+				pp->first++;
 				//cout<<"energy="<<energy<<",pp.second="<<pp.second<<endl;
-				assert(energy==pp.second);
+				assert(energy==pp->second);
 			}
 			else {
 				if(ST_D2_ENABLE_SCATTER_PLOT){
-					std::pair< std::string, std::pair<int,double> > new_pp = make_pair(ensemble.substr(1),std::pair<int,double>(1,energy));
-					uniq_structs_thread[thdId].insert(new_pp); 
+					bool inserted;
+					uniq_structs_thread[thdId].insert(ensemble.c_str()+1,std::pair<int,double>(1,energy),inserted); 
 				}
 				//uniq_structs_thread[thdId].insert(make_pair(ensemble.substr(1),std::pair<int,double>(1,energy))); 
 			}
@@ -1354,26 +1364,20 @@ std::map< std::string,std::pair<int,double> > StochasticTracebackD2<MyDouble>::b
 
 		if(ST_D2_ENABLE_SCATTER_PLOT){
 			for(int thd_id=0; thd_id<threads_for_counts; thd_id++){
-				std::map<std::string,std::pair<int,double> >::iterator thd_iter ;
-				for (thd_iter = uniq_structs_thread[thd_id].begin(); thd_iter != uniq_structs_thread[thd_id].end();  ++thd_iter)
+				std::string thd_ss;
+				for (size_t thd_idx = 0; thd_idx < uniq_structs_thread[thd_id].size();  ++thd_idx)
 				{
-					const std::string& thd_ss = thd_iter->first;
-					const std::pair<int,double>& thd_pp = thd_iter->second;
+					uniq_structs_thread[thd_id].structure(thd_idx, thd_ss);
+					const std::pair<int,double>& thd_pp = uniq_structs_thread[thd_id].value(thd_idx);
 					const int thd_freq = thd_pp.first;
 					const double thd_e = thd_pp.second;
 
-					std::map<std::string,std::pair<int,double> >::iterator iter ;
-					if ((iter =uniq_structs.find(thd_ss)) != uniq_structs.end())
-					{
-						std::pair<int,double>& pp = iter->second;
-						(pp.first)+=thd_freq;
-						const double e = pp.second;
-						//cout<<"e="<<e<<",thd_e="<<thd_e<<endl;
-						assert(e==thd_e);
-					}
-					else {
-						uniq_structs.insert(make_pair(thd_ss,std::pair<int,double>(thd_freq,thd_e)));
-					}
+					bool inserted;
+					std::pair<int,double>& pp = uniq_structs.insert(thd_ss,std::pair<int,double>(0,thd_e),inserted);
+					(pp.first)+=thd_freq;
+					const double e = pp.second;
+					//cout<<"e="<<e<<",thd_e="<<thd_e<<endl;
+					assert(e==thd_e);
 				}
 			}
 		}
@@ -1391,13 +1395,13 @@ std::map< std::string,std::pair<int,double> > StochasticTracebackD2<MyDouble>::b
 			fprintf(scatterPlotoutfile, "nsamples=%d\n",num_rnd);
 			fprintf(scatterPlotoutfile, "%s,%s,%s","structure","energy","boltzman_probability");
 			fprintf(scatterPlotoutfile, ",%s,%s\t%s\n","estimated_probability","frequency","structure in triplet notation");
-			std::map<std::string,std::pair<int,double> >::iterator iter ;
+			std::vector<size_t> order = uniq_structs.sorted_indices();
 			int index=0;
-			for (iter = uniq_structs.begin(); iter != uniq_structs.end();  ++iter)
+			for (size_t e = 0; e < order.size();  ++e)
 			{
 				index++;
-				const std::string& ss = iter->first;
-				const std::pair<int,double>& pp = iter->second;
+				const std::string ss = uniq_structs.structure(order[e]);
+				const std::pair<int,double>& pp = uniq_structs.value(order[e]);
 				const double& estimated_p =  (double)pp.first/(double)num_rnd;
 				const double& energy = pp.second;
 				//MyDouble actual_p = (MyDouble(pow(2.718281,-1.0*energy/RT_)))/U;
@@ -1442,11 +1446,11 @@ std::map< std::string,std::pair<int,double> > StochasticTracebackD2<MyDouble>::b
                         for(int p=1; p<=length; ++p) for(int q=p+1; q<=length; ++q) bpp_freq[p][q]=0;
                         //for(int p=1; p<=length; ++p) for(int q=1; q<=length; ++q) bpp_freq[p][q]=0;
                         int total_bpp_freq=0;
-                        std::map<std::string,std::pair<int,double> >::iterator iter ;
-                        for (iter = uniq_structs.begin(); iter != uniq_structs.end();  ++iter)
+                        std::string struc_str;
+                        for (size_t e = 0; e < uniq_structs.size();  ++e)
                         {
-                                const std::string& struc_str = iter->first;
-                                const std::pair<int,double>& pp = iter->second;
+                                uniq_structs.structure(e, struc_str);
+                                const std::pair<int,double>& pp = uniq_structs.value(e);
                                 const int& struc_freq =  pp.first;
                                 updateBppFreq(struc_str, struc_freq, bpp_freq, length, total_bpp_freq);
                         }
@@ -1471,7 +1475,7 @@ std::map< std::string,std::pair<int,double> > StochasticTracebackD2<MyDouble>::b
 
 
 template <class MyDouble>
-std::map< std::string,std::pair<int,double> > StochasticTracebackD2<MyDouble>::batch_sample_and_dump(int num_rnd, std::string ctFileDumpDir, std::string stochastic_summery_file_name, std::string seq, std::string seqfile)
+sample_table_t StochasticTracebackD2<MyDouble>::batch_sample_and_dump(int num_rnd, std::string ctFileDumpDir, std::string stochastic_summery_file_name, std::string seq, std::string seqfile)
 {
 	//MyDouble U = pf_d2.get_u(1,length);
 	 MyDouble U;
@@ -1506,8 +1510,8 @@ std::map< std::string,std::pair<int,double> > StochasticTracebackD2<MyDouble>::b
 	cout<<"Sequence Name = "<<seqname<<endl;
 	//data dump preparation code ends here
 
-	srand(time(NULL));
-	std::map<std::string,std::pair<int,double> >  uniq_structs;
+	uint64_t seed = rng_batch_seed();
+	sample_table_t uniq_structs;
 	int* structure = new int[length+1];
 	if (num_rnd > 0 ) {
 		printf("\nSampling structures...\n");
@@ -1515,6 +1519,7 @@ std::map< std::string,std::pair<int,double> > StochasticTracebackD2<MyDouble>::b
 		//int nsamples =0;
 		for (count = 1; count <= num_rnd; ++count) 
 		{
+			rng_seed_sample(seed, count);
 			memset(structure, 0, (length+1)*sizeof(int));
 			double energy = rnd_structure(structure);
 
@@ -1534,15 +1539,8 @@ std::map< std::string,std::pair<int,double> > StochasticTracebackD2<MyDouble>::b
 			if (fabs(energy-myEnegry)>0.0001) continue; //TODO: debug
 			//++count;
 			*/
-			std::map<std::string,std::pair<int,double> >::iterator iter ;
-			if ((iter =uniq_structs.find(ensemble.substr(1))) != uniq_structs.end())
-			{
-				std::pair<int,double>& pp = iter->second;
-				pp.first++;
-			}
-			else {
-				uniq_structs.insert(make_pair(ensemble.substr(1),std::pair<int,double>(1,energy))); 
-			}
+			bool inserted;
+			uniq_structs.insert(ensemble.c_str()+1,std::pair<int,double>(0,energy),inserted).first++;
 
 			// std::cout << ensemble.substr(1) << ' ' << energy << std::endl;
 			//data dump code starts here
@@ -1559,11 +1557,11 @@ std::map< std::string,std::pair<int,double> > StochasticTracebackD2<MyDouble>::b
 
 		printf("%s,%s,%s","structure","energy","boltzman_probability");
 		printf(",%s,%s\n","estimated_probability","frequency");
-		std::map<std::string,std::pair<int,double> >::iterator iter ;
-		for (iter = uniq_structs.begin(); iter != uniq_structs.end();  ++iter)
+		std::vector<size_t> order = uniq_structs.sorted_indices();
+		for (size_t e = 0; e < order.size();  ++e)
 		{
-			const std::string& ss = iter->first;
-			const std::pair<int,double>& pp = iter->second;
+			const std::string ss = uniq_structs.structure(order[e]);
+			const std::pair<int,double>& pp = uniq_structs.value(order[e]);
 			const double& estimated_p =  (double)pp.first/(double)num_rnd;
 			const double& energy = pp.second;
 	
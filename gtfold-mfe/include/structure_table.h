@@ -0,0 +1,200 @@
+#ifndef _STRUCTURE_TABLE_H
+#define _STRUCTURE_TABLE_H
+
+/*
+ * Open addressing hash table of dot bracket structures (all of one length), used
+ * in place of a std::map keyed on the structure strings to find the duplicate
+ * subopt structures and to count the distinct sampled structures. Each structure
+ * is stored once, packed two bits per base ('(', ')' and '.'), in one array of
+ * the table (so an entry costs length / 4 bytes plus its value and hash, where a
+ * map node holds a heap allocated string), and the hash is only used to find the
+ * candidate entries, which are then compared exactly. The entries keep their
+ * insertion order, and sorted_indices lists them in the order of a std::map.
+ */
+
+#include <assert.h>
+#include <stdint.h>
+#include <string.h>
+
+#include <algorithm>
+#include <string>
+#include <vector>
+
+template <typename Value_t>
+class StructureTable {
+public:
+	StructureTable() : length_(-1), row_bytes_(0), slot_mask_(0) {}
+
+	size_t size() const { return values_.size(); }
+
+	bool empty() const { return values_.empty(); }
+
+	/* Returns the value of dotStruct, inserting value for it first (and setting
+	 * inserted) if it is not in the table yet:
+	 */
+	Value_t & insert(const char *dotStruct, const Value_t &value, bool &inserted)
+	{
+		if (length_ < 0) {
+			length_ = strlen(dotStruct);
+			row_bytes_ = (length_ + 3) / 4;
+			row_.resize(row_bytes_);
+		}
+		assert((int) strlen(dotStruct) == length_);
+		pack(dotStruct, &row_[0]);
+		uint64_t hash = hash_row(&row_[0]);
+		size_t slot = find_slot(&row_[0], hash);
+		inserted = (slots_.empty() || slots_[slot] == 0);
+		if (!inserted) {
+			return values_[slots_[slot] - 1];
+		}
+		if (2 * (values_.size() + 1) > slots_.size()) {
+			grow();
+			slot = find_slot(&row_[0], hash);
+		}
+		packed_.insert(packed_.end(), row_.begin(), row_.end());
+		hashes_.push_back(hash);
+		values_.push_back(value);
+		slots_[slot] = (uint32_t) values_.size();
+		return values_.back();
+	}
+
+	Value_t & insert(const std::string &dotStruct, const Value_t &value, bool &inserted)
+	{
+		return insert(dotStruct.c_str(), value, inserted);
+	}
+
+	/* Returns the value of dotStruct, or NULL if it is not in the table: */
+	Value_t * find(const char *dotStruct)
+	{
+		if (values_.empty() || (int) strlen(dotStruct) != length_) {
+			return NULL;
+		}
+		pack(dotStruct, &row_[0]);
+		size_t slot = find_slot(&row_[0], hash_row(&row_[0]));
+		return slots_[slot] == 0 ? NULL : &values_[slots_[slot] - 1];
+	}
+
+	/* Writes the structure of the index'th entry to str (and returns it): */
+	const char * structure(size_t index, std::string &str) const
+	{
+		static const char codes[] = "().?";
+		const uint8_t *row = &packed_[index * row_bytes_];
+		str.resize(length_);
+		for (int k = 0; k < length_; k++) {
+			str[k] = codes[(row[k >> 2] >> (6 - 2 * (k & 3))) & 3];
+		}
+		return str.c_str();
+	}
+
+	std::string structure(size_t index) const
+	{
+		std::string str;
+		structure(index, str);
+		return str;
+	}
+
+	Value_t & value(size_t index) { return values_[index]; }
+
+	const Value_t & value(size_t index) const { return values_[index]; }
+
+	/* The indices of the entries in the order of their structures (since '(' < ')' < '.'
+	 * are packed as 0 < 1 < 2, from the high bits of each byte down, the packed rows
+	 * compare as the strings do):
+	 */
+	std::vector<size_t> sorted_indices() const
+	{
+		std::vector<size_t> indices(values_.size());
+		for (size_t e = 0; e < indices.size(); e++) {
+			indices[e] = e;
+		}
+		std::sort(indices.begin(), indices.end(), row_less(*this));
+		return indices;
+	}
+
+	void swap(StructureTable &table)
+	{
+		std::swap(length_, table.length_);
+		std::swap(row_bytes_, table.row_bytes_);
+		std::swap(slot_mask_, table.slot_mask_);
+		packed_.swap(table.packed_);
+		hashes_.swap(table.hashes_);
+		values_.swap(table.values_);
+		slots_.swap(table.slots_);
+		row_.swap(table.row_);
+	}
+
+private:
+	struct row_less {
+		const StructureTable &table;
+		row_less(const StructureTable &t) : table(t) {}
+		bool operator()(size_t e1, size_t e2) const {
+			return memcmp(&table.packed_[e1 * table.row_bytes_],
+				      &table.packed_[e2 * table.row_bytes_], table.row_bytes_) < 0;
+		}
+	};
+
+	void pack(const char *dotStruct, uint8_t *row) const
+	{
+		memset(row, 0, row_bytes_);
+		for (int k = 0; k < length_; k++) {
+			uint8_t code = (dotStruct[k] == '(') ? 0 : (dotStruct[k] == ')') ? 1 :
+				       (dotStruct[k] == '.') ? 2 : 3;
+			row[k >> 2] |= code << (6 - 2 * (k & 3));
+		}
+	}
+
+	uint64_t hash_row(const uint8_t *row) const
+	{
+		uint64_t hash = 0x9E3779B97F4A7C15ULL ^ (uint64_t) length_;
+		for (int b = 0; b < row_bytes_; b += 8) {
+			uint64_t word = 0;
+			memcpy(&word, row + b, std::min(8, row_bytes_ - b));
+			hash = (hash ^ word) * 0xBF58476D1CE4E5B9ULL;
+			hash ^= hash >> 31;
+		}
+		hash *= 0x94D049BB133111EBULL;
+		return hash ^ (hash >> 29);
+	}
+
+	/* The slot of row, or the empty slot where it goes: */
+	size_t find_slot(const uint8_t *row, uint64_t hash) const
+	{
+		if (slots_.empty()) {
+			return 0;
+		}
+		size_t slot = hash & slot_mask_;
+		while (slots_[slot] != 0) {
+			size_t e = slots_[slot] - 1;
+			if (hashes_[e] == hash && !memcmp(&packed_[e * row_bytes_], row, row_bytes_)) {
+				break;
+			}
+			slot = (slot + 1) & slot_mask_;
+		}
+		return slot;
+	}
+
+	void grow()
+	{
+		size_t num_slots = slots_.empty() ? 64 : 2 * slots_.size();
+		slots_.assign(num_slots, 0);
+		slot_mask_ = num_slots - 1;
+		for (size_t e = 0; e < values_.size(); e++) {
+			size_t slot = hashes_[e] & slot_mask_;
+			while (slots_[slot] != 0) {
+				slot = (slot + 1) & slot_mask_;
+			}
+			slots_[slot] = (uint32_t) (e + 1);
+		}
+	}
+
+	int length_;
+	int row_bytes_;
+	size_t slot_mask_;
+	std::vector<uint8_t> packed_;   /* the packed structures, row_bytes_ each */
+	std::vector<uint64_t> hashes_;
+	std::vector<Value_t> values_;
+	std::vector<uint32_t> slots_;   /* entry index + 1, or 0 for an empty slot */
+	std::vector<uint8_t> row_;      /* the structure being looked up */
+};
+
+#endif
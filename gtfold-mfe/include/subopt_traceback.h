@@ -35,6 +35,8 @@
 #include <cstdlib>
 #include <fstream>
 
+#include "structure_table.h"
+
 //#define UNIQUE_MULTILOOP_DECOMPOSITION
 //extern int UNIQUE_MULTILOOP_DECOMPOSITION;
 
@@ -86,24 +88,66 @@ struct segment
 typedef segment SEG;
 typedef std::stack<segment>  SEGSTACK;
 
+/* A node of the persistent (immutable, shared) lists of a partial structure: the 
+ * segments left to fold, or the base pairs (i_, j_) so far. The partial structures 
+ * which a trace_func makes from one another share the nodes of their common parts, 
+ * which are reference counted and allocated from the arena of the current traceback 
+ * (see subopt_traceback.cc), so copying a partial structure allocates nothing: 
+ */
+struct ps_node
+{
+	segment seg;
+	ps_node *next;
+	int refs;
+
+	ps_node(const segment& s, ps_node *n) : seg(s), next(n), refs(1) {}
+};
+
+/* Returns a new node in front of next (taking over the reference to next): */
+ps_node * ps_node_push(const segment& seg, ps_node *next);
+
+/* Drops a reference to node, and frees the nodes which are no longer referenced: */
+void ps_node_release(ps_node *node);
+
+static inline ps_node * ps_node_retain(ps_node *node)
+{
+	if (node != NULL) __atomic_add_fetch(&node->refs, 1, __ATOMIC_RELAXED);
+	return node;
+}
+
+/* Returns the rest of the list after node (taking over the reference to node): */
+static inline ps_node * ps_node_pop(ps_node *node)
+{
+	ps_node *next = node->next;
+	if (__atomic_load_n(&node->refs, __ATOMIC_ACQUIRE) == 1) {
+		// The only reference, so the reference of node to next is handed over:
+		node->next = NULL;
+	}
+	else {
+		ps_node_retain(next);
+	}
+	ps_node_release(node);
+	return next;
+}
+
 struct pstruct
 {
-	std::string str;
-	SEGSTACK st_segment;
-	SEGSTACK st_v; /* used for backtracking in traceWM */
+	ps_node *segments_; /* the stack of segments left to fold */
+	ps_node *pairs_;    /* the base pairs, the last one added first */
+	int len_;
 	
 	int ae_;
 	int le_;
 
 	int total() const { return ae_ + le_; }
 
-	pstruct() {}
+	pstruct() : segments_(NULL), pairs_(NULL), len_(0), ae_(0), le_(0) {}
 	
 	pstruct(const pstruct& ps)
 	{
-		str = ps.str;
-		st_segment = ps.st_segment;
-		st_v = ps.st_v;
+		segments_ = ps_node_retain(ps.segments_);
+		pairs_ = ps_node_retain(ps.pairs_);
+		len_ = ps.len_;
 		ae_ = ps.ae_;
 		le_ = ps.le_;
 	}
@@ -112,25 +156,33 @@ struct pstruct
 	{
 		if (&ps != this)
 		{
-			str = ps.str;
-			st_segment = ps.st_segment;
-			st_v = ps.st_v;
+			ps_node *segments = ps_node_retain(ps.segments_);
+			ps_node *pairs = ps_node_retain(ps.pairs_);
+			ps_node_release(segments_);
+			ps_node_release(pairs_);
+			segments_ = segments;
+			pairs_ = pairs;
+			len_ = ps.len_;
 			ae_ = ps.ae_;
 			le_ = ps.le_;
 		}
 		return *this;
 	}
 
+	~pstruct()
+	{
+		ps_node_release(segments_);
+		ps_node_release(pairs_);
+	}
 
-	void update(int i, int j, char c1, char c2)
+	void add_pair(int i, int j)
 	{
-		str[i-1] = c1; str[j-1] = c2;	
+		pairs_ = ps_node_push(segment(i, j, lV, 0), pairs_);
 	}
 
-	pstruct(int ae, int len) : ae_(ae) 
+	pstruct(int ae, int len) : segments_(NULL), pairs_(NULL), len_(len), ae_(ae) 
 	{
 		le_ = 0;
-		str = std::string(len, '.');
 	}
 
 	void accumulate(int en)
@@ -140,71 +192,46 @@ struct pstruct
 
 	void push(segment seg) 
 	{
-		st_segment.push(seg);
-		le_ += seg.en_;
-	}
-
-	void push_v(segment seg) 
-	{
-		st_v.push(seg);
+		segments_ = ps_node_push(seg, segments_);
 		le_ += seg.en_;
 	}
 
 	void pop()
 	{
-		segment seg = st_segment.top();
-		le_ -= seg.en_;
-		st_segment.pop();
-	}
-
-	void pop_v()
-	{
-		segment seg = st_v.top();
-		le_ -= seg.en_;
-		st_v.pop();
+		le_ -= segments_->seg.en_;
+		segments_ = ps_node_pop(segments_);
 	}
 
 	segment top()
 	{
-		return st_segment.top();
-	}
-
-
-	segment top_v()
-	{
-		return st_v.top();
+		return segments_->seg;
 	}
 
 	bool empty() 
 	{
-		return st_segment.empty();
+		return segments_ == NULL;
 	}
 
-	bool empty_v() 
+	/* Writes the dot bracket structure of the base pairs so far to str (and returns it): */
+	const char * structure(std::string& str) const
 	{
-		return st_v.empty();
+		str.assign(len_, '.');
+		for (ps_node *pr = pairs_; pr != NULL; pr = pr->next)
+		{
+			str[pr->seg.i_-1] = '('; str[pr->seg.j_-1] = ')';
+		}
+		return str.c_str();
 	}
 
 	void print() const
 	{
-		SEGSTACK st = st_segment;
 		std::cout <<'[' << ' ' ;
-		while (!st.empty())
+		for (ps_node *sn = segments_; sn != NULL; sn = sn->next)
 		{
-			segment seg = st.top();
-			std::cout << seg << ' '; 
-			st.pop();	
+			std::cout << sn->seg << ' '; 
 		}
-
-		st = st_v;
-		std::cout << ']' << ' ' << '[' ;
-		while (!st.empty())
-		{
-			segment seg = st.top();
-			std::cout << seg << ' '; 
-			st.pop();	
-		}
-		std::cout << ']' << ' ' << str << ' ' ;
+		std::string str;
+		std::cout << ']' << ' ' << structure(str) << ' ' ;
 		std::cout << " ae=" << ae_ << " le=" << le_ << " te=" << ae_+le_  ;
 	}
 };
@@ -221,6 +248,9 @@ typedef std::map<std::string, pstruct> ps_map_t;
 /* secondary structure map */
 typedef std::map<std::string, int> ss_map_t;
 
+/* secondary structure table (the energies of the structures, see structure_table.h) */
+typedef StructureTable<int> ss_table_t;
+
 #include "subopt_traceback_cinclude.h"
 
 #ifdef __cplusplus
@@ -228,6 +258,9 @@ extern "C" {
      void push_to_gstack(ps_stack_t & gs, const ps_t& v);
      ss_map_t subopt_traceback(int len, int gap, const char *suboptFile, int writeToFile, 
 		               int is_check_for_duplicates_enabled, int max_structure_count);
+     ss_map_t subopt_traceback_parallel(int len, int gap, const char *suboptFile, int writeToFile, 
+		                        int is_check_for_duplicates_enabled, int max_structure_count, 
+					int num_threads);
 
      void subopt_traceV(int i, int j, ps_t & ps, ps_stack_t & gs); 
      void subopt_traceVBI(int i, int j, ps_t & ps, ps_stack_t & gs);
@@ -239,6 +272,7 @@ extern "C" {
      void subopt_traceM1(int i, int j, ps_t & ps, ps_stack_t & gs);
 
      ss_ctype_t * SSMapToCType(const ss_map_t &ssm, int *arrCount);
+     ss_ctype_t * SSTableToCType(const ss_table_t &sst, int *arrCount);
      //ss_ctype_t * SuboptTraceback(int len, int gap, const char *suboptFile, int writeToFile, 
      //                             int is_check_for_duplicates_enabled, int max_structure_count,
      //                             int *arrayCount);
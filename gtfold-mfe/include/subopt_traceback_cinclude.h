@@ -6,16 +6,35 @@ typedef struct {
      int energy;
 } ss_ctype_t;
 
+/* Called by subopt_traceback_visit on each structure (dot bracket notation, energy) 
+ * as the traceback completes it. Returning zero stops the traceback: 
+ */
+typedef int (*subopt_visit_t)(const char *dotStruct, int energy, void *visitArg);
+
 #ifdef __cplusplus
 extern "C" {
 ss_ctype_t * SuboptTraceback(int len, int gap, const char *suboptFile, int writeToFile, 
                              int is_check_for_duplicates_enabled, int max_structure_count, 
 			     int *arrayCount);
+ss_ctype_t * SuboptTracebackParallel(int len, int gap, const char *suboptFile, int writeToFile, 
+                                     int is_check_for_duplicates_enabled, int max_structure_count, 
+                                     int numThreads, int *arrayCount);
+int subopt_traceback_visit(int len, int gap, int max_structure_count, 
+		           subopt_visit_t visit, void *visitArg);
+int subopt_kbest_visit(int len, int k, subopt_visit_t visit, void *visitArg);
+char ** subopt_energy_band_counts(int len, int gap, int binWidth, int *numBins);
 }
 #else 
 ss_ctype_t * SuboptTraceback(int len, int gap, const char *suboptFile, int writeToFile, 
                              int is_check_for_duplicates_enabled, int max_structure_count, 
 			     int *arrayCount);
+ss_ctype_t * SuboptTracebackParallel(int len, int gap, const char *suboptFile, int writeToFile, 
+                                     int is_check_for_duplicates_enabled, int max_structure_count, 
+                                     int numThreads, int *arrayCount);
+int subopt_traceback_visit(int len, int gap, int max_structure_count, 
+		           subopt_visit_t visit, void *visitArg);
+int subopt_kbest_visit(int len, int k, subopt_visit_t visit, void *visitArg);
+char ** subopt_energy_band_counts(int len, int gap, int binWidth, int *numBins);
 #endif
 
 #endif
@@ -1,6 +1,7 @@
 #include <stdlib.h>
 #include <stdio.h>
 #include <math.h>
+#include <string.h>
 
 #include "energy.h"
 #include "utils.h"
@@ -21,83 +22,65 @@ int alloc_flag = 0;
 const float RT = ((0.00198721 * 310.15)*100); //* 100.00);
 const float RT_ = (0.00198721 * 310.15);
 
-void create_tables(int len) {	
-	V = (int *) malloc(((len+1)*len/2 + 1) * sizeof(int));
-	if (V == NULL) {
-		perror("Cannot allocate variable 'V'");
+/* The tables are an arena which is kept from one fold to the next: create_tables 
+ * only allocates when len is larger than any sequence folded since the last 
+ * release_tables (the tables are then sized for len), and free_tables leaves them 
+ * for the next fold. The index of V(i,j) does not depend on the sequence length 
+ * and the rows of WM, WMPrime and PP are blocks of one allocation each, so tables 
+ * sized for a longer sequence serve any shorter one as they are.
+ */
+static int table_capacity = -1;
+static int *WM_block = NULL;
+static int *WMPrime_block = NULL;
+static int *PP_block = NULL;
+
+static void * alloc_table(size_t size, const char *name) {
+	void *table = malloc(size);
+	if (table == NULL) {
+		fprintf(stderr, "Cannot allocate variable '%s'\n", name);
 		exit(-1);
 	}
+	return table;
+}
 
+static int ** alloc_rows(int len, int **block, const char *name) {
 	int i;
-	WM = (int **) malloc((len+1)* sizeof(int *));
-	if (WM == NULL) {
-		perror("Cannot allocate variable 'WM'");
-		exit(-1);
-	}   
-	for (i = 0; i <= len; i++) {
-		WM[i] = (int *)malloc((len+1)* sizeof(int));
-		if (WM[i] == NULL) {
-			perror("Cannot allocate variable 'WM[i]'");
-			exit(-1);
-		}   
-	}
-
-	PP = (int **) malloc((len+1)* sizeof(int *));
-	if (PP == NULL) {
-		perror("Cannot allocate variable 'WM'");
-		exit(-1);
-	}   
-	for (i = 0; i <= len; i++) {
-		PP[i] = (int *)malloc((len+1)* sizeof(int));
-		if (PP[i] == NULL) {
-			perror("Cannot allocate variable 'WM[i]'");
-			exit(-1);
-		}   
-	}
-
-  	WMPrime = (int **) malloc((len+1)* sizeof(int *));
-	if (WMPrime == NULL) {
-		perror("Cannot allocate variable 'WM'");
-		exit(-1);
-	}   
-	for (i = 0; i <= len; i++) {
-		WMPrime[i] = (int *)malloc((len+1)* sizeof(int));
-		if (WMPrime[i] == NULL) {
-			perror("Cannot allocate variable 'WM[i]'");
-			exit(-1);
-		}   
-	}
-
-	VM = (int *) malloc(((len+1)*len/2 + 1) * sizeof(int));
-	if (VM == NULL) {
-		perror("Cannot allocate variable 'V'");
-		exit(-1);
-	}
-
-	VBI = (int *) malloc(((len+1)*len/2 + 1) * sizeof(int));
-	if (VBI == NULL) {
-		perror("Cannot allocate variable 'V'");
-		exit(-1);
-	}
+	int **rows = (int **) alloc_table((len+1) * sizeof(int *), name);
+	*block = (int *) alloc_table((size_t) (len+1) * (len+1) * sizeof(int), name);
+	for (i = 0; i <= len; i++) 
+		rows[i] = *block + (size_t) i * (len+1);
+	return rows;
+}
 
-	W = (int *) malloc((len+1) * sizeof(int));
-	if (W == NULL) {
-		perror("Cannot allocate variable 'W'");
-		exit(-1);
+void create_tables(int len) {	
+	if (alloc_flag == 1 && len <= table_capacity) {
+		init_tables(len);
+		return;
 	}
+	release_tables();
+
+	size_t triangle = (size_t) (len+1)*len/2 + 1;
+	V = (int *) alloc_table(triangle * sizeof(int), "V");
+	VM = (int *) alloc_table(triangle * sizeof(int), "VM");
+	VBI = (int *) alloc_table(triangle * sizeof(int), "VBI");
+	WM = alloc_rows(len, &WM_block, "WM");
+	WMPrime = alloc_rows(len, &WMPrime_block, "WMPrime");
+	PP = alloc_rows(len, &PP_block, "PP");
+	W = (int *) alloc_table((len+1) * sizeof(int), "W");
+	indx = (int *) alloc_table((len+1) * sizeof(int), "indx");
 
-	indx = (int*) malloc((len+1) * sizeof(int));
-	if (indx == NULL) {
-		perror("Cannot allocate variable 'indx'");
-		exit(-1);
-	}
+	int i;
+	indx[0] = 0;
+	for (i = 1; i <= len; i++) 
+	    indx[i] = (i*(i-1)) >> 1;        /* n(n-1)/2 */
 
+	table_capacity = len;
 	alloc_flag = 1;
 	
 	init_tables(len);
 }
 
-
+/* Resets the part of the tables used to fold a sequence of length len: */
 void init_tables(int len) {
 	int i, j, LLL;
 	
@@ -106,8 +89,8 @@ void init_tables(int len) {
 		for (j = 0; j <= len; j++) {
 			WM[i][j] = INFINITY_;
 			WMPrime[i][j] = INFINITY_;
-    		PP[i][j] = 0;
 		}
+		memset(PP[i], 0, (len+1) * sizeof(int));
 	}
 	
 	LLL = (len)*(len+1)/2 + 1;
@@ -117,28 +100,33 @@ void init_tables(int len) {
 		VBI[i] = INFINITY_;
 	}
 
-	for (i = 1; i <= (unsigned) len; i++) 
-	    indx[i] = (i*(i-1)) >> 1;        /* n(n-1)/2 */
-
 	return;
 }
 
+/* The tables are kept for the next fold (see release_tables): */
 void free_tables(int len) {
+	(void) len;
+}
+
+void release_tables(void) {
 	if (alloc_flag == 1) {
 		free(indx);
-
-		int i;
-		for (i = 0; i <= len; i++) free(WM[i]);
 		free(WM);
-
-		for (i = 0; i <= len; i++) free(WMPrime[i]);
+		free(WM_block);
 		free(WMPrime);
-
+		free(WMPrime_block);
+		free(PP);
+		free(PP_block);
 		free(VM);
 		free(VBI);
 		free(V);
 		free(W);
 	}
+	V = W = VBI = VM = indx = NULL;
+	WM = WMPrime = PP = NULL;
+	WM_block = WMPrime_block = PP_block = NULL;
+	table_capacity = -1;
+	alloc_flag = 0;
 }
 
 
@@ -5,6 +5,7 @@
 #include "utils.h"
 #include "global.h"
 #include "constraints.h"
+#include "random-generator.h"
 
 unsigned char *RNA; 
 int *structure; 
@@ -23,6 +24,9 @@ int g_prefilter2;
 int g_LIMIT_DISTANCE;
 int g_contactDistance;
 int g_bignumprecision = 512;
+long long g_sample_seed = -1;
+long long g_sample_index_offset = 0;
+__thread rng_state_t g_rng_state;
 
 void init_global_params(int len) {
 	RNA = (unsigned char *) malloc((len+1)* sizeof(unsigned char));
@@ -45,22 +45,42 @@ using namespace std;
 
 char EN_DATADIR[256] = { '\0' };
 
-int poppen[5];
+/* Local storage for the energy tables (see the note in data.h): */
+static int poppenTable[5];
+static int eparamTable[11];
+static int multConstTable[3];
+static int dangleTable[4][4][4][2];
+static int interTable[31];
+static int bulgeTable[31];
+static int hairpinTable[31];
+static int stackTable[256];
+static int tstkhTable[256];
+static int tstkiTable[256];
+static int tloopTable[maxtloop + 1][2];
+static int iloop21Table[5][5][5][5][5][5][5];
+static int iloop22Table[5][5][5][5][5][5][5][5];
+static int iloop11Table[5][5][5][5][5][5];
+static int tstackmTable[5][5][6][6];
+static int tstackeTable[5][5][6][6];
+static int tstacki23Table[5][5][5][5];
+static int triloopTable[maxtloop + 1][2];
+
+int *poppen = poppenTable;
 int maxpen;
-int eparam[11];
-int multConst[3]; /* for multiloop penalties. */
-int dangle[4][4][4][2]; /* Contain dangling energy values */
-int inter[31]; /* Contains size penalty for internal loops */
-int bulge[31]; /* Contain the size penalty for bulges */
-int hairpin[31]; /* Contains the size penalty for hairpin loops */
-int _stack[256]; /* Stacking energy used to calculate energy of stack loops */
-int tstkh[256]; /* Terminal mismatch energy used in the calculations of hairpin loops */
-int tstki[256]; /* Terminal mismatch energy used in the calculations of internal loops */
-int tloop[maxtloop + 1][2];
+int *eparam = eparamTable;
+int *multConst = multConstTable; /* for multiloop penalties. */
+int (*dangle)[4][4][2] = dangleTable; /* Contain dangling energy values */
+int *inter = interTable; /* Contains size penalty for internal loops */
+int *bulge = bulgeTable; /* Contain the size penalty for bulges */
+int *hairpin = hairpinTable; /* Contains the size penalty for hairpin loops */
+int *_stack = stackTable; /* Stacking energy used to calculate energy of stack loops */
+int *tstkh = tstkhTable; /* Terminal mismatch energy used in the calculations of hairpin loops */
+int *tstki = tstkiTable; /* Terminal mismatch energy used in the calculations of internal loops */
+int (*tloop)[2] = tloopTable;
 int numoftloops;
-int iloop21[5][5][5][5][5][5][5]; /* 2*1 internal loops */
-int iloop22[5][5][5][5][5][5][5][5]; /* 2*2 internal looops */
-int iloop11[5][5][5][5][5][5]; /* 1*1 internal loops */
+int (*iloop21)[5][5][5][5][5][5] = iloop21Table; /* 2*1 internal loops */
+int (*iloop22)[5][5][5][5][5][5][5] = iloop22Table; /* 2*2 internal looops */
+int (*iloop11)[5][5][5][5][5] = iloop11Table; /* 1*1 internal loops */
 
 //int coax[6][6][6][6];
 //int tstackcoax[6][6][6][6];
@@ -68,9 +88,9 @@ int iloop11[5][5][5][5][5][5]; /* 1*1 internal loops */
 //int tstack[6][6][6][6];
 //int tstkm[6][6][6][6];
 
-int tstackm[5][5][6][6];
-int tstacke[5][5][6][6];
-int tstacki23[5][5][5][5];
+int (*tstackm)[5][6][6] = tstackmTable;
+int (*tstacke)[5][6][6] = tstackeTable;
+int (*tstacki23)[5][5][5] = tstacki23Table;
 
 int auend;
 int gubonus;
@@ -80,12 +100,33 @@ int c3;
 int efn2a;
 int efn2b;
 int efn2c;
-int triloop[maxtloop + 1][2];
+int (*triloop)[2] = triloopTable;
 int numoftriloops;
 int init;
 int gail; /* It is either 0 or 1. It is used for grosely asymmetric internal loops */
 float prelog;
 
+void resetEnergyTablePointers() {
+	poppen = poppenTable;
+	eparam = eparamTable;
+	multConst = multConstTable;
+	dangle = dangleTable;
+	inter = interTable;
+	bulge = bulgeTable;
+	hairpin = hairpinTable;
+	_stack = stackTable;
+	tstkh = tstkhTable;
+	tstki = tstkiTable;
+	tloop = tloopTable;
+	iloop21 = iloop21Table;
+	iloop22 = iloop22Table;
+	iloop11 = iloop11Table;
+	tstackm = tstackmTable;
+	tstacke = tstackeTable;
+	tstacki23 = tstacki23Table;
+	triloop = triloopTable;
+}
+
 void readThermodynamicParameters(const char *userdatadir, bool userdatalogic, 
 		                 int unamode = 0, int rnamode = 0, int mismatch = 0) {
 	struct stat buf;
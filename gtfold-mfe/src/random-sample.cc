@@ -6,6 +6,7 @@
 #include "algorithms-partition.h"
 #include "energy.h"
 #include "random-sample.h"
+#include "random-generator.h"
 
 using namespace std;
 
@@ -26,7 +27,7 @@ using namespace std;
 }*/
 
 double randdouble(){
-	    return rand()/(double(RAND_MAX)+1);
+	    return rng_thread_double();
 } 
 
 //P_0
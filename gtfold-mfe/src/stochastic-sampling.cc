@@ -1,6 +1,7 @@
 #include "stochastic-sampling.h"
 
 #include "global.h"
+#include "random-generator.h"
 #include <assert.h>
 #include <stdio.h>
 #include <stdlib.h>
@@ -19,7 +20,7 @@ double energy = 0;
 
 double randdouble()
 {
-  return rand()/(double(RAND_MAX)+1);
+  return rng_thread_double();
 }
 
 bool feasible(int i, int j)
@@ -651,7 +652,6 @@ void rnd_upm(int i, int j, int* structure)
 double rnd_structure(int* structure, int len)
 {
   //printf("%lf %lf %lf\n", EA_new(), EB_new(), EC_new());
-  srand(rand());
   base_pair first(1,len,U);
   g_stack.push(first);
   energy = 0.0;
@@ -680,7 +680,7 @@ double rnd_structure(int* structure, int len)
 void batch_sample(int num_rnd, int length, double U)
 {
 	  int* structure = new int[length+1];
-	  srand(time(NULL));
+	  uint64_t seed = rng_batch_seed();
     std::map<std::string,std::pair<int,double> >  uniq_structs;
 	  
     if (num_rnd > 0 ) {
@@ -688,6 +688,7 @@ void batch_sample(int num_rnd, int length, double U)
       int count; //nsamples =0;
       for (count = 1; count <= num_rnd; ++count) 
       {
+        rng_seed_sample(seed, count);
         memset(structure, 0, (length+1)*sizeof(int));
         double energy = rnd_structure(structure, length);
 
@@ -769,7 +770,7 @@ void batch_sample_and_dump(int num_rnd, int length, double U, std::string ctFile
 	//data dump preparation code ends here
 
 	  int* structure = new int[length+1];
-	  srand(time(NULL));
+	  uint64_t seed = rng_batch_seed();
     std::map<std::string,std::pair<int,double> >  uniq_structs;
 	  
     if (num_rnd > 0 ) {
@@ -777,6 +778,7 @@ void batch_sample_and_dump(int num_rnd, int length, double U, std::string ctFile
       int count; //nsamples =0;
       for (count = 1; count <= num_rnd; ++count) 
       {
+        rng_seed_sample(seed, count);
         memset(structure, 0, (length+1)*sizeof(int));
         double energy = rnd_structure(structure, length);
 
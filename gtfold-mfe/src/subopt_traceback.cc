@@ -33,6 +33,19 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #include <iostream>
 #include <iterator>
 #include <cstdlib>
+#include <map>
+#include <deque>
+#include <functional>
+#include <unordered_map>
+#include <new>
+#include <cerrno>
+#include <stdint.h>
+#include <gmp.h>
+#include <sched.h>
+
+#ifdef _OPENMP
+#include "omp.h"
+#endif
 
 //#define DEBUG 1
 
@@ -46,7 +59,7 @@ void (*trace_func[8]) (int i, int j, ps_t& ps, ps_stack_t& gs);
 static int delta = 0;
 static int mfe = INFINITY_;
 static int length = -1;
-static int gflag = 0;
+static __thread int gflag = 0; // per thread for the parallel traceback
 
 //#ifdef UNIQUE_MULTILOOP_DECOMPOSITION
 
@@ -101,13 +114,121 @@ void calculate_fm() {
 
 //#endif
 
-void process(ss_map_t& subopt_data, int len, string suboptFile, int writeToFile, 
-	     int is_check_for_duplicates_enabled, int max_structure_count) {
-	ofstream outfile;
-        outfile.open(suboptFile.c_str(), ios::out | ios::app);
-        char buff[4096];
+/* The arena of the partial structure list nodes of a traceback: the nodes are carved out 
+ * of chunks, and the freed ones are kept on a free list for reuse, one per thread (a node 
+ * goes onto the list of the thread which frees it), so that a traceback allocates about 
+ * as many chunks as it has nodes live at once. The chunks are all freed with the arena: 
+ */
+#define PS_ARENA_CHUNK_NODES 4096
+
+class ps_arena_t {
+     public:
+          ps_arena_t(int num_threads) : slots_(MAX(num_threads, 1)) {}
+
+          ~ps_arena_t() {
+               for (size_t t = 0; t < slots_.size(); t++) {
+                    for (size_t c = 0; c < slots_[t].chunks.size(); c++) {
+                         free(slots_[t].chunks[c]);
+                    }
+               }
+          }
+
+          inline ps_node * allocate() {
+               slot_t &slot = slots_[thread_slot()];
+               if (slot.free_nodes != NULL) {
+                    ps_node *node = slot.free_nodes;
+                    slot.free_nodes = node->next;
+                    return node;
+               }
+               if (slot.chunk_used == PS_ARENA_CHUNK_NODES || slot.chunks.empty()) {
+                    ps_node *chunk = (ps_node *) malloc(PS_ARENA_CHUNK_NODES * sizeof(ps_node));
+                    if (chunk == NULL) throw std::bad_alloc();
+                    slot.chunks.push_back(chunk);
+                    slot.chunk_used = 0;
+               }
+               return slot.chunks.back() + slot.chunk_used++;
+          }
+
+          inline void deallocate(ps_node *node) {
+               slot_t &slot = slots_[thread_slot()];
+               node->next = slot.free_nodes;
+               slot.free_nodes = node;
+          }
+
+     private:
+          typedef struct slot_t {
+               std::vector<ps_node *> chunks;
+               int chunk_used;
+               ps_node *free_nodes;
+               slot_t() : chunk_used(0), free_nodes(NULL) {}
+          } slot_t;
+
+          inline int thread_slot() const {
+#ifdef _OPENMP
+               return omp_get_thread_num() % slots_.size();
+#else
+               return 0;
+#endif
+          }
+
+          std::vector<slot_t> slots_;
+};
+
+static ps_arena_t *ps_arena = NULL;
+
+/* Makes a new arena the one of the partial structures of the traceback for its lifetime 
+ * (all of which must be gone by the end of it): 
+ */
+class ps_arena_scope_t {
+     public:
+          ps_arena_scope_t(int num_threads = 1) : arena_(num_threads), saved_(ps_arena) {
+               ps_arena = &arena_;
+          }
+          ~ps_arena_scope_t() {
+               ps_arena = saved_;
+          }
+     private:
+          ps_arena_t arena_;
+          ps_arena_t *saved_;
+};
+
+ps_node * ps_node_push(const segment& seg, ps_node *next) {
+        return new (ps_arena->allocate()) ps_node(seg, next);
+}
+
+void ps_node_release(ps_node *node) {
+        while (node != NULL && __atomic_sub_fetch(&node->refs, 1, __ATOMIC_ACQ_REL) == 0) {
+                ps_node *next = node->next;
+                ps_arena->deallocate(node);
+                node = next;
+        }
+}
+
+/* Expands the top segment of the partial structure ps with trace_func, pushing the 
+ * resulting partial structures onto expanded (or ps without the segment, if it has none): 
+ */
+static inline void expand_partial_structure(ps_t &ps, ps_stack_t &expanded) {
+        segment smt = ps.top();
+        ps.pop();
+
+        gflag = 0;
+        if (smt.j_ - smt.i_ > TURN) {
+                (*trace_func[smt.label_])(smt.i_, smt.j_, ps, expanded);
+        }
 
+        // discarded current segment, using remaining ones
+        if (!gflag) {
+                ps_t ps1(ps);
+                expanded.push(ps1);
+        }
+}
 
+/* Runs the traceback set up by init_subopt_traceback, calling visit on each complete 
+ * structure as it is popped off the partial structure stack. Stops after 
+ * max_structure_count structures (if it is positive), or once visit returns zero. 
+ * Returns the number of structures visited: 
+ */
+static int traverse_subopt_structures(int len, int max_structure_count, subopt_visit_t visit, void *visitArg) {
         int count = 0;
         length = len;
 
@@ -116,8 +237,9 @@ void process(ss_map_t& subopt_data, int len, string suboptFile, int writeToFile,
         	calculate_fm();
 	}
 
+        ps_arena_scope_t arena;
         ps_stack_t gstack;
-
+        string structure;
 
         // initialize the partial structure, segment stack = {[1,n]}, label = W, list_bp = {} 
         ps_t first(0, len);
@@ -131,40 +253,54 @@ void process(ss_map_t& subopt_data, int len, string suboptFile, int writeToFile,
 
                 if (ps.empty()) {
                         count++;
-				pair<ss_map_t::iterator, bool> ins_result;
-				ins_result = subopt_data.insert(std::make_pair(ps.str,ps.ae_));
-				if (is_check_for_duplicates_enabled==1 && ins_result.second == false) {
-					if(!SILENT) {
-					     fprintf(stderr, "Duplicate Structure!!!\n   >> %s\n", ps.str.c_str());
-					}
-					errno = EDOM;
-					break;
-					//exit(1);
-				}
-                        if(writeToFile) {
-			     //cout << ps.str << endl;
-			     sprintf(buff,"%d\t%s\t%6.2f", count, (ps.str).c_str(), (ps.ae_)/100.0);
-			     outfile << buff << std::endl;
-			}
+			if (!(*visit)(ps.structure(structure), ps.ae_, visitArg)) break;
 			if(max_structure_count>0 && count>=max_structure_count) break;//exit
                         continue;
                 }	
                 else {
-                       segment smt = ps.top();
-                        ps.pop();
-
-                        gflag = 0;
-                        if (smt.j_ - smt.i_ > TURN) {
-                                (*trace_func[smt.label_])(smt.i_, smt.j_, ps, gstack);
-                        }
-
-                        // discarded current segment, using remaining ones
-                        if (!gflag) {
-                                ps_t ps1(ps);
-                                gstack.push(ps1);
-                        }
+                        expand_partial_structure(ps, gstack);
                 }
         }
+        return count;
+}
+
+/* The visitor of process, which collects the structures into subopt_data: */
+typedef struct {
+	ss_table_t *subopt_data;
+	ofstream *outfile;
+	int writeToFile;
+	int is_check_for_duplicates_enabled;
+	int count;
+} subopt_collect_t;
+
+static int collect_subopt_structure(const char *dotStruct, int energy, void *visitArg) {
+	subopt_collect_t *collect = (subopt_collect_t *) visitArg;
+	char buff[4096];
+	collect->count++;
+	bool inserted;
+	collect->subopt_data->insert(dotStruct, energy, inserted);
+	if (collect->is_check_for_duplicates_enabled==1 && inserted == false) {
+		if(!SILENT) {
+		     fprintf(stderr, "Duplicate Structure!!!\n   >> %s\n", dotStruct);
+		}
+		errno = EDOM;
+		return 0;
+		//exit(1);
+	}
+	if(collect->writeToFile) {
+	     sprintf(buff,"%d\t%s\t%6.2f", collect->count, dotStruct, energy/100.0);
+	     *(collect->outfile) << buff << std::endl;
+	}
+	return 1;
+}
+
+void process(ss_table_t& subopt_data, int len, string suboptFile, int writeToFile, 
+	     int is_check_for_duplicates_enabled, int max_structure_count) {
+	ofstream outfile;
+        outfile.open(suboptFile.c_str(), ios::out | ios::app);
+
+        subopt_collect_t collect = { &subopt_data, &outfile, writeToFile, is_check_for_duplicates_enabled, 0 };
+        int count = traverse_subopt_structures(len, max_structure_count, collect_subopt_structure, &collect);
         outfile.close();
         printf("Counts of structure generated=%d\n", count);
 
@@ -173,10 +309,215 @@ void process(ss_map_t& subopt_data, int len, string suboptFile, int writeToFile,
 //#endif
 }
 
-ss_map_t subopt_traceback(int len, int _delta, const char *suboptCFile, int writeToFile, 
-		          int is_check_for_duplicates_enabled, int max_structure_count) {
-        string suboptFile = suboptCFile;
-	
+#ifdef _OPENMP
+
+/* The partial structures of one thread of the parallel traceback: the owner pushes and 
+ * pops them at the back (depth first, as in the sequential traceback), and the idle 
+ * threads steal them from the front (the oldest ones, closest to the root, which have 
+ * the most work left under them): 
+ */
+typedef struct {
+	std::deque<ps_t> items;
+	omp_lock_t lock;
+} subopt_work_deque_t;
+
+static bool pop_partial_structure(std::vector<subopt_work_deque_t> &deques, int thread, ps_t &ps) {
+	int num_deques = deques.size();
+	for (int d = 0; d < num_deques; d++) {
+		subopt_work_deque_t &deque = deques[(thread + d) % num_deques];
+		bool found = false;
+		omp_set_lock(&deque.lock);
+		if (!deque.items.empty()) {
+			if (d == 0) {
+				ps = deque.items.back();
+				deque.items.pop_back();
+			}
+			else {
+				ps = deque.items.front();
+				deque.items.pop_front();
+			}
+			found = true;
+		}
+		omp_unset_lock(&deque.lock);
+		if (found) return true;
+	}
+	return false;
+}
+
+/* The parallel version of traverse_subopt_structures, which calls visit (which must be 
+ * safe to call from several threads at once) from num_threads threads. The top-level 
+ * W segment is first expanded breadth first to seed the per thread stacks, which the 
+ * threads then run depth first, stealing partial structures from each other when they 
+ * run out. Returns the number of structures visited: 
+ */
+static int traverse_subopt_structures_parallel(int len, int max_structure_count, subopt_visit_t visit, 
+		                               void *visitArg, int num_threads) {
+        length = len;
+
+	if( UNIQUE_MULTILOOP_DECOMPOSITION == 1){
+	        calculate_fm1();
+        	calculate_fm();
+	}
+
+        ps_arena_scope_t arena(num_threads);
+        std::deque<ps_t> seeds, complete;
+        ps_t first(0, len);
+        first.push(segment(1, len, lW, W[len]));
+        seeds.push_back(first);
+        while (!seeds.empty() && (int) seeds.size() < 4 * num_threads) {
+                ps_t ps = seeds.front();
+                seeds.pop_front();
+                if (ps.empty()) {
+                        complete.push_back(ps);
+                        continue;
+                }
+                ps_stack_t expanded;
+                expand_partial_structure(ps, expanded);
+                while (!expanded.empty()) {
+                        seeds.push_back(expanded.top());
+                        expanded.pop();
+                }
+        }
+        seeds.insert(seeds.end(), complete.begin(), complete.end());
+
+        std::vector<subopt_work_deque_t> deques(num_threads);
+        for (int t = 0; t < num_threads; t++) {
+                omp_init_lock(&deques[t].lock);
+        }
+        for (size_t s = 0; s < seeds.size(); s++) {
+                deques[s % num_threads].items.push_back(seeds[s]);
+        }
+        // The partial structures which are queued or being expanded:
+        long pending = seeds.size();
+        int count = 0, stop = 0;
+        seeds.clear();
+
+        #pragma omp parallel num_threads(num_threads)
+        {
+                int thread = omp_get_thread_num();
+                ps_t ps;
+                ps_stack_t expanded;
+                string structure;
+                while (!__atomic_load_n(&stop, __ATOMIC_RELAXED)) {
+                        if (!pop_partial_structure(deques, thread, ps)) {
+                                if (__atomic_load_n(&pending, __ATOMIC_ACQUIRE) == 0) break;
+                                sched_yield();
+                                continue;
+                        }
+                        if (ps.empty()) {
+                                int index = __atomic_add_fetch(&count, 1, __ATOMIC_RELAXED);
+                                if (max_structure_count > 0 && index > max_structure_count) {
+                                        __atomic_store_n(&stop, 1, __ATOMIC_RELAXED);
+                                }
+                                else if (!(*visit)(ps.structure(structure), ps.ae_, visitArg) || 
+                                         (max_structure_count > 0 && index == max_structure_count)) {
+                                        __atomic_store_n(&stop, 1, __ATOMIC_RELAXED);
+                                }
+                        }
+                        else {
+                                expand_partial_structure(ps, expanded);
+                                __atomic_add_fetch(&pending, (long) expanded.size(), __ATOMIC_RELEASE);
+                                subopt_work_deque_t &deque = deques[thread];
+                                omp_set_lock(&deque.lock);
+                                while (!expanded.empty()) {
+                                        deque.items.push_back(expanded.top());
+                                        expanded.pop();
+                                }
+                                omp_unset_lock(&deque.lock);
+                        }
+                        __atomic_sub_fetch(&pending, 1, __ATOMIC_RELEASE);
+                }
+        }
+
+        for (int t = 0; t < num_threads; t++) {
+                omp_destroy_lock(&deques[t].lock);
+        }
+        return (max_structure_count > 0) ? MIN(count, max_structure_count) : count;
+}
+
+/* The number of shards of the structure table of the parallel traceback: */
+#define SUBOPT_MAP_SHARDS 64
+
+/* The visitor of process_parallel, which collects the structures into a table sharded by 
+ * a hash of the structures (so that the threads rarely wait on each other to insert 
+ * them, or to check them for duplicates): 
+ */
+typedef struct {
+	ss_table_t shards[SUBOPT_MAP_SHARDS];
+	omp_lock_t shard_locks[SUBOPT_MAP_SHARDS];
+	omp_lock_t file_lock;
+	ofstream *outfile;
+	int writeToFile;
+	int is_check_for_duplicates_enabled;
+	int count;
+	int duplicate;
+} subopt_shared_collect_t;
+
+static int collect_subopt_structure_shared(const char *dotStruct, int energy, void *visitArg) {
+	subopt_shared_collect_t *collect = (subopt_shared_collect_t *) visitArg;
+	uint32_t hash = 2166136261u;
+	for (const char *c = dotStruct; *c != '\0'; c++) {
+		hash = (hash ^ (uint8_t) *c) * 16777619u;
+	}
+	int shard = hash % SUBOPT_MAP_SHARDS;
+	bool inserted;
+	omp_set_lock(&collect->shard_locks[shard]);
+	collect->shards[shard].insert(dotStruct, energy, inserted);
+	omp_unset_lock(&collect->shard_locks[shard]);
+	int index = __atomic_add_fetch(&collect->count, 1, __ATOMIC_RELAXED);
+	if (collect->is_check_for_duplicates_enabled==1 && !inserted) {
+		if(!SILENT) {
+		     fprintf(stderr, "Duplicate Structure!!!\n   >> %s\n", dotStruct);
+		}
+		collect->duplicate = 1;
+		return 0;
+	}
+	if(collect->writeToFile) {
+	     char buff[4096];
+	     sprintf(buff,"%d\t%s\t%6.2f", index, dotStruct, energy/100.0);
+	     omp_set_lock(&collect->file_lock);
+	     *(collect->outfile) << buff << std::endl;
+	     omp_unset_lock(&collect->file_lock);
+	}
+	return 1;
+}
+
+void process_parallel(ss_table_t& subopt_data, int len, string suboptFile, int writeToFile, 
+	              int is_check_for_duplicates_enabled, int max_structure_count, int num_threads) {
+	ofstream outfile;
+        outfile.open(suboptFile.c_str(), ios::out | ios::app);
+
+        subopt_shared_collect_t *collect = new subopt_shared_collect_t();
+        for (int s = 0; s < SUBOPT_MAP_SHARDS; s++) {
+                omp_init_lock(&collect->shard_locks[s]);
+        }
+        omp_init_lock(&collect->file_lock);
+        collect->outfile = &outfile;
+        collect->writeToFile = writeToFile;
+        collect->is_check_for_duplicates_enabled = is_check_for_duplicates_enabled;
+        int count = traverse_subopt_structures_parallel(len, max_structure_count, collect_subopt_structure_shared, 
+			                                collect, num_threads);
+        string structure;
+        for (int s = 0; s < SUBOPT_MAP_SHARDS; s++) {
+                const ss_table_t &shard = collect->shards[s];
+                for (size_t e = 0; e < shard.size(); e++) {
+                        bool inserted;
+                        subopt_data.insert(shard.structure(e, structure), shard.value(e), inserted);
+                }
+                omp_destroy_lock(&collect->shard_locks[s]);
+        }
+        omp_destroy_lock(&collect->file_lock);
+        if (collect->duplicate) {
+                errno = EDOM;
+        }
+        delete collect;
+        outfile.close();
+        printf("Counts of structure generated=%d\n", count);
+}
+
+#endif
+
+static void init_subopt_traceback(int len, int _delta) {
 	trace_func[0] = subopt_traceW;
         trace_func[1] = subopt_traceV;
         trace_func[2] = subopt_traceVBI;
@@ -191,11 +532,153 @@ ss_map_t subopt_traceback(int len, int _delta, const char *suboptCFile, int writ
         mfe = W[len];
         delta = _delta;
         length = len;
+}
 
-        ss_map_t subopt_data;
+/* Collects the structures within _delta of the MFE into subopt_data with num_threads 
+ * threads (or as many as OpenMP has if it is not positive, and sequentially without 
+ * OpenMP). The parallel traceback finds the structures in no particular order, so with 
+ * max_structure_count, which ones are collected can vary: 
+ */
+static void subopt_traceback_table(ss_table_t &subopt_data, int len, int _delta, const char *suboptCFile, 
+		                   int writeToFile, int is_check_for_duplicates_enabled, 
+				   int max_structure_count, int num_threads) {
+        string suboptFile = suboptCFile;
+        init_subopt_traceback(len, _delta);
+#ifdef _OPENMP
+        if (num_threads <= 0) {
+                num_threads = omp_get_max_threads();
+        }
+        if (num_threads > 1) {
+                process_parallel(subopt_data, len, suboptFile, writeToFile, is_check_for_duplicates_enabled, 
+                                 max_structure_count, num_threads);
+                return;
+        }
+#endif
         process(subopt_data, len, suboptFile, writeToFile, is_check_for_duplicates_enabled, max_structure_count);
+}
 
-        return subopt_data;
+static ss_map_t SSTableToMap(const ss_table_t &sst) {
+        ss_map_t ssm;
+        for (size_t e = 0; e < sst.size(); e++) {
+                ssm.insert(std::make_pair(sst.structure(e), sst.value(e)));
+        }
+        return ssm;
+}
+
+ss_map_t subopt_traceback(int len, int _delta, const char *suboptCFile, int writeToFile, 
+		          int is_check_for_duplicates_enabled, int max_structure_count) {
+        ss_table_t subopt_data;
+        subopt_traceback_table(subopt_data, len, _delta, suboptCFile, writeToFile, 
+                               is_check_for_duplicates_enabled, max_structure_count, 1);
+        return SSTableToMap(subopt_data);
+}
+
+/* As subopt_traceback, but with num_threads threads (or as many as OpenMP has if it is not 
+ * positive), where the structures are found in no particular order, so with 
+ * max_structure_count, which ones are returned can vary: 
+ */
+ss_map_t subopt_traceback_parallel(int len, int _delta, const char *suboptCFile, int writeToFile, 
+		                   int is_check_for_duplicates_enabled, int max_structure_count, 
+				   int num_threads) {
+        ss_table_t subopt_data;
+        subopt_traceback_table(subopt_data, len, _delta, suboptCFile, writeToFile, 
+                               is_check_for_duplicates_enabled, max_structure_count, num_threads);
+        return SSTableToMap(subopt_data);
+}
+
+/* Streams the structures within _delta of the MFE to visit instead of collecting them 
+ * (there is no check for duplicate structures, which needs all of them in memory). 
+ * Returns the number of structures visited: 
+ */
+int subopt_traceback_visit(int len, int _delta, int max_structure_count, 
+		           subopt_visit_t visit, void *visitArg) {
+        if (visit == NULL) {
+                return 0;
+        }
+        init_subopt_traceback(len, _delta);
+        return traverse_subopt_structures(len, max_structure_count, visit, visitArg);
+}
+
+/* Any valid structure has an energy below this bound (while the arrays are INFINITY_ 
+ * for the segments which cannot fold): 
+ */
+#define KBEST_ENERGY_BOUND (INFINITY_ / 2)
+
+/* Sets up a traceback with the unique multiloop decomposition (so that each structure 
+ * has exactly one traceback), saving the previous setting in unique_multiloop_decomposition. 
+ * Returns false if the sequence is too long for the FM arrays: 
+ */
+static bool begin_unique_traceback(int len, int _delta, int &unique_multiloop_decomposition) {
+        if (len >= (int) (sizeof(FM) / sizeof(FM[0]))) {
+                return false;
+        }
+        unique_multiloop_decomposition = UNIQUE_MULTILOOP_DECOMPOSITION;
+        UNIQUE_MULTILOOP_DECOMPOSITION = 1;
+        init_subopt_traceback(len, _delta);
+        calculate_fm1();
+        calculate_fm();
+        return true;
+}
+
+/* Visits the k lowest energy structures in the order of increasing energy (ties in no 
+ * particular order) with a best-first search over the partial structures. Since the 
+ * energy of each segment is the minimum over its foldings, ps.total() is the energy 
+ * of the best structure which completes ps, so popping the partial structure with the 
+ * least total() pops the complete structures in energy order. With the unique 
+ * multiloop decomposition each structure has one traceback, so only the best 
+ * k - count partial structures can still lead to the k - count structures left to 
+ * visit, and the queue never holds more than k partial structures. Returns the number 
+ * of structures visited, or -1 if the sequence is too long for the FM arrays: 
+ */
+int subopt_kbest_visit(int len, int k, subopt_visit_t visit, void *visitArg) {
+        if (visit == NULL || k <= 0) {
+                return 0;
+        }
+        int unique_multiloop_decomposition;
+        if (!begin_unique_traceback(len, KBEST_ENERGY_BOUND - W[len], unique_multiloop_decomposition)) {
+                return -1;
+        }
+
+        ps_arena_scope_t arena;
+        typedef std::multimap<int, ps_t> ps_queue_t;
+        ps_queue_t pqueue;
+        string structure;
+        ps_t first(0, len);
+        first.push(segment(1, len, lW, W[len]));
+        pqueue.insert(std::make_pair(first.total(), first));
+
+        int count = 0;
+        while (!pqueue.empty() && count < k) {
+                ps_t ps = pqueue.begin()->second;
+                pqueue.erase(pqueue.begin());
+                if (ps.empty()) {
+                        count++;
+                        if (!(*visit)(ps.structure(structure), ps.ae_, visitArg)) break;
+                        continue;
+                }
+                int remaining = k - count;
+                int best_total = ps.total();
+
+                // The best completion of ps has the energy best_total, so once the queue 
+                // is full, the other ones are only needed if they are no worse than its last entry:
+                int bound = KBEST_ENERGY_BOUND;
+                if ((int) pqueue.size() + 1 >= remaining) {
+                        bound = pqueue.empty() ? best_total : MAX(best_total, pqueue.rbegin()->first);
+                }
+                delta = bound - mfe;
+
+                ps_stack_t expanded;
+                expand_partial_structure(ps, expanded);
+                while (!expanded.empty()) {
+                        pqueue.insert(std::make_pair(expanded.top().total(), expanded.top()));
+                        expanded.pop();
+                }
+                while ((int) pqueue.size() > remaining) {
+                        pqueue.erase(--pqueue.end());
+                }
+        }
+        UNIQUE_MULTILOOP_DECOMPOSITION = unique_multiloop_decomposition;
+        return count;
 }
 
 void subopt_traceV(int i, int j, ps_t& ps, ps_stack_t& gstack) {
@@ -204,7 +687,7 @@ void subopt_traceV(int i, int j, ps_t& ps, ps_stack_t& gstack) {
         if (eH(i,j) + ps.total()  <= mfe + delta) {
                 ps_t ps1(ps); 
                 ps1.accumulate(eH(i,j));
-                ps1.update(i, j, '(', ')');
+                ps1.add_pair(i, j);
                 push_to_gstack(gstack, ps1);
         }
 
@@ -213,7 +696,7 @@ void subopt_traceV(int i, int j, ps_t& ps, ps_stack_t& gstack) {
                 ps_t ps1(ps);
                 ps1.push(segment(i+1, j-1, lV, V(i+1, j-1)));
                 ps1.accumulate(eS(i,j));
-                ps1.update(i, j , '(', ')');
+                ps1.add_pair(i, j);
                 push_to_gstack(gstack, ps1);
         }
 
@@ -238,7 +721,7 @@ void subopt_traceV(int i, int j, ps_t& ps, ps_stack_t& gstack) {
 				ps1.push(segment(i+1,k, lM, FM[i+1][k]));
 				ps1.push(segment(k+1,j-1, lM1, FM1[k+1][j-1]));
 				ps1.accumulate(kenergy2);
-				ps1.update(i,j,'(',')');
+				ps1.add_pair(i, j);
 				push_to_gstack(gstack, ps1);
 			}
 		}
@@ -248,7 +731,7 @@ void subopt_traceV(int i, int j, ps_t& ps, ps_stack_t& gstack) {
 		if (VM(i,j) + ps.total() <= mfe + delta) {
 			ps_t ps1(ps);
 			ps1.push(segment(i, j, lVM, VM(i,j)));
-			ps1.update(i, j, '(', ')');
+			ps1.add_pair(i, j);
 			push_to_gstack(gstack, ps1);
 		}
 
@@ -267,7 +750,7 @@ void subopt_traceVBI(int i, int j, ps_t& ps, ps_stack_t& gstack) {
                         if (V(p, q) + eL(i, j, p, q) + ps.total() <= mfe + delta) {
                                 ps_t ps1(ps);
                                 ps1.push(segment(p, q, lV, V(p, q)));
-                                ps1.update(i, j , '(', ')');
+                                ps1.add_pair(i, j);
                                 ps1.accumulate(eL(i, j, p, q));
                                 push_to_gstack(gstack, ps1);
                         }
@@ -322,7 +805,7 @@ void subopt_traceM1(int i, int j, ps_t& ps, ps_stack_t& gstack) {
     ps_t ps1(ps);
     ps1.push(segment(i, j, lV, V(i,j)));
     ps1.accumulate(d5 + d3 + aup + Eb);
-    ps1.update(i,j,'(',')');
+    ps1.add_pair(i, j);
     push_to_gstack(gstack, ps1);
   }
 }
@@ -348,7 +831,7 @@ void subopt_traceM(int i, int j, ps_t& ps, ps_stack_t& gstack) {
     ps_t ps1(ps);
     ps1.push(segment(i, j, lV, V(i,j)));
     ps1.accumulate(d5 + d3 + Eb + aup);
-    ps1.update(i,j,'(',')');
+    ps1.add_pair(i, j);
     push_to_gstack(gstack, ps1);
   }
 
@@ -365,7 +848,7 @@ void subopt_traceM(int i, int j, ps_t& ps, ps_stack_t& gstack) {
       ps1.push(segment(i, k, lM, FM[i][k]));
       ps1.push(segment(k+1, j, lV, V(k+1,j)));
       ps1.accumulate(d5 + d3 + Eb + aup);
-      ps1.update(k+1,j,'(',')');
+      ps1.add_pair(k+1, j);
       push_to_gstack(gstack, ps1);
     }
   }
@@ -381,7 +864,7 @@ void subopt_traceM(int i, int j, ps_t& ps, ps_stack_t& gstack) {
       ps_t ps1(ps);
       ps1.push(segment(k+1, j, lV, V(k+1,j)));
       ps1.accumulate(d5 + d3 + Eb + Ec*(k-i+1) + aup);
-      ps1.update(k+1, j, '(', ')');
+      ps1.add_pair(k+1, j);
       push_to_gstack(gstack, ps1);
     }
   }
@@ -470,14 +953,265 @@ ss_ctype_t * SSMapToCType(const ss_map_t &ssm, int *arrCount) {
           return ssDataArr;
 }
 
+/* As SSMapToCType, with the structures in the same (sorted) order: */
+ss_ctype_t * SSTableToCType(const ss_table_t &sst, int *arrCount) {
+          if(sst.size() == 0) {
+               return NULL;
+	  }
+	  ss_ctype_t *ssDataArr = (ss_ctype_t *) calloc(sst.size(), sizeof(ss_ctype_t));
+          if(ssDataArr == NULL || arrCount == NULL) {
+               return NULL;
+          }
+          std::vector<size_t> order = sst.sorted_indices();
+          std::string dotStruct;
+          for(size_t midx = 0; midx < order.size(); midx++) {
+               ssDataArr[midx].dotStruct = strdup(sst.structure(order[midx], dotStruct));
+               ssDataArr[midx].energy = sst.value(order[midx]);
+          }
+          *arrCount = sst.size();
+          return ssDataArr;
+}
+
 ss_ctype_t * SuboptTraceback(int len, int gap, const char *suboptFile, int writeToFile,
                                                 int is_check_for_duplicates_enabled, int max_structure_count,
                                                 int *arrayCount) {
+          return SuboptTracebackParallel(len, gap, suboptFile, writeToFile, is_check_for_duplicates_enabled, 
+                                         max_structure_count, 1, arrayCount);
+}
+
+ss_ctype_t * SuboptTracebackParallel(int len, int gap, const char *suboptFile, int writeToFile,
+                                     int is_check_for_duplicates_enabled, int max_structure_count,
+                                     int numThreads, int *arrayCount) {
           if(arrayCount == NULL) {
                return NULL;
           }
-          ss_map_t ssm = subopt_traceback(len, gap, suboptFile, writeToFile, is_check_for_duplicates_enabled,
-                                          max_structure_count);
-          return SSMapToCType(ssm, arrayCount);
+          ss_table_t sst;
+          subopt_traceback_table(sst, len, gap, suboptFile, writeToFile, is_check_for_duplicates_enabled,
+                                 max_structure_count, numThreads);
+          return SSTableToCType(sst, arrayCount);
 }
 
+
+/* An arbitrary precision count for subopt_band_counter (once the counts overflow 64 bits): */
+class subopt_big_count {
+     public:
+          subopt_big_count(unsigned long value = 0) { mpz_init_set_ui(value_, value); }
+          subopt_big_count(const subopt_big_count &count) { mpz_init_set(value_, count.value_); }
+          ~subopt_big_count() { mpz_clear(value_); }
+          subopt_big_count & operator = (const subopt_big_count &count) {
+               mpz_set(value_, count.value_);
+               return *this;
+          }
+          mpz_t value_;
+};
+
+static inline bool count_is_zero(uint64_t count) { return count == 0; }
+static inline bool count_is_zero(const subopt_big_count &count) { return mpz_sgn(count.value_) == 0; }
+
+static inline void count_add(uint64_t &sum, uint64_t count, bool &overflow) {
+     if (__builtin_add_overflow(sum, count, &sum)) overflow = true;
+}
+
+static inline void count_add(subopt_big_count &sum, const subopt_big_count &count, bool &) {
+     mpz_add(sum.value_, sum.value_, count.value_);
+}
+
+static inline void count_add_product(uint64_t &sum, uint64_t count1, uint64_t count2, bool &overflow) {
+     uint64_t product;
+     if (__builtin_mul_overflow(count1, count2, &product) || __builtin_add_overflow(sum, product, &sum)) {
+          overflow = true;
+     }
+}
+
+static inline void count_add_product(subopt_big_count &sum, const subopt_big_count &count1, 
+		                     const subopt_big_count &count2, bool &) {
+     mpz_addmul(sum.value_, count1.value_, count2.value_);
+}
+
+static inline char * count_string(uint64_t count) {
+     char buff[32];
+     snprintf(buff, sizeof(buff), "%llu", (unsigned long long) count);
+     return strdup(buff);
+}
+
+static inline char * count_string(const subopt_big_count &count) {
+     char *str = mpz_get_str(NULL, 10, count.value_);
+     char *count_str = (str != NULL) ? strdup(str) : NULL;
+     void (*gmp_free)(void *, size_t);
+     mp_get_memory_functions(NULL, NULL, &gmp_free);
+     if (str != NULL) (*gmp_free)(str, strlen(str) + 1);
+     return count_str;
+}
+
+/* Counts the foldings of the segments (label, i, j) of the subopt traceback by energy: 
+ * counts(seg)[d] is the number of foldings of seg with the energy seg.en_ + d, for 
+ * 0 <= d <= max_offset. The segments are expanded by trace_func exactly as in the 
+ * traceback, so the counts are those of the structures the traceback would output, but 
+ * each segment is only expanded once (so that the time is polynomial in the length and 
+ * max_offset however many structures there are). Count_t is uint64_t (which sets 
+ * overflow if a count does not fit) or subopt_big_count: 
+ */
+template<typename Count_t>
+class subopt_band_counter {
+     public:
+          typedef std::vector<Count_t> counts_t;
+
+          subopt_band_counter(int len, int max_offset) : 
+               overflow(false), length_(len), max_offset_(max_offset), ps_empty_(0, len) {}
+
+          const counts_t & counts(const segment &seg) {
+               long long key = ((long long) seg.label_ * (length_ + 1) + seg.i_) * (length_ + 1) + seg.j_;
+               typename std::unordered_map<long long, counts_t>::iterator it = segment_counts_.find(key);
+               if (it != segment_counts_.end()) {
+                    return it->second;
+               }
+               counts_t seg_counts(max_offset_ + 1, Count_t(0));
+               std::vector<expansion_t> expansions = expand(seg);
+               for (size_t x = 0; x < expansions.size(); x++) {
+                    add_expansion(seg, expansions[x], seg_counts);
+               }
+               return segment_counts_.insert(std::make_pair(key, seg_counts)).first->second;
+          }
+
+          /* Sums the counts of the bins [k * bin_width, (k + 1) * bin_width) of offsets: */
+          counts_t bins(const counts_t &seg_counts, int bin_width) {
+               counts_t bin_counts(max_offset_ / bin_width + 1, Count_t(0));
+               for (int d = 0; d <= max_offset_; d++) {
+                    count_add(bin_counts[d / bin_width], seg_counts[d], overflow);
+               }
+               return bin_counts;
+          }
+
+          bool overflow;
+
+     private:
+          /* One of the ways trace_func expands a segment: the energy it adds, and the 
+           * segments it leaves to fold: 
+           */
+          typedef struct {
+               int energy;
+               std::vector<segment> segments;
+          } expansion_t;
+
+          std::vector<expansion_t> expand(const segment &seg) {
+               // Only the expansions within max_offset_ of the energy of seg are needed:
+               delta = seg.en_ + max_offset_ - mfe;
+               ps_stack_t expanded;
+               gflag = 0;
+               if (seg.j_ - seg.i_ > TURN) {
+                    ps_t ps(ps_empty_);
+                    (*trace_func[seg.label_])(seg.i_, seg.j_, ps, expanded);
+               }
+               if (!gflag) {
+                    expanded.push(ps_empty_);
+               }
+               std::vector<expansion_t> expansions;
+               while (!expanded.empty()) {
+                    ps_t &ps = expanded.top();
+                    expansion_t expansion;
+                    expansion.energy = ps.ae_;
+                    while (!ps.empty()) {
+                         expansion.segments.push_back(ps.top());
+                         ps.pop();
+                    }
+                    expansions.push_back(expansion);
+                    expanded.pop();
+               }
+               return expansions;
+          }
+
+          void add_expansion(const segment &seg, const expansion_t &expansion, counts_t &seg_counts) {
+               // The offset of the best folding of the expansion (which is >= 0, since the 
+               // energies of the segments are the minima over their foldings):
+               int base = expansion.energy - seg.en_;
+               for (size_t s = 0; s < expansion.segments.size(); s++) {
+                    base += expansion.segments[s].en_;
+               }
+               base = MAX(0, base);
+               if (base > max_offset_) {
+                    return;
+               }
+               // The counts of the foldings of the segments so far by their offset from base:
+               counts_t fold_counts(max_offset_ - base + 1, Count_t(0));
+               fold_counts[0] = Count_t(1);
+               for (size_t s = 0; s < expansion.segments.size(); s++) {
+                    const counts_t &sub_counts = counts(expansion.segments[s]);
+                    counts_t next_counts(fold_counts.size(), Count_t(0));
+                    for (size_t d1 = 0; d1 < fold_counts.size(); d1++) {
+                         if (count_is_zero(fold_counts[d1])) continue;
+                         for (size_t d2 = 0; d1 + d2 < fold_counts.size(); d2++) {
+                              if (count_is_zero(sub_counts[d2])) continue;
+                              count_add_product(next_counts[d1 + d2], fold_counts[d1], sub_counts[d2], overflow);
+                         }
+                    }
+                    fold_counts.swap(next_counts);
+               }
+               for (size_t d = 0; d < fold_counts.size(); d++) {
+                    count_add(seg_counts[base + d], fold_counts[d], overflow);
+               }
+          }
+
+          int length_;
+          int max_offset_;
+          ps_t ps_empty_;
+          std::unordered_map<long long, counts_t> segment_counts_;
+};
+
+/* The bin counts of an energy band histogram as decimal strings (which are allocated with 
+ * malloc and strdup): 
+ */
+template<typename Count_t>
+static char ** band_count_strings(const std::vector<Count_t> &bin_counts) {
+     char **count_strs = (char **) calloc(bin_counts.size(), sizeof(char *));
+     for (size_t b = 0; count_strs != NULL && b < bin_counts.size(); b++) {
+          count_strs[b] = count_string(bin_counts[b]);
+          if (count_strs[b] == NULL) {
+               for (size_t c = 0; c < b; c++) free(count_strs[c]);
+               free(count_strs);
+               count_strs = NULL;
+          }
+     }
+     return count_strs;
+}
+
+/* Counts the structures the subopt traceback finds within _delta of the MFE in the bins 
+ * [mfe + k * bin_width, mfe + (k + 1) * bin_width) of energy, without enumerating them. 
+ * The counts are exact (arbitrary precision once they overflow 64 bits) and are returned 
+ * as decimal strings, allocated with malloc, in an array of *num_bins entries. Returns 
+ * NULL and sets errno to EINVAL for invalid arguments, to ERANGE if the sequence is too 
+ * long for the FM arrays, and to ENOMEM if the counts do not fit in memory: 
+ */
+char ** subopt_energy_band_counts(int len, int _delta, int bin_width, int *num_bins) {
+        if (_delta < 0 || bin_width <= 0 || num_bins == NULL) {
+                errno = EINVAL;
+                return NULL;
+        }
+        int unique_multiloop_decomposition;
+        if (!begin_unique_traceback(len, _delta, unique_multiloop_decomposition)) {
+                errno = ERANGE;
+                return NULL;
+        }
+        segment root(1, len, lW, W[len]);
+        char **count_strs = NULL;
+        try {
+                ps_arena_scope_t arena;
+                subopt_band_counter<uint64_t> counter(len, _delta);
+                std::vector<uint64_t> bin_counts = counter.bins(counter.counts(root), bin_width);
+                if (!counter.overflow) {
+                        count_strs = band_count_strings(bin_counts);
+                }
+                else {
+                        subopt_band_counter<subopt_big_count> big_counter(len, _delta);
+                        count_strs = band_count_strings(big_counter.bins(big_counter.counts(root), bin_width));
+                }
+        } catch (std::bad_alloc &) {
+                count_strs = NULL;
+        }
+        UNIQUE_MULTILOOP_DECOMPOSITION = unique_multiloop_decomposition;
+        if (count_strs == NULL) {
+                errno = ENOMEM;
+                return NULL;
+        }
+        *num_bins = _delta / bin_width + 1;
+        return count_strs;
+}